@@ -0,0 +1,16 @@
+"""
+Defect Viewer Benchmarks
+------------------------
+
+Timed scenarios of the viewer on synthetic nSpec datasets, so
+regressions in loading, defect placement, click lookup and tile
+rendering show up before users notice them.
+
+Run from the repository root:
+
+    $ python -m benchmarks --size small --out results.json
+
+Datasets are generated into --data (a temporary folder by default)
+and reused while their parameters are unchanged. Pass a previous
+results file with --baseline to print the change of every timing.
+"""
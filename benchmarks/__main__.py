@@ -0,0 +1,98 @@
+"""
+benchmarks.__main__
+-------------------
+
+Command line entry point, see the benchmarks package docstring.
+"""
+
+# __main__.py imports
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import numpy as np
+import PIL
+
+# custom modules
+from benchmarks import scenarios
+from benchmarks import synth
+
+
+def environment():
+    """Describe the machine and library versions the benchmark ran with."""
+    return {'python': platform.python_version(), 'numpy': np.__version__, 'pillow': PIL.__version__,
+            'platform': platform.platform(), 'processor': platform.processor(), 'cpu_count': os.cpu_count()}
+
+
+def flatten(results, prefix=''):
+    """Yield (dotted name, value) for every timing in a results dict."""
+    for key, value in results.items():
+        name = prefix + key
+        if isinstance(value, dict):
+            yield from flatten(value, name + '.')
+        elif key in ('min', 'median'):
+            yield name, value
+
+
+def compare(results, baseline):
+    """Print the change of every min and median timing against a baseline run."""
+    old = dict(flatten(baseline['scenarios']))
+    print(f"{'timing':<45}{'baseline':>12}{'current':>12}{'change':>9}")
+    for name, value in flatten(results['scenarios']):
+        if name in old and old[name] > 0:
+            print(f"{name:<45}{old[name]:>12.4g}{value:>12.4g}{value / old[name]:>8.2f}x")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='benchmarks', description='Time the defect viewer on synthetic nSpec data')
+    parser.add_argument('--size', choices=sorted(synth.PRESETS), default='small', help='dataset size preset')
+    parser.add_argument('--tiles', type=int, help='number of tiles, overrides the preset')
+    parser.add_argument('--defects', type=int, help='number of defects per analysis, overrides the preset')
+    parser.add_argument('--tile-pixels', type=int, default=synth.DEFAULT_PARAMS['tile_pixels'],
+                        help='side of the tile images in pixels')
+    parser.add_argument('--mosaic-pixels', type=int, default=synth.DEFAULT_PARAMS['mosaic_pixels'],
+                        help='longer side of the mosaic image in pixels')
+    parser.add_argument('--seed', type=int, default=0, help='random seed of the dataset')
+    parser.add_argument('--data', help='folder to generate the dataset in and reuse it from')
+    parser.add_argument('--scale', type=int, default=4, help='image scale used to shrink the mosaic')
+    parser.add_argument('--repeat', type=int, default=3, help='runs of every timing')
+    parser.add_argument('--scenario', nargs='+', choices=list(scenarios.SCENARIOS),
+                        default=list(scenarios.SCENARIOS), help='scenarios to run, default is all')
+    parser.add_argument('--out', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='previous results JSON file to compare against')
+    args = parser.parse_args(argv)
+
+    params = dict(synth.PRESETS[args.size], tile_pixels=args.tile_pixels,
+                  mosaic_pixels=args.mosaic_pixels, seed=args.seed)
+    if args.tiles is not None:
+        params['tiles'] = args.tiles
+    if args.defects is not None:
+        params['defects'] = args.defects
+
+    with tempfile.TemporaryDirectory(prefix='dfv-bench-') as tmp:
+        start = time.perf_counter()
+        dataset = synth.load_or_make(args.data or tmp, **params)
+        print(f"dataset ready in {time.perf_counter() - start:.1f} s: "
+              f"{params['tiles']} tiles, {params['defects']} defects", file=sys.stderr)
+        results = {'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'environment': environment(),
+                   'dataset': dataset.params, 'image_scale': args.scale, 'scenarios': {}}
+        for name in args.scenario:
+            print('running ' + name, file=sys.stderr)
+            results['scenarios'][name] = scenarios.SCENARIOS[name](dataset, args.repeat, args.scale)
+
+    text = json.dumps(results, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,541 @@
+"""
+benchmarks.scenarios
+--------------------
+
+This module holds the timed benchmark scenarios. Each scenario
+runs the code behind one interaction of the viewer on a synthetic
+dataset and returns its timings in seconds:
+
+    - db_load: fetching and converting the image and defect rows,
+      and loading them back from the local column cache
+    - mosaic_image: opening and resizing the Mosaic image
+    - defect_placement: mosaic coordinates, binning and mark colors
+      of every defect, then stamping the marks onto the mosaic
+    - click_lookup: finding the tile under a click and its defects
+    - pyramid_build: building the image pyramid of one tile
+    - pan_zoom: rendering the visible tile region while zooming
+      in and out and panning across the tile
+    - analysis_diff: matching the defects of an analysis with a
+      shifted copy of them, missing some and adding others
+    - defect_filter: building the sorted column indexes, then
+      evaluating range, class and region filters as a slider moves
+    - region_select: building the grid index of the defect marks,
+      then selecting defects in rectangles and a lasso polygon
+    - tile_focus: time to the first frame of a tile opened by a
+      click, the whole tile at native size with its full pyramid
+      against the view zoomed on the defect nearest to the click
+    - defect_review: stepping through defects by size in one tile
+      view, the first frame of every defect, with and without the
+      tiles ahead preloaded on the decode workers
+    - memory_budget: opening tiles one after another, each kept
+      open with every pyramid level, accounted by a MemoryManager,
+      without a budget and within one, with the time to account and
+      evict and the time to rebuild an evicted level
+    - manual_pages: opening a PDF manual, rendering every page up
+      front against the page sizes and the pages in view only, from
+      a cold and a warm page cache
+
+Tk is not used, canvas item creation and PhotoImage conversion
+are not part of the timings.
+"""
+
+# scenarios.py imports
+import shutil
+import tempfile
+import time
+import numpy as np
+from PIL import Image
+
+# custom modules
+from dfv import colcache
+from dfv import core
+from dfv import imaging
+from dfv import matching
+from dfv import memory
+from dfv import pdfpages
+from dfv import pdfshow
+from dfv import query
+from dfv import render
+from dfv import review
+from dfv import scheduler
+
+
+def timed(func, repeat):
+    """Call func repeat times and summarize the wall clock times.
+
+    Returns
+    -------
+    stats : dict
+        min, median, mean and max of the run times in seconds.
+    result : object
+        Return value of the last call.
+    """
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    times = np.array(times)
+    stats = {'min': float(times.min()), 'median': float(np.median(times)),
+             'mean': float(times.mean()), 'max': float(times.max()), 'repeat': repeat}
+    return stats, result
+
+
+def new_model(dataset, image_scale):
+    """Create an unloaded MosaicModel of the first analysis of a dataset."""
+    return core.MosaicModel(dataset.db_file, core.scan_folder(dataset.scan_dir, dataset.scan_id),
+                            dataset.scan_id, dataset.analysis_ids[0], image_scale)
+
+
+def loaded_model(dataset, image_scale):
+    """Create a MosaicModel with its tables loaded and mosaic size set."""
+    model = new_model(dataset, image_scale)
+    model.load()
+    with Image.open(core.find_mosaic_image(model.img_loc)) as image:
+        width, height = image.size
+    model.set_mosaic_size(round(width / model.image_scale), round(height / model.image_scale))
+    return model
+
+
+def db_load(dataset, repeat, image_scale):
+    """Time the SQL fetch and the conversion into typed columns separately."""
+    model = new_model(dataset, image_scale)
+
+    def fetch():
+        with model.connect() as conn:
+            return conn.execute(core.SQL_DEFECTS, (model.analysis_id,)).fetchall()
+
+    fetch_stats, rows = timed(fetch, repeat)
+    convert_stats, _ = timed(lambda: core.ColumnTable.from_rows(core.DEFECT_SCHEMA, rows), repeat)
+
+    # time a full load without the column cache, then reopening from a warm cache in a scratch folder
+    enabled, cache_dir = colcache.cache.enabled, colcache.cache.folder
+    try:
+        colcache.cache.enabled = False
+        load_stats, _ = timed(model.load, repeat)
+        colcache.cache.enabled, colcache.cache.folder = True, tempfile.mkdtemp(prefix='dfv_bench_tables_')
+        model.load()
+        cached_stats, _ = timed(model.load, repeat)
+    finally:
+        if colcache.cache.folder != cache_dir:
+            shutil.rmtree(colcache.cache.folder, ignore_errors=True)
+        colcache.cache.enabled, colcache.cache.folder = enabled, cache_dir
+    return {'defects': len(rows), 'images': len(model.images), 'defect_fetch': fetch_stats,
+            'defect_convert': convert_stats, 'load': load_stats, 'load_cached': cached_stats}
+
+
+def mosaic_image(dataset, repeat, image_scale):
+    """Time opening and resizing the Mosaic image."""
+    model = new_model(dataset, image_scale)
+    model.load()
+    stats, image = timed(model.load_mosaic_image, repeat)
+    return {'source_size': [model.mos_source_width, model.mos_source_height],
+            'resize_size': list(image.size), 'load': stats}
+
+
+def defect_placement(dataset, repeat, image_scale):
+    """Time the per-defect work of plot_defects and a headless draw of the marks."""
+    model = loaded_model(dataset, image_scale)
+
+    def place():
+        model._tile_index = None  # recompute the tile of every defect each run
+        x, y = model.defect_mosaic_coords()
+        size_bins = model.size_bins()
+        class_bins = model.class_bins()
+        core.bin_counts(size_bins, len(model.binning_colors))
+        core.bin_counts(class_bins, len(model.binning_type_colors))
+        colors = core.bin_colors(size_bins, model.binning_colors, model.inf_bin_color)
+        core.bin_colors(class_bins, model.binning_type_colors, model.inf_bin_color)
+        return x, y, size_bins, colors
+
+    place_stats, (x, y, size_bins, _) = timed(place, repeat)
+    palette = np.array([render.resolve_color(c) for c in list(model.binning_colors) + [model.inf_bin_color]],
+                       dtype=np.uint8)
+    marks = palette[np.minimum(size_bins, len(palette) - 1)]
+    pixels = np.zeros((model.mos_resize_height, model.mos_resize_width, 3), dtype=np.uint8)
+    stamp_stats, _ = timed(lambda: render.stamp_marks(pixels, x, y, marks, float(model.defect_mark_size)), repeat)
+    return {'defects': len(model.defects), 'place': place_stats, 'stamp': stamp_stats}
+
+
+def click_lookup(dataset, repeat, image_scale, clicks=1000, seed=0):
+    """Time tile hit testing and the per-tile defect lookup of random clicks."""
+    model = loaded_model(dataset, image_scale)
+    rng = np.random.default_rng(seed)
+    xs = rng.uniform(0, model.mos_resize_width, clicks)
+    ys = rng.uniform(0, model.mos_resize_height, clicks)
+    # the first lookup sorts the defects by tile, time it on its own
+    def first_lookup():
+        model._tile_order = None
+        return model.tile_defects(0)
+
+    first_stats, _ = timed(first_lookup, repeat)
+
+    def click_all():
+        found = 0
+        for x, y in zip(xs, ys):
+            index = model.tile_at(x, y)
+            if index is not None:
+                found += len(model.tile_defects(index))
+        return found
+
+    stats, found = timed(click_all, repeat)
+    per_click = {k: v / clicks for k, v in stats.items() if k != 'repeat'}
+    return {'clicks': clicks, 'defects_found': int(found), 'first_lookup': first_stats,
+            'all_clicks': stats, 'per_click': per_click}
+
+
+def pyramid_build(dataset, repeat, image_scale):
+    """Time opening one tile and building its image pyramid."""
+    model = new_model(dataset, image_scale)
+    model.load()
+    path = model.tile_path(0)
+
+    def build():
+        image = Image.open(path)
+        image.load()
+        return imaging.build_pyramid(image)
+
+    stats, pyramid = timed(build, repeat)
+    return {'tile_size': list(pyramid[0].size), 'levels': len(pyramid), 'build': stats}
+
+
+def pan_zoom(dataset, repeat, image_scale, viewport=(1200, 800), zoom_steps=12, pan_steps=24):
+    """Time rendering the visible tile region while zooming and panning.
+
+    The tile starts at native size in the corner of the viewport,
+    is zoomed in step by step around the viewport center, panned
+    across and zoomed back out, as in TileCanvas.show_image.
+    """
+    model = new_model(dataset, image_scale)
+    model.load()
+    image = Image.open(model.tile_path(0))
+    image.load()
+    pyramid = imaging.build_pyramid(image)
+    view_w, view_h = viewport
+
+    # (imscale, left, top) of the image on the canvas for every frame
+    frames = []
+    imscale = 1.0
+    left = top = 0.0
+    for step in range(zoom_steps):
+        imscale *= imaging.PYRAMID_REDUCE_FACTOR
+        left = view_w / 2 - (view_w / 2 - left) * imaging.PYRAMID_REDUCE_FACTOR
+        top = view_h / 2 - (view_h / 2 - top) * imaging.PYRAMID_REDUCE_FACTOR
+        frames.append((imscale, left, top))
+    width, height = image.size[0] * imscale, image.size[1] * imscale
+    for step in range(pan_steps):
+        frames.append((imscale, -(width - view_w) * step / pan_steps, -(height - view_h) * step / pan_steps))
+    for step in range(zoom_steps):
+        imscale /= imaging.PYRAMID_REDUCE_FACTOR
+        frames.append((imscale, 0.0, 0.0))
+
+    def render_frames():
+        for imscale, left, top in frames:
+            level, scale = imaging.pyramid_level(imscale, len(pyramid))
+            width, height = image.size[0] * imscale, image.size[1] * imscale
+            # visible region relative to the image corner
+            x1, y1 = max(-left, 0), max(-top, 0)
+            x2, y2 = min(view_w, left + width) - left, min(view_h, top + height) - top
+            if int(x2 - x1) > 0 and int(y2 - y1) > 0:
+                imaging.render_view(pyramid, level, scale, x1, y1, x2, y2)
+
+    stats, _ = timed(render_frames, repeat)
+    per_frame = {k: v / len(frames) for k, v in stats.items() if k != 'repeat'}
+    return {'viewport': list(viewport), 'frames': len(frames), 'all_frames': stats, 'per_frame': per_frame}
+
+
+def analysis_diff(dataset, repeat, image_scale, tolerance=5.0, missing=0.1, seed=0):
+    """Time matching the defects of an analysis against a perturbed copy of itself.
+
+    The copy has every defect shifted by a fraction of the tolerance,
+    a share of them removed and as many new ones added at random.
+    """
+    model = new_model(dataset, image_scale)
+    model.load()
+    a = model.defects
+    rng = np.random.default_rng(seed)
+    kept = np.flatnonzero(rng.random(len(a)) >= missing)
+    added = rng.integers(0, len(a), len(a) - len(kept))
+    image_b = np.concatenate([a['ImageID'][kept], a['ImageID'][added]])
+    x_b = np.concatenate([a['X'][kept] + rng.normal(0, tolerance / 10, len(kept)),
+                          rng.uniform(a['X'].min(), a['X'].max(), len(added))])
+    y_b = np.concatenate([a['Y'][kept] + rng.normal(0, tolerance / 10, len(kept)),
+                          rng.uniform(a['Y'].min(), a['Y'].max(), len(added))])
+    stats, (match_a, _) = timed(lambda: matching.match_defects(a['ImageID'], a['X'], a['Y'],
+                                                               image_b, x_b, y_b, tolerance), repeat)
+    return {'defects': len(a), 'compare_defects': len(x_b), 'matched': int((match_a >= 0).sum()),
+            'shifted_copies': len(kept), 'match': stats}
+
+
+def defect_filter(dataset, repeat, image_scale, steps=20):
+    """Time the filter of the filter panel, a range slider moving across Area with a class and region kept."""
+    model = loaded_model(dataset, image_scale)
+    index_stats, _ = timed(lambda: [query.DefectIndex(model.defects, np.zeros(len(model.defects)),
+                                                      np.zeros(len(model.defects))).sorted_column(name)
+                                    for name in query.RANGE_COLUMNS], repeat)
+    index = model.defect_index()
+    max_rows, max_cols = core.mosaic_grid(model.images)
+    class_ids = np.unique(model.defects['ClassID'])[:2]
+
+    def move_slider():
+        kept = 0
+        for step in range(steps):
+            defect_query = query.DefectQuery({'Area': (index.quantile('Area', step / (2 * steps)), None),
+                                              'Intensity': (None, index.quantile('Intensity', 0.9))},
+                                             class_ids, (0, max_rows // 2, 0, max_cols // 2))
+            kept = int(np.count_nonzero(index.evaluate(defect_query)))
+        return kept
+
+    stats, kept = timed(move_slider, repeat)
+    per_step = {k: v / steps for k, v in stats.items() if k != 'repeat'}
+    return {'defects': len(model.defects), 'steps': steps, 'kept_last_step': kept, 'index': index_stats,
+            'all_steps': stats, 'per_step': per_step}
+
+
+def region_select(dataset, repeat, image_scale, selections=100, seed=0):
+    """Time selecting the defects in random rectangles and a star shaped lasso on the mosaic."""
+    model = loaded_model(dataset, image_scale)
+
+    def build_index():
+        model.set_mosaic_size(model.mos_resize_width, model.mos_resize_height)  # drops the cached index
+        return model.mark_index()
+
+    index_stats, _ = timed(build_index, repeat)
+    rng = np.random.default_rng(seed)
+    width, height = model.mos_resize_width, model.mos_resize_height
+    corners = rng.uniform(0, 1, (selections, 4)) * [width, height, width, height]
+
+    def select_rects():
+        return sum(len(model.select_rect(*corner)) for corner in corners)
+
+    angle = np.linspace(0, 2 * np.pi, 400, endpoint=False)
+    radius = min(width, height) / 4 * (1 + 0.3 * np.sin(5 * angle))
+    px, py = width / 2 + radius * np.cos(angle), height / 2 + radius * np.sin(angle)
+    rect_stats, selected = timed(select_rects, repeat)
+    lasso_stats, lasso = timed(lambda: model.select_polygon(px, py), repeat)
+    per_rect = {k: v / selections for k, v in rect_stats.items() if k != 'repeat'}
+    return {'defects': len(model.defects), 'rects': selections, 'rect_defects': selected, 'lasso_defects': len(lasso),
+            'index': index_stats, 'per_rect': per_rect, 'lasso': lasso_stats}
+
+
+def tile_focus(dataset, repeat, image_scale, viewport=(800, 600), clicks=20, seed=0):
+    """Time the first frame of tiles opened by random clicks, whole and focused on the nearest defect.
+
+    The whole tile is the view before tiles opened on a defect: the
+    full pyramid is built on open and the first frame shows the tile
+    at native size. The focused view finds the defect nearest to the
+    click, builds no pyramid level and renders the region around the
+    defect, as in TileCanvas.focus_on.
+    """
+    model = loaded_model(dataset, image_scale)
+    rng = np.random.default_rng(seed)
+    xs = rng.uniform(0, model.mos_resize_width, clicks)
+    ys = rng.uniform(0, model.mos_resize_height, clicks)
+    hits = [(model.tile_at(x, y), x, y) for x, y in zip(xs, ys)]
+    hits = [hit for hit in hits if hit[0] is not None]
+    view_w, view_h = viewport
+
+    def open_whole():
+        for index, _, _ in hits:
+            image = Image.open(model.tile_path(index))
+            image.load()
+            pyramid = imaging.build_pyramid(image)
+            imaging.render_view(pyramid, 0, 1.0, 0, 0, min(view_w, image.size[0]), min(view_h, image.size[1]))
+
+    def open_focused():
+        for index, x, y in hits:
+            model._tile_grids = {}  # every click builds the grid index of its tile
+            defect = model.nearest_tile_defect(index, x, y)
+            pyramid = imaging.LazyPyramid(Image.open(model.tile_path(index)))
+            width, height = pyramid.sizes[0]
+            if defect is None:
+                imaging.render_view(pyramid, 0, 1.0, 0, 0, min(view_w, width), min(view_h, height))
+            else:
+                focused_frame(model, pyramid, index, defect, viewport)
+
+    whole_stats, _ = timed(open_whole, repeat)
+    focus_stats, _ = timed(open_focused, repeat)
+    per_whole = {k: v / max(len(hits), 1) for k, v in whole_stats.items() if k != 'repeat'}
+    per_focus = {k: v / max(len(hits), 1) for k, v in focus_stats.items() if k != 'repeat'}
+    return {'viewport': list(viewport), 'tiles': len(hits), 'per_tile_whole': per_whole, 'per_tile_focused': per_focus}
+
+
+def focused_frame(model, pyramid, index, defect, viewport):
+    """Render the first frame of a tile view zoomed on a defect, as in TileCanvas.focus_on."""
+    view_w, view_h = viewport
+    width, height = pyramid.sizes[0]
+    px, py = model.tile_pixel_coords(defect, index, width, height)
+    size = np.nan_to_num(max(model.defects['W'][defect], model.defects['H'][defect]))
+    imscale = imaging.focus_scale(size, min(viewport), max_scale=min(viewport) // 2)
+    level, scale = imaging.pyramid_level(imscale, len(pyramid))
+    # visible region relative to the image corner, with the defect in the centre
+    x1, y1 = max(px * imscale - view_w / 2, 0), max(py * imscale - view_h / 2, 0)
+    x2, y2 = min(px * imscale + view_w / 2, width * imscale), min(py * imscale + view_h / 2, height * imscale)
+    return imaging.render_view(pyramid, level, scale, x1, y1, x2, y2)
+
+
+def defect_review(dataset, repeat, image_scale, viewport=(800, 600), steps=200, dwell=0.15):
+    """Time stepping through the largest defects, the first frame of each one.
+
+    Every step looks up the tile of the next defect, takes its pyramid
+    from the tile cache of a Scheduler, finds the defects to draw on
+    it and renders the view zoomed on the defect. The reviewer looks
+    at every defect for dwell seconds, not part of the timings. Without
+    preloading a tile is decoded when it is reached, with it the tiles
+    ahead are decoded on the workers while the current one is looked at.
+    """
+    model = loaded_model(dataset, image_scale)
+    order_stats, sequence = timed(lambda: review.DefectSequence(model, 'Size', descending=True), repeat)
+    steps = min(steps, len(sequence))
+    tile_index = model.tile_index()
+
+    def step_all(preload):
+        shared = scheduler.Scheduler()
+        times = []
+        try:
+            sequence.move_to(0)
+            for step in range(steps):
+                start = time.perf_counter()
+                defect = sequence.current()
+                index = int(tile_index[defect])
+                pyramid = shared.tile_pyramid(model.tile_path(index))
+                model.tile_defects(index)
+                focused_frame(model, pyramid, index, defect, viewport)
+                if preload:
+                    for i, image_index in enumerate(sequence.upcoming_tiles()):
+                        shared.preload_tile(model.tile_path(image_index), levels=i < review.PRELOAD_LEVELS)
+                times.append(time.perf_counter() - start)
+                sequence.step(1)
+                time.sleep(dwell)
+        finally:
+            shared.shutdown()
+        return np.array(times)
+
+    results = {'defects': len(sequence), 'steps': steps, 'dwell': dwell, 'order': order_stats}
+    for name, preload in (('per_step', False), ('per_step_preloaded', True)):
+        times = np.concatenate([step_all(preload) for _ in range(repeat)])
+        results[name] = {'median': float(np.median(times)), 'mean': float(times.mean()),
+                         'p95': float(np.percentile(times, 95)), 'max': float(times.max())}
+    return results
+
+
+def memory_budget(dataset, repeat, image_scale, tiles=24, budget=64 * 1024**2):
+    """Time memory accounting and eviction while tiles pile up in open windows.
+
+    Every tile is taken from the tile cache of a Scheduler with all of
+    its pyramid levels built and registered as a tile window would,
+    with the defect indexes of the mosaic and the shared caches. After
+    every tile the budget is enforced, as Root does periodically. The
+    peak is the largest total accounted after enforcing.
+    """
+    model = loaded_model(dataset, image_scale)
+    tiles = min(tiles, len(model.images))
+
+    def open_all(limit):
+        shared = scheduler.Scheduler()
+        manager = memory.MemoryManager(limit)
+        owner = manager.new_owner('Mosaic')
+        manager.register(owner, 'defect tables', lambda: model.defects.nbytes)
+        manager.register(owner, 'defect indexes', model.cache_nbytes, model.drop_caches)
+        owner = manager.new_owner('Shared caches')
+        manager.register(owner, 'preloaded tiles', shared.idle_tile_bytes, shared.drop_idle_tiles)
+        model.defect_index().sorted_column('Area')
+        model.mark_index()
+        pyramids, enforce_times, peak = [], [], 0
+        try:
+            for index in range(tiles):
+                pyramid = shared.tile_pyramid(model.tile_path(index))
+                pyramid.build_all()
+                pyramids.append(pyramid)
+                owner = manager.new_owner('Tile window')
+                manager.register(owner, 'tile pyramid', lambda p=pyramid: p.nbytes, pyramid.drop_levels)
+                start = time.perf_counter()
+                manager.enforce()
+                enforce_times.append(time.perf_counter() - start)
+                peak = max(peak, manager.total())
+            start = time.perf_counter()
+            pyramids[0][len(pyramids[0]) - 1]  # zoom out fully on the coldest tile
+            rebuild = time.perf_counter() - start
+        finally:
+            shared.shutdown()
+        return {'peak_bytes': peak, 'enforce_mean': float(np.mean(enforce_times)),
+                'enforce_max': float(np.max(enforce_times)), 'rebuild_level': rebuild}
+
+    results = {'tiles': tiles, 'budget': budget}
+    for name, limit in (('unbounded', float('inf')), ('budgeted', budget)):
+        runs = [open_all(limit) for _ in range(repeat)]
+        results[name] = {key: float(np.median([run[key] for run in runs])) for key in runs[0]}
+    return results
+
+
+def manual_pages(dataset, repeat, image_scale, pages=40, view_pages=2):
+    """Time opening a PDF manual until its first view is shown.
+
+    The manual is made with a tile image on every page. Rendering every
+    page up front, as the viewer once did, is compared with reading the
+    page sizes and rendering the pages in view plus those kept around
+    them. Held is the memory of the photo images shown at 4 bytes per pixel.
+    """
+    import fitz  # only needed here, by the viewer itself and dfv.pdfpages
+
+    model = loaded_model(dataset, image_scale)
+    folder = tempfile.mkdtemp(prefix='dfv_bench_pages_')
+    enabled, cache_dir = pdfpages.cache.enabled, pdfpages.cache.folder
+    try:
+        pdf_path = folder + '/manual.pdf'
+        document = fitz.open()
+        for number in range(pages):
+            page = document.new_page()
+            page.insert_text((72, 72), f'Page {number + 1}', fontsize=20)
+            page.insert_image(fitz.Rect(72, 100, 520, 548), filename=model.tile_path(number % len(model.images)))
+        document.save(pdf_path)
+        document.close()
+
+        def render_all():
+            with fitz.open(pdf_path) as document:
+                images = [Image.frombytes('RGB', (pix.width, pix.height), pix.samples)
+                          for pix in (page.get_pixmap() for page in document)]
+            return sum(image.width * image.height * 4 for image in images)
+
+        def first_view():
+            manual = pdfpages.PdfPages(pdf_path)
+            sizes = manual.page_sizes()
+            for number in range(view_pages + pdfshow.KEEP_PAGES):
+                manual.render_page(number)
+            manual.close()
+            return sum(w * h * 4 for w, h in sizes[:view_pages + pdfshow.KEEP_PAGES])
+
+        all_stats, all_bytes = timed(render_all, repeat)
+        pdfpages.cache.enabled, pdfpages.cache.folder = True, folder + '/cache'
+        cold = []
+        for _ in range(repeat):
+            shutil.rmtree(pdfpages.cache.folder, ignore_errors=True)
+            start = time.perf_counter()
+            view_bytes = first_view()
+            cold.append(time.perf_counter() - start)
+        cached_stats, _ = timed(first_view, repeat)
+    finally:
+        pdfpages.cache.enabled, pdfpages.cache.folder = enabled, cache_dir
+        shutil.rmtree(folder, ignore_errors=True)
+    return {'pages': pages, 'all_pages': all_stats, 'all_pages_held': all_bytes,
+            'first_view_cold': float(np.median(cold)), 'first_view_cached': cached_stats,
+            'first_view_held': view_bytes}
+
+
+# scenario name -> function, in the order they run
+SCENARIOS = {
+    'db_load': db_load,
+    'mosaic_image': mosaic_image,
+    'defect_placement': defect_placement,
+    'click_lookup': click_lookup,
+    'pyramid_build': pyramid_build,
+    'pan_zoom': pan_zoom,
+    'analysis_diff': analysis_diff,
+    'defect_filter': defect_filter,
+    'region_select': region_select,
+    'tile_focus': tile_focus,
+    'defect_review': defect_review,
+    'memory_budget': memory_budget,
+    'manual_pages': manual_pages,
+}
@@ -0,0 +1,247 @@
+"""
+benchmarks.synth
+----------------
+
+This module generates synthetic nSpec datasets for benchmarking:
+an SQLite database with the tables and views read by dfv, and a
+scans directory holding the tile images and the Mosaic image.
+
+Tiles are laid out on a grid of devices, defects are spread over
+the tiles at random. Only a few distinct tile images are encoded,
+the remaining tile files are hard links to them (copies where links
+are not supported), so large scans are generated quickly.
+"""
+
+# synth.py imports
+import json
+import os
+import shutil
+import sqlite3
+import numpy as np
+from PIL import Image
+
+# default dataset sizes, selectable with --size
+PRESETS = {
+    'small': {'tiles': 1000, 'defects': 10000},
+    'medium': {'tiles': 10000, 'defects': 200000},
+    'large': {'tiles': 50000, 'defects': 2000000},
+}
+
+# table layouts, the column order matters since dfv reads the rows by position
+SCHEMA = """
+CREATE TABLE Scans(ScanID INTEGER PRIMARY KEY, Name TEXT);
+CREATE TABLE ScanProperties(ScanID INTEGER, Name TEXT, Value TEXT);
+CREATE TABLE Analyzers(AnalyzerID INTEGER PRIMARY KEY, Name TEXT, Version TEXT, Type TEXT);
+CREATE TABLE Analysis(AnalysisID INTEGER PRIMARY KEY, Name TEXT, Date TEXT, AnalyzerID INTEGER, ScanID INTEGER,
+                      Recipe TEXT, Operator TEXT, Status TEXT, StartTime TEXT, EndTime TEXT, NumDefects INTEGER);
+CREATE TABLE AnalysisProperties(AnalysisID INTEGER, Name TEXT, Value TEXT);
+CREATE TABLE Images(ImageID INTEGER PRIMARY KEY, ScanID INTEGER, FileName TEXT, StageX REAL, StageY REAL,
+                    StageZ REAL, Focus REAL, Row INTEGER, Col INTEGER, WidthMicrons REAL, HeightMicrons REAL,
+                    WidthPixels INTEGER, HeightPixels INTEGER);
+CREATE TABLE Defects(DefectID INTEGER PRIMARY KEY, ImageID INTEGER, AnalysisID INTEGER, DeviceID INTEGER,
+                     X REAL, Y REAL, W REAL, H REAL, Area REAL, Intensity REAL, IntensityDeviation REAL,
+                     Eccentricity REAL, Orientation REAL, XinDevice REAL, YinDevice REAL, ClassID INTEGER,
+                     Score REAL, Contour TEXT);
+CREATE TABLE DetectionClasses(ClassID INTEGER, AnalysisID INTEGER, Name TEXT);
+CREATE INDEX ix_images_scan ON Images(ScanID);
+CREATE INDEX ix_defects_analysis ON Defects(AnalysisID);
+CREATE VIEW vwImages AS SELECT * FROM Images;
+CREATE VIEW vwDefectsLegacy AS SELECT * FROM Defects;
+"""
+
+# generator parameters and their defaults, see make_dataset
+DEFAULT_PARAMS = {
+    'tiles': 1000, 'defects': 10000, 'analyses': 1, 'classes': 4, 'tiles_per_device': 4,
+    'tile_pixels': 1024, 'tile_microns': 500.0, 'tile_format': 'jpg', 'unique_tiles': 8,
+    'mosaic_pixels': 8192, 'seed': 0,
+}
+
+CLASS_NAMES = ['Particle', 'Scratch', 'Residue', 'Pit', 'Bump', 'Stain', 'Crack', 'Void']
+
+
+class Dataset:
+    """Locations and parameters of a generated dataset."""
+
+    def __init__(self, out_dir, params):
+        self.out_dir = out_dir  # folder holding the database and the scans directory
+        self.params = params  # generator parameters, see make_dataset
+        self.db_file = os.path.join(out_dir, 'synthetic.db')  # nSpec database file
+        self.scan_dir = os.path.join(out_dir, 'synthetic')  # directory containing the 'Scan_XXX' folders
+        self.scan_id = '1'
+        self.analysis_ids = [str(a + 1) for a in range(params['analyses'])]
+
+
+def grid_shape(tiles, tiles_per_device):
+    """Return the (rows, columns) of a near square grid holding all tiles.
+
+    Both are multiples of the device side, so every device is complete.
+    """
+    side = int(np.ceil(np.sqrt(tiles_per_device)))
+    devices = int(np.ceil(tiles / side**2))
+    device_cols = int(np.ceil(np.sqrt(devices)))
+    device_rows = int(np.ceil(devices / device_cols))
+    return device_rows * side, device_cols * side
+
+
+def texture(rng, width, height, channels=3):
+    """Smooth random image, cheaper to encode than white noise and closer to a real tile."""
+    coarse = rng.integers(40, 215, (max(height // 32, 2), max(width // 32, 2), channels), dtype=np.uint8)
+    image = Image.fromarray(coarse).resize((width, height), Image.BILINEAR)
+    noise = rng.integers(-12, 12, (height, width, channels))
+    return Image.fromarray(np.clip(np.asarray(image, dtype=np.int16) + noise, 0, 255).astype(np.uint8))
+
+
+def link_or_copy(src, dst):
+    """Hard link a file, falling back on a copy."""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+def write_images(img_loc, file_names, rows, cols, params, rng):
+    """Write the tile images and the Mosaic image of the scan."""
+    os.makedirs(img_loc, exist_ok=True)
+    tile_px = params['tile_pixels']
+    ext = params['tile_format']
+    templates = []
+    for i in range(min(params['unique_tiles'], len(file_names))):
+        path = os.path.join(img_loc, file_names[i])
+        texture(rng, tile_px, tile_px).save(path)
+        templates.append(path)
+    for i in range(len(templates), len(file_names)):
+        link_or_copy(templates[i % len(templates)], os.path.join(img_loc, file_names[i]))
+
+    # the mosaic is the stitched scan, downsampled so its longer side is mosaic_pixels
+    longer = max(rows, cols)
+    mosaic_w = max(1, round(params['mosaic_pixels'] * cols / longer))
+    mosaic_h = max(1, round(params['mosaic_pixels'] * rows / longer))
+    texture(rng, mosaic_w, mosaic_h).save(os.path.join(img_loc, 'Mosaic.' + ext))
+
+
+def defect_rows(rng, first_id, count, analysis_id, num_tiles, tiles_per_side, grid_cols, params):
+    """Generate count vwDefectsLegacy rows of an analysis as a list of tuples."""
+    tile_um = params['tile_microns']
+    image_id = rng.integers(1, num_tiles + 1, count)
+    tile = image_id - 1
+    row, col = tile // grid_cols, tile % grid_cols
+    device_id = (row // tiles_per_side) * (grid_cols // tiles_per_side) + col // tiles_per_side
+    x = rng.uniform(0, tile_um, count)
+    y = rng.uniform(0, tile_um, count)
+    w = rng.gamma(2.0, tile_um / 400, count)
+    h = rng.gamma(2.0, tile_um / 400, count)
+    # area in um^2, heavy tailed so every default size bin gets defects
+    area = rng.lognormal(np.log(40000), 1.0, count)
+    x_in_device = (col % tiles_per_side) * tile_um + x
+    y_in_device = (row % tiles_per_side) * tile_um + y
+    class_id = rng.integers(1, params['classes'] + 1, count)
+    columns = [np.arange(first_id, first_id + count), image_id, np.full(count, analysis_id), device_id,
+               x, y, w, h, area, rng.uniform(0, 255, count), rng.uniform(0, 30, count),
+               rng.uniform(0, 1, count), rng.uniform(0, 180, count), x_in_device, y_in_device,
+               class_id, rng.uniform(0, 1, count)]
+    return [r + ('',) for r in zip(*(c.tolist() for c in columns))]
+
+
+def make_dataset(out_dir, chunk=100000, **params):
+    """Generate a synthetic nSpec dataset.
+
+    Parameters
+    ----------
+    out_dir : string
+        Folder to create the dataset in, any previous dataset is replaced.
+    chunk : int, optional
+        Defect rows inserted per executemany. The default is 100000.
+    **params
+        Any of the DEFAULT_PARAMS below.
+    tiles : int, optional
+        Number of tile images of the scan. The default is 1000.
+    defects : int, optional
+        Number of defects per analysis. The default is 10000.
+    analyses : int, optional
+        Number of analyses run on the scan. The default is 1.
+    classes : int, optional
+        Number of detection classes per analysis. The default is 4.
+    tiles_per_device : int, optional
+        Tiles per device, rounded up to a square. The default is 4.
+    tile_pixels : int, optional
+        Side of the square tile images in pixels. The default is 1024.
+    tile_microns : float, optional
+        Side of a tile in microns. The default is 500.
+    tile_format : string, optional
+        File extension of the tiles and mosaic. The default is 'jpg'.
+    unique_tiles : int, optional
+        Number of distinct tile images encoded. The default is 8.
+    mosaic_pixels : int, optional
+        Longer side of the Mosaic image in pixels. The default is 8192.
+    seed : int, optional
+        Random seed, equal parameters give equal datasets. The default is 0.
+
+    Returns
+    -------
+    Dataset
+        Paths and parameters of the generated dataset.
+    """
+    unknown = set(params) - set(DEFAULT_PARAMS)
+    if unknown:
+        raise TypeError('unknown dataset parameters: ' + ', '.join(sorted(unknown)))
+    params = dict(DEFAULT_PARAMS, **params)
+    tiles, defects, analyses = params['tiles'], params['defects'], params['analyses']
+    classes, tile_pixels, tile_microns = params['classes'], params['tile_pixels'], params['tile_microns']
+    tiles_per_device, tile_format = params['tiles_per_device'], params['tile_format']
+    dataset = Dataset(out_dir, params)
+    if os.path.exists(dataset.db_file):
+        os.remove(dataset.db_file)
+    shutil.rmtree(dataset.scan_dir, ignore_errors=True)
+    os.makedirs(out_dir, exist_ok=True)
+    rng = np.random.default_rng(params['seed'])
+
+    tiles_per_side = int(np.ceil(np.sqrt(tiles_per_device)))
+    rows, cols = grid_shape(tiles, tiles_per_device)
+    file_names = [f"tile_{i + 1:06d}.{tile_format}" for i in range(tiles)]
+
+    conn = sqlite3.connect(dataset.db_file)
+    conn.executescript(SCHEMA)
+    conn.execute("INSERT INTO Scans VALUES (1, 'synthetic')")
+    scan_props = {'SampleID': 'SYN-001', 'LotID': 'SYNLOT', 'JobName': 'benchmark', 'Autofocus Set': '1',
+                  'Golden Tile Tiles per Device': str(tiles_per_side**2),
+                  'Golden Tile Number of Devices': str((rows // tiles_per_side) * (cols // tiles_per_side)),
+                  'Scan Width Microns': str(cols * tile_microns), 'Scan Height Microns': str(rows * tile_microns),
+                  'DieWidth': str(tiles_per_side * tile_microns), 'DieHeight': str(tiles_per_side * tile_microns)}
+    conn.executemany("INSERT INTO ScanProperties VALUES (1, ?, ?)", scan_props.items())
+    conn.execute("INSERT INTO Analyzers VALUES (1, 'Synthetic', '1.0', 'Darkfield')")
+    conn.executemany("INSERT INTO Images VALUES (?, 1, ?, ?, ?, 0, 0, ?, ?, ?, ?, ?, ?)",
+                     ((i + 1, file_names[i], (i % cols) * tile_microns, (i // cols) * tile_microns,
+                       i // cols, i % cols, tile_microns, tile_microns, tile_pixels, tile_pixels)
+                      for i in range(tiles)))
+    next_id = 1
+    for a in range(1, analyses + 1):
+        conn.execute("INSERT INTO Analysis VALUES (?, ?, '', 1, 1, '', '', 'Done', '', '', ?)",
+                     (a, 'analysis ' + str(a), defects))
+        conn.executemany("INSERT INTO DetectionClasses VALUES (?, ?, ?)",
+                         ((c, a, CLASS_NAMES[(c - 1) % len(CLASS_NAMES)]) for c in range(1, classes + 1)))
+        for start in range(0, defects, chunk):
+            count = min(chunk, defects - start)
+            conn.executemany("INSERT INTO Defects VALUES (" + ", ".join("?" * 18) + ")",
+                             defect_rows(rng, next_id, count, a, tiles, tiles_per_side, cols, params))
+            next_id += count
+    conn.commit()
+    conn.close()
+
+    write_images(os.path.join(dataset.scan_dir, 'Scan_001'), file_names, rows, cols, params, rng)
+    with open(os.path.join(out_dir, 'params.json'), 'w') as f:
+        json.dump(params, f, indent=2)
+    return dataset
+
+
+def load_or_make(out_dir, **params):
+    """Reuse the dataset in out_dir when it was generated with the same parameters."""
+    wanted = dict(DEFAULT_PARAMS, **params)
+    try:
+        with open(os.path.join(out_dir, 'params.json')) as f:
+            existing = json.load(f)
+    except (OSError, ValueError):
+        existing = None
+    dataset = Dataset(out_dir, wanted)
+    if existing == wanted and os.path.exists(dataset.db_file):
+        return dataset
+    return make_dataset(out_dir, **params)
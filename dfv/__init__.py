@@ -13,6 +13,15 @@ Package is intended to be run as a program from the command line:
     
 This will automatically run the root GUI window
 
+Annotated mosaics may also be rendered without the GUI,
+see dfv.render for all options:
+
+    $ python -m dfv render --db X.db --scans DIR --scan 3 --analysis 7 --scale 4 --out mosaic.png
+
+Defect image crops are exported in bulk the same way:
+
+    $ python -m dfv crops --db X.db --scans DIR --analysis 7 --out crops.zip
+
 If running directly in Python interpreter, users may import the root module:
     
     >>> from dfv import root
@@ -13,6 +13,40 @@ Package is intended to be run as a program from the command line:
     
 This will automatically run the root GUI window
 
+To find out where time goes, run with --profile (or set DFV_PROFILE=1),
+a live timings window opens and a JSON trace is written at exit:
+
+    $ python -m dfv --profile trace.json
+
+Likewise --watchdog (or DFV_WATCHDOG=1) reports every callback that
+freezes the GUI and writes a histogram of its latency at exit
+
+Image and defect tables are cached locally in ~/.cache/dfv/tables
+for instant reopening, DFV_TABLE_CACHE=0 switches this off, and
+the rendered pages of the instruction manual in ~/.cache/dfv/pages,
+DFV_PAGE_CACHE=0 switches that off. The caches keep to 2 GB and
+500 MB, DFV_TABLE_CACHE_SIZE and DFV_PAGE_CACHE_SIZE set them in MB
+
+Open windows keep their large images and indexes within a memory
+budget of 4 GB, DFV_MEMORY_BUDGET sets it in MB, e.g. 2048
+
+Annotated mosaics may also be rendered without the GUI:
+
+    $ python -m dfv render --db X.db --scans DIR --scan 3 --analysis 7 --scale 4 --out mosaic.png
+
+Defect image crops are exported in bulk the same way:
+
+    $ python -m dfv crops --db X.db --scans DIR --analysis 7 --out crops.zip
+
+The thumbnail cache of the lot gallery can be filled ahead of time:
+
+    $ python -m dfv thumbs --db X.db --scans DIR
+
+Repeaters across a lot and adders between two scans are exported as CSV tables:
+
+    $ python -m dfv repeaters --db A.db B.db --cell 10 --min-dies 3 --out repeaters.csv
+    $ python -m dfv adders --db X.db --earlier 7 --later 9 --out adders.csv
+
 If running directly in Python interpreter, users may import the root module:
     
     >>> from dfv import root
@@ -33,9 +67,38 @@ Generally, individual modules are for utility purposes and not
 meant to be independently imported for use
 """
 
-from dfv import root
+import argparse
+
+from dfv import crops
+from dfv import instrument
+from dfv import render
+from dfv import repeaters
+from dfv import thumbs
+from dfv import watchdog
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='dfv', description='Defect Viewer, runs the GUI when no command is given')
+    parser.add_argument('--profile', nargs='?', const='', metavar='TRACE',
+                        help='time the hot paths and write a JSON trace at exit, optionally to TRACE')
+    parser.add_argument('--watchdog', nargs='?', const='', metavar='REPORT',
+                        help='report GUI stalls and write a latency histogram at exit, optionally to REPORT')
+    subparsers = parser.add_subparsers(dest='command')
+    render.add_parser(subparsers)
+    crops.add_parser(subparsers)
+    thumbs.add_parser(subparsers)
+    repeaters.add_parser(subparsers)
+    args = parser.parse_args(argv)
+    if args.profile is not None:
+        instrument.enable(args.profile or None)
+    if args.watchdog is not None:
+        watchdog.enable(args.watchdog or None)
+
+    if args.command is not None:
+        args.func(args)
+        return
 
-def main():
+    # the GUI is only imported when needed, headless commands must run without tk or a display
+    from dfv import root
     print("Starting new defect viewer GUI")
     root_obj = root.Root()
     root_obj.root_wnd.mainloop()
@@ -0,0 +1,193 @@
+"""
+dfv.clusters
+------------
+
+This module finds clusters and scratches among the defects of an
+analysis, on their positions across the whole scan in microns.
+
+Clustering is a grid-bucketed variant of DBSCAN. Defects are
+hashed into square cells with the side of the link distance. Cells
+holding at least a minimum number of defects are core cells, and
+core cells touching each other, diagonals included, form a cluster.
+Defects in other cells next to a core cell join its cluster, all
+remaining defects are noise. The cost is a sort of the defects plus
+a few passes over the occupied cells, so it grows near-linearly.
+
+Every cluster gets a line fit from the principal axes of its
+defects. Long, thin clusters are scratches. The fitted axes also
+give the outline of every cluster, an oriented rectangle around
+its defects.
+
+Nothing in here imports tkinter.
+"""
+
+# clusters.py imports
+import numpy as np
+
+# custom modules
+from dfv import instrument
+
+DEFAULT_LINK_DISTANCE = "50"  # side of a grid cell in um
+DEFAULT_MIN_CELL_DEFECTS = "3"  # defects a cell needs to be a core cell
+DEFAULT_MIN_CLUSTER_DEFECTS = "10"  # defects a cluster needs to be reported
+SCRATCH_ELONGATION = 5.0  # length to width ratio from which a cluster is a scratch
+
+# kind of a cluster
+CLUSTER = 0
+SCRATCH = 1
+KIND_NAMES = ('Cluster', 'Scratch')
+
+# the 8 neighbours of a cell as (dx, dy)
+NEIGHBOURS = tuple((dx, dy) for dy in (-1, 0, 1) for dx in (-1, 0, 1) if dx or dy)
+
+
+def neighbour_index(cells, cx, cy, num_cx, dx, dy):
+    """Return the index into the sorted cell keys of the (dx, dy) neighbour of every cell, -1 when empty."""
+    key = (cy + dy) * num_cx + (cx + dx)
+    pos = np.minimum(np.searchsorted(cells, key), len(cells) - 1)
+    return np.where(cells[pos] == key, pos, -1)
+
+
+def connect(core, neighbours):
+    """Label the connected components of the core cells.
+
+    Parameters
+    ----------
+    core : numpy array of bool
+        Whether every cell is a core cell.
+    neighbours : list of numpy arrays
+        neighbour_index of every cell, for each of the 8 neighbours.
+
+    Returns
+    -------
+    numpy array of int
+        Component label of every cell, the smallest cell index of the
+        component, -1 for cells which are not core cells.
+    """
+    labels = np.where(core, np.arange(len(core)), -1)
+    # only links between two core cells count
+    links = [(np.flatnonzero(core & (nbr >= 0) & core[np.maximum(nbr, 0)]), nbr) for nbr in neighbours]
+    links = [(cells, nbr[cells]) for cells, nbr in links if cells.size]
+    while True:
+        # hook the root of every cell onto the smallest label among its neighbours
+        new = labels.copy()
+        for cells, nbr in links:
+            np.minimum.at(new, labels[cells], labels[nbr])
+        # then compress every path to its root
+        while True:
+            jumped = np.where(new >= 0, new[np.maximum(new, 0)], -1)
+            if np.array_equal(jumped, new):
+                break
+            new = jumped
+        if np.array_equal(new, labels):
+            return labels
+        labels = new
+
+
+def cluster_shapes(x, y, labels, num_clusters):
+    """Fit the principal axes of every cluster.
+
+    Returns
+    -------
+    dict
+        'count', center 'cx' and 'cy', 'length' and 'width' along the
+        axes, 'angle' of the long axis in degrees, 'elongation' and
+        'corners' (num_clusters, 4, 2) of the oriented outline.
+    """
+    if num_clusters == 0:
+        empty = np.empty(0)
+        return {'count': np.empty(0, dtype=np.int64), 'cx': empty, 'cy': empty, 'length': empty, 'width': empty,
+                'angle': empty, 'elongation': empty, 'corners': np.empty((0, 4, 2))}
+    count = np.bincount(labels, minlength=num_clusters).astype(float)
+    cx = np.bincount(labels, x, num_clusters) / count
+    cy = np.bincount(labels, y, num_clusters) / count
+    dx, dy = x - cx[labels], y - cy[labels]
+    sxx = np.bincount(labels, dx * dx, num_clusters) / count
+    syy = np.bincount(labels, dy * dy, num_clusters) / count
+    sxy = np.bincount(labels, dx * dy, num_clusters) / count
+    # direction of the long axis of the 2x2 covariance, the least squares line through the defects
+    theta = 0.5 * np.arctan2(2 * sxy, sxx - syy)
+    ux, uy = np.cos(theta), np.sin(theta)
+    along = dx * ux[labels] + dy * uy[labels]
+    across = -dx * uy[labels] + dy * ux[labels]
+
+    # extent along both axes, from the defects sorted by cluster
+    order = np.argsort(labels, kind='stable')
+    starts = np.searchsorted(labels[order], np.arange(num_clusters))
+    lo_a, hi_a = np.minimum.reduceat(along[order], starts), np.maximum.reduceat(along[order], starts)
+    lo_c, hi_c = np.minimum.reduceat(across[order], starts), np.maximum.reduceat(across[order], starts)
+    length, width = hi_a - lo_a, hi_c - lo_c
+    corners = np.empty((num_clusters, 4, 2))
+    for i, (a, c) in enumerate(((lo_a, lo_c), (hi_a, lo_c), (hi_a, hi_c), (lo_a, hi_c))):
+        corners[:, i, 0] = cx + a * ux - c * uy
+        corners[:, i, 1] = cy + a * uy + c * ux
+    return {'count': count.astype(np.int64), 'cx': cx, 'cy': cy, 'length': length, 'width': width,
+            'angle': np.degrees(theta), 'elongation': length / np.maximum(width, 1e-9), 'corners': corners}
+
+
+@instrument.timed('clusters')
+def find_clusters(x, y, link_distance, min_cell_defects=3, min_cluster_defects=10):
+    """Find the clusters and scratches among defects.
+
+    Parameters
+    ----------
+    x, y : numpy arrays of float
+        Defect positions across the scan, in um.
+    link_distance : float
+        Side of a grid cell in um, defects further apart than about
+        twice this distance are never linked directly.
+    min_cell_defects : int, optional
+        Defects a cell needs to be a core cell. The default is 3.
+    min_cluster_defects : int, optional
+        Defects a cluster needs to be reported. The default is 10.
+
+    Returns
+    -------
+    labels : numpy array of int
+        Cluster of every defect, -1 for noise.
+    shapes : dict
+        cluster_shapes of every cluster plus its 'kind', CLUSTER or
+        SCRATCH, largest cluster first.
+    """
+    link_distance = float(link_distance)
+    if not link_distance > 0:
+        raise ValueError('Link distance must be positive, got ' + str(link_distance))
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    labels = np.full(len(x), -1, dtype=np.int64)
+    if len(x) == 0:
+        return labels, dict(cluster_shapes(x, y, labels, 0), kind=np.empty(0, dtype=np.int64))
+
+    # hash the defects into cells, shifted by one cell so every neighbour cell has valid coordinates
+    dcx = np.floor((x - x.min()) / link_distance).astype(np.int64) + 1
+    dcy = np.floor((y - y.min()) / link_distance).astype(np.int64) + 1
+    num_cx = int(dcx.max()) + 2
+    cells, cell_of, cell_count = np.unique(dcy * num_cx + dcx, return_inverse=True, return_counts=True)
+    cell_of = cell_of.reshape(-1)
+    cx, cy = cells % num_cx, cells // num_cx
+    neighbours = [neighbour_index(cells, cx, cy, num_cx, dx, dy) for dx, dy in NEIGHBOURS]
+
+    core = cell_count >= int(min_cell_defects)
+    cell_label = connect(core, neighbours)
+    # border cells join the smallest neighbouring cluster
+    border = np.full(len(cells), np.iinfo(np.int64).max)
+    for nbr in neighbours:
+        found = (nbr >= 0) & ~core
+        nbr_label = np.where(found, cell_label[np.maximum(nbr, 0)], -1)
+        border = np.where(nbr_label >= 0, np.minimum(border, nbr_label), border)
+    cell_label = np.where(~core & (border < np.iinfo(np.int64).max), border, cell_label)
+
+    # renumber the clusters large enough to report, largest first
+    defect_label = cell_label[cell_of]
+    roots, sizes = np.unique(defect_label[defect_label >= 0], return_counts=True)
+    keep = sizes >= int(min_cluster_defects)
+    roots, sizes = roots[keep], sizes[keep]
+    roots = roots[np.argsort(-sizes, kind='stable')]
+    renumber = np.full(len(cells), -1, dtype=np.int64)
+    renumber[roots] = np.arange(len(roots))
+    labels = np.where(defect_label >= 0, renumber[np.maximum(defect_label, 0)], -1)
+
+    member = labels >= 0
+    shapes = cluster_shapes(x[member], y[member], labels[member], len(roots))
+    shapes['kind'] = np.where(shapes['elongation'] >= SCRATCH_ELONGATION, SCRATCH, CLUSTER)
+    instrument.count('clusters.found', len(roots))
+    return labels, shapes
@@ -0,0 +1,116 @@
+"""
+dfv.colcache
+------------
+
+This module keeps a local on-disk copy of the typed columns of the
+image and defect tables, so reopening an analysis does not run the
+SQL query and row conversion again.
+
+Every table is stored as a folder with one .npy file per column.
+Columns are memory-mapped when read back, so a reopen only touches
+the pages that are actually used, straight from the local disk
+even when the database sits on a network share. Plain .npy files
+are used rather than compressed .npz or Parquet, since compressed
+columns cannot be memory-mapped.
+
+A cache entry is keyed by the database path, its modification time
+and size, the table and the Scan or Analysis ID. Any change to the
+database makes its entries stale, stale entries of a table are
+removed when it is stored again.
+
+The cache holds at most 2 GB, entries used longest ago are removed
+first once a new entry takes it over, see dfv.diskcache. It is on
+by default. DFV_TABLE_CACHE=0 switches it off, any other value is
+used as the cache folder. DFV_TABLE_CACHE_SIZE sets its size in MB:
+
+    $ DFV_TABLE_CACHE=/tmp/dfv_tables DFV_TABLE_CACHE_SIZE=500 python -m dfv
+"""
+
+# colcache.py imports
+import json
+import os
+
+import numpy as np
+
+# custom modules
+from dfv import diskcache
+from dfv import instrument
+
+DEFAULT_MAX_BYTES = 2 * 1024**3  # bytes of all entries before the least recently used are removed
+CACHE_VERSION = '1'  # bump when the stored columns change
+
+cache = diskcache.DiskCache('tables', 'DFV_TABLE_CACHE', DEFAULT_MAX_BYTES)  # folder, size and switch of the cache
+
+
+def entry_names(db_file, table, table_id):
+    """Return the folder name prefix shared by all versions of a table, and the full folder name.
+
+    The prefix identifies the table, the suffix the state of the database.
+    """
+    path = os.path.abspath(db_file)
+    prefix = diskcache.digest(CACHE_VERSION, path, table, table_id, length=20)
+    return prefix, prefix + '-' + diskcache.file_state(path)
+
+
+def load(db_file, table, table_id):
+    """Return the cached columns of a table, memory-mapped, or None on a cache miss.
+
+    Parameters
+    ----------
+    db_file : string
+        Database the table was read from.
+    table : string
+        Table name, e.g. 'images' or 'defects'.
+    table_id : string
+        Scan ID or Analysis ID the rows belong to.
+
+    Returns
+    -------
+    dict or None
+        Read-only numpy array for every column name.
+    """
+    if not cache.enabled:
+        return None
+    entry = entry_names(db_file, table, table_id)[1]
+    folder = cache.path(entry)
+    try:
+        with open(os.path.join(folder, 'columns.json')) as f:
+            names = json.load(f)
+        with instrument.timer('colcache.load'):
+            columns = {name: np.load(os.path.join(folder, str(i) + '.npy'), mmap_mode='r')
+                       for i, name in enumerate(names)}
+    except (OSError, ValueError):
+        instrument.count('colcache.misses')
+        return None  # missing or damaged entry
+    cache.touch(entry)
+    instrument.count('colcache.hits')
+    return columns
+
+
+def store(db_file, table, table_id, columns):
+    """Write the columns of a table to the cache, replacing stale versions of it.
+
+    Entries used longest ago are removed should the cache go over
+    its size. Caching is best effort, a failure to write is ignored.
+    """
+    if not cache.enabled:
+        return
+
+    def write(folder):
+        for i, column in enumerate(columns.values()):
+            np.save(os.path.join(folder, str(i) + '.npy'), np.ascontiguousarray(column), allow_pickle=False)
+        with open(os.path.join(folder, 'columns.json'), 'w') as f:
+            json.dump(list(columns), f)
+
+    try:
+        prefix, name = entry_names(db_file, table, table_id)
+        with instrument.timer('colcache.store'):
+            cache.create(name, write)
+        cache.remove_stale(prefix, name)
+    except (OSError, ValueError) as e:
+        print('Could not cache ' + table + ' table: ' + str(e))
+
+
+def clear():
+    """Remove every cache entry."""
+    cache.clear()
@@ -0,0 +1,1134 @@
+"""
+dfv.core
+--------
+
+This module provides the Tk-free data layer of the package.
+It holds all state needed to select a scan/analysis pair, load
+its images and defects, bin the defects and transform coordinates
+between tiles (microns), tile images (pixels) and the mosaic.
+
+The GUI classes wrap these objects:
+
+    - Session holds the choices of the Root window
+    - MosaicModel holds everything a MosaicCreator window shows
+
+Nothing in here imports tkinter, so headless tools and worker
+processes can use it without a display.
+"""
+
+# core.py imports
+import os
+import sqlite3
+from contextlib import closing
+import numpy as np
+from PIL import Image
+
+# custom modules
+from dfv import clusters
+from dfv import colcache
+from dfv import density
+from dfv import instrument
+from dfv import matching
+from dfv import query
+from dfv import spatial
+
+# sql queries used to retrieve defect and image data
+SQL_IMAGES = "SELECT * FROM vwImages WHERE ScanID = ?;"
+SQL_DEFECTS = "SELECT * FROM vwDefectsLegacy WHERE AnalysisID = ?;"
+SQL_SCAN_PROPERTIES = "SELECT * FROM ScanProperties WHERE ScanID = ?"
+SQL_DEFECT_CLASSES = "SELECT * FROM DetectionClasses WHERE AnalysisID = ?"
+SQL_ANALYSIS = "SELECT * FROM Analysis WHERE AnalysisID = ?;"
+
+STREAM_CHUNK = 5000  # rows fetched at a time when streaming a table
+
+# default size binning, applied to every mosaic unless changed by the user
+DEFAULT_BINNING_RANGES = np.array([16000, 32000, 64000, 112000, 160000])
+DEFAULT_BINNING_COLORS = np.array(['aqua', 'chartreuse3', 'royalblue3', 'goldenrod1', 'magenta3'])
+DEFAULT_INF_BIN_COLOR = 'red'
+
+# diff mode colors, indexed by matching.ONLY_A, ONLY_B and MATCHED
+DEFAULT_DIFF_COLORS = np.array(['red', 'royalblue3', 'gray60'])
+DEFAULT_MATCH_TOLERANCE = "5"  # distance in um within which defects of two analyses match
+
+# lot overlay colors of repeaters and adders
+DEFAULT_LOT_COLORS = np.array(['magenta2', 'orange'])
+
+# default defect info shown on the defect label text line (X, Y and Area)
+DEFAULT_LABEL_TEXT_CHOICES = np.array([False, False, False, False, True, True, False, False, True, False,
+                                       False, False, False, False, False, False, False, False])
+
+# column schemas as (name, column index in the database row, kind)
+# kind is one of 'int', 'float', 'id' (integer that may be NULL, stored as float) or 'str'
+DEFECT_SCHEMA = (
+    ('DefectID', 0, 'int'), ('ImageID', 1, 'int'), ('AnalysisID', 2, 'int'), ('DeviceID', 3, 'id'),
+    ('X', 4, 'float'), ('Y', 5, 'float'), ('W', 6, 'float'), ('H', 7, 'float'),
+    ('Area', 8, 'float'), ('Intensity', 9, 'float'), ('IntensityDeviation', 10, 'float'),
+    ('Eccentricity', 11, 'float'), ('Orientation', 12, 'float'),
+    ('XinDevice', 13, 'float'), ('YinDevice', 14, 'float'), ('ClassID', 15, 'id'),
+    ('Score', 16, 'float'), ('Contour', 17, 'str'),
+)
+IMAGE_SCHEMA = (
+    ('ImageID', 0, 'int'), ('FileName', 2, 'str'), ('Row', 7, 'int'), ('Column', 8, 'int'),
+    ('WidthMicrons', 9, 'float'), ('HeightMicrons', 10, 'float'),
+    ('WidthPixels', 11, 'float'), ('HeightPixels', 12, 'float'),
+)
+DEFECT_FIELDS = tuple(name for name, _, _ in DEFECT_SCHEMA)
+KIND_DTYPES = {'int': np.int64, 'float': np.float64, 'id': np.float64, 'str': str}
+
+
+class ColumnTable:
+    """Typed, column-oriented copy of database rows.
+
+    Each column is a numpy array, accessed by name: table['Area'].
+    """
+
+    def __init__(self, schema, columns):
+        """Hold the columns of a table.
+
+        Parameters
+        ----------
+        schema : tuple
+            (name, index, kind) for every column, e.g. DEFECT_SCHEMA.
+        columns : dict
+            Numpy array for every column name, all of the same length.
+
+        Returns -> None.
+        """
+        self.schema = schema
+        self.columns = columns
+
+    @classmethod
+    def from_rows(cls, schema, rows):
+        """Convert rows as returned by fetchall() into typed columns."""
+        if len(rows) == 0:
+            return cls(schema, {name: np.empty(0, dtype=KIND_DTYPES[kind]) for name, _, kind in schema})
+        rows = np.array(rows, dtype=object)
+        columns = {}
+        for name, index, kind in schema:
+            if kind == 'str':
+                columns[name] = np.array([('' if v is None else str(v)) for v in rows[:, index]], dtype=str)
+            else:
+                columns[name] = rows[:, index].astype(KIND_DTYPES[kind])
+        return cls(schema, columns)
+
+    @classmethod
+    def empty(cls, schema):
+        """Return a table without rows."""
+        return cls.from_rows(schema, [])
+
+    def __len__(self):
+        return len(next(iter(self.columns.values())))
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    @property
+    def nbytes(self):
+        """Memory held by the columns in bytes."""
+        return sum(column.nbytes for column in self.columns.values())
+
+    def take(self, index):
+        """Return a new table holding only the rows at index (int array or mask)."""
+        return ColumnTable(self.schema, {name: column[index] for name, column in self.columns.items()})
+
+    def row(self, i):
+        """Return row i as a dict of plain python values."""
+        return {name: self.columns[name][i].item() for name, _, _ in self.schema}
+
+    def text(self, i, name):
+        """Return the value of row i in a column formatted for display."""
+        value = self.columns[name][i].item()
+        kind = next(k for n, _, k in self.schema if n == name)
+        if kind == 'id' or kind == 'float':
+            if np.isnan(value):
+                return 'None'
+            if kind == 'id':
+                return str(int(value))
+        return str(value)
+
+
+class ColumnBuilder:
+    """Typed columns filled chunk by chunk from database rows.
+
+    Numeric columns are allocated once for the expected row count,
+    and grown should more rows arrive, so the rows never exist as one
+    big list of tuples. Text columns are kept per chunk and joined
+    at the end.
+    """
+
+    def __init__(self, schema, capacity=0):
+        self.schema = schema
+        self.size = 0  # rows appended so far
+        self.numeric = {name: np.empty(capacity, dtype=KIND_DTYPES[kind]) for name, _, kind in schema if kind != 'str'}
+        self.text = {name: [] for name, _, kind in schema if kind == 'str'}  # one array per chunk
+
+    def append(self, rows):
+        """Convert a chunk of rows into the columns, returns the chunk as a ColumnTable."""
+        chunk = ColumnTable.from_rows(self.schema, rows)
+        start, stop = self.size, self.size + len(rows)
+        for name, column in self.numeric.items():
+            if stop > len(column):
+                grown = np.empty(max(stop, 2 * len(column)), dtype=column.dtype)
+                grown[:start] = column[:start]
+                self.numeric[name] = column = grown
+            column[start:stop] = chunk[name]
+        for name, parts in self.text.items():
+            parts.append(chunk[name])
+        self.size = stop
+        return chunk
+
+    def table(self):
+        """Return the rows appended so far as a ColumnTable."""
+        columns = {}
+        for name, _, kind in self.schema:
+            if kind == 'str':
+                parts = self.text[name]
+                columns[name] = np.concatenate(parts) if parts else np.empty(0, dtype=str)
+            elif len(self.numeric[name]) == self.size:
+                columns[name] = self.numeric[name]
+            else:
+                columns[name] = self.numeric[name][:self.size].copy()  # the row count estimate was off
+        return ColumnTable(self.schema, columns)
+
+
+def scan_folder(scan_dir, scan_id):
+    """Return the image folder for a scan inside the scans directory.
+
+    Parameters
+    ----------
+    scan_dir : string
+        Directory containing all 'Scan_XXX' folders.
+    scan_id : string or int
+        Scan ID as found in the Scans table.
+
+    Returns
+    -------
+    string
+        Path to the folder holding the tiles and mosaic of the scan.
+    """
+    return scan_dir + '/' + 'Scan_' + f"{int(scan_id):03d}"
+
+
+def find_mosaic_image(img_loc):
+    """Return the path of the mosaic image inside a scan folder.
+
+    Parameters
+    ----------
+    img_loc : string
+        Folder containing the scanned images for one scan.
+
+    Returns
+    -------
+    string
+        Path to the first file with 'Mosaic' in its name.
+    """
+    list_of_images = np.array(next(os.walk(img_loc + '/'))[2])  # list of images from directory
+    mosaic_image_name = list_of_images[np.flatnonzero(np.char.find(list_of_images, 'Mosaic') != -1)[0]]  # find mosaic image in list
+    return img_loc + '/' + mosaic_image_name
+
+
+def load_mosaic_image(img_loc, image_scale):
+    """Open the mosaic image of a scan and shrink it by the image scale.
+
+    Parameters
+    ----------
+    img_loc : string
+        Folder containing the scanned images for one scan.
+    image_scale : int
+        The image is scaled by dividing its size by this value.
+
+    Returns
+    -------
+    image : PIL image
+        Resized mosaic image.
+    source_size : tuple of int
+        Native (width, height) of the mosaic image.
+    """
+    with instrument.timer('mosaic.decode'):
+        image = Image.open(find_mosaic_image(img_loc))  # open initial mosaic image from file
+        image.load()
+    source_width, source_height = image.size  # get the native size of the mosaic image
+    # resize mosaic image and interpolate, reducing_gap lets PIL shrink by whole factors first
+    with instrument.timer('mosaic.resize'):
+        image = image.resize((round(source_width / int(image_scale)), round(source_height / int(image_scale))),
+                             Image.LANCZOS, reducing_gap=3.0)
+    return image, (source_width, source_height)
+
+
+def scan_ids(cur):
+    """Return all Scan IDs of the database."""
+    scans_info = np.array(cur.execute("SELECT * FROM Scans;").fetchall()).astype(str)  # fetch all data from Scans table
+    if scans_info.size == 0:
+        return np.array([], dtype=str)
+    return scans_info[:, 0]
+
+
+def analysis_ids(cur, scan_id):
+    """Return the Analysis IDs belonging to a scan."""
+    analysis_info = np.array(cur.execute("SELECT * FROM Analysis").fetchall()).astype(str)  # fetch all data from Analysis table
+    if analysis_info.size == 0:
+        return np.array([], dtype=str)
+    return (analysis_info[analysis_info[:, 4] == str(scan_id)])[:, 0]  # filter for Analysis IDs of the chosen Scan ID
+
+
+def analysis_scan_id(cur, analysis_id):
+    """Return the Scan ID an analysis was run on."""
+    analysis_info = np.array(cur.execute("SELECT * FROM Analysis WHERE AnalysisID = ?;", (str(analysis_id),)).fetchall()).astype(str)
+    if analysis_info.size == 0:
+        raise ValueError('Analysis ID ' + str(analysis_id) + ' not found in database')
+    return analysis_info[0][4]
+
+
+def scan_property(scan_prop_info, name):
+    """Return the value stored next to a property name in the ScanProperties rows."""
+    where = np.where(scan_prop_info == name)
+    return scan_prop_info[where[0][0], where[1][0] + 1]
+
+
+def fetch_rows(cur, name, sql, params):
+    """Run a query and fetch all rows, timed and counted under sql.<name>."""
+    with instrument.timer('sql.' + name):
+        rows = cur.execute(sql, params).fetchall()
+    instrument.count('sql.' + name + '.rows', len(rows))
+    return rows
+
+
+def stream_rows(cur, name, sql, params, chunk=STREAM_CHUNK):
+    """Run a query and yield its rows chunk by chunk, each fetch timed and counted under sql.<name>."""
+    with instrument.timer('sql.' + name):
+        cur.execute(sql, params)
+    while True:
+        with instrument.timer('sql.' + name):
+            rows = cur.fetchmany(chunk)
+        if not rows:
+            return
+        instrument.count('sql.' + name + '.rows', len(rows))
+        yield rows
+
+
+def analysis_defect_count(cur, analysis_id):
+    """Number of defects the Analysis table lists for an analysis, 0 when unknown."""
+    row = cur.execute(SQL_ANALYSIS, (str(analysis_id),)).fetchone()
+    try:
+        return max(0, int(row[10]))
+    except (TypeError, ValueError, IndexError):
+        return 0
+
+
+def load_images(cur, scan_id):
+    """Fetch the vwImages rows of a scan as a ColumnTable."""
+    rows = fetch_rows(cur, 'images', SQL_IMAGES, (str(scan_id),))
+    with instrument.timer('convert.images'):
+        return ColumnTable.from_rows(IMAGE_SCHEMA, rows)
+
+
+def load_defects(cur, analysis_id, on_chunk=None):
+    """Fetch the vwDefectsLegacy rows of an analysis as a ColumnTable.
+
+    Rows are streamed into preallocated columns, so peak memory stays
+    near the size of the final table. on_chunk, when given, is called
+    with the ColumnTable of every chunk as it arrives.
+    """
+    builder = ColumnBuilder(DEFECT_SCHEMA, analysis_defect_count(cur, analysis_id))
+    for rows in stream_rows(cur, 'defects', SQL_DEFECTS, (str(analysis_id),)):
+        with instrument.timer('convert.defects'):
+            chunk = builder.append(rows)
+        if on_chunk is not None:
+            on_chunk(chunk)
+    return builder.table()
+
+
+def cached_table(db_file, table, table_id, schema, fetch):
+    """Return a table from the local column cache, or fetch it and cache it.
+
+    Parameters
+    ----------
+    db_file : string
+        Database the table is read from.
+    table : string
+        Table name, e.g. 'images' or 'defects'.
+    table_id : string
+        Scan ID or Analysis ID the rows belong to.
+    schema : tuple
+        Column schema of the table, e.g. DEFECT_SCHEMA.
+    fetch : callable
+        Returns the ColumnTable from the database on a cache miss.
+
+    Returns
+    -------
+    ColumnTable
+        The table, its columns are read-only memory maps on a cache hit.
+    """
+    columns = colcache.load(db_file, table, table_id)
+    if columns is not None and set(columns) == {name for name, _, _ in schema}:
+        return ColumnTable(schema, columns)
+    result = fetch()
+    colcache.store(db_file, table, table_id, result.columns)
+    return result
+
+
+def load_defect_classes(cur, analysis_id):
+    """Fetch the DetectionClasses rows of an analysis."""
+    return np.array(fetch_rows(cur, 'defect_classes', SQL_DEFECT_CLASSES, (str(analysis_id),)))
+
+
+def mosaic_grid(images):
+    """Return the number of tile rows and columns of the mosaic.
+
+    Parameters
+    ----------
+    images : ColumnTable
+        Image table of the scan.
+
+    Returns
+    -------
+    tuple of int
+        (max_rows, max_cols) of the tile grid.
+    """
+    return int(images['Row'].max()) + 1, int(images['Column'].max()) + 1
+
+
+def defect_tile_index(images, defects):
+    """Map every defect onto the row of the image table holding its tile.
+
+    Parameters
+    ----------
+    images : ColumnTable
+        Image table of the scan.
+    defects : ColumnTable
+        Defect table of the analysis.
+
+    Returns
+    -------
+    numpy array of int
+        Index into the image table for every defect.
+
+    Raises ValueError when a defect has an ImageID missing from the image table.
+    """
+    order = np.argsort(images['ImageID'], kind='stable')
+    # searchsorted on the sorted image IDs replaces a scan of the image table per defect
+    sorted_ids = images['ImageID'][order]
+    pos = np.minimum(np.searchsorted(sorted_ids, defects['ImageID']), max(len(order) - 1, 0))
+    found = sorted_ids[pos] == defects['ImageID'] if len(order) else np.zeros(len(pos), dtype=bool)
+    missing = np.flatnonzero(~found)
+    if len(missing):
+        raise ValueError(f"{len(missing)} defects have an ImageID not in the image table, e.g. ImageID "
+                         f"{defects['ImageID'][missing[0]]} of DefectID {defects['DefectID'][missing[0]]}")
+    return order[pos]
+
+
+def defect_mosaic_coords(images, defects, mos_tile_width, mos_tile_height, tile_index=None):
+    """Convert defect tile coordinates into mosaic coordinates.
+
+    Parameters
+    ----------
+    images : ColumnTable
+        Image table of the scan.
+    defects : ColumnTable
+        Defect table of the analysis.
+    mos_tile_width, mos_tile_height : float
+        Size of a single tile on the (resized) mosaic, in pixels.
+    tile_index : numpy array of int, optional
+        Result of defect_tile_index, computed when not given.
+
+    Returns
+    -------
+    x_mosaic, y_mosaic : numpy arrays of float
+        Defect positions on the mosaic, in pixels.
+    """
+    if len(defects) == 0:
+        return np.empty(0), np.empty(0)
+    if tile_index is None:
+        tile_index = defect_tile_index(images, defects)
+    tile_row = images['Row'][tile_index]  # Row and Column of the tile in the mosaic image
+    tile_column = images['Column'][tile_index]
+    tile_width_um = images['WidthMicrons'][tile_index]  # width and height of tile in um
+    tile_height_um = images['HeightMicrons'][tile_index]
+
+    # find defect coordinates in mosaic, scaled by number of rows/cols in the mosaic
+    x_mosaic = mos_tile_width * (defects['X'] + tile_column * tile_width_um) / tile_width_um
+    y_mosaic = mos_tile_height * (defects['Y'] + tile_row * tile_height_um) / tile_height_um
+    return x_mosaic, y_mosaic
+
+
+def size_bin_index(areas, binning_ranges):
+    """Return the size bin of every defect based on its area.
+
+    The infinity bin has index len(binning_ranges).
+    """
+    if binning_ranges.size == 0:
+        return np.zeros(len(areas), dtype=int)
+    return np.searchsorted(binning_ranges.astype(float), areas)
+
+
+def class_bin_index(class_ids, defect_type_data, binning_type_colors):
+    """Return the class bin of every defect based on its ClassID.
+
+    Defects fall into the infinity bin, index len(binning_type_colors),
+    when no class binning is set or their class is unknown.
+    """
+    num_bins = len(binning_type_colors)
+    if num_bins == 0 or defect_type_data.size == 0:
+        return np.full(len(class_ids), num_bins, dtype=int)
+    type_ids = defect_type_data[:, 0].astype(float)
+    order = np.argsort(type_ids, kind='stable')
+    pos = np.minimum(np.searchsorted(type_ids[order], class_ids), len(order) - 1)
+    index = order[pos]
+    return np.where(type_ids[index] == class_ids, index, num_bins)
+
+
+def bin_counts(bin_index, num_bins):
+    """Count defects per bin, the final entry being the infinity bin."""
+    return np.bincount(bin_index, minlength=num_bins + 1).astype(float)[:num_bins + 1]
+
+
+def bin_palette(colors, inf_bin_color):
+    """Return the mark color of every bin, the infinity bin last."""
+    return np.append(np.asarray(colors, dtype=object), inf_bin_color)
+
+
+def bin_color_index(bin_index, num_colors):
+    """Return the index into bin_palette of the mark color of every defect, in the smallest unsigned dtype."""
+    return np.minimum(bin_index, num_colors).astype(np.min_scalar_type(num_colors))
+
+
+def bin_colors(bin_index, colors, inf_bin_color):
+    """Return the mark color of every defect from its bin index."""
+    return bin_palette(colors, inf_bin_color)[bin_color_index(bin_index, len(colors))]
+
+
+class MarkBuilder:
+    """Defect marks of a whole table filled chunk by chunk, see MosaicModel.chunk_marks.
+
+    Mark arrays are allocated once for the expected row count, and
+    grown should more rows arrive, so the marks of the chunks are never
+    joined in a second copy. Per bin counts are summed.
+    """
+
+    def __init__(self, capacity=0):
+        self.capacity = capacity  # rows the arrays are allocated for
+        self.size = 0  # rows appended so far
+        self.columns = {}  # per defect mark arrays, allocated on the first chunk
+        self.counts = {}  # per bin counts summed over the chunks
+
+    def append(self, marks):
+        """Copy the marks of the next chunk into the arrays."""
+        start = self.size
+        stop = start + len(marks['x'])
+        for key, value in marks.items():
+            if key.endswith('_counts'):
+                self.counts[key] = self.counts[key] + value if key in self.counts else value.copy()
+                continue
+            column = self.columns.get(key)
+            if column is None:
+                self.columns[key] = column = np.empty(max(self.capacity, stop), dtype=value.dtype)
+            elif stop > len(column):
+                grown = np.empty(max(stop, 2 * len(column)), dtype=column.dtype)
+                grown[:start] = column[:start]
+                self.columns[key] = column = grown
+            column[start:stop] = value
+        self.size = stop
+
+    def marks(self):
+        """Return the marks appended so far, None when no chunk was appended."""
+        if not self.columns:
+            return None
+        marks = {key: column if len(column) == self.size else column[:self.size].copy()  # the row count estimate was off
+                 for key, column in self.columns.items()}
+        marks.update(self.counts)
+        return marks
+
+
+class Session:
+    """Choices made in the Root window, shared by every mosaic opened from it."""
+
+    def __init__(self):
+        self.scan_dir = ''  # path to folder containing all scan folders
+        self.db_file = ''  # path to database file
+        self.scan_options = np.array([], dtype=str)  # list of scan IDs to choose from
+        self.analysis_options = np.array([], dtype=str)  # list of analysis IDs to choose from
+        self.scan_id = None  # specific scan ID to plot
+        self.analysis_id = None  # specific analysis ID to draw defects from
+        self.img_loc = None  # path to folder containing images for specific scan
+        self.image_scale = ''  # image is scaled by dividing by this value (integer)
+        self.image_view_only = False  # only open the images and do not plot defects
+        self.binning_ranges = DEFAULT_BINNING_RANGES  # default bin size ranges for new mosaics
+        self.binning_colors = DEFAULT_BINNING_COLORS  # default bin colors for new mosaics
+        self.inf_bin_color = DEFAULT_INF_BIN_COLOR  # default infinity bin color for new mosaics
+
+    def connect(self):
+        """Open a connection to the selected database file."""
+        return closing(sqlite3.connect(self.db_file))
+
+    def set_paths(self, scan_dir, db_file):
+        """Set the scans directory and database file, loading the scan options.
+
+        Raises ValueError when the paths are missing or invalid.
+        """
+        self.scan_id = None
+        self.analysis_id = None
+        self.scan_options = np.array([], dtype=str)
+        self.analysis_options = np.array([], dtype=str)
+        if scan_dir == '' or db_file == '':
+            raise ValueError('Please fill out filepath fields first')
+        if not any(x.startswith('Scan_') for x in os.listdir(scan_dir + '/')):
+            raise ValueError('Scans Directory must contain image folders with naming convention \'Scan_XXX\'')
+        self.scan_dir = scan_dir
+        self.db_file = db_file
+        with self.connect() as conn:
+            self.scan_options = scan_ids(conn.cursor())
+
+    def names_match(self):
+        """Check that the database file is named after the scans directory."""
+        return self.db_file.split('.db')[0].split('/')[-1] == self.scan_dir.split('/')[-1]
+
+    def select_scan(self, scan_id):
+        """Select a scan, updating the image folder and the analysis options."""
+        self.scan_id = str(scan_id)
+        self.analysis_id = None
+        self.img_loc = scan_folder(self.scan_dir, scan_id)
+        with self.connect() as conn:
+            self.analysis_options = analysis_ids(conn.cursor(), scan_id)
+
+    def select_analysis(self, analysis_id):
+        """Select the analysis to draw defects from."""
+        self.analysis_id = None if analysis_id is None else str(analysis_id)
+
+    def ready_to_plot(self):
+        """Check that a scan, an analysis and an integer image scale are chosen."""
+        return self.scan_id is not None and self.analysis_id is not None and str(self.image_scale).isdigit()
+
+    def ready_to_plot_lot(self):
+        """Check that the scan options are loaded and an integer image scale is chosen."""
+        return len(self.scan_options) > 0 and str(self.image_scale).isdigit()
+
+    def sample_name(self):
+        """Name of the database file, used in window titles."""
+        return self.db_file.split("/")[-1]
+
+    def scan_properties(self):
+        """Return (label, value) pairs describing the selected scan."""
+        with self.connect() as conn:
+            scan_prop_info = np.array(conn.execute(SQL_SCAN_PROPERTIES, (self.scan_id,)).fetchall())  # fetch all data from Scan Properties table
+        # property names in the database and their user-friendly labels
+        properties = [('SampleID', 'Sample ID'), ('LotID', 'Lot ID'), ('JobName', 'Job Name'),
+                      ('Autofocus Set', 'Autofocus Set'), ('Golden Tile Tiles per Device', 'Tiles per Device'),
+                      ('Golden Tile Number of Devices', 'Number of Devices'),
+                      ('Scan Width Microns', 'Scan Width (Microns)'), ('Scan Height Microns', 'Scan Height (Microns)'),
+                      ('DieWidth', 'Die Width (Microns)'), ('DieHeight', 'Die Height (Microns)')]
+        return [(label, scan_property(scan_prop_info, name)) for name, label in properties]
+
+    def analysis_properties(self):
+        """Return (label, value) pairs describing the selected analysis."""
+        with self.connect() as conn:
+            cur = conn.cursor()
+            analysis_info = np.array(cur.execute("SELECT * FROM Analysis WHERE AnalysisID = ?;", (self.analysis_id,)).fetchall())  # fetch all data from Analysis table
+            analyzer_info = np.array(cur.execute("SELECT * FROM Analyzers;").fetchall())  # fetch all data from Analyzers table
+        analyzer_type = analyzer_info[np.where(analyzer_info[:, 0].astype(str) == str(analysis_info[0][3]))[0][0], 3]
+        num_defects = analysis_info[0][10]
+        return [('Analyzer Type', analyzer_type), ('Number of Defects', num_defects)]
+
+    def mosaic_model(self):
+        """Create a MosaicModel for the current selection, not loaded yet."""
+        return MosaicModel(self.db_file, self.img_loc, self.scan_id, self.analysis_id, self.image_scale,
+                           image_view_only=self.image_view_only, binning_ranges=self.binning_ranges,
+                           binning_colors=self.binning_colors, inf_bin_color=self.inf_bin_color)
+
+    def scan_model(self, scan_id, analysis_id):
+        """Create a MosaicModel for any scan of the database, not loaded yet.
+
+        A scan without analysis (analysis_id None) only shows its images.
+        """
+        return MosaicModel(self.db_file, scan_folder(self.scan_dir, scan_id), scan_id, analysis_id, self.image_scale,
+                           image_view_only=self.image_view_only or analysis_id is None,
+                           binning_ranges=self.binning_ranges, binning_colors=self.binning_colors,
+                           inf_bin_color=self.inf_bin_color)
+
+    def lot_models(self):
+        """Create a MosaicModel for every scan of the database, each showing the last analysis of its scan.
+
+        Scans without any analysis are skipped, unless only the images are viewed.
+        """
+        models = []
+        with self.connect() as conn:
+            cur = conn.cursor()
+            for scan_id in self.scan_options:
+                analyses = analysis_ids(cur, scan_id)
+                if len(analyses) == 0 and not self.image_view_only:
+                    continue
+                models.append(self.scan_model(scan_id, analyses[-1] if len(analyses) else None))
+        return models
+
+
+class MosaicModel:
+    """Data and display settings of a single mosaic.
+
+    Owns the image and defect tables of a scan/analysis pair, the
+    binning settings and the geometry of the resized mosaic.
+    """
+
+    def __init__(self, db_file, img_loc, scan_id, analysis_id, image_scale, image_view_only=False,
+                 binning_ranges=DEFAULT_BINNING_RANGES, binning_colors=DEFAULT_BINNING_COLORS,
+                 inf_bin_color=DEFAULT_INF_BIN_COLOR):
+        self.db_file = db_file  # database containing analysis and scan information
+        self.img_loc = img_loc  # folder containing the images of the scan
+        self.scan_id = str(scan_id)
+        self.analysis_id = str(analysis_id)
+        self.image_scale = int(image_scale)  # mosaic is scaled by dividing by this value
+        self.image_view_only = bool(image_view_only)  # do not plot any defects
+
+        self.font_size_defect_label = "20"  # text size of defect labels on clicked tile
+        self.defect_mark_size = "3"  # defect marker size on mosaic
+        self.binning_ranges = binning_ranges  # bin size ranges given in um^2
+        self.binning_colors = binning_colors  # colors for size binning
+        self.binning_type_colors = np.array([])  # colors for defect classification binning (no default unlike size binning)
+        self.inf_bin_color = inf_bin_color  # infinity bin color
+        self.which_binning_show = 'SIZE'  # determines which color binning to show, or 'DENSITY' for the heat map
+        # density mode settings
+        self.density_weight = 'COUNT'  # what a defect adds to its density cell, 'COUNT' or 'AREA'
+        self.density_class = None  # only defects of this ClassID count, all defects when None
+        self.density_cell = "2"  # side of a density cell in mosaic pixels
+        # diff mode settings, comparing the analysis with a second analysis of the scan
+        self.compare_analysis_id = None  # analysis B of the diff, None until chosen
+        self.match_tolerance = DEFAULT_MATCH_TOLERANCE  # distance in um within which defects match
+        self.diff_colors = DEFAULT_DIFF_COLORS  # colors of only in A, only in B and matched defects
+        # lot overlay settings, repeaters across the lot and adders since the previous scan
+        self.lot_cell = "10"  # side of a device grid cell in um, the position tolerance
+        self.lot_min_dies = "3"  # dies a device position must hold a defect on to be a repeater
+        self.lot_colors = DEFAULT_LOT_COLORS  # colors of repeaters and adders
+        # cluster detection settings
+        self.cluster_link_distance = clusters.DEFAULT_LINK_DISTANCE  # side of a cluster grid cell in um
+        self.cluster_min_cell_defects = clusters.DEFAULT_MIN_CELL_DEFECTS  # defects a cell needs to seed a cluster
+        self.cluster_min_defects = clusters.DEFAULT_MIN_CLUSTER_DEFECTS  # defects a cluster needs to be shown
+        # defect filter, only the defects it keeps are shown on the mosaic, the tiles and in the statistics
+        self.defect_query = query.DefectQuery()
+        # this array keeps track of the defect info which will be output on the defect label text line
+        self.defect_label_text_choices = np.copy(DEFAULT_LABEL_TEXT_CHOICES)
+
+        # data tables, filled by load()
+        self.images = ColumnTable.empty(IMAGE_SCHEMA)
+        self.defects = ColumnTable.empty(DEFECT_SCHEMA)
+        self.compare_defects = ColumnTable.empty(DEFECT_SCHEMA)  # defects of the compare analysis
+        self.compare_loaded_id = None  # analysis ID whose defects compare_defects holds
+        self.scan_properties = np.array([])
+        self.defect_type_data = np.array([])
+        # mosaic geometry, filled by set_mosaic_size()
+        self.mos_source_width = None  # native width of the mosaic image
+        self.mos_source_height = None  # native height of the mosaic image
+        self.mos_resize_width = None  # width of the mosaic after scaling
+        self.mos_resize_height = None  # height of the mosaic after scaling
+        self.mos_tile_width = None  # width of one tile on the scaled mosaic
+        self.mos_tile_height = None  # height of one tile on the scaled mosaic
+        self._tile_index = None  # cached defect_tile_index
+        self._tile_order = None  # cached defect order grouped by tile
+        self._tile_sorted = None  # cached tile index in that order
+        self._matches = None  # cached (tolerance, match_a, match_b) of the diff
+        self._defect_index = None  # cached query.DefectIndex of the defects
+        self._compare_index = None  # cached query.DefectIndex of the compare defects
+        self._visible = None  # cached (mask, index) of the defects kept by the filter
+        self._mark_index = None  # cached spatial.GridIndex of the mosaic coordinates of those defects
+        self._tile_grids = {}  # image table index -> cached (defect index, spatial.GridIndex) of one tile
+
+    def connect(self):
+        """Open a connection to the database file."""
+        return closing(sqlite3.connect(self.db_file))
+
+    def scan_analysis_ids(self):
+        """Return the Analysis IDs of the scan of this model, which need not be the scan selected in the Root window."""
+        with self.connect() as conn:
+            return analysis_ids(conn.cursor(), self.scan_id)
+
+    def load(self):
+        """Fetch the image, defect, scan property and class rows."""
+        with self.connect() as conn:
+            self.load_tables(conn.cursor())
+
+    def load_tables(self, cur):
+        """Fetch the image, defect, scan property and class rows through an open cursor."""
+        self.load_scan_tables(cur)
+        self.load_analysis_tables(cur)
+
+    def load_scan_tables(self, cur):
+        """Fetch the image and scan property rows, enough to place defects once the mosaic size is known."""
+        # image and defect tables come from the local column cache when the database is unchanged
+        self.images = cached_table(self.db_file, 'images', self.scan_id, IMAGE_SCHEMA,
+                                   lambda: load_images(cur, self.scan_id))  # fetch all data from image table
+        self.scan_properties = np.array(fetch_rows(cur, 'scan_properties', SQL_SCAN_PROPERTIES, (self.scan_id,)))  # fetch all data from scan properties table
+
+    def load_analysis_tables(self, cur, on_chunk=None):
+        """Fetch the detection class and defect rows of the analysis.
+
+        on_chunk, when given, is called with the ColumnTable of every
+        chunk of defects as it streams in, or once with the whole table
+        when it comes from the local column cache.
+        """
+        defect_type_data = load_defect_classes(cur, self.analysis_id)
+        self.defect_type_data = defect_type_data  # chunks are binned while streaming
+        streamed = []
+
+        def fetch():
+            streamed.append(True)
+            return load_defects(cur, self.analysis_id, on_chunk)
+
+        defects = cached_table(self.db_file, 'defects', self.analysis_id, DEFECT_SCHEMA, fetch)
+        if on_chunk is not None and not streamed:
+            on_chunk(defects)
+        self.set_defects(defects, defect_type_data)
+
+    def set_defects(self, defects, defect_type_data):
+        """Replace the defect table, dropping everything derived from it."""
+        self.defects = defects
+        self.defect_type_data = defect_type_data
+        self._tile_index = None
+        self._tile_order = None
+        self._tile_sorted = None
+        self._matches = None
+        self._defect_index = None
+        self._visible = None
+        self._mark_index = None
+        self._tile_grids = {}
+
+    def set_compare_analysis(self, analysis_id):
+        """Choose a second analysis of the scan, analysis B of the diff mode, loaded by load_compare_defects."""
+        self.compare_analysis_id = str(analysis_id)
+
+    def load_compare_defects(self):
+        """Load the defects of the compare analysis unless they are loaded, e.g. on a worker thread."""
+        analysis_id = self.compare_analysis_id
+        if analysis_id is None or analysis_id == self.compare_loaded_id:
+            return
+        with self.connect() as conn:
+            cur = conn.cursor()
+            defects = cached_table(self.db_file, 'defects', analysis_id, DEFECT_SCHEMA,
+                                   lambda: load_defects(cur, analysis_id))
+        self.compare_defects = defects
+        self._matches = None
+        self._compare_index = None
+        self.compare_loaded_id = analysis_id
+
+    def set_analysis(self, analysis_id):
+        """Load the defects of another analysis of the same scan.
+
+        Class binning, the density class and the defect filter are reset,
+        since they belong to the previous analysis. Raises ValueError,
+        leaving the model as it was, when the analysis belongs to another
+        scan, e.g. the one selected in the Root window rather than the
+        scan of a lot or gallery mosaic.
+        """
+        with self.connect() as conn:
+            cur = conn.cursor()
+            scan_id = analysis_scan_id(cur, analysis_id)
+            if str(scan_id) != self.scan_id:
+                raise ValueError('Analysis ID ' + str(analysis_id) + ' belongs to Scan ID ' + str(scan_id)
+                                 + ', not to Scan ID ' + self.scan_id + ' of this mosaic')
+            self.analysis_id = str(analysis_id)
+            self.load_analysis_tables(cur)
+        self.binning_type_colors = np.array([])
+        self.density_class = None
+        self.set_defect_query(query.DefectQuery())
+
+    def load_mosaic_image(self):
+        """Open and resize the mosaic image, updating the mosaic geometry."""
+        image, source_size = load_mosaic_image(self.img_loc, self.image_scale)
+        self.set_mosaic_image(image, source_size)
+        return image
+
+    def set_mosaic_image(self, image, source_size):
+        """Take the geometry from a mosaic image loaded elsewhere, the image table must be loaded."""
+        self.mos_source_width, self.mos_source_height = source_size
+        self.set_mosaic_size(*image.size)
+
+    def set_mosaic_size(self, width, height):
+        """Set the size of the resized mosaic and derive the tile size."""
+        self.mos_resize_width, self.mos_resize_height = width, height
+        # obtain size of one mosaic tile in pixels (based on # mosaic rows and columns)
+        max_rows, max_cols = mosaic_grid(self.images)
+        self.mos_tile_width = self.mos_resize_width / max_cols
+        self.mos_tile_height = self.mos_resize_height / max_rows
+        self._mark_index = None
+
+    def defect_marks(self):
+        """Compute everything plot_defects needs to draw the defect marks.
+
+        Returns
+        -------
+        dict
+            'x' and 'y' mosaic coordinates, 'size_colors' and 'class_colors'
+            mark colors as indexes into mark_palettes, 'size_counts' and
+            'class_counts' defects per bin.
+        """
+        visible = self.visible_index()
+        if visible is None:
+            return self.chunk_marks(self.defects, self.tile_index())
+        return self.chunk_marks(self.defects.take(visible), self.tile_index()[visible])
+
+    def chunk_marks(self, defects, tile_index=None):
+        """Defect marks, as in defect_marks, of any part of the defect table, e.g. a streamed chunk."""
+        x, y = defect_mosaic_coords(self.images, defects, self.mos_tile_width, self.mos_tile_height, tile_index)
+        size_bins = size_bin_index(defects['Area'], self.binning_ranges)
+        class_bins = class_bin_index(defects['ClassID'], self.defect_type_data, self.binning_type_colors)
+        return {'x': x, 'y': y,
+                'size_colors': bin_color_index(size_bins, len(self.binning_colors)),
+                'class_colors': bin_color_index(class_bins, len(self.binning_type_colors)),
+                'size_counts': bin_counts(size_bins, len(self.binning_colors)),
+                'class_counts': bin_counts(class_bins, len(self.binning_type_colors))}
+
+    def mark_palettes(self):
+        """Mark color of every size bin and every class bin, indexed by the colors of defect_marks."""
+        return (bin_palette(self.binning_colors, self.inf_bin_color),
+                bin_palette(self.binning_type_colors, self.inf_bin_color))
+
+    def tile_index(self):
+        """Index into the image table of the tile of every defect (cached)."""
+        if self._tile_index is None:
+            self._tile_index = defect_tile_index(self.images, self.defects)
+        return self._tile_index
+
+    def defect_index(self):
+        """Sorted column indexes of the defects for the filter (cached)."""
+        if self._defect_index is None:
+            tile_index = self.tile_index()
+            self._defect_index = query.DefectIndex(self.defects, self.images['Row'][tile_index],
+                                                   self.images['Column'][tile_index])
+        return self._defect_index
+
+    def query_mask(self, defect_query):
+        """Mask of the defects a query keeps without applying it, None when it keeps all of them."""
+        return self.defect_index().evaluate(defect_query)
+
+    def set_defect_query(self, defect_query):
+        """Apply a defect filter, an empty query shows every defect again."""
+        self.defect_query = defect_query
+        self._visible = None
+        self._mark_index = None
+        self._tile_grids = {}
+
+    def visible_mask(self):
+        """Mask of the defects kept by the filter, None when the filter keeps all of them (cached)."""
+        if self.defect_query.is_empty():
+            return None
+        if self._visible is None:
+            mask = self.query_mask(self.defect_query)
+            self._visible = (mask, np.flatnonzero(mask))
+        return self._visible[0]
+
+    def visible_index(self):
+        """Defect table index of the defects kept by the filter, None when it keeps all of them."""
+        return None if self.visible_mask() is None else self._visible[1]
+
+    def mark_index(self):
+        """Grid index over the mosaic coordinates of the defects kept by the filter (cached)."""
+        if self._mark_index is None:
+            x, y = self.defect_mosaic_coords()
+            visible = self.visible_index()
+            if visible is not None:
+                x, y = x[visible], y[visible]
+            self._mark_index = spatial.GridIndex(x, y)
+        return self._mark_index
+
+    def select_rect(self, x0, y0, x1, y1):
+        """Return the defect table index of the defects kept by the filter within a mosaic rectangle."""
+        return self.mark_positions(self.mark_index().in_rect(x0, y0, x1, y1))
+
+    def select_polygon(self, px, py):
+        """Return the defect table index of the defects kept by the filter within a mosaic polygon."""
+        return self.mark_positions(self.mark_index().in_polygon(px, py))
+
+    def mark_positions(self, positions):
+        """Convert positions among the defects kept by the filter into defect table indices."""
+        visible = self.visible_index()
+        return positions if visible is None else visible[positions]
+
+    def defect_mosaic_coords(self):
+        """Mosaic coordinates of every defect, in pixels."""
+        return defect_mosaic_coords(self.images, self.defects, self.mos_tile_width,
+                                    self.mos_tile_height, self.tile_index())
+
+    def scan_coords(self):
+        """Position of every defect across the whole scan in um, the mosaic at native scale."""
+        tile_index = self.tile_index()
+        x = self.defects['X'] + self.images['Column'][tile_index] * self.images['WidthMicrons'][tile_index]
+        y = self.defects['Y'] + self.images['Row'][tile_index] * self.images['HeightMicrons'][tile_index]
+        return x, y
+
+    def scan_to_mosaic(self, x, y):
+        """Convert scan positions in um into resized mosaic pixels, tiles taken to be of equal size."""
+        return (np.asarray(x) * self.mos_tile_width / np.median(self.images['WidthMicrons']),
+                np.asarray(y) * self.mos_tile_height / np.median(self.images['HeightMicrons']))
+
+    def find_clusters(self):
+        """Find the clusters and scratches of the defects with the cluster settings.
+
+        Returns labels and shapes as clusters.find_clusters, with the
+        cluster 'corners' converted into mosaic pixels.
+        """
+        x, y = self.scan_coords()
+        visible = self.visible_index()
+        if visible is not None:
+            x, y = x[visible], y[visible]
+        labels, shapes = clusters.find_clusters(x, y, self.cluster_link_distance, int(self.cluster_min_cell_defects),
+                                                int(self.cluster_min_defects))
+        corners = shapes['corners'].copy()
+        corners[..., 0], corners[..., 1] = self.scan_to_mosaic(corners[..., 0], corners[..., 1])
+        shapes['corners'] = corners
+        return labels, shapes
+
+    def size_bins(self):
+        """Size bin index of every defect, last index is the infinity bin."""
+        return size_bin_index(self.defects['Area'], self.binning_ranges)
+
+    def class_bins(self):
+        """Class bin index of every defect, last index is the infinity bin."""
+        return class_bin_index(self.defects['ClassID'], self.defect_type_data, self.binning_type_colors)
+
+    def defect_matches(self):
+        """Match the defects with those of the compare analysis, cached per tolerance.
+
+        Returns match_a and match_b as in matching.match_defects, A being this analysis.
+        """
+        tolerance = float(self.match_tolerance)
+        self.load_compare_defects()
+        if self._matches is None or self._matches[0] != tolerance:
+            a, b = self.defects, self.compare_defects
+            self._matches = (tolerance,) + matching.match_defects(a['ImageID'], a['X'], a['Y'],
+                                                                  b['ImageID'], b['X'], b['Y'], tolerance)
+        return self._matches[1:]
+
+    @instrument.timed('diff_marks')
+    def diff_marks(self):
+        """Compute the defect marks of the diff mode.
+
+        Every defect of this analysis is marked as only in A or matched,
+        followed by the defects only found by the compare analysis. The
+        defect filter applies to both analyses.
+
+        Returns
+        -------
+        dict
+            'x' and 'y' mosaic coordinates, 'colors' mark colors and
+            'counts' number of defects only in A, only in B and matched.
+        """
+        match_a, match_b = self.defect_matches()
+        status_a, status_b = matching.diff_status(match_a, match_b)
+        keep_b = status_b == matching.ONLY_B
+        if not self.defect_query.is_empty():
+            compare_index = self._compare_index
+            if compare_index is None:
+                tile_index = defect_tile_index(self.images, self.compare_defects)
+                compare_index = self._compare_index = query.DefectIndex(
+                    self.compare_defects, self.images['Row'][tile_index], self.images['Column'][tile_index])
+            keep_b &= compare_index.evaluate(self.defect_query)
+        only_b = np.flatnonzero(keep_b)
+        x_a, y_a = self.defect_mosaic_coords()
+        visible = self.visible_index()
+        if visible is not None:
+            x_a, y_a, status_a = x_a[visible], y_a[visible], status_a[visible]
+        x_b, y_b = defect_mosaic_coords(self.images, self.compare_defects.take(only_b),
+                                        self.mos_tile_width, self.mos_tile_height)
+        status = np.concatenate([status_a, status_b[only_b]])
+        return {'x': np.concatenate([x_a, x_b]), 'y': np.concatenate([y_a, y_b]),
+                'colors': np.asarray(self.diff_colors, dtype=object)[status],
+                'counts': np.bincount(status, minlength=len(matching.STATUS_NAMES))}
+
+    @instrument.timed('density')
+    def density_heatmap(self, x=None, y=None):
+        """Color-mapped defect density of the resized mosaic, as an RGBA image of the mosaic size.
+
+        x and y are the mosaic coordinates of the defects kept by the
+        filter, computed when not given.
+        """
+        visible = self.visible_index()
+        if x is None:
+            x, y = self.defect_mosaic_coords()
+            if visible is not None:
+                x, y = x[visible], y[visible]
+        area, class_ids = self.defects['Area'], self.defects['ClassID']
+        if visible is not None:
+            area, class_ids = area[visible], class_ids[visible]
+        weights = area if self.density_weight == 'AREA' else None
+        if self.density_class is not None:
+            keep = class_ids == float(self.density_class)
+            x, y = x[keep], y[keep]
+            weights = None if weights is None else weights[keep]
+        counts = density.histogram(x, y, self.mos_resize_width, self.mos_resize_height,
+                                   cell=max(1, int(float(self.density_cell))), weights=weights)
+        return density.heatmap(counts, size=(self.mos_resize_width, self.mos_resize_height))
+
+    @instrument.timed('tile_at')
+    def tile_at(self, x, y):
+        """Return the image table index of the tile under a mosaic point, or None.
+
+        Blank space between separate die has no tile.
+        """
+        # find the ranges of values where tile exists inside mosaic canvas
+        x_bottom = self.images['Column'] * self.mos_tile_width
+        y_bottom = self.images['Row'] * self.mos_tile_height
+        hits = np.flatnonzero((x_bottom <= x) & (x <= x_bottom + self.mos_tile_width)
+                              & (y_bottom <= y) & (y <= y_bottom + self.mos_tile_height))
+        return int(hits[0]) if hits.size else None
+
+    def tile_path(self, image_index):
+        """Path of the tile image at an image table index."""
+        return self.img_loc + '/' + self.images['FileName'][image_index]
+
+    def tile_defects(self, image_index):
+        """Return the defect table indices of the defects on one tile kept by the filter."""
+        if self._tile_order is None:
+            self._tile_order = np.argsort(self.tile_index(), kind='stable')
+            self._tile_sorted = self.tile_index()[self._tile_order]
+        lo, hi = np.searchsorted(self._tile_sorted, [image_index, image_index + 1])
+        index = self._tile_order[lo:hi]
+        mask = self.visible_mask()
+        return index if mask is None else index[mask[index]]
+
+    def nearest_tile_defect(self, image_index, x, y):
+        """Return the defect table index of the defect kept by the filter nearest to a mosaic point on a tile.
+
+        The defects of a tile get a grid index over their tile coordinates on first use, None when the tile has none.
+        """
+        if image_index not in self._tile_grids:
+            index = self.tile_defects(image_index)
+            self._tile_grids[image_index] = (index, spatial.GridIndex(self.defects['X'][index], self.defects['Y'][index]))
+        index, grid = self._tile_grids[image_index]
+        # mosaic point into tile microns, the inverse of defect_mosaic_coords
+        tile_x = (x - self.images['Column'][image_index] * self.mos_tile_width) / self.mos_tile_width
+        tile_y = (y - self.images['Row'][image_index] * self.mos_tile_height) / self.mos_tile_height
+        nearest = grid.nearest(tile_x * self.images['WidthMicrons'][image_index],
+                               tile_y * self.images['HeightMicrons'][image_index])
+        return None if nearest is None else int(index[nearest])
+
+    def cache_nbytes(self):
+        """Memory held by the indexes dropped by drop_caches in bytes."""
+        nbytes = sum(array.nbytes for array in (self._tile_order, self._tile_sorted) if array is not None)
+        nbytes += sum(index.nbytes for index in (self._defect_index, self._compare_index, self._mark_index)
+                      if index is not None)
+        nbytes += sum(index.nbytes + grid.nbytes for index, grid in list(self._tile_grids.values()))
+        return nbytes
+
+    def drop_caches(self):
+        """Drop the sorted and spatial defect indexes, they are built again on first use.
+
+        The tile and filter caches stay, loading workers read them.
+        """
+        self._tile_order = None
+        self._tile_sorted = None
+        self._defect_index = None
+        self._compare_index = None
+        self._mark_index = None
+        self._tile_grids = {}
+
+    def tile_pixel_coords(self, defect_index, image_index, image_width, image_height):
+        """Convert defect positions from tile microns into tile image pixels."""
+        x = self.defects['X'][defect_index] * image_width / self.images['WidthMicrons'][image_index]
+        y = self.defects['Y'][defect_index] * image_height / self.images['HeightMicrons'][image_index]
+        return x, y
+
+    def microns_per_pixel(self, image_index):
+        """Return the (x, y) size of one tile image pixel in microns."""
+        return (self.images['WidthMicrons'][image_index] / self.images['WidthPixels'][image_index],
+                self.images['HeightMicrons'][image_index] / self.images['HeightPixels'][image_index])
+
+    def label_text(self, defect_index):
+        """Return the defect label text of one defect from the chosen text options."""
+        return ", ".join(name + " = " + self.defects.text(defect_index, name)
+                         for name, chosen in zip(DEFECT_FIELDS, self.defect_label_text_choices) if chosen)
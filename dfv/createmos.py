@@ -1,217 +1,734 @@
 # Mosaic Creator imports
 import tkinter as tk
-from PIL import Image, ImageTk
+from PIL import ImageTk
 from tkinter import ttk
 from tkinter import Tk, Canvas, mainloop
 import warnings
 import numpy as np
-import sqlite3
-import os
+import time
+from concurrent.futures import CancelledError
 
 # custom modules
+from dfv import clusters
+from dfv import filterwin
+from dfv import instrument
+from dfv import matching
+from dfv import pipeline
+from dfv import render
+from dfv import repeaters
+from dfv import reviewwin
+from dfv import selwin
 from dfv import setmos
+from dfv import stackwin
+from dfv import tablewin
 from dfv import tileclick
 
+POLL_MS = 50  # time between checks on the background loader
+FRAME_BUDGET = 0.03  # seconds spent on loader messages per event loop turn
+MARK_CHUNK = 5000  # defect marks drawn per event loop turn when drawing all marks in the background
+CLUSTER_COLORS = ('yellow', 'red')  # outline colors of clusters and scratches
+LASSO_STEP = 3  # mosaic pixels the pointer moves before the lasso gets a new vertex
+
+def overlay_marks(compute, size, radius, *args):
+    """ Computes overlay marks on a worker thread and draws them into one transparent image, see render.overlay_image
+
+    compute(*args) returns the marks as a dict with 'x', 'y' and 'colors', the image is added as 'image'.
+    """
+    overlay = compute(*args)
+    overlay['image'] = render.overlay_image(overlay['x'], overlay['y'], overlay['colors'], size, radius)
+    return overlay
+
+def photo_bytes(photo):
+    """ Returns the memory of a tk photo image in bytes, 4 per pixel, 0 for None """
+    return 0 if photo is None else photo.width() * photo.height() * 4
+
 class MosaicCreator:
     """ Create Mosaic With Selectable Tiles """
-    def __init__(self, root):
+    def __init__(self, root, model=None):
 
         self.root = root  # MosaicCreator instance holds instance of Root 
 
-        self.font_size_defect_label = "20"  # text size of defect labels on clicked tile
-        self.defect_mark_size = "3"  # defect marker size on mosaic
-        self.binning_ranges = self.root.binning_ranges  # set ranges to default received by root
-        self.binning_colors = self.root.binning_colors  # set colors to default received by root
-        self.binning_type_colors = np.array([])  # colors for defect classification binning (no default unlike size binning)
-        self.inf_bin_color = self.root.inf_bin_color  # set infinity bin color to default received by root
-        self.which_binning_show = 'SIZE'  # determines which color binning to show
-        
-        # this array keeps track of the defect info which will be output on the defect label text line
-        self.defect_label_text_choices = np.array([False, False, False, False, True, True, False, False, True, False,
-                                                   False, False, False, False, False, False, False, False])
-        
-        # set unique analysis ID instance variable for MosaicCreator
-        # allows analysis ID change without affecting Root window
-        self.analysis_id = self.root.ana_id.get()
+        # the model holds the data and display settings of the mosaic, independent of tk
+        # it has its own analysis ID, allowing analysis ID change without affecting Root window
+        # by default it shows the selection of the Root window, a lot review passes one model per scan
+        self.model = model if model is not None else self.root.session.mosaic_model()
 
         # more instance variable initializations
         self.canvas = None  # canvas to plot mosaic image and defects
         self.mosaic_image = None  # will be used to creat tk photo image object
-        self.mos_source_width = None  # will be used to store native width of the mosaic image
-        self.mos_source_height = None  # will be used to store native height of the mosaic image
         # arrays to hold number of defects per bin for size/type binning
         self.num_defects_type_binning = None
         self.num_defects_size_binning = None
+        self.loader = None  # background loader, set while the mosaic opens
+        self.load_frame = None  # progress bar and cancel button, shown while the mosaic opens
+        self.draw_after_id = None  # pending chunk of defect marks
+        self.marks = None  # defect marks of the current plot, see model.defect_marks
+        self.marks_drawn = False  # whether the marks are on the canvas, they are skipped in density mode
+        self.num_streamed = 0  # defect marks drawn so far while loading
+        self.density_image = None  # tk photo image of the density map, made on first use
+        self.diff_counts = None  # defects only in A, only in B and matched, set once the diff is drawn
+        self.diff_future = None  # pending diff overlay, matched on a worker thread
+        self.overlay_images = {}  # overlay tag -> tk photo image of the diff or lot overlay drawn
+        self.lot_future = None  # pending lot overlay, found on a worker thread
+        self.lot = None  # counts of repeaters and adders and the earlier analysis ID, set once the lot overlay is drawn
+        self.status_label = None  # status line under the mosaic while an overlay is computed
+        self.clusters = None  # (labels, shapes) of the defect clusters, found on first use
+        self.clusters_shown = False  # whether the cluster outlines are visible
+        self.selection_mode = None  # 'RECT' or 'LASSO' while a selection is dragged on the mosaic
+        self.selection_points = []  # corners of the rectangle or vertices of the lasso dragged so far
+        self.image_future = None  # mosaic image decoding again on a worker after it was evicted
 
         # create a new tkinter window for plotting the mosaic of the scans
         self.mosaic_window = tk.Toplevel()
-        self.sample_name = (self.root.db_file.get().split("/"))[-1]
-        self.mosaic_window.title(self.sample_name + " || " + "Scan ID = " + str(self.root.scan_id.get()) + " || " + "Analysis ID = " + str(self.analysis_id))
+        self.sample_name = self.root.session.sample_name()
+        self.set_title()
+        self.mosaic_window.protocol('WM_DELETE_WINDOW', self.close)
+        self.register_memory()
 
-        # connect to the database containing analysis and scan information
-        self.conn = sqlite3.connect(self.root.db_file.get())
-        self.cur = self.conn.cursor()
+        instrument.count('mosaics.opened')
 
-        # sql queries used to retrieve defect and image data
-        self.sql_cmd_pos = "SELECT * FROM vwImages WHERE ScanID = ?;" 
-        self.sql_cmd_def = "SELECT * FROM vwDefectsLegacy WHERE AnalysisID = ?;" 
-        self.sql_cmd_scn = "SELECT * FROM ScanProperties WHERE ScanID = ?"
-        self.sql_cmd_typ = "SELECT * FROM DetectionClasses WHERE AnalysisID = ?"
+        # fetch the table rows, load the mosaic image and place the defects in the background
+        self.load_mosaic()
 
-        self.image_data = np.array(self.cur.execute(self.sql_cmd_pos, (str(self.root.scan_id.get()),)).fetchall())  # fetch all data from image table
-        self.defect_data = np.array(self.cur.execute(self.sql_cmd_def, (str(self.analysis_id),)).fetchall())  # fetch all data from defect table
-        self.scan_properties = np.array(self.cur.execute(self.sql_cmd_scn, (str(self.root.scan_id.get()),)).fetchall())  # fetch all data from scan properties table
-        self.defect_type_data = np.array(self.cur.execute(self.sql_cmd_typ, (str(self.analysis_id),)).fetchall())  # fetch all data from detection class table
+    def set_title(self):
+        """ Titles the mosaic window after the sample, scan and analysis shown """
+        title = self.sample_name + " || " + "Scan ID = " + self.model.scan_id + " || " + "Analysis ID = " + self.model.analysis_id
+        if not self.model.defect_query.is_empty():
+            title += " || Filter = " + self.model.defect_query.describe()
+        self.mosaic_window.title(title)
 
-        # call image plotting function upon class object creation
-        self.plot_mosaic()
+    def root_progress(self, text):
+        """ Shows the loading progress of the latest mosaic in the root window """
+        # first destroy previous loading progress label
+        for child in self.root.root_wnd.winfo_children():
+            if "LOAD_PROGRESS" in child.bindtags():
+                child.destroy()
+        load_progress = tk.Label(self.root.root_wnd, text=text)
+        load_progress.bindtags(load_progress.bindtags() + ("LOAD_PROGRESS",))  # add custom tag for deletion purposes
+        load_progress.grid(row=6, column=2, columnspan=2)
 
-    def plot_defects(self):
-        """ Plot the defects onto the mosaic created by plot_mosaic function """
+    def load_mosaic(self):
+        """ Starts loading the mosaic on worker threads, the tk event loop stays free meanwhile """
+        self.root_progress('Loading Image...')
+
+        # progress bar with one step per loading stage, plus one for drawing the defect marks
+        self.load_frame = tk.Frame(self.mosaic_window)
+        self.load_status = tk.Label(self.load_frame, text='Loading database and image...')
+        self.load_bar = ttk.Progressbar(self.load_frame, length=300, mode='determinate', maximum=len(pipeline.STAGES) + 1)
+        button_cancel = tk.Button(self.load_frame, text='Cancel', width=10, command=self.close)
+        self.load_status.grid(row=0, column=0, columnspan=2)
+        self.load_bar.grid(row=1, column=0)
+        button_cancel.grid(row=1, column=1)
+        self.load_frame.grid(row=4, column=0)
+
+        # the loader shares its workers, connections and image cache with all other mosaics of Root
+        self.loader = pipeline.MosaicLoader(self.model, place_defects=not self.model.image_view_only,
+                                            scheduler=self.root.scheduler)
+        self.loader.start()
+        self.mosaic_window.after(POLL_MS, self.poll_loader)
+
+    def poll_loader(self):
+        """ Handles the messages of the background loader, runs on the tk event loop """
+        loader = self.loader
+        if loader is None:
+            return  # the window was closed
+        # handle messages for at most one frame, so streamed defect marks never freeze the window
+        deadline = time.perf_counter() + FRAME_BUDGET
+        while time.perf_counter() < deadline:
+            message = loader.next_message()
+            if message is None:
+                break
+            kind, payload = message
+            if kind == 'progress':
+                self.load_bar.step(1)
+                self.load_status.config(text='Loaded ' + payload + '...')
+            elif kind == 'image':
+                self.plot_mosaic(payload)  # show the mosaic while the defects are still being placed
+            elif kind == 'marks':
+                # draw every chunk of defects as it streams in, the density map and diff wait for all of them
+                if self.model.which_binning_show in ("SIZE", "CLASS"):
+                    self.draw_marks(payload, 0, len(payload['x']))
+                    self.num_streamed += len(payload['x'])
+                    self.load_status.config(text='Drawing defects... ' + str(self.num_streamed))
+            elif kind == 'done':
+                self.loader = None
+                self.add_controls()
+                if payload is not None:  # not image view only
+                    self.set_marks(payload)
+                    self.marks_drawn = self.model.which_binning_show in ("SIZE", "CLASS")
+                    if not self.marks_drawn:
+                        self.toggle_binning(self.model.which_binning_show)
+                self.loaded()
+                return
+            elif kind == 'error':
+                self.loader = None
+                print('Error loading mosaic: ' + payload)
+                self.load_status.config(text='Loading failed, ' + payload)
+                self.root_progress('Loading Failed!')
+                return
+            elif kind == 'cancelled':
+                self.loader = None
+                return
+        else:
+            # out of time with messages left, continue right after tk handled its own events
+            self.mosaic_window.after(1, self.poll_loader)
+            return
+        self.mosaic_window.after(POLL_MS, self.poll_loader)
+
+    def loaded(self):
+        """ Removes the progress bar once the mosaic is fully drawn """
+        if self.load_frame is not None:
+            self.load_frame.destroy()
+            self.load_frame = None
+            self.root_progress('Done Loading!')  # update root window upon image load completion
+
+    def register_memory(self):
+        """ Registers the large buffers of the window with the memory accounting of Root
+
+        Over the memory budget, the mosaic image of a minimized window, the density map
+        while hidden and the defect indexes are dropped, and made again when needed.
+        """
+        self.memory_owner = self.root.memory.new_owner('Mosaic ' + self.model.scan_id + '/' + self.model.analysis_id)
+        self.root.memory.register(self.memory_owner, 'mosaic image',
+                                  lambda: photo_bytes(self.mosaic_image), self.evict_mosaic_image)
+        self.root.memory.register(self.memory_owner, 'density map',
+                                  lambda: photo_bytes(self.density_image), self.evict_density_image)
+        self.root.memory.register(self.memory_owner, 'diff and lot overlays',
+                                  lambda: sum(photo_bytes(photo) for photo in self.overlay_images.values()))
+        self.root.memory.register(self.memory_owner, 'defect tables',
+                                  lambda: self.model.images.nbytes + self.model.defects.nbytes
+                                  + self.model.compare_defects.nbytes)
+        self.root.memory.register(self.memory_owner, 'defect marks',
+                                  lambda: 0 if self.marks is None else sum(a.nbytes for a in self.marks.values()))
+        self.root.memory.register(self.memory_owner, 'defect indexes', self.model.cache_nbytes, self.model.drop_caches)
+        self.mosaic_window.bind('<FocusIn>', lambda event: self.root.memory.touch(self.memory_owner), add='+')
+        self.mosaic_window.bind('<Map>', self.restore_mosaic_image, add='+')
+
+    def evict_mosaic_image(self):
+        """ Drops the mosaic photo image while the window is minimized, it is made again once shown """
+        if self.loader is not None or self.mosaic_image is None:
+            return  # still loading
+        if self.mosaic_window.state() not in ('iconic', 'withdrawn'):
+            return  # in view
+        self.canvas.itemconfigure("IMAGE_TILE", image='')
+        self.mosaic_image = None
+
+    def restore_mosaic_image(self, event):
+        """ Makes the evicted mosaic image again once the window is shown, decoding on a worker """
+        if event.widget is not self.mosaic_window or self.canvas is None:
+            return  # a child widget was mapped, or the mosaic is still loading
+        if self.mosaic_image is not None or self.image_future is not None:
+            return
+        self.image_future = self.root.scheduler.decode_pool.submit(self.root.scheduler.mosaic_image,
+                                                                   self.model.img_loc, self.model.image_scale)
+        self.mosaic_window.after(POLL_MS, self.poll_mosaic_image)
+
+    def poll_mosaic_image(self):
+        """ Shows the mosaic image decoded again once ready """
+        future = self.image_future
+        if future is None:
+            return  # the window was closed
+        if not future.done():
+            self.mosaic_window.after(POLL_MS, self.poll_mosaic_image)
+            return
+        self.image_future = None
+        try:
+            image, _ = future.result()
+        except (CancelledError, Exception) as e:
+            print('Error reloading the mosaic image: ' + str(e))
+            return
+        self.mosaic_image = ImageTk.PhotoImage(image)
+        self.canvas.itemconfigure("IMAGE_TILE", image=self.mosaic_image)
+        instrument.count('memory.mosaics_restored')
+
+    def evict_density_image(self):
+        """ Drops the density map while another binning is shown, it is made again on first use """
+        if self.density_image is not None and self.model.which_binning_show != "DENSITY":
+            self.canvas.delete("DEFECT_DENSITY")
+            self.density_image = None
+
+    def close(self):
+        """ Closes the mosaic window, cancelling any loading still in progress """
+        self.root.memory.unregister(self.memory_owner)
+        self.image_future = None  # a mosaic image decoding again is dropped once done
+        if self.loader is not None:
+            self.loader.cancel()
+            self.loader = None
+            self.root_progress('Loading Cancelled')
+        if self.draw_after_id is not None:
+            self.mosaic_window.after_cancel(self.draw_after_id)
+            self.draw_after_id = None
+        self.lot_future = None  # a pending lot overlay is dropped once done
+        self.diff_future = None  # likewise a pending diff overlay
+        self.mosaic_window.destroy()
+
+    @instrument.timed('plot_defects')
+    def plot_defects(self, marks=None):
+        """ Plot the defects onto the mosaic created by plot_mosaic function
+
+        marks are the defect marks from model.defect_marks, computed here when not given.
+        """
+        if self.draw_after_id is not None:  # stop drawing the marks of a previous plot
+            self.mosaic_window.after_cancel(self.draw_after_id)
+            self.draw_after_id = None
         self.canvas.delete("DEFECT_MARK_SIZE_BINNING")  # deletes all current defect marks to allow for re-plotting
         self.canvas.delete("DEFECT_MARK_CLASS_BINNING")
-
-        # initialize arrays to hold number of defects per bin for size/type binning
-        self.num_defects_size_binning = np.zeros([len(self.binning_colors) + 1])  
-        self.num_defects_type_binning = np.zeros([len(self.binning_type_colors) + 1])  
-
-        for idx, def_row in enumerate(self.defect_data):
-
-            tile_row_index = np.where(np.any(self.image_data[:, 0:1].astype(float) == float(def_row[1]), axis=1))[0]  # find the tile where defect resides
-            tile_row = float(self.image_data[tile_row_index, 7][0])  # find the Row and Column of the tile in the mosaic image
-            tile_column = float(self.image_data[tile_row_index, 8][0])
-            tile_width_um = float(self.image_data[tile_row_index, 9][0])  # find width and height of tile in um
-            tile_height_um = float(self.image_data[tile_row_index, 10][0])
-            tile_width_pix = float(self.image_data[tile_row_index, 11][0])  # find width and height of tile in pixels
-            tile_height_pix = float(self.image_data[tile_row_index, 12][0])
-            def_x_tile = float(def_row[4])  # obtain the coordinates of defect within its image tile (um)
-            def_y_tile = float(def_row[5])
-
-            # find defect coordinates in mosaic, convert to pixels, and scale by number of rows/cols in the mosaic
-            x_mosaic = self.mos_tile_width * ((def_x_tile + (tile_column * tile_width_um)) * (tile_width_pix / tile_width_um)) / tile_width_pix
-            y_mosaic = self.mos_tile_height * ((def_y_tile + (tile_row * tile_height_um)) * (tile_height_pix / tile_height_um)) / tile_height_pix
-
-            size_adj = float(self.defect_mark_size)  # arbitrary scaling value used to control size of defect mark on mosaic
-
-            # we will plot multiple copies of each defect overlaid on each other
-            # each copy will have a different defect mark color for the different available binning types
-            # then we can simply toggle the defect visibility by using tags for each bin type
-
-            # get index corresponding to binning range of defect area
-            bin_range_index = np.searchsorted(self.binning_ranges, float(def_row[8]))
-            # set size-based defect mark color based on binning color corresponding to index found above
-            if (bin_range_index > (len(self.binning_ranges) - 1)) or (self.binning_ranges.size == 0):
-                mark_color = self.inf_bin_color
-                self.num_defects_size_binning[len(self.binning_colors)] += 1  # iterate defect count for infinity bin
-            else:
-                mark_color = self.binning_colors[bin_range_index]
-                self.num_defects_size_binning[bin_range_index] += 1  # iterate defect count for specific bin
-
-            # set class-based defect mark color based on user binning input
-            if self.binning_type_colors.size == 0 or self.defect_type_data.size == 0:
-                mark_type_color = self.inf_bin_color
-                self.num_defects_type_binning[len(self.binning_type_colors)] += 1  # iterate defect count for infinity bin
-            else:
-                mark_type_color = self.binning_type_colors[np.where(self.defect_type_data[:, 0:1].flatten() == def_row[15])][0]
-                self.num_defects_type_binning[np.where(self.defect_type_data[:, 0:1].flatten() == def_row[15])] += 1  # iterate defect count for specific bin
-
+        self.canvas.delete("DEFECT_DENSITY")
+        self.canvas.delete("DEFECT_MARK_DIFF")
+        self.canvas.delete("DEFECT_MARK_LOT")
+        self.canvas.delete("DEFECT_CLUSTER")
+        self.canvas.delete("SELECTION")
+        self.clusters = None
+        self.clusters_shown = False
+        self.density_image = None
+        self.diff_counts = None
+        self.diff_future = None
+        self.overlay_images = {}
+        self.lot_future = None
+        self.lot = None
+        self.show_status(None)
+
+        # find defect coordinates in mosaic and the bin colors for size (area) and class binning, for all defects at once
+        if marks is None:
+            marks = self.model.defect_marks()
+        self.set_marks(marks)
+
+        if self.model.which_binning_show not in ("SIZE", "CLASS"):
+            # the marks are only drawn once size or class binning is chosen
+            self.marks_drawn = False
+            self.toggle_binning(self.model.which_binning_show)
+        else:
+            self.marks_drawn = True
+            self.draw_marks(marks, 0, len(marks['x']))
+        self.loaded()
+
+    def set_marks(self, marks):
+        """ Keeps the defect marks of the current plot and their number per bin """
+        instrument.count('defects.placed', len(marks['x']))
+        # number of defects per bin, the last one is the infinity bin
+        self.num_defects_size_binning = marks['size_counts']
+        self.num_defects_type_binning = marks['class_counts']
+        self.marks = marks
+
+    @instrument.timed('plot_defects.chunk')
+    def draw_chunk(self, marks, start, chunk):
+        """ Draws one chunk of defect marks and schedules the next one """
+        total = len(marks['x'])
+        stop = min(start + chunk, total)
+        self.draw_marks(marks, start, stop)
+        if stop < total:
+            if self.load_frame is not None:
+                self.load_bar.config(value=len(pipeline.STAGES) + stop / total)
+            self.draw_after_id = self.mosaic_window.after(1, self.draw_chunk, marks, stop, chunk)
+        else:
+            self.draw_after_id = None
+            self.loaded()
+
+    def draw_marks(self, marks, start, stop):
+        """ Draws the defect marks from index start up to stop """
+        size_adj = float(self.model.defect_mark_size)  # arbitrary scaling value used to control size of defect mark on mosaic
+
+        # only the marks of the selected binning are shown, by default the defect size binning
+        size_state = "normal" if self.model.which_binning_show == "SIZE" else "hidden"
+        class_state = "normal" if self.model.which_binning_show == "CLASS" else "hidden"
+        size_palette, class_palette = self.model.mark_palettes()  # marks hold indexes into these
+
+        # we will plot multiple copies of each defect overlaid on each other
+        # each copy will have a different defect mark color for the different available binning types
+        # then we can simply toggle the defect visibility by using tags for each bin type
+        for x, y, mark_color, mark_type_color in zip(marks['x'][start:stop], marks['y'][start:stop],
+                                                     size_palette[marks['size_colors'][start:stop]],
+                                                     class_palette[marks['class_colors'][start:stop]]):
             # now plot the defect on the mosaic, we plot multiple overlaid copies for each binning type
-            self.canvas.create_oval(x_mosaic - size_adj, y_mosaic - size_adj, 
-                                    x_mosaic + size_adj, y_mosaic + size_adj, 
-                                    outline=mark_color, fill=mark_color, tags="DEFECT_MARK_SIZE_BINNING")
-            self.canvas.create_oval(x_mosaic - size_adj, y_mosaic - size_adj, 
-                                    x_mosaic + size_adj, y_mosaic + size_adj, 
-                                    outline=mark_type_color, fill=mark_type_color, tags="DEFECT_MARK_CLASS_BINNING")
-            self.canvas.itemconfigure("DEFECT_MARK_SIZE_BINNING", state="hidden")
-            self.canvas.itemconfigure("DEFECT_MARK_CLASS_BINNING", state="hidden")
-
-        # by default we will show the defect size binning 
-        if self.which_binning_show == "SIZE":
-            self.canvas.itemconfigure("DEFECT_MARK_SIZE_BINNING", state="normal")
-        if self.which_binning_show == "CLASS":
-            self.canvas.itemconfigure("DEFECT_MARK_CLASS_BINNING", state="normal")
+            self.canvas.create_oval(x - size_adj, y - size_adj, x + size_adj, y + size_adj,
+                                    outline=mark_color, fill=mark_color, state=size_state,
+                                    tags="DEFECT_MARK_SIZE_BINNING")
+            self.canvas.create_oval(x - size_adj, y - size_adj, x + size_adj, y + size_adj,
+                                    outline=mark_type_color, fill=mark_type_color, state=class_state,
+                                    tags="DEFECT_MARK_CLASS_BINNING")
+
+    def show_density(self):
+        """ Shows the defect density map over the mosaic, a single image item instead of one mark per defect """
+        if self.density_image is None:
+            self.density_image = ImageTk.PhotoImage(self.model.density_heatmap(self.marks['x'], self.marks['y']))
+            self.canvas.create_image(0, 0, anchor=tk.NW, image=self.density_image, tags="DEFECT_DENSITY")
+        self.canvas.itemconfigure("DEFECT_DENSITY", state="normal")
+
+    def show_diff(self):
+        """ Shows the defects of both analyses colored by whether only one of them or both found them
+
+        The compare analysis is loaded and matched on a worker thread first.
+        """
+        if self.diff_counts is not None:
+            self.canvas.itemconfigure("DEFECT_MARK_DIFF", state="normal")
+            return True
+        if self.diff_future is None:
+            try:
+                if float(self.model.match_tolerance) <= 0:
+                    raise ValueError
+            except ValueError:
+                print('Please enter a positive number for Match Tolerance')
+                return False
+            self.show_status('Matching the defects of both analyses...')
+            self.diff_future = self.root.scheduler.decode_pool.submit(
+                overlay_marks, self.model.diff_marks, (self.model.mos_resize_width, self.model.mos_resize_height),
+                float(self.model.defect_mark_size))
+            self.mosaic_window.after(POLL_MS, self.poll_diff, self.diff_future)
+        return True
+
+    def poll_diff(self, future):
+        """ Draws the diff overlay once its worker is done """
+        if future is not self.diff_future:
+            return  # replotted or closed meanwhile
+        if not future.done():
+            self.mosaic_window.after(POLL_MS, self.poll_diff, future)
+            return
+        self.diff_future = None
+        self.show_status(None)
+        try:
+            diff = future.result()
+        except Exception as e:
+            print('Error comparing the analyses: ' + f"{type(e).__name__}: {e}")
+            return
+        self.draw_overlay(diff, "DEFECT_MARK_DIFF", "normal" if self.model.which_binning_show == "DIFF" else "hidden")
+        self.diff_counts = diff['counts']
+
+    def show_lot(self):
+        """ Shows the repeaters and adders among the defects, the lot is searched on a worker thread first """
+        if self.lot is not None:
+            self.canvas.itemconfigure("DEFECT_MARK_LOT", state="normal")
+            return True
+        if self.lot_future is None:
+            try:
+                cell, min_dies = float(self.model.lot_cell), int(self.model.lot_min_dies)
+            except ValueError:
+                print('Please enter a number for Repeater Cell and an integer for Repeater Min Dies')
+                return False
+            self.show_status('Finding repeaters and adders in the lot...')
+            self.lot_future = self.root.scheduler.db_pool.submit(
+                overlay_marks, repeaters.lot_marks, (self.model.mos_resize_width, self.model.mos_resize_height),
+                float(self.model.defect_mark_size), self.model, cell, min_dies)
+            self.mosaic_window.after(POLL_MS, self.poll_lot, self.lot_future)
+        return True
+
+    def poll_lot(self, future):
+        """ Draws the lot overlay once its worker is done """
+        if future is not self.lot_future:
+            return  # replotted or closed meanwhile
+        if not future.done():
+            self.mosaic_window.after(POLL_MS, self.poll_lot, future)
+            return
+        self.lot_future = None
+        self.show_status(None)
+        try:
+            lot = future.result()
+        except Exception as e:
+            print('Error finding repeaters and adders: ' + f"{type(e).__name__}: {e}")
+            return
+        self.draw_overlay(lot, "DEFECT_MARK_LOT", "normal" if self.model.which_binning_show == "LOT" else "hidden")
+        self.lot = lot
+
+    def show_status(self, text):
+        """ Shows a status line under the mosaic while something is computed, None removes it """
+        if self.status_label is not None:
+            self.status_label.destroy()
+            self.status_label = None
+        if text is not None:
+            self.status_label = tk.Label(self.mosaic_window, text=text)
+            self.status_label.grid(row=5, column=0)
+
+    def draw_overlay(self, overlay, tag, state="normal"):
+        """ Draws an overlay, such as the analysis diff, as one image item from the image of overlay_marks """
+        self.overlay_images[tag] = ImageTk.PhotoImage(overlay['image'])
+        self.canvas.create_image(0, 0, anchor=tk.NW, image=self.overlay_images[tag], state=state, tags=tag)
 
     def toggle_binning(self, toggle_choice):
-        """ Toggles visibility for the desired set of defect binning colors """
-        self.which_binning_show = toggle_choice  # we must update variable for binning visibility, bug fix
+        """ Toggles visibility for the desired set of defect binning colors, the density map or the analysis diff """
+        if toggle_choice == "DIFF" and self.model.compare_analysis_id is None:
+            print('Please select a Compare Analysis ID in the Advanced settings first')
+            return
+        self.model.which_binning_show = toggle_choice  # we must update variable for binning visibility, bug fix
+        if self.marks is None:
+            return  # no defects plotted, image view only
+        # hide everything shown so far, then show the choice
+        self.canvas.itemconfigure("DEFECT_MARK_SIZE_BINNING", state="hidden")
+        self.canvas.itemconfigure("DEFECT_MARK_CLASS_BINNING", state="hidden")
+        self.canvas.itemconfigure("DEFECT_DENSITY", state="hidden")
+        self.canvas.itemconfigure("DEFECT_MARK_DIFF", state="hidden")
+        self.canvas.itemconfigure("DEFECT_MARK_LOT", state="hidden")
+        if toggle_choice == "LOT":
+            if not self.show_lot():
+                self.toggle_binning("SIZE")
+            return
+        if toggle_choice == "DENSITY":
+            self.show_density()
+            return
+        if toggle_choice == "DIFF":
+            if not self.show_diff():
+                self.toggle_binning("SIZE")
+            return
+        if not self.marks_drawn:
+            # the mosaic was plotted in density mode, draw the marks now in the chosen binning
+            self.marks_drawn = True
+            self.draw_chunk(self.marks, 0, MARK_CHUNK)
         if toggle_choice == "SIZE":
             self.canvas.itemconfigure("DEFECT_MARK_SIZE_BINNING", state="normal")
-            self.canvas.itemconfigure("DEFECT_MARK_CLASS_BINNING", state="hidden")
         if toggle_choice == "CLASS":
-            self.canvas.itemconfigure("DEFECT_MARK_SIZE_BINNING", state="hidden")
             self.canvas.itemconfigure("DEFECT_MARK_CLASS_BINNING", state="normal")
 
+    def toggle_clusters(self):
+        """ Shows or hides the outlines of the defect clusters and scratches, finding them on first use """
+        if self.marks is None:
+            print('Clusters need defects, they are not available in image view only')
+            return
+        if self.clusters_shown:
+            self.canvas.itemconfigure("DEFECT_CLUSTER", state="hidden")
+            self.clusters_shown = False
+            return
+        if self.clusters is None:
+            try:
+                self.clusters = self.model.find_clusters()
+            except ValueError:
+                print('Please enter a positive number for Cluster Link Distance and integers for the cluster defect counts')
+                return
+            self.draw_clusters()
+        self.canvas.itemconfigure("DEFECT_CLUSTER", state="normal")
+        self.canvas.tag_raise("DEFECT_CLUSTER")  # outlines stay on top of the defect marks
+        self.clusters_shown = True
+        self.cluster_stats()
+
+    def draw_clusters(self):
+        """ Draws an outlined polygon and the number of every cluster """
+        shapes = self.clusters[1]
+        for number, (corners, kind) in enumerate(zip(shapes['corners'], shapes['kind']), start=1):
+            color = CLUSTER_COLORS[kind]
+            self.canvas.create_polygon(*corners.ravel(), outline=color, fill='', width=2, tags="DEFECT_CLUSTER")
+            self.canvas.create_text(corners[:, 0].max() + 4, corners[:, 1].min(), text=str(number), fill=color,
+                                    anchor=tk.W, tags="DEFECT_CLUSTER")
+
+    def cluster_stats(self):
+        """ Lists the clusters and scratches in a new window, numbered as on the mosaic """
+        labels, shapes = self.clusters
+        cluster_window = tk.Toplevel()
+        cluster_window.title('Cluster Statistics')
+
+        num_scratches = int((shapes['kind'] == clusters.SCRATCH).sum())
+        tk.Label(cluster_window, text=f"{len(shapes['kind']) - num_scratches} clusters, {num_scratches} scratches, "
+                                      f"{int((labels >= 0).sum())} of {len(labels)} defects clustered").grid(row=0, column=0, sticky='w')
+
+        # table of clusters, largest first
+        columns = ('kind', 'defects', 'length', 'width', 'angle', 'x', 'y')
+        headings = ('Kind', 'Defects', 'Length (um)', 'Width (um)', 'Angle (deg)', 'Center X (um)', 'Center Y (um)')
+        table = ttk.Treeview(cluster_window, columns=columns, height=15)
+        table.heading('#0', text='Cluster')
+        table.column('#0', width=70)
+        for column, heading in zip(columns, headings):
+            table.heading(column, text=heading)
+            table.column(column, width=95, anchor='e')
+        for i in range(len(shapes['kind'])):
+            table.insert('', 'end', text=str(i + 1),
+                         values=(clusters.KIND_NAMES[shapes['kind'][i]], int(shapes['count'][i]), f"{shapes['length'][i]:.1f}",
+                                 f"{shapes['width'][i]:.1f}", f"{shapes['angle'][i]:.1f}", f"{shapes['cx'][i]:.1f}",
+                                 f"{shapes['cy'][i]:.1f}"))
+        scrollbar = ttk.Scrollbar(cluster_window, orient='vertical', command=table.yview)
+        table.configure(yscrollcommand=scrollbar.set)
+        table.grid(row=1, column=0, sticky='nsew')
+        scrollbar.grid(row=1, column=1, sticky='ns')
+
+        # button to close window
+        button_close = tk.Button(cluster_window, text='Close', width=10, command=cluster_window.destroy)
+        button_close.grid(row=2, column=0, sticky='e')
+        cluster_window.rowconfigure(1, weight=1)
+        cluster_window.columnconfigure(0, weight=1)
+
+    def start_selection(self, event, mode):
+        """ Starts dragging a rectangle or a lasso on the mosaic to select defects """
+        if self.marks is None:
+            print('Selections need defects, they are not available in image view only')
+            return
+        self.canvas.delete("SELECTION")
+        self.selection_mode = mode
+        self.selection_points = [(event.x, event.y)]
+        if mode == 'RECT':
+            self.canvas.create_rectangle(event.x, event.y, event.x, event.y, outline='white', dash=(4, 2), tags="SELECTION")
+        else:
+            self.canvas.create_line(event.x, event.y, event.x, event.y, fill='white', dash=(4, 2), tags="SELECTION")
+
+    def drag_selection(self, event):
+        """ Follows the pointer with the selection outline """
+        if self.selection_mode is None:
+            return
+        if self.selection_mode == 'RECT':
+            self.selection_points[1:] = [(event.x, event.y)]
+        else:
+            last_x, last_y = self.selection_points[-1]
+            if abs(event.x - last_x) + abs(event.y - last_y) < LASSO_STEP:
+                return
+            self.selection_points.append((event.x, event.y))
+        if self.selection_mode == 'RECT':
+            (x0, y0), (x1, y1) = self.selection_points
+            self.canvas.coords("SELECTION", x0, y0, x1, y1)
+        else:
+            self.canvas.coords("SELECTION", *np.ravel(self.selection_points))
+
+    def end_selection(self, event):
+        """ Selects the defects within the dragged rectangle or lasso and lists them in a new window """
+        mode, points = self.selection_mode, self.selection_points
+        if mode is None:
+            return
+        self.selection_mode = None
+        self.selection_points = []
+        if mode == 'RECT':
+            points = [points[0], (event.x, event.y)]
+            if points[0][0] == points[1][0] or points[0][1] == points[1][1]:
+                self.canvas.delete("SELECTION")
+                return
+            (x0, y0), (x1, y1) = points
+            self.canvas.coords("SELECTION", x0, y0, x1, y1)
+            defect_index = self.model.select_rect(x0, y0, x1, y1)
+        else:
+            if len(points) < 3:
+                self.canvas.delete("SELECTION")
+                return
+            # close the lasso into a polygon
+            self.canvas.delete("SELECTION")
+            self.canvas.create_polygon(*np.ravel(points), outline='white', fill='', dash=(4, 2), tags="SELECTION")
+            px, py = np.array(points, dtype=float).T
+            defect_index = self.model.select_polygon(px, py)
+        instrument.count('defects.selected', len(defect_index))
+        if len(defect_index) == 0:
+            print('No defects selected')
+            return
+        selwin.Selection(self, defect_index)  # pass instance of MosaicCreator to Selection
+
+    def open_filter(self):
+        """ Opens the defect filter panel, once defects are plotted """
+        if self.marks is None:
+            print('The defect filter needs defects, it is not available in image view only')
+        else:
+            filterwin.DefectFilter(self)  # pass instance of MosaicCreator to DefectFilter
+
+    def open_table(self):
+        """ Opens the defect table of the defects kept by the filter, once defects are plotted """
+        if self.marks is None:
+            print('The defect table needs defects, it is not available in image view only')
+        else:
+            tablewin.DefectTable(self)  # pass instance of MosaicCreator to DefectTable
+
+    def open_review(self):
+        """ Opens a tile window stepping through the defects kept by the filter, once defects are plotted """
+        if self.marks is None:
+            print('Defect review needs defects, it is not available in image view only')
+        else:
+            reviewwin.DefectReview(self)  # pass instance of MosaicCreator to DefectReview
+
+    def open_die_stack(self):
+        """ Opens the die stack window, once defects are plotted """
+        if self.marks is None:
+            print('The die stack needs defects, it is not available in image view only')
+        else:
+            stackwin.DieStack(self)  # pass instance of MosaicCreator to DieStack
+
     def analysis_stats(self):
         """ Displays statistics about the current analysis in new window """   
+        model = self.model
         # create the statistics window
         ana_stats_window = tk.Toplevel()
         ana_stats_window.title('Analysis Statistics')
+        if not model.defect_query.is_empty():
+            # the counts below only include the defects kept by the filter
+            ana_stats_window.title('Analysis Statistics || ' + str(len(self.marks['x'])) + ' of '
+                                   + str(len(model.defects)) + ' defects, Filter = ' + model.defect_query.describe())
 
         # create labels for current bin info and defect counts, check current binning mode
-        # if defect binning selection is "SIZE"...
-        if self.which_binning_show == "SIZE":
+        # if defect binning selection is "SIZE", the density map also lists the size bins...
+        if model.which_binning_show in ("SIZE", "DENSITY"):
             tk.Label(ana_stats_window, text="Bin Ceiling").grid(row=0, column=0)  # create headers
             tk.Label(ana_stats_window, text="Bin Color").grid(row=0, column=1)
             tk.Label(ana_stats_window, text="Number of Defects").grid(row=0, column=2)
             ttk.Separator(ana_stats_window, orient='horizontal').grid(row=1, column=0, columnspan=3, sticky='ew')
             # iterate through all the ranges/colors and create labels for each
-            for i in range(len(self.binning_colors)):
-                tk.Label(ana_stats_window, text=str(self.binning_ranges[i])).grid(row=i + 2, column=0)
-                tk.Label(ana_stats_window, text=str(self.binning_colors[i]), fg=str(self.binning_colors[i])).grid(row=i + 2, column=1)
+            for i in range(len(model.binning_colors)):
+                tk.Label(ana_stats_window, text=str(model.binning_ranges[i])).grid(row=i + 2, column=0)
+                tk.Label(ana_stats_window, text=str(model.binning_colors[i]), fg=str(model.binning_colors[i])).grid(row=i + 2, column=1)
                 tk.Label(ana_stats_window, text=str(int(self.num_defects_size_binning[i]))).grid(row=i + 2, column=2)
-            tk.Label(ana_stats_window, text="Infinity").grid(row=len(self.binning_colors) + 3, column=0)
-            tk.Label(ana_stats_window, text=str(self.inf_bin_color), fg=str(self.inf_bin_color)).grid(row=len(self.binning_colors) + 3, column=1)
-            tk.Label(ana_stats_window, text=str(int(self.num_defects_size_binning[-1]))).grid(row=len(self.binning_colors) + 3, column=2)
+            tk.Label(ana_stats_window, text="Infinity").grid(row=len(model.binning_colors) + 3, column=0)
+            tk.Label(ana_stats_window, text=str(model.inf_bin_color), fg=str(model.inf_bin_color)).grid(row=len(model.binning_colors) + 3, column=1)
+            tk.Label(ana_stats_window, text=str(int(self.num_defects_size_binning[-1]))).grid(row=len(model.binning_colors) + 3, column=2)
 
             # button to close window
             button_close = tk.Button(ana_stats_window, text='Close', width=10, command=ana_stats_window.destroy)
-            button_close.grid(row=len(self.binning_colors) + 4, column=2, columnspan=1)
+            button_close.grid(row=len(model.binning_colors) + 4, column=2, columnspan=1)
 
         # if defect binning selection is "CLASS"...
-        if self.which_binning_show == "CLASS":
+        if model.which_binning_show == "CLASS":
             tk.Label(ana_stats_window, text="Defect Class Name").grid(row=0, column=0)  # create headers
             tk.Label(ana_stats_window, text="Bin Color").grid(row=0, column=1)
             tk.Label(ana_stats_window, text="Number of Defects").grid(row=0, column=2)
             ttk.Separator(ana_stats_window, orient = 'horizontal').grid(row=1, column=0, columnspan=3, sticky='ew')
             # first check if any class binning has been applied (or if classes even exist for this analysis)
-            if len(self.binning_type_colors) == 0:
+            if len(model.binning_type_colors) == 0:
                 tk.Label(ana_stats_window, text="No Binning Set Yet!").grid(row=2, column=0)
-                tk.Label(ana_stats_window, text=str(self.inf_bin_color), fg=str(self.inf_bin_color)).grid(row=2, column=1)
+                tk.Label(ana_stats_window, text=str(model.inf_bin_color), fg=str(model.inf_bin_color)).grid(row=2, column=1)
                 tk.Label(ana_stats_window, text=str(int(self.num_defects_type_binning[-1]))).grid(row=2, column=2)
             else:
                 # iterate through all the colors/class names and create labels for each
-                for i in range(len(self.binning_type_colors)):
-                    tk.Label(ana_stats_window, text=str(self.defect_type_data[i][2])).grid(row=i + 2, column=0)
-                    tk.Label(ana_stats_window, text=str(self.binning_type_colors[i]), fg=str(self.binning_type_colors[i])).grid(row=i + 2, column=1)
+                for i in range(len(model.binning_type_colors)):
+                    tk.Label(ana_stats_window, text=str(model.defect_type_data[i][2])).grid(row=i + 2, column=0)
+                    tk.Label(ana_stats_window, text=str(model.binning_type_colors[i]), fg=str(model.binning_type_colors[i])).grid(row=i + 2, column=1)
                     tk.Label(ana_stats_window, text=str(int(self.num_defects_type_binning[i]))).grid(row=i + 2, column=2)
 
             # button to close window
             button_close = tk.Button(ana_stats_window, text='Close', width = 10, command=ana_stats_window.destroy)
-            button_close.grid(row = len(self.binning_type_colors)+3, column=2, columnspan=1)
+            button_close.grid(row = len(model.binning_type_colors)+3, column=2, columnspan=1)
+
+        # if the analysis diff is shown...
+        if model.which_binning_show == "DIFF" and self.diff_counts is not None:
+            tk.Label(ana_stats_window, text="A = Analysis ID " + model.analysis_id + ", B = Analysis ID "
+                     + model.compare_analysis_id + ", Tolerance = " + model.match_tolerance + " um").grid(row=0, column=0, columnspan=3)
+            tk.Label(ana_stats_window, text="Defects").grid(row=1, column=0)  # create headers
+            tk.Label(ana_stats_window, text="Mark Color").grid(row=1, column=1)
+            tk.Label(ana_stats_window, text="Number of Defects").grid(row=1, column=2)
+            ttk.Separator(ana_stats_window, orient='horizontal').grid(row=2, column=0, columnspan=3, sticky='ew')
+            for i, name in enumerate(matching.STATUS_NAMES):
+                tk.Label(ana_stats_window, text=name).grid(row=i + 3, column=0)
+                tk.Label(ana_stats_window, text=str(model.diff_colors[i]), fg=str(model.diff_colors[i])).grid(row=i + 3, column=1)
+                tk.Label(ana_stats_window, text=str(int(self.diff_counts[i]))).grid(row=i + 3, column=2)
 
-    def plot_mosaic(self):
-        """ Plot the mosaic onto a selectable canvas """                
-        # create new label in root window which tracks image loading progress
-        # first destroy previous loading progress label
-        for child in self.root.root_wnd.winfo_children():
-            if "LOAD_PROGRESS" in child.bindtags():
-                child.destroy()
-        load_progress = tk.Label(self.root.root_wnd, text='Loading Image...')
-        load_progress.bindtags(load_progress.bindtags() + ("LOAD_PROGRESS",))  # add custom tag for deletion purposes
-        load_progress.grid(row=6, column=2, columnspan=2)
-        self.root.root_wnd.update()
+            # button to close window
+            button_close = tk.Button(ana_stats_window, text='Close', width=10, command=ana_stats_window.destroy)
+            button_close.grid(row=len(matching.STATUS_NAMES) + 3, column=2, columnspan=1)
+
+        # if the lot overlay is shown...
+        if model.which_binning_show == "LOT" and self.lot is not None:
+            earlier = 'no previous scan' if self.lot['earlier'] is None else 'since Analysis ID ' + self.lot['earlier']
+            tk.Label(ana_stats_window, text="Repeater Cell = " + model.lot_cell + " um, Min Dies = "
+                     + model.lot_min_dies).grid(row=0, column=0, columnspan=3)
+            tk.Label(ana_stats_window, text="Defects").grid(row=1, column=0)  # create headers
+            tk.Label(ana_stats_window, text="Mark Color").grid(row=1, column=1)
+            tk.Label(ana_stats_window, text="Number of Defects").grid(row=1, column=2)
+            ttk.Separator(ana_stats_window, orient='horizontal').grid(row=2, column=0, columnspan=3, sticky='ew')
+            for i, name in enumerate(('Repeaters', 'Adders, ' + earlier)):
+                tk.Label(ana_stats_window, text=name).grid(row=i + 3, column=0)
+                tk.Label(ana_stats_window, text=str(model.lot_colors[i]), fg=str(model.lot_colors[i])).grid(row=i + 3, column=1)
+                tk.Label(ana_stats_window, text=str(self.lot['counts'][i])).grid(row=i + 3, column=2)
 
-        list_of_images = np.array(next(os.walk(self.root.img_loc + '/'))[2])  # list of images from directory
-        mosaic_image_name = list_of_images[np.flatnonzero(np.char.find(list_of_images,'Mosaic') != -1)[0]]  # find mosaic image in list
-        image = Image.open(self.root.img_loc + '/' + mosaic_image_name)  # open initial mosaic image from file
-        self.mos_source_width, self.mos_source_height = image.size  # get the native size of the mosaic image
-        # resize mosaic image and interpolate
-        image = image.resize((round(self.mos_source_width / int(self.root.image_scale.get())), round(self.mos_source_height / int(self.root.image_scale.get()))), Image.LANCZOS)
-        self.mos_resize_width, self.mos_resize_height = image.size  # get the new size of mosaic image
+            # button to close window
+            button_close = tk.Button(ana_stats_window, text='Close', width=10, command=ana_stats_window.destroy)
+            button_close.grid(row=5, column=2, columnspan=1)
 
+    @instrument.timed('plot_mosaic')
+    def plot_mosaic(self, image):
+        """ Plot the resized mosaic image onto a selectable canvas """
         # create the canvas with size according to resized mosaic image
-        self.canvas = Canvas(self.mosaic_window, width=self.mos_resize_width, height=self.mos_resize_height, bd=0)
+        self.canvas = Canvas(self.mosaic_window, width=image.width, height=image.height, bd=0)
+
+        self.mosaic_image = ImageTk.PhotoImage(image)  # create tkinter photo object
+        self.canvas.create_image(0, 0, anchor=tk.NW, image=self.mosaic_image, tags="IMAGE_TILE")
+        self.canvas.grid(row=0, column=0)
 
+    def add_controls(self):
+        """ Adds the mosaic buttons and makes the mosaic selectable, once the model is fully loaded """
         # button for advanced settings, passes instance of MosaicCreator to MosaicSettings
         button_advanced = tk.Button(self.mosaic_window, text='Advanced', width=10, command=lambda: setmos.MosaicSettings(self))
 
@@ -224,33 +741,48 @@ class MosaicCreator:
         # button for showing class-binned defect colors
         button_class_binning = tk.Button(self.mosaic_window, text='Class Binning', width=10, command=lambda: self.toggle_binning("CLASS"))
 
-        self.mosaic_image = ImageTk.PhotoImage(image)  # create tkinter photo object
-        self.canvas.create_image(0, 0, anchor=tk.NW, image=self.mosaic_image, tags="IMAGE_TILE")
+        # button for showing the defect density map
+        button_density = tk.Button(self.mosaic_window, text='Density', width=10, command=lambda: self.toggle_binning("DENSITY"))
 
-        # now prepare for plotting defects onto canvas
-        # find max # rows and columns -> will be used to scale individual mosaic tile
-        row_numbers = (self.image_data[:, 7:8]).astype(int)
-        col_numbers = (self.image_data[:, 8:9]).astype(int)
-        max_rows = max(row_numbers)[0] + 1
-        max_cols = max(col_numbers)[0] + 1
+        # button for showing the diff with the compare analysis
+        button_diff = tk.Button(self.mosaic_window, text='Analysis Diff', width=10, command=lambda: self.toggle_binning("DIFF"))
 
-        # obtain size of one mosaic tile in pixels (based on # mosaic rows and columns)
-        self.mos_tile_width = self.mos_resize_width / max_cols
-        self.mos_tile_height = self.mos_resize_height / max_rows
+        # button for showing the repeaters and adders found across the lot
+        button_lot = tk.Button(self.mosaic_window, text='Repeaters', width=10, command=lambda: self.toggle_binning("LOT"))
 
-        # check if user has selected image view only
-        if self.root.image_view_only.get() == 0: 
-            self.plot_defects()  # function that plots the defects onto the canvas created above
+        # button for showing the outlines of defect clusters and scratches
+        button_clusters = tk.Button(self.mosaic_window, text='Clusters', width=10, command=self.toggle_clusters)
 
-        self.canvas.bind('<Button-1>', lambda event: tileclick.Clicked(self, event))  # makes mosaic selectable
+        # button for opening the defect filter panel
+        button_filter = tk.Button(self.mosaic_window, text='Filter', width=10, command=self.open_filter)
 
-        load_progress.config(text='Done Loading!')  # update root window upon image load completion
-        self.root.root_wnd.update()
+        # button for opening the table of all defects
+        button_table = tk.Button(self.mosaic_window, text='Defect Table', width=10, command=self.open_table)
+
+        # button for stepping through the defects in one tile window
+        button_review = tk.Button(self.mosaic_window, text='Review', width=10, command=self.open_review)
+
+        # button for opening the die stack of all devices
+        button_die_stack = tk.Button(self.mosaic_window, text='Die Stack', width=10, command=self.open_die_stack)
+
+        self.canvas.bind('<Button-1>', lambda event: tileclick.Clicked(self, event))  # makes mosaic selectable
+        # dragging with shift selects the defects in a rectangle, with control in a lasso
+        self.canvas.bind('<Shift-Button-1>', lambda event: self.start_selection(event, 'RECT'))
+        self.canvas.bind('<Control-Button-1>', lambda event: self.start_selection(event, 'LASSO'))
+        self.canvas.bind('<B1-Motion>', self.drag_selection)
+        self.canvas.bind('<ButtonRelease-1>', self.end_selection)
 
         # place all the items according to grid
-        self.canvas.grid(row=0, column=0)
         button_advanced.grid(row=1, column=0)
         button_size_binning.grid(row=1, column=0, sticky='e')
         button_class_binning.grid(row=2, column=0, sticky='e')
+        button_density.grid(row=2, column=0, sticky='w')
+        button_diff.grid(row=3, column=0, sticky='w')
+        button_lot.grid(row=2, column=0)
+        button_die_stack.grid(row=3, column=0)
+        button_clusters.grid(row=1, column=0, sticky='w')
+        button_filter.grid(row=4, column=0, sticky='w')
+        button_table.grid(row=4, column=0)
+        button_review.grid(row=4, column=0, sticky='e')
 
         button_analy_stats.grid(row=3, column=0, sticky='e')
@@ -0,0 +1,230 @@
+"""
+dfv.crops
+---------
+
+This module provides a batch exporter for per-defect image crops
+(a "defect gallery"), without opening any tile windows.
+
+Defects of an analysis are grouped by ImageID so every tile image is
+opened once. Tiles are fanned out across a process pool and the crops
+are written to a directory, or streamed into a single zip archive:
+
+    $ python -m dfv crops --db X.db --scans DIR --analysis 7 --out crops/
+    $ python -m dfv crops --db X.db --scans DIR --analysis 7 --out crops.zip
+
+A manifest.csv listing every crop is written next to the crops.
+"""
+
+# crops.py imports
+import csv
+import io
+import os
+import sqlite3
+import zipfile
+from contextlib import closing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import numpy as np
+from PIL import Image
+
+# custom modules
+from dfv import core
+
+MANIFEST_FIELDS = ['DefectID', 'ImageID', 'ClassID', 'Area', 'Left', 'Top', 'Right', 'Bottom', 'File']
+
+
+class TileTask:
+    """All defects of one tile, with the crop boxes already computed."""
+
+    def __init__(self, tile_path, image_id, defect_rows, boxes, out_dir, image_format):
+        self.tile_path = tile_path  # path to the tile image
+        self.image_id = image_id  # ImageID of the tile
+        self.defect_rows = defect_rows  # (DefectID, ClassID, Area) of every defect
+        self.boxes = boxes  # (n, 4) int array of left, top, right, bottom in tile pixels
+        self.out_dir = out_dir  # write crops here, or return them encoded when None
+        self.image_format = image_format  # file extension of the crops, e.g. 'png'
+
+
+def crop_boxes(defects, images, image_index, pad):
+    """Compute padded crop boxes of the defects of one tile.
+
+    The defect mark on the tile canvas spans H pixels in x and W pixels
+    in y around the defect center, the crops use the same extent.
+
+    Parameters
+    ----------
+    defects : dfv.core.ColumnTable
+        Defect table holding only the defects of the tile.
+    images : dfv.core.ColumnTable
+        Image table of the scan.
+    image_index : int
+        Index of the tile in the image table.
+    pad : int
+        Extra pixels added on every side of the defect.
+
+    Returns
+    -------
+    numpy array of int
+        (n, 4) array of left, top, right, bottom, clipped to the tile.
+    """
+    width_pix = images['WidthPixels'][image_index]
+    height_pix = images['HeightPixels'][image_index]
+    # convert defect center from microns to tile pixels
+    x = defects['X'] * width_pix / images['WidthMicrons'][image_index]
+    y = defects['Y'] * height_pix / images['HeightMicrons'][image_index]
+    half_x = defects['H'] + pad
+    half_y = defects['W'] + pad
+    boxes = np.column_stack([np.floor(x - half_x), np.floor(y - half_y),
+                             np.ceil(x + half_x), np.ceil(y + half_y)])
+    boxes = np.clip(boxes, 0, [width_pix, height_pix, width_pix, height_pix]).astype(int)
+    # never return an empty box, even for defects at the tile border
+    boxes[:, 2] = np.maximum(boxes[:, 2], boxes[:, 0] + 1)
+    boxes[:, 3] = np.maximum(boxes[:, 3], boxes[:, 1] + 1)
+    return boxes
+
+
+def export_tile(task):
+    """Open one tile and cut all of its defect crops.
+
+    Runs inside the worker processes. Crops are written straight to
+    task.out_dir, or returned encoded when task.out_dir is None.
+
+    Returns
+    -------
+    list of tuple
+        (manifest row, encoded crop or None) for every defect.
+    """
+    results = []
+    with Image.open(task.tile_path) as tile:
+        tile.load()
+        for (defect_id, class_id, area), box in zip(task.defect_rows, task.boxes):
+            name = str(task.image_id) + '/' + str(defect_id) + '.' + task.image_format
+            crop = tile.crop(tuple(int(v) for v in box))
+            row = [defect_id, task.image_id, class_id, area] + [int(v) for v in box] + [name]
+            if task.out_dir is None:
+                buffer = io.BytesIO()
+                crop.save(buffer, format=Image.registered_extensions()['.' + task.image_format])
+                results.append((row, buffer.getvalue()))
+            else:
+                crop.save(os.path.join(task.out_dir, name))
+                results.append((row, None))
+    return results
+
+
+def tile_tasks(model, pad, out_dir, image_format):
+    """Group the defects of a loaded MosaicModel by tile and yield one TileTask per tile."""
+    if len(model.defects) == 0:
+        return
+    tile_index = model.tile_index()
+    order = np.argsort(tile_index, kind='stable')
+    # boundaries of the runs of defects sharing a tile
+    splits = np.flatnonzero(np.diff(tile_index[order])) + 1
+    for run in np.split(order, splits):
+        image_index = tile_index[run[0]]
+        image_id = model.images.text(image_index, 'ImageID')
+        defects = model.defects.take(run)
+        defect_rows = list(zip((defects.text(i, 'DefectID') for i in range(len(defects))),
+                               (defects.text(i, 'ClassID') for i in range(len(defects))),
+                               defects['Area'].tolist()))
+        if out_dir is not None:
+            os.makedirs(os.path.join(out_dir, image_id), exist_ok=True)
+        yield TileTask(model.tile_path(image_index), image_id, defect_rows,
+                       crop_boxes(defects, model.images, image_index, pad), out_dir, image_format)
+
+
+def run_tasks(tasks, workers):
+    """Run the tile tasks on a process pool, yielding results as they finish.
+
+    Only a bounded number of tiles is in flight at once, so crops are
+    streamed to their destination instead of piling up in memory.
+    """
+    if workers == 1:
+        for task in tasks:
+            yield export_tile(task)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        for task in tasks:
+            pending.add(pool.submit(export_tile, task))
+            if len(pending) >= workers * 4:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        for future in pending:
+            yield future.result()
+
+
+def export_crops(db_file, scan_dir, analysis_id, out, pad=16, image_format='png', workers=None):
+    """Export a padded crop around every defect of an analysis.
+
+    Parameters
+    ----------
+    db_file : string
+        nSpec database file.
+    scan_dir : string
+        Directory containing the 'Scan_XXX' folders.
+    analysis_id : string
+        Analysis ID whose defects are exported.
+    out : string
+        Output directory, or a path ending in '.zip' for a single archive.
+    pad : int, optional
+        Extra pixels around every defect. The default is 16.
+    image_format : string, optional
+        File extension of the crops. The default is 'png'.
+    workers : int, optional
+        Number of worker processes. The default is the number of cores.
+
+    Returns
+    -------
+    int
+        Number of crops written.
+    """
+    with closing(sqlite3.connect(db_file)) as conn:
+        scan_id = core.analysis_scan_id(conn.cursor(), analysis_id)
+    model = core.MosaicModel(db_file, core.scan_folder(scan_dir, scan_id), scan_id, analysis_id, 1)
+    model.load()
+
+    workers = workers or os.cpu_count() or 1
+    count = 0
+    if out.endswith('.zip'):
+        os.makedirs(os.path.dirname(out) or '.', exist_ok=True)
+        manifest = io.StringIO()
+        writer = csv.writer(manifest)
+        writer.writerow(MANIFEST_FIELDS)
+        # crops are already compressed images, store them as is
+        with zipfile.ZipFile(out, 'w', compression=zipfile.ZIP_STORED) as archive:
+            for results in run_tasks(tile_tasks(model, pad, None, image_format), workers):
+                for row, encoded in results:
+                    archive.writestr(row[-1], encoded)
+                    writer.writerow(row)
+                    count += 1
+            archive.writestr('manifest.csv', manifest.getvalue())
+    else:
+        os.makedirs(out, exist_ok=True)
+        with open(os.path.join(out, 'manifest.csv'), 'w', newline='') as manifest:
+            writer = csv.writer(manifest)
+            writer.writerow(MANIFEST_FIELDS)
+            for results in run_tasks(tile_tasks(model, pad, out, image_format), workers):
+                writer.writerows(row for row, _ in results)
+                count += len(results)
+    return count
+
+
+def run(args):
+    """Entry point of the crops subcommand."""
+    count = export_crops(args.db, args.scans, args.analysis, args.out, pad=args.pad,
+                         image_format=args.format, workers=args.workers)
+    print(f"Wrote {count} defect crops to {args.out}")
+
+
+def add_parser(subparsers):
+    """Register the crops subcommand on the dfv argument parser."""
+    parser = subparsers.add_parser('crops', help='export a padded image crop around every defect')
+    parser.add_argument('--db', required=True, help='nSpec database file')
+    parser.add_argument('--scans', required=True, help="directory containing the 'Scan_XXX' folders")
+    parser.add_argument('--analysis', required=True, help='analysis ID to export')
+    parser.add_argument('--out', required=True, help="output directory, or a '.zip' archive")
+    parser.add_argument('--pad', type=int, default=16, help='extra pixels around each defect')
+    parser.add_argument('--format', default='png', help='image format of the crops, e.g. png or jpg')
+    parser.add_argument('--workers', type=int, default=None, help='number of worker processes')
+    parser.set_defaults(func=run)
+    return parser
@@ -0,0 +1,100 @@
+"""
+dfv.density
+-----------
+
+This module turns defect positions into a color-mapped density
+image, which shows where defects cluster far better than one mark
+per defect once there are many of them.
+
+Defects are counted per cell of a pixel grid with a single
+np.bincount, so the cost is linear in the number of defects and
+the result is one RGBA image to blend over the mosaic.
+
+Nothing in here imports tkinter.
+"""
+
+# density.py imports
+import numpy as np
+from PIL import Image
+
+# color map stops from few to many defects, as (position, r, g, b)
+COLOR_STOPS = np.array([
+    (0.0, 40, 0, 120),
+    (0.25, 0, 90, 255),
+    (0.5, 0, 220, 180),
+    (0.75, 255, 220, 0),
+    (1.0, 255, 0, 0),
+])
+# the color map sampled at 256 levels, looked up instead of interpolated per cell
+COLOR_TABLE = np.stack([np.interp(np.linspace(0, 1, 256), COLOR_STOPS[:, 0], COLOR_STOPS[:, channel])
+                        for channel in (1, 2, 3)], axis=1).astype(np.uint8)
+DEFAULT_ALPHA = 0.6  # opacity of the non-empty cells
+
+
+def histogram(x, y, width, height, cell=1, weights=None):
+    """Count the defects in every cell of a pixel grid.
+
+    Parameters
+    ----------
+    x, y : numpy arrays of float
+        Defect positions in pixels.
+    width, height : int
+        Size of the image the positions refer to.
+    cell : int, optional
+        Side of a grid cell in pixels. The default is 1.
+    weights : numpy array of float, optional
+        Weight of every defect, e.g. its area. The default counts defects.
+
+    Returns
+    -------
+    numpy array
+        (rows, columns) grid of defect counts or summed weights,
+        defects outside the image are dropped.
+    """
+    cols = int(np.ceil(width / cell))
+    rows = int(np.ceil(height / cell))
+    ix = np.floor(np.asarray(x) / cell).astype(np.int64)
+    iy = np.floor(np.asarray(y) / cell).astype(np.int64)
+    keep = (ix >= 0) & (ix < cols) & (iy >= 0) & (iy < rows)
+    if weights is not None:
+        weights = np.asarray(weights, dtype=float)[keep]
+    counts = np.bincount(iy[keep] * cols + ix[keep], weights=weights, minlength=rows * cols)
+    return counts.reshape(rows, cols)
+
+
+def heatmap(counts, size=None, alpha=DEFAULT_ALPHA):
+    """Color-map a grid of defect counts into a transparent image.
+
+    Counts are scaled logarithmically, so a few dense spots do not
+    wash out the rest of the wafer. Empty cells stay transparent.
+
+    Parameters
+    ----------
+    counts : numpy array
+        Grid as returned by histogram.
+    size : tuple of int, optional
+        (width, height) to stretch the image to, without smoothing.
+        The default is one pixel per cell.
+    alpha : float, optional
+        Opacity of the non-empty cells. The default is 0.6.
+
+    Returns
+    -------
+    PIL image
+        RGBA heat map.
+    """
+    counts = np.maximum(counts, 0)
+    top = counts.max() if counts.size else 0
+    level = np.log1p(counts) / np.log1p(top) if top > 0 else np.zeros(counts.shape)
+    rgba = np.zeros(counts.shape + (4,), dtype=np.uint8)
+    rgba[..., :3] = COLOR_TABLE[np.rint(level * 255).astype(np.uint8)]
+    rgba[..., 3] = np.where(counts > 0, round(alpha * 255), 0)
+    image = Image.fromarray(rgba, 'RGBA')
+    if size is not None and image.size != tuple(size):
+        image = image.resize(tuple(size), Image.NEAREST)
+    return image
+
+
+def blend(image, heat):
+    """Blend a heat map over an image of the same size, returns an RGB image."""
+    return Image.alpha_composite(image.convert('RGBA'), heat).convert('RGB')
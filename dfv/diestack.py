@@ -0,0 +1,168 @@
+"""
+dfv.diestack
+------------
+
+This module stacks the defects of every device of a scan into one
+die-sized frame, using their XinDevice and YinDevice positions.
+Signatures repeating on every die, e.g. from the reticle or a
+process step, add up in the stack where they are lost among the
+dies of the raw mosaic.
+
+The stack is drawn as a scatter of defect marks in the size or
+class binning of the mosaic, or as a density image. A second view
+counts the defects of every device by their DeviceID, laid out row
+by row on the device grid of the scan, or from the tile grid when
+the defects have no DeviceID.
+All of it is computed on whole arrays, one pass over the defects.
+
+Nothing in here imports tkinter.
+"""
+
+# diestack.py imports
+import math
+import numpy as np
+from PIL import Image
+
+# custom modules
+from dfv import core
+from dfv import density
+from dfv import instrument
+from dfv import render
+
+STACK_SIZE = 600  # longest side of the die stack image in pixels
+BACKGROUND = (24, 24, 24)  # color of the die area without defects
+
+
+def scan_value(model, name):
+    """Return a scan property of a loaded model as a float, None when missing or not a number."""
+    try:
+        return float(core.scan_property(model.scan_properties, name))
+    except (IndexError, ValueError, TypeError):
+        return None
+
+
+def device_positions(model):
+    """Return the defects placed on a device and their XinDevice, YinDevice in um.
+
+    Returns
+    -------
+    index : numpy array of int
+        Defect table index of every defect with a device position.
+    x, y : numpy arrays of float
+        Position of these defects within their device.
+    """
+    x, y = model.defects['XinDevice'], model.defects['YinDevice']
+    index = np.flatnonzero(~(np.isnan(x) | np.isnan(y)))
+    return index, x[index], y[index]
+
+
+def die_size(model):
+    """Return the (width, height) of a die in um.
+
+    Taken from the DieWidth and DieHeight scan properties, or from the
+    largest device position when the scan does not have them.
+    """
+    width, height = scan_value(model, 'DieWidth'), scan_value(model, 'DieHeight')
+    if width and height:
+        return width, height
+    _, x, y = device_positions(model)
+    return (float(x.max()) if x.size else 1.0) or 1.0, (float(y.max()) if y.size else 1.0) or 1.0
+
+
+def stack_size(model, size=STACK_SIZE):
+    """Return the (width, height) in pixels of a die stack image, keeping the die aspect ratio."""
+    width, height = die_size(model)
+    scale = size / max(width, height)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+@instrument.timed('diestack')
+def stack_image(model, mode='SCATTER', size=STACK_SIZE):
+    """Draw every defect of a loaded model into one die-sized frame.
+
+    Parameters
+    ----------
+    model : dfv.core.MosaicModel
+        Loaded model. Its binning settings color the scatter marks and
+        its density settings apply to the density image.
+    mode : string, optional
+        'SCATTER' for one mark per defect or 'DENSITY'. The default is 'SCATTER'.
+    size : int, optional
+        Longest side of the image in pixels. The default is 600.
+
+    Returns
+    -------
+    PIL image
+        RGB die stack image.
+    """
+    die_width, die_height = die_size(model)
+    width, height = stack_size(model, size)
+    index, x, y = device_positions(model)
+    x = x * width / die_width
+    y = y * height / die_height
+    image = Image.new('RGB', (width, height), BACKGROUND)
+    if mode == 'DENSITY':
+        weights = model.defects['Area'][index] if model.density_weight == 'AREA' else None
+        if model.density_class is not None:
+            keep = model.defects['ClassID'][index] == float(model.density_class)
+            x, y = x[keep], y[keep]
+            weights = None if weights is None else weights[keep]
+        counts = density.histogram(x, y, width, height, cell=max(1, int(float(model.density_cell))), weights=weights)
+        return density.blend(image, density.heatmap(counts, size=(width, height)))
+    pixels = np.array(image)
+    render.stamp_marks(pixels, x, y, render.mark_colors(model)[index], float(model.defect_mark_size))
+    return Image.fromarray(pixels)
+
+
+def device_grid(model):
+    """Return the number of (rows, columns) of devices of the scan and the tile side of a device.
+
+    A device is a square block of tiles, 'Golden Tile Tiles per Device' of them.
+    """
+    tiles = scan_value(model, 'Golden Tile Tiles per Device') or 1
+    side = max(1, math.isqrt(int(tiles)))
+    max_rows, max_cols = core.mosaic_grid(model.images)
+    return -(-max_rows // side), -(-max_cols // side), side
+
+
+@instrument.timed('diestack.devices')
+def device_counts(model):
+    """Count the defects of every device of a loaded model.
+
+    Defects are counted per DeviceID, device n being cell n of the
+    grid in row order, the grid growing rows should there be more
+    devices than it holds. Without any DeviceID the device of a
+    defect is the block of tiles holding it, see device_grid.
+
+    Returns
+    -------
+    dict
+        'grid' (rows, columns) defect count of every device position of the scan,
+        'num_devices' devices of the scan from 'Golden Tile Number of Devices',
+        or the grid size when missing, 'with_defects' devices holding defects
+        and 'placed' defects with a device position.
+    """
+    rows, cols, side = device_grid(model)
+    device = model.defects['DeviceID']
+    known = device >= 0  # False for NaN
+    if known.any():
+        counts = np.bincount(device[known].astype(np.int64))
+        rows = max(rows, -(-len(counts) // cols))
+        grid = np.zeros(rows * cols, dtype=counts.dtype)
+        grid[:len(counts)] = counts
+        grid = grid.reshape(rows, cols)
+    else:
+        tile = model.tile_index()
+        device_row = model.images['Row'][tile] // side
+        device_col = model.images['Column'][tile] // side
+        grid = np.bincount(device_row * cols + device_col, minlength=rows * cols)[:rows * cols].reshape(rows, cols)
+    num_devices = scan_value(model, 'Golden Tile Number of Devices')
+    index, _, _ = device_positions(model)
+    return {'grid': grid, 'num_devices': int(num_devices) if num_devices else rows * cols,
+            'with_defects': int(np.count_nonzero(grid)), 'placed': len(index)}
+
+
+def count_image(grid, cell_pixels):
+    """Color-map a device count grid into an image of cell_pixels per device."""
+    heat = density.heatmap(grid, size=(grid.shape[1] * cell_pixels, grid.shape[0] * cell_pixels), alpha=1.0)
+    return density.blend(Image.new('RGB', heat.size, BACKGROUND), heat)
@@ -0,0 +1,203 @@
+"""
+dfv.diskcache
+-------------
+
+This module provides the persistent local caches of dfv, the
+columns of image and defect tables, dfv.colcache, and the rendered
+pages of the instruction manual, dfv.pdfpages.
+
+A cache is a folder below ~/.cache/dfv holding one sub folder per
+entry. Entry names start with a hash of what the entry holds, then
+a hash of the state of the source file, so a changed source makes
+its entries stale. Entries are written into a private folder and
+renamed into place, files added to an existing entry go through a
+temporary file, so a reader never sees them half written.
+
+Every cache holds a number of bytes at most, entries used longest
+ago are removed first once it goes over. Reading an entry marks it
+used. Every cache is switched by two environment variables, e.g.
+DFV_TABLE_CACHE and DFV_TABLE_CACHE_SIZE: '0' switches it off and
+any other value is used as its folder, the size is set in MB:
+
+    $ DFV_TABLE_CACHE=/tmp/dfv_tables DFV_TABLE_CACHE_SIZE=500 python -m dfv
+
+Nothing in here imports tkinter.
+"""
+
+# diskcache.py imports
+import hashlib
+import os
+import shutil
+import threading
+
+# custom modules
+from dfv import instrument
+
+CACHE_ROOT = os.path.join(os.path.expanduser('~'), '.cache', 'dfv')  # default parent folder of every cache
+
+
+def digest(*parts, length=16):
+    """Return a short hex hash of the parts joined, for entry names."""
+    return hashlib.sha1('|'.join(str(part) for part in parts).encode()).hexdigest()[:length]
+
+
+def file_state(path):
+    """Return a short hash of the modification time and size of a file, which changes with the file."""
+    stat = os.stat(path)
+    return digest(stat.st_mtime_ns, stat.st_size, length=12)
+
+
+def entry_bytes(folder):
+    """Return the bytes of the files of a cache entry."""
+    total = 0
+    with os.scandir(folder) as files:
+        for file in files:
+            if file.is_file():
+                total += file.stat().st_size
+    return total
+
+
+class DiskCache:
+    """A cache folder of entry folders, bounded in bytes, the least recently used entries removed first."""
+
+    def __init__(self, name, env_var, max_bytes):
+        """Set up the cache from its environment variables, nothing is written until an entry is stored.
+
+        Parameters
+        ----------
+        name : string
+            Folder of the cache below CACHE_ROOT, e.g. 'tables'.
+        env_var : string
+            Variable switching the cache off or setting its folder, env_var + '_SIZE' sets its size in MB.
+        max_bytes : int
+            Default size of the cache in bytes.
+
+        Returns -> None.
+        """
+        self.name = name  # used in instrument counts
+        self.env_var = env_var  # variables read by enable_from_env
+        self.enabled = True  # whether entries are read and stored
+        self.folder = os.path.join(CACHE_ROOT, name)  # folder holding the entries
+        self.max_bytes = max_bytes  # bytes of all entries before the least recently used are removed
+        self.enable_from_env()
+
+    def enable_from_env(self):
+        """Apply the environment variables of the cache, see the module docstring."""
+        value = os.environ.get(self.env_var, '')
+        if value == '0':
+            self.enabled = False
+        elif value:
+            self.folder = value
+        value = os.environ.get(self.env_var + '_SIZE', '')
+        if value:
+            try:
+                self.max_bytes = int(float(value) * 1024**2)
+            except ValueError:
+                print(self.env_var + '_SIZE must be a number of MB, keeping the default size')
+
+    def path(self, name, *files):
+        """Return the path of an entry, or of files inside it."""
+        return os.path.join(self.folder, name, *files)
+
+    def touch(self, name):
+        """Mark an entry used, it is removed last."""
+        try:
+            os.utime(self.path(name))
+        except OSError:
+            pass
+
+    def create(self, name, write):
+        """Write a new entry through a private folder renamed into place, then trim the cache.
+
+        Parameters
+        ----------
+        name : string
+            Name of the entry.
+        write : callable
+            Fills the folder it is given with the files of the entry.
+
+        Returns -> None. Raises OSError when the entry cannot be written.
+        """
+        os.makedirs(self.folder, exist_ok=True)
+        temp = os.path.join(self.folder, f"{name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        os.makedirs(temp, exist_ok=True)
+        try:
+            write(temp)
+            os.rename(temp, self.path(name))
+        except OSError:
+            shutil.rmtree(temp, ignore_errors=True)
+            if not os.path.isdir(self.path(name)):
+                raise
+            # stored meanwhile by another thread or process
+        self.trim(keep=name)
+
+    def store_file(self, path, write):
+        """Write one file into an existing entry through a temporary file.
+
+        Caching is best effort, a failure to write is reported and ignored.
+
+        Parameters
+        ----------
+        path : string
+            Path of the file, see path().
+        write : callable
+            Writes the file to the temporary path it is given.
+
+        Returns -> None.
+        """
+        tmp = path + '.tmp'
+        try:
+            write(tmp)
+            os.replace(tmp, path)
+        except OSError as e:
+            print('Could not cache ' + path + ': ' + str(e))
+
+    def remove_stale(self, prefix, current):
+        """Remove the entries whose name starts with prefix + '-', except those starting with current."""
+        if not os.path.isdir(self.folder):
+            return
+        for other in os.listdir(self.folder):
+            if other.startswith(prefix + '-') and not other.startswith(current) and not other.endswith('.tmp'):
+                shutil.rmtree(self.path(other), ignore_errors=True)
+
+    def trim(self, limit=None, keep=None):
+        """Remove the entries used longest ago until the cache holds at most limit bytes.
+
+        Parameters
+        ----------
+        limit : int, optional
+            Bytes to get down to. The default is max_bytes.
+        keep : string, optional
+            Entry never removed, e.g. the one just stored. The default is None.
+
+        Returns
+        -------
+        int
+            Bytes removed.
+        """
+        limit = self.max_bytes if limit is None else limit
+        entries = []  # (last used, bytes, name)
+        try:
+            with os.scandir(self.folder) as folders:
+                for folder in folders:
+                    if folder.is_dir() and not folder.name.endswith('.tmp'):
+                        try:
+                            entries.append((folder.stat().st_mtime, entry_bytes(folder.path), folder.name))
+                        except OSError:
+                            pass  # removed meanwhile
+        except OSError:
+            return 0  # no cache folder yet
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, name in sorted(entries):
+            if total - removed <= limit:
+                break
+            if name != keep:
+                shutil.rmtree(self.path(name), ignore_errors=True)
+                removed += size
+                instrument.count('diskcache.' + self.name + '.evictions')
+        return removed
+
+    def clear(self):
+        """Remove every entry."""
+        shutil.rmtree(self.folder, ignore_errors=True)
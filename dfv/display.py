@@ -0,0 +1,85 @@
+"""
+dfv.display
+-----------
+
+This module provides persistent display buffers for canvases that
+redraw an image on every pan or zoom.
+
+Creating a new PhotoImage and canvas image item per frame allocates
+a Tk image each time, and items that are never deleted pile up on
+the canvas. A PhotoBuffer instead owns one PhotoImage and one canvas
+item, and copies every new frame into the existing PhotoImage with
+paste(), a direct put of the pixel buffer into the Tk photo. A new
+PhotoImage is only made when the frame size changes, e.g. at the
+image edges or when the window is resized.
+"""
+
+# display.py imports
+import numpy as np
+from PIL import Image, ImageTk
+
+# custom modules
+from dfv import instrument
+
+
+class PhotoBuffer:
+    """One reusable PhotoImage shown by one canvas image item."""
+
+    def __init__(self, canvas, tags=()):
+        """Prepare the buffer, nothing is drawn until show().
+
+        Parameters
+        ----------
+        canvas : tk canvas
+            Canvas to draw on.
+        tags : string or tuple, optional
+            Tags of the canvas image item. The default is none.
+
+        Returns -> None.
+        """
+        self.canvas = canvas  # canvas holding the image item
+        self.tags = tags  # tags of the image item
+        self.photo = None  # current tk photo image, kept to avoid garbage collection
+        self.size = None  # (width, height) of the photo image
+        self.item = None  # canvas image item, created on first show
+
+    @property
+    def nbytes(self):
+        """Memory held by the photo image in bytes, tk keeps 4 bytes per pixel."""
+        return 0 if self.size is None else self.size[0] * self.size[1] * 4
+
+    def show(self, image, x, y):
+        """Show an image with its upper left corner at canvas position (x, y).
+
+        Parameters
+        ----------
+        image : PIL image or numpy array
+            New frame, a numpy array must be (height, width, 3) uint8.
+        x, y : float
+            Canvas position of the upper left corner.
+
+        Returns -> None
+        """
+        if isinstance(image, np.ndarray):
+            image = Image.fromarray(np.ascontiguousarray(image), 'RGB')
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGB')
+        if self.photo is None or self.size != image.size:
+            # a tk photo image cannot change size through paste, make one of the new size
+            self.photo = ImageTk.PhotoImage(image)
+            self.size = image.size
+            instrument.count('photo.allocated')
+        else:
+            with instrument.timer('photo.paste'):
+                self.photo.paste(image)
+        if self.item is None:
+            self.item = self.canvas.create_image(x, y, anchor='nw', image=self.photo, tags=self.tags)
+            self.canvas.lower(self.item)  # set image into background
+        else:
+            self.canvas.itemconfigure(self.item, image=self.photo, state='normal')
+            self.canvas.coords(self.item, x, y)
+
+    def hide(self):
+        """Hide the image item, e.g. while the image is scrolled out of view."""
+        if self.item is not None:
+            self.canvas.itemconfigure(self.item, state='hidden')
@@ -0,0 +1,169 @@
+"""
+dfv.filterwin
+-------------
+
+This module provides the defect filter panel of a mosaic: value range
+sliders of the defect columns, a choice of defect classes and a region
+of tiles, combined with AND or OR. The number of defects kept is
+updated live while a slider moves, Apply redraws the mosaic with them.
+See dfv.query.
+"""
+
+# filterwin.py imports
+import tkinter as tk
+import numpy as np
+
+# custom modules
+from dfv import query
+
+SLIDER_STEPS = 1000  # slider positions, each one a quantile of the column
+REGION_FIELDS = ('First Row', 'Last Row', 'First Column', 'Last Column')
+
+
+class DefectFilter:
+    """ Filter panel of one mosaic """
+    def __init__(self, mosaic_creator):
+
+        self.mosaic_creator = mosaic_creator  # DefectFilter instance holds instance of MosaicCreator
+        self.model = mosaic_creator.model  # model of the mosaic, holds the defect index and the applied filter
+        self.index = self.model.defect_index()  # sorted column indexes, built once per column
+        self.count_after_id = None  # pending update of the defect count
+        self.sliders = {}  # column name -> (low, high) slider variables
+        self.value_labels = {}  # column name -> label showing the chosen range
+        self.class_ids = [float(row[0]) for row in self.model.defect_type_data] + [np.nan]  # last entry unclassified
+
+        self.filter_window = tk.Toplevel()
+        self.filter_window.title('Defect Filter || Analysis ID = ' + self.model.analysis_id)
+        self.filter_window.protocol('WM_DELETE_WINDOW', self.close)
+        applied = self.model.defect_query
+
+        # one pair of sliders per column, the full range of a column is no predicate
+        tk.Label(self.filter_window, text='Min').grid(row=0, column=1)
+        tk.Label(self.filter_window, text='Max').grid(row=0, column=2)
+        for row, name in enumerate(query.RANGE_COLUMNS, start=1):
+            low, high = applied.ranges.get(name, (None, None))
+            start, stop = self.index.range_slice(name, low, high)
+            valid = max(1, self.index.sorted_column(name)[2] - 1)
+            low_position = tk.IntVar(self.filter_window, value=round(start * SLIDER_STEPS / valid))
+            high_position = tk.IntVar(self.filter_window, value=round(max(start, stop - 1) * SLIDER_STEPS / valid)
+                                      if high is not None else SLIDER_STEPS)
+            self.sliders[name] = (low_position, high_position)
+            tk.Label(self.filter_window, text=name).grid(row=row, column=0, sticky='w')
+            for column, position in ((1, low_position), (2, high_position)):
+                tk.Scale(self.filter_window, variable=position, from_=0, to=SLIDER_STEPS, orient='horizontal',
+                         showvalue=False, length=180, command=lambda _: self.schedule_count()).grid(row=row, column=column)
+            self.value_labels[name] = tk.Label(self.filter_window, width=24, anchor='w')
+            self.value_labels[name].grid(row=row, column=3, sticky='w')
+
+        # defect classes, none selected keeps every class
+        row = len(query.RANGE_COLUMNS) + 1
+        tk.Label(self.filter_window, text='Classes').grid(row=row, column=0, sticky='nw')
+        self.class_list = tk.Listbox(self.filter_window, selectmode=tk.MULTIPLE, exportselection=False, height=6)
+        for type_row in self.model.defect_type_data:
+            self.class_list.insert(tk.END, str(type_row[2]))
+        self.class_list.insert(tk.END, 'Unclassified')
+        if applied.class_ids is not None:
+            for i, class_id in enumerate(self.class_ids):
+                if np.isin(class_id, applied.class_ids) or (np.isnan(class_id) and np.isnan(applied.class_ids).any()):
+                    self.class_list.selection_set(i)
+        self.class_list.bind('<<ListboxSelect>>', lambda event: self.schedule_count())
+        self.class_list.grid(row=row, column=1, columnspan=2, sticky='ew')
+
+        # region of tiles, an empty field is an open end
+        self.region = []
+        for i, field in enumerate(REGION_FIELDS):
+            value = '' if applied.region is None or applied.region[i] is None else str(applied.region[i])
+            variable = tk.StringVar(self.filter_window, value=value)
+            variable.trace_add('write', lambda *args: self.schedule_count())
+            self.region.append(variable)
+            tk.Label(self.filter_window, text=field).grid(row=row + 1 + i, column=0, sticky='w')
+            tk.Entry(self.filter_window, textvariable=variable, width=5).grid(row=row + 1 + i, column=1, sticky='w')
+
+        # how the predicates combine
+        row += len(REGION_FIELDS) + 1
+        self.combine = tk.StringVar(self.filter_window, value=applied.combine)
+        tk.Label(self.filter_window, text='Combine').grid(row=row, column=0, sticky='w')
+        tk.Radiobutton(self.filter_window, text='AND', variable=self.combine, value='AND',
+                       command=self.schedule_count).grid(row=row, column=1, sticky='w')
+        tk.Radiobutton(self.filter_window, text='OR', variable=self.combine, value='OR',
+                       command=self.schedule_count).grid(row=row, column=2, sticky='w')
+
+        self.count_label = tk.Label(self.filter_window)
+        self.count_label.grid(row=row + 1, column=0, columnspan=4, sticky='w')
+
+        button_apply = tk.Button(self.filter_window, text='Apply', width=10, command=self.apply)
+        button_clear = tk.Button(self.filter_window, text='Clear', width=10, command=self.clear)
+        button_close = tk.Button(self.filter_window, text='Close', width=10, command=self.close)
+        button_apply.grid(row=row + 2, column=1)
+        button_clear.grid(row=row + 2, column=2)
+        button_close.grid(row=row + 2, column=3)
+
+        self.update_count()
+
+    def region_value(self, i):
+        """ Returns a region field as an int, None when empty """
+        text = self.region[i].get().strip()
+        return int(text) if text else None
+
+    def current_query(self):
+        """ Builds the query of the chosen settings, raises ValueError for a region field that is not an integer """
+        ranges = {}
+        for name, (low_position, high_position) in self.sliders.items():
+            low, high = low_position.get(), high_position.get()
+            if low > 0 or high < SLIDER_STEPS:
+                ranges[name] = (self.index.quantile(name, low / SLIDER_STEPS) if low > 0 else None,
+                                self.index.quantile(name, high / SLIDER_STEPS) if high < SLIDER_STEPS else None)
+        selected = self.class_list.curselection()
+        class_ids = [self.class_ids[i] for i in selected] if selected else None
+        region = tuple(self.region_value(i) for i in range(len(REGION_FIELDS)))
+        return query.DefectQuery(ranges, class_ids, None if region == (None,) * 4 else region, self.combine.get())
+
+    def schedule_count(self):
+        """ Updates the defect count once tk is idle, slider moves in between are merged """
+        if self.count_after_id is None:
+            self.count_after_id = self.filter_window.after_idle(self.update_count)
+
+    def update_count(self):
+        """ Shows the chosen ranges and the number of defects the chosen filter keeps """
+        self.count_after_id = None
+        for name, (low_position, high_position) in self.sliders.items():
+            low = self.index.quantile(name, low_position.get() / SLIDER_STEPS)
+            high = self.index.quantile(name, high_position.get() / SLIDER_STEPS)
+            self.value_labels[name].config(text='no values' if low is None else f'{low:g} to {high:g}')
+        try:
+            defect_query = self.current_query()
+        except ValueError:
+            self.count_label.config(text='Please enter integers for the tile region')
+            return
+        mask = self.model.query_mask(defect_query)
+        kept = len(self.index) if mask is None else int(np.count_nonzero(mask))
+        self.count_label.config(text=f'{kept} of {len(self.index)} defects kept')
+
+    def apply(self):
+        """ Applies the filter and redraws the mosaic with the defects it keeps """
+        try:
+            defect_query = self.current_query()
+        except ValueError:
+            print('Please enter integers for the tile region, or leave them empty')
+            return
+        self.model.set_defect_query(defect_query)
+        self.mosaic_creator.set_title()
+        self.mosaic_creator.plot_defects()
+
+    def clear(self):
+        """ Resets every setting and shows all defects again """
+        for low_position, high_position in self.sliders.values():
+            low_position.set(0)
+            high_position.set(SLIDER_STEPS)
+        self.class_list.selection_clear(0, tk.END)
+        for variable in self.region:
+            variable.set('')
+        self.combine.set('AND')
+        self.apply()
+        self.update_count()
+
+    def close(self):
+        """ Closes the panel, the applied filter stays """
+        if self.count_after_id is not None:
+            self.filter_window.after_cancel(self.count_after_id)
+        self.filter_window.destroy()
@@ -0,0 +1,131 @@
+"""
+dfv.gallery
+-----------
+
+This module provides the lot gallery, a scrollable grid with a
+wafer map thumbnail of every scan in the database and scans
+directory. Each thumbnail shows the defect density of the last
+analysis of its scan, clicking it opens the full mosaic.
+
+Thumbnails come from dfv.thumbs, made on a process pool by a
+background thread and handed to tk through a queue polled with
+after(), so the gallery is usable while they are still coming in.
+"""
+
+# gallery.py imports
+import queue
+import threading
+import tkinter as tk
+from PIL import Image, ImageTk
+
+# custom modules
+from dfv import createmos
+from dfv import thumbs
+
+COLUMNS = 5  # thumbnails per gallery row
+POLL_MS = 100  # time between checks for finished thumbnails
+
+
+class Gallery:
+    """ Grid of wafer map thumbnails of every scan in the lot """
+    def __init__(self, root):
+
+        self.root = root  # Gallery instance holds instance of Root
+        self.results = queue.Queue()  # ThumbResult of every finished thumbnail, filled by the background thread
+        self.closed = threading.Event()  # tells the background thread to stop
+        self.photos = {}  # scan ID -> tk photo image, kept to avoid garbage collection
+        self.cells = {}  # scan ID -> thumbnail button
+        self.num_done = 0  # thumbnails shown so far
+
+        session = self.root.session
+        self.jobs = thumbs.lot_jobs(session.db_file, session.scan_dir)
+
+        # create the gallery window, with a scrollable frame holding the thumbnails
+        self.gallery_window = tk.Toplevel()
+        self.gallery_window.title('Lot Gallery || ' + session.sample_name())
+        self.gallery_window.protocol('WM_DELETE_WINDOW', self.close)
+        self.canvas = tk.Canvas(self.gallery_window, highlightthickness=0,
+                                width=COLUMNS * (thumbs.THUMB_SIZE + 10), height=2 * (thumbs.THUMB_SIZE + 50))
+        vbar = tk.Scrollbar(self.gallery_window, orient='vertical', command=self.canvas.yview)
+        self.canvas.configure(yscrollcommand=vbar.set)
+        self.frame = tk.Frame(self.canvas)
+        self.canvas.create_window(0, 0, anchor=tk.NW, window=self.frame)
+        self.frame.bind('<Configure>', lambda event: self.canvas.configure(scrollregion=self.canvas.bbox('all')))
+        self.canvas.grid(row=0, column=0, sticky='nswe')
+        vbar.grid(row=0, column=1, sticky='ns')
+        self.gallery_window.rowconfigure(0, weight=1)
+        self.gallery_window.columnconfigure(0, weight=1)
+
+        # one button per scan, showing a blank image until its thumbnail is ready
+        self.placeholder = tk.PhotoImage(width=thumbs.THUMB_SIZE, height=thumbs.THUMB_SIZE)
+        for idx, job in enumerate(self.jobs):
+            cell = tk.Button(self.frame, image=self.placeholder, compound='top', text=self.caption(job, 'Loading...'),
+                             command=lambda job=job: self.open_mosaic(job))
+            cell.grid(row=idx // COLUMNS, column=idx % COLUMNS, padx=2, pady=2)
+            self.cells[job.scan_id] = cell
+
+        # label tracking how many thumbnails are done, and button to close window
+        self.status = tk.Label(self.gallery_window, text=f"0 of {len(self.jobs)} thumbnails")
+        self.status.grid(row=1, column=0, sticky='w')
+        button_close = tk.Button(self.gallery_window, text='Close', width=10, command=self.close)
+        button_close.grid(row=1, column=0, sticky='e')
+
+        # make the thumbnails in the background
+        threading.Thread(target=self.make_thumbnails, name='dfv-gallery', daemon=True).start()
+        self.gallery_window.after(POLL_MS, self.poll)
+
+    @staticmethod
+    def caption(job, text):
+        """ Text shown under the thumbnail of a scan """
+        analysis = 'No Analysis' if job.analysis_id is None else 'Analysis ID = ' + job.analysis_id
+        return 'Scan ID = ' + job.scan_id + ' || ' + analysis + '\n' + text
+
+    def make_thumbnails(self):
+        """ Makes or fetches every thumbnail, runs on a background thread """
+        for result in thumbs.make_thumbnails(self.jobs):
+            if self.closed.is_set():
+                break  # also drops the thumbnails still queued
+            self.results.put(result)
+
+    def poll(self):
+        """ Shows the thumbnails finished since the last poll """
+        if self.closed.is_set():
+            return
+        while True:
+            try:
+                result = self.results.get_nowait()
+            except queue.Empty:
+                break
+            self.show(result)
+        self.status.config(text=f"{self.num_done} of {len(self.jobs)} thumbnails")
+        if self.num_done < len(self.jobs):
+            self.gallery_window.after(POLL_MS, self.poll)
+
+    def show(self, result):
+        """ Puts a finished thumbnail into its button """
+        self.num_done += 1
+        cell = self.cells[result.job.scan_id]
+        if result.error is not None:
+            print('Error making thumbnail of scan ' + result.job.scan_id + ': ' + result.error)
+            cell.config(text=self.caption(result.job, 'Thumbnail Failed!'))
+            return
+        if result.path is not None:
+            with Image.open(result.path) as image:
+                self.photos[result.job.scan_id] = ImageTk.PhotoImage(image)
+            cell.config(image=self.photos[result.job.scan_id])
+        text = str(result.num_defects) + ' defects' if result.path is not None else 'No Mosaic Image'
+        cell.config(text=self.caption(result.job, text))
+
+    def open_mosaic(self, job):
+        """ Opens the full mosaic of a scan, using the image scale of the Root window """
+        self.root.session.image_scale = self.root.image_scale.get()
+        self.root.session.image_view_only = bool(self.root.image_view_only.get())
+        if not str(self.root.session.image_scale).isdigit():
+            print('Please enter an integer for Image Scale before opening a mosaic')
+        else:
+            createmos.MosaicCreator(self.root, self.root.session.scan_model(job.scan_id, job.analysis_id))
+
+    def close(self):
+        """ Stops making thumbnails and destroys the window """
+        self.closed.set()
+        self.gallery_window.destroy()
@@ -0,0 +1,205 @@
+"""
+dfv.imaging
+-----------
+
+This module provides the Tk-free image operations behind the
+zoomable tile view: building the image pyramid, choosing the
+pyramid level for a zoom scale and rendering the visible region.
+
+A tile opened on a defect is zoomed in, so its first frame only
+needs the native image. LazyPyramid builds the reduced levels on
+first use instead, or on a worker thread once the tile is shown.
+
+TileCanvas only converts the result to a tk PhotoImage, so the
+same code can be timed or reused without a display.
+"""
+
+# imaging.py imports
+import math
+import threading
+from PIL import Image
+
+# custom modules
+from dfv import instrument
+
+# the factor by which to shrink image size between pyramid levels
+# this equals the zoom scale factor of the tile canvas, giving
+# a one-to-one selection of pyramid level to total zoom scale
+PYRAMID_REDUCE_FACTOR = 1.3
+PYRAMID_CUTOFF = 512  # the pixel size to stop reducing beyond
+FOCUS_MARGIN = 8  # defect sizes across the view of a focused defect
+FOCUS_MIN_SPAN = 64  # image pixels across the view at the largest focus zoom
+
+
+@instrument.timed('pyramid.build')
+def build_pyramid(image, reduce_factor=PYRAMID_REDUCE_FACTOR, cutoff=PYRAMID_CUTOFF):
+    """Build an image pyramid from a full resolution image.
+
+    Resizing and interpolating the original high-res tile image
+    over and over during zoom is slow, so reduced copies are
+    built once and picked from during zoom.
+
+    Parameters
+    ----------
+    image : PIL image
+        Full resolution image, the first pyramid level.
+    reduce_factor : float, optional
+        Size ratio between neighbouring levels. The default is 1.3.
+    cutoff : int, optional
+        Stop reducing once either side is at most this many pixels.
+        The default is 512.
+
+    Returns
+    -------
+    list of PIL image
+        Pyramid levels, from native size to the smallest.
+    """
+    pyramid = [image]  # init pyramid list with native image
+    w, h = image.size  # starting width and height
+    while w > cutoff and h > cutoff:
+        w = w / reduce_factor
+        h = h / reduce_factor
+        # append scaled image to pyramid list
+        pyramid.append(pyramid[-1].resize((int(w), int(h)), Image.LANCZOS))
+    return pyramid
+
+
+def pyramid_sizes(size, reduce_factor=PYRAMID_REDUCE_FACTOR, cutoff=PYRAMID_CUTOFF):
+    """Return the (width, height) of every pyramid level of an image size, as built by build_pyramid."""
+    sizes = [tuple(size)]
+    w, h = size
+    while w > cutoff and h > cutoff:
+        w = w / reduce_factor
+        h = h / reduce_factor
+        sizes.append((int(w), int(h)))
+    return sizes
+
+
+class LazyPyramid:
+    """Image pyramid whose reduced levels are built on first use.
+
+    Indexing and len() work as on the list of build_pyramid, so
+    render_view takes either. Levels may be built on a worker
+    thread with build_all while the GUI thread renders.
+    """
+
+    def __init__(self, image, reduce_factor=PYRAMID_REDUCE_FACTOR, cutoff=PYRAMID_CUTOFF):
+        image.load()  # decode once here, never at the same time on two threads
+        self.levels = [image]  # levels built so far, from native size down
+        self.sizes = pyramid_sizes(image.size, reduce_factor, cutoff)  # size of every level
+        self.lock = threading.Lock()  # guards building the levels
+
+    def __len__(self):
+        return len(self.sizes)
+
+    def __getitem__(self, level):
+        if level >= len(self.levels):
+            with self.lock, instrument.timer('pyramid.level'):
+                # levels are built one at a time from the one above, a closed pyramid builds none
+                while self.levels and len(self.levels) <= level:
+                    self.levels.append(self.levels[-1].resize(self.sizes[len(self.levels)], Image.LANCZOS))
+        return self.levels[level]
+
+    @property
+    def nbytes(self):
+        """Memory held by the levels built in bytes."""
+        levels = self.levels
+        return sum(image.width * image.height * len(image.getbands()) for image in levels)
+
+    def drop_levels(self):
+        """Drop the reduced levels, they are built again on first use, the native image stays."""
+        with self.lock:
+            del self.levels[1:]
+
+    def build_all(self):
+        """Build every level not built yet, one lock at a time so the GUI thread can take a level in between."""
+        for level in range(1, len(self)):
+            if not self.levels:
+                return  # closed meanwhile
+            self[level]
+
+    def close(self):
+        """Close the images of all levels built."""
+        with self.lock:
+            for image in self.levels:
+                image.close()
+            self.levels = []
+
+
+def focus_scale(defect_size, view_size, reduce_factor=PYRAMID_REDUCE_FACTOR, max_scale=None):
+    """Choose the zoom scale showing a defect at a comfortable size.
+
+    Parameters
+    ----------
+    defect_size : float
+        Size of the defect in image pixels.
+    view_size : float
+        Smaller side of the view in canvas pixels.
+    reduce_factor : float, optional
+        The scale is a power of this factor, as reached by zooming with the wheel. The default is 1.3.
+    max_scale : float, optional
+        Largest scale allowed. The default is no limit.
+
+    Returns
+    -------
+    float
+        Zoom scale, 1.0 is native size.
+    """
+    span = max(defect_size * FOCUS_MARGIN, FOCUS_MIN_SPAN)  # image pixels across the view
+    scale = reduce_factor**round(math.log(view_size / span, reduce_factor))
+    return scale if max_scale is None else min(scale, max_scale)
+
+
+def pyramid_level(imscale, num_levels, reduce_factor=PYRAMID_REDUCE_FACTOR):
+    """Choose the pyramid level for a zoom scale.
+
+    Parameters
+    ----------
+    imscale : float
+        Total zoom scale of the image, 1.0 is native size.
+    num_levels : int
+        Number of levels in the pyramid.
+    reduce_factor : float, optional
+        Size ratio between neighbouring levels. The default is 1.3.
+
+    Returns
+    -------
+    level : int
+        Index of the pyramid image to use, negative when zoomed in.
+    scale : float
+        Total scale between the chosen pyramid image and the canvas,
+        the zoom scale times the reduction of the chosen level.
+    """
+    # log(curr zoom image scale, pyramid scale factor) = pyramid list index
+    log_chooser = int(math.log(imscale, reduce_factor))
+    level = min((-1) * log_chooser, num_levels - 1)
+    return level, imscale * reduce_factor**(max(0, level))
+
+
+@instrument.timed('tile.render_view')
+def render_view(pyramid, level, scale, x1, y1, x2, y2):
+    """Crop and resize the visible region of the image from the pyramid.
+
+    Parameters
+    ----------
+    pyramid : list of PIL image
+        Pyramid levels as returned by build_pyramid.
+    level : int
+        Pyramid level to crop from, as returned by pyramid_level.
+    scale : float
+        Total scale of that level on the canvas.
+    x1, y1, x2, y2 : float
+        Visible region in canvas pixels, relative to the image corner.
+
+    Returns
+    -------
+    PIL image
+        The visible region at canvas size, (x2 - x1) by (y2 - y1).
+    """
+    # we must scale the dimensions to crop based on the
+    # reduction factor of the currently selected image
+    image = pyramid[max(0, level)].crop((int(x1 / scale), int(y1 / scale),
+                                         int(x2 / scale), int(y2 / scale)))
+    # resize the reduced pyramid image to fit the size
+    # of the currently scrolled/zoomed canvas region
+    return image.resize((int(x2 - x1), int(y2 - y1)), Image.LANCZOS)
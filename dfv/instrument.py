@@ -0,0 +1,200 @@
+"""
+dfv.instrument
+--------------
+
+This module provides low-overhead timers and counters around the
+hot paths of the viewer (SQL fetches, mosaic decode and resize,
+defect placement, tile lookup, pyramid build, tile rendering).
+
+Instrumentation is off by default, timers then cost a single
+attribute check. It is switched on with the DFV_PROFILE
+environment variable or the --profile flag:
+
+    $ DFV_PROFILE=1 python -m dfv
+    $ python -m dfv --profile trace.json
+
+When on, a JSON trace of the session is written at exit. Its
+"traceEvents" list uses the Chrome trace event format, so the file
+opens directly in chrome://tracing or Perfetto. Its "stats" and
+"counters" sections hold the per-name totals.
+
+Usage in code:
+
+    >>> with instrument.timer('sql.defects'):
+    ...     rows = cur.execute(sql).fetchall()
+    >>> instrument.count('sql.defects.rows', len(rows))
+"""
+
+# instrument.py imports
+import atexit
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+
+MAX_EVENTS = 200000  # oldest trace events are dropped beyond this, stats are kept
+
+ENABLED = False  # whether timers and counters record anything
+trace_path = None  # file the trace is written to at exit
+
+_lock = threading.Lock()
+_origin = time.perf_counter()  # trace timestamps are relative to this
+_started = time.time()
+_stats = {}  # name -> [count, total, min, max, last] in seconds
+_counters = {}  # name -> value
+_events = deque(maxlen=MAX_EVENTS)  # (name, start, duration, thread id)
+_null_timer = nullcontext()  # returned while disabled, reusable
+
+
+class _Timer:
+    """Context manager recording the wall clock time of a block."""
+
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, self.start, time.perf_counter() - self.start)
+        return False
+
+
+def default_trace_path():
+    """Trace file in the working directory, named after the session start time."""
+    return os.path.abspath(time.strftime('dfv_trace_%Y%m%d_%H%M%S', time.localtime(_started))
+                           + '_' + str(os.getpid()) + '.json')
+
+
+def enable(path=None):
+    """Switch instrumentation on and write the trace to path at exit.
+
+    Parameters
+    ----------
+    path : string, optional
+        Trace file. The default is a time-stamped file in the working directory.
+
+    Returns -> None
+    """
+    global ENABLED, trace_path
+    if not ENABLED:
+        atexit.register(dump)
+    ENABLED = True
+    trace_path = path or default_trace_path()
+
+
+def enable_from_env():
+    """Enable instrumentation when DFV_PROFILE is set.
+
+    DFV_PROFILE=1 writes the trace to the default file, any value
+    ending in '.json' is used as the trace file instead.
+    """
+    value = os.environ.get('DFV_PROFILE', '')
+    if value and value != '0':
+        enable(value if value.endswith('.json') else None)
+
+
+def timer(name):
+    """Return a context manager timing a block under name, a no-op when disabled."""
+    if ENABLED:
+        return _Timer(name)
+    return _null_timer
+
+
+def timed(name):
+    """Decorator timing every call of a function under name."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return func(*args, **kwargs)
+            with _Timer(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record(name, start, duration):
+    """Record a finished measurement, start is a time.perf_counter() value."""
+    with _lock:
+        stats = _stats.get(name)
+        if stats is None:
+            _stats[name] = [1, duration, duration, duration, duration]
+        else:
+            stats[0] += 1
+            stats[1] += duration
+            stats[2] = min(stats[2], duration)
+            stats[3] = max(stats[3], duration)
+            stats[4] = duration
+        _events.append((name, start - _origin, duration, threading.get_ident()))
+
+
+def count(name, n=1):
+    """Add n to the counter name."""
+    if not ENABLED:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def snapshot():
+    """Return the current stats and counters.
+
+    Returns
+    -------
+    stats : dict
+        name -> dict of count, total, mean, min, max and last, in seconds.
+    counters : dict
+        name -> value.
+    """
+    with _lock:
+        stats = {name: {'count': s[0], 'total': s[1], 'mean': s[1] / s[0], 'min': s[2], 'max': s[3], 'last': s[4]}
+                 for name, s in _stats.items()}
+        return stats, dict(_counters)
+
+
+def reset():
+    """Forget all measurements, e.g. before profiling a single interaction."""
+    with _lock:
+        _stats.clear()
+        _counters.clear()
+        _events.clear()
+
+
+def trace():
+    """Return the session trace as a JSON-serializable dict."""
+    stats, counters = snapshot()
+    with _lock:
+        events = list(_events)
+    pid = os.getpid()
+    return {
+        'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(_started)),
+        'argv': sys.argv,
+        'stats': stats,
+        'counters': counters,
+        'dropped_events': max(0, sum(s['count'] for s in stats.values()) - len(events)),
+        'displayTimeUnit': 'ms',
+        # complete events, timestamps and durations in microseconds
+        'traceEvents': [{'name': name, 'ph': 'X', 'ts': round(start * 1e6, 1), 'dur': round(duration * 1e6, 1),
+                         'pid': pid, 'tid': tid} for name, start, duration, tid in events],
+    }
+
+
+def dump(path=None):
+    """Write the session trace to path, or to the trace file chosen in enable()."""
+    path = path or trace_path or default_trace_path()
+    with open(path, 'w') as f:
+        json.dump(trace(), f)
+    print('Wrote timing trace to ' + path)
+    return path
+
+
+enable_from_env()
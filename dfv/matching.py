@@ -0,0 +1,150 @@
+"""
+dfv.matching
+------------
+
+This module matches the defects of two analyses of the same scan,
+e.g. two recipes or analyzer versions, to find the defects only
+one of them reports.
+
+Two defects match when they lie on the same image within a
+tolerance of each other, in microns. Defects are hashed into a grid
+of tolerance-sized cells per image, so a defect of analysis A is
+only compared with the defects of analysis B in its own cell and
+the 8 cells around it. Hashing, candidate lookup and distances are
+done with sorts and searchsorted on whole arrays, there is no loop
+over defects.
+
+Matches are one to one. Candidate pairs are accepted closest first,
+in rounds: a pair is accepted when both defects are each other's
+closest remaining candidate, until no candidate pair is left.
+
+Nothing in here imports tkinter.
+"""
+
+# matching.py imports
+import numpy as np
+
+# custom modules
+from dfv import instrument
+
+# diff status of a defect
+ONLY_A = 0  # found by analysis A only
+ONLY_B = 1  # found by analysis B only
+MATCHED = 2  # found by both analyses
+STATUS_NAMES = ('Only in A', 'Only in B', 'Matched')
+
+
+def first_of_each(values):
+    """Return a mask of the first occurrence of every value."""
+    first = np.zeros(len(values), dtype=bool)
+    first[np.unique(values, return_index=True)[1]] = True
+    return first
+
+
+def candidate_pairs(image_a, x_a, y_a, image_b, x_b, y_b, tolerance):
+    """Find all pairs of defects of A and B on the same image within tolerance of each other.
+
+    Returns
+    -------
+    pair_a, pair_b : numpy arrays of int
+        Index into A and into B of every candidate pair.
+    dist : numpy array of float
+        Distance of every pair, in the unit of the coordinates.
+    """
+    n_a = len(x_a)
+    # one rank per image, shared by both analyses
+    _, rank = np.unique(np.concatenate([image_a, image_b]), return_inverse=True)
+    rank = rank.reshape(-1).astype(np.int64)
+    rank_a, rank_b = rank[:n_a], rank[n_a:]
+
+    # grid cells of the size of the tolerance, shifted by one cell so every neighbour cell exists
+    x0 = min(x_a.min(), x_b.min())
+    y0 = min(y_a.min(), y_b.min())
+    cx_a = np.floor((x_a - x0) / tolerance).astype(np.int64) + 1
+    cy_a = np.floor((y_a - y0) / tolerance).astype(np.int64) + 1
+    cx_b = np.floor((x_b - x0) / tolerance).astype(np.int64) + 1
+    cy_b = np.floor((y_b - y0) / tolerance).astype(np.int64) + 1
+    num_cx = int(max(cx_a.max(), cx_b.max())) + 2
+    num_cy = int(max(cy_a.max(), cy_b.max())) + 2
+    key_a = (rank_a * num_cy + cy_a) * num_cx + cx_a
+    key_b = (rank_b * num_cy + cy_b) * num_cx + cx_b
+
+    # B defects sorted by cell, with the first index and number of defects of every occupied cell
+    order_b = np.argsort(key_b)
+    cells_b, start_b, count_b = np.unique(key_b[order_b], return_index=True, return_counts=True)
+    # A defects sorted by cell as well, so the lookups below search for increasing keys
+    order_a = np.argsort(key_a)
+    sorted_a = key_a[order_a]
+    pairs_a, pairs_b = [], []
+    for dy in (-1, 0, 1):
+        for dx in (-1, 0, 1):
+            # the cell of B holding the neighbour cell of every A defect, if any
+            key = sorted_a + dy * num_cx + dx
+            cell = np.minimum(np.searchsorted(cells_b, key), len(cells_b) - 1)
+            count = np.where(cells_b[cell] == key, count_b[cell], 0)
+            total = int(count.sum())
+            if total == 0:
+                continue
+            # expand the cells into one entry per pair, without a loop
+            a = order_a[np.repeat(np.arange(n_a), count)]
+            offset = np.arange(total) - np.repeat(np.cumsum(count) - count, count)
+            b = order_b[np.repeat(start_b[cell], count) + offset]
+            pairs_a.append(a)
+            pairs_b.append(b)
+    if not pairs_a:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, np.empty(0)
+    pair_a = np.concatenate(pairs_a)
+    pair_b = np.concatenate(pairs_b)
+    dist = np.hypot(x_a[pair_a] - x_b[pair_b], y_a[pair_a] - y_b[pair_b])
+    keep = dist <= tolerance
+    return pair_a[keep], pair_b[keep], dist[keep]
+
+
+@instrument.timed('matching')
+def match_defects(image_a, x_a, y_a, image_b, x_b, y_b, tolerance):
+    """Match the defects of analysis A one to one with those of analysis B.
+
+    Parameters
+    ----------
+    image_a, image_b : numpy arrays of int
+        ImageID of every defect of A and of B.
+    x_a, y_a, x_b, y_b : numpy arrays of float
+        Defect positions on their image, in microns.
+    tolerance : float
+        Largest distance between matching defects, in microns.
+
+    Returns
+    -------
+    match_a : numpy array of int
+        Index into B of the defect matched to every defect of A, -1 when unmatched.
+    match_b : numpy array of int
+        Index into A of the defect matched to every defect of B, -1 when unmatched.
+    """
+    tolerance = float(tolerance)
+    if not tolerance > 0:
+        raise ValueError('Match tolerance must be positive, got ' + str(tolerance))
+    x_a, y_a = np.asarray(x_a, dtype=float), np.asarray(y_a, dtype=float)
+    x_b, y_b = np.asarray(x_b, dtype=float), np.asarray(y_b, dtype=float)
+    match_a = np.full(len(x_a), -1, dtype=np.int64)
+    match_b = np.full(len(x_b), -1, dtype=np.int64)
+    if len(x_a) == 0 or len(x_b) == 0:
+        return match_a, match_b
+
+    pair_a, pair_b, dist = candidate_pairs(np.asarray(image_a), x_a, y_a, np.asarray(image_b), x_b, y_b, tolerance)
+    instrument.count('matching.candidates', len(pair_a))
+    order = np.lexsort((pair_b, pair_a, dist))  # closest first, ties broken by index
+    pair_a, pair_b = pair_a[order], pair_b[order]
+    while pair_a.size:
+        # the first pair of a defect in this order is its closest remaining candidate
+        best = first_of_each(pair_a) & first_of_each(pair_b)
+        match_a[pair_a[best]] = pair_b[best]
+        match_b[pair_b[best]] = pair_a[best]
+        keep = (match_a[pair_a] < 0) & (match_b[pair_b] < 0)
+        pair_a, pair_b = pair_a[keep], pair_b[keep]
+    return match_a, match_b
+
+
+def diff_status(match_a, match_b):
+    """Return the diff status of every defect of A and of B, see ONLY_A, ONLY_B and MATCHED."""
+    return np.where(match_a >= 0, MATCHED, ONLY_A), np.where(match_b >= 0, MATCHED, ONLY_B)
@@ -0,0 +1,151 @@
+"""
+dfv.memory
+----------
+
+This module keeps account of the large buffers held by the open
+windows of a session: mosaic and density photo images, defect tables,
+defect marks and their indexes, tile pyramids and the shared image
+caches of the scheduler. Every window registers its buffers under one
+owner, each with a function returning its current size in bytes.
+
+When the total goes over the memory budget, buffers that can be
+rebuilt on demand are evicted, those of the owner used longest ago
+first: the reduced levels of tile pyramids, mosaic images of
+minimized windows, cached images and defect indexes. Buffers in view
+are never evicted, a buffer may refuse when it is in use.
+
+The budget is 4 GB by default, DFV_MEMORY_BUDGET sets it in MB:
+
+    $ DFV_MEMORY_BUDGET=2048 python -m dfv
+
+Nothing in here imports tkinter.
+"""
+
+# memory.py imports
+import os
+import time
+
+# custom modules
+from dfv import instrument
+
+DEFAULT_BUDGET = 4 * 1024**3  # bytes of all registered buffers before eviction starts
+
+budget = DEFAULT_BUDGET  # memory budget of new managers in bytes
+
+
+def enable_from_env():
+    """Apply DFV_MEMORY_BUDGET, the memory budget in MB."""
+    global budget
+    value = os.environ.get('DFV_MEMORY_BUDGET', '')
+    if value:
+        try:
+            budget = int(float(value) * 1024**2)
+        except ValueError:
+            print('DFV_MEMORY_BUDGET must be a number of MB, keeping the default budget')
+
+
+def format_bytes(nbytes):
+    """Return a size in bytes as text in MB, e.g. for a usage report."""
+    return f'{nbytes / 1024**2:.1f} MB'
+
+
+class MemoryManager:
+    """Registry of the large buffers of the open windows, evicting cold ones over the budget.
+
+    Used from the tk thread only, size and evict functions of shared
+    objects take their own locks.
+    """
+
+    def __init__(self, memory_budget=None):
+        self.budget = budget if memory_budget is None else memory_budget  # bytes before eviction starts
+        self.buffers = {}  # owner -> {buffer name: (size function, evict function or None)}
+        self.last_used = {}  # owner -> time it was last used, the coldest owner is evicted first
+        self.labels = set()  # owner names in use
+
+    def new_owner(self, label):
+        """Return a unique owner name starting with label, e.g. for a second window of the same scan."""
+        owner, number = label, 1
+        while owner in self.labels:
+            number += 1
+            owner = f'{label} ({number})'
+        self.labels.add(owner)
+        self.buffers[owner] = {}
+        self.last_used[owner] = time.monotonic()
+        return owner
+
+    def register(self, owner, name, size, evict=None):
+        """Register a buffer of an owner.
+
+        Parameters
+        ----------
+        owner : string
+            Owner name, as returned by new_owner.
+        name : string
+            Name of the buffer within the owner.
+        size : callable
+            Returns the current size of the buffer in bytes.
+        evict : callable, optional
+            Drops the buffer, or what of it can be rebuilt on demand,
+            and may do nothing while it is in use. The default is None,
+            a buffer that is never evicted.
+
+        Returns -> None.
+        """
+        self.buffers.setdefault(owner, {})[name] = (size, evict)
+        self.last_used.setdefault(owner, time.monotonic())
+
+    def unregister(self, owner):
+        """Forget an owner and all of its buffers, e.g. when its window closes."""
+        self.buffers.pop(owner, None)
+        self.last_used.pop(owner, None)
+        self.labels.discard(owner)
+
+    def touch(self, owner):
+        """Mark an owner as used now, it is evicted last."""
+        if owner in self.last_used:
+            self.last_used[owner] = time.monotonic()
+
+    def usage(self):
+        """Return {owner: {buffer name: bytes}} of every registered buffer."""
+        return {owner: {name: int(size()) for name, (size, _) in buffers.items()}
+                for owner, buffers in self.buffers.items()}
+
+    def total(self):
+        """Return the bytes held by all registered buffers."""
+        return sum(sum(sizes.values()) for sizes in self.usage().values())
+
+    @instrument.timed('memory.enforce')
+    def enforce(self, limit=None):
+        """Evict buffers, coldest owner and largest buffer first, until the total is within a limit.
+
+        Parameters
+        ----------
+        limit : int, optional
+            Bytes to get down to. The default is the budget.
+
+        Returns
+        -------
+        int
+            Bytes freed.
+        """
+        limit = self.budget if limit is None else limit
+        usage = self.usage()
+        total = sum(sum(sizes.values()) for sizes in usage.values())
+        freed = 0
+        for owner in sorted(usage, key=lambda owner: self.last_used[owner]):
+            for name in sorted(usage[owner], key=usage[owner].get, reverse=True):
+                if total - freed <= limit:
+                    return freed
+                size, evict = self.buffers[owner][name]
+                if evict is None or usage[owner][name] == 0:
+                    continue
+                evict()
+                released = usage[owner][name] - int(size())
+                if released > 0:
+                    freed += released
+                    instrument.count('memory.evictions')
+                    instrument.count('memory.evicted_bytes', released)
+        return freed
+
+
+enable_from_env()
@@ -0,0 +1,103 @@
+"""
+dfv.memwin
+----------
+
+This module provides a live window of the memory held by the open
+windows, as registered with dfv.memory: one row per window with its
+buffers below it, and the total against the memory budget. Trim
+evicts everything that can be rebuilt on demand right away.
+"""
+
+# memwin.py imports
+import tkinter as tk
+from tkinter import ttk
+
+# custom modules
+from dfv import memory
+
+
+class MemoryWindow:
+    """Live table of the memory held by every window and buffer."""
+
+    def __init__(self, manager, refresh_ms=1000):
+        """Create the window and start refreshing it.
+
+        Parameters
+        ----------
+        manager : memory.MemoryManager
+            Registry of the buffers of the session.
+        refresh_ms : int, optional
+            Milliseconds between refreshes. The default is 1000.
+
+        Returns -> None.
+        """
+        self.manager = manager  # registry of the buffers shown
+        self.refresh_ms = refresh_ms  # time between table refreshes
+        self.after_id = None  # pending refresh callback, cancelled on close
+
+        self.memory_window = tk.Toplevel()
+        self.memory_window.title('Memory')
+        self.memory_window.protocol('WM_DELETE_WINDOW', self.close)
+
+        # table of windows, their buffers as children, largest first
+        self.table = ttk.Treeview(self.memory_window, columns=('size',), height=16)
+        self.table.heading('#0', text='Window / buffer')
+        self.table.column('#0', width=280)
+        self.table.heading('size', text='size')
+        self.table.column('size', width=100, anchor='e')
+        self.table.grid(row=0, column=0, columnspan=3, sticky='nsew')
+
+        self.total_label = tk.Label(self.memory_window, anchor='w')
+        self.total_label.grid(row=1, column=0, columnspan=3, sticky='w')
+
+        # buttons to evict all that can be rebuilt now, or close the window
+        button_trim = tk.Button(self.memory_window, text='Trim', width=10, command=self.trim)
+        button_trim.grid(row=2, column=0)
+        button_close = tk.Button(self.memory_window, text='Close', width=10, command=self.close)
+        button_close.grid(row=2, column=2)
+
+        self.memory_window.rowconfigure(0, weight=1)
+        self.memory_window.columnconfigure(0, weight=1)
+        self.refresh()
+
+    def refresh(self):
+        """Update the table from the current usage and schedule the next refresh."""
+        usage = self.manager.usage()
+        totals = {owner: sum(sizes.values()) for owner, sizes in usage.items()}
+        existing = set(self.table.get_children())
+        for index, owner in enumerate(sorted(usage, key=totals.get, reverse=True)):
+            if owner in existing:
+                self.table.item(owner, values=(memory.format_bytes(totals[owner]),))
+                self.table.move(owner, '', index)
+            else:
+                self.table.insert('', index, iid=owner, text=owner, values=(memory.format_bytes(totals[owner]),))
+            self.fill_buffers(owner, usage[owner])
+        for owner in existing - set(usage):
+            self.table.delete(owner)  # window closed
+        self.total_label.config(text=f'Total {memory.format_bytes(sum(totals.values()))} '
+                                     f'of a {memory.format_bytes(self.manager.budget)} budget')
+        self.after_id = self.memory_window.after(self.refresh_ms, self.refresh)
+
+    def fill_buffers(self, owner, sizes):
+        """Update the buffer rows below the row of an owner, largest first."""
+        existing = set(self.table.get_children(owner))
+        for index, name in enumerate(sorted(sizes, key=sizes.get, reverse=True)):
+            iid = owner + '/' + name
+            if iid in existing:
+                self.table.item(iid, values=(memory.format_bytes(sizes[name]),))
+                self.table.move(iid, owner, index)
+            else:
+                self.table.insert(owner, index, iid=iid, text=name, values=(memory.format_bytes(sizes[name]),))
+        for iid in existing - {owner + '/' + name for name in sizes}:
+            self.table.delete(iid)
+
+    def trim(self):
+        """Evict every buffer that can be rebuilt on demand and report the bytes freed."""
+        freed = self.manager.enforce(0)
+        print(f'Freed {memory.format_bytes(freed)}')
+
+    def close(self):
+        """Stop refreshing and destroy the window."""
+        if self.after_id is not None:
+            self.memory_window.after_cancel(self.after_id)
+        self.memory_window.destroy()
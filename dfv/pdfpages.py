@@ -0,0 +1,143 @@
+"""
+dfv.pdfpages
+------------
+
+This module renders the pages of a PDF one at a time for the
+instruction manual viewer, dfv.pdfshow, and keeps them in a
+persistent cache, so the manual opens from the local disk even when
+the PDF sits on a network share.
+
+Every PDF and zoom is stored as a folder holding the page sizes in
+sizes.json and one PNG per page rendered so far. An entry is keyed
+by the PDF path, its modification time and size, and the zoom. Any
+change to the PDF makes its entries stale, they are removed when an
+entry of the changed PDF is made.
+
+The cache holds at most 500 MB, entries used longest ago are removed
+first, see dfv.diskcache. It is on by default. DFV_PAGE_CACHE=0
+switches it off, any other value is used as the cache folder, and
+DFV_PAGE_CACHE_SIZE sets its size in MB.
+
+A PdfPages is used by one thread at a time, PyMuPDF documents are
+not thread-safe. Nothing in here imports tkinter.
+"""
+
+# pdfpages.py imports
+import json
+import os
+
+import fitz
+from PIL import Image
+
+# custom modules
+from dfv import diskcache
+from dfv import instrument
+
+DEFAULT_MAX_BYTES = 500 * 1024**2  # bytes of all entries before the least recently used are removed
+CACHE_VERSION = '1'  # bump when the rendering of pages changes
+
+cache = diskcache.DiskCache('pages', 'DFV_PAGE_CACHE', DEFAULT_MAX_BYTES)  # folder, size and switch of the cache
+
+
+def entry_names(pdf_path, zoom):
+    """Return the folder name prefixes of a PDF and of its current version, and the full folder name at a zoom.
+
+    The first prefix identifies the PDF, the second adds its state, the suffix is the zoom.
+    """
+    path = os.path.abspath(pdf_path)
+    prefix = diskcache.digest(path)
+    version = prefix + '-' + diskcache.digest(CACHE_VERSION, diskcache.file_state(path))
+    return prefix, version, f'{version}-{zoom:g}'
+
+
+class PdfPages:
+    """Page sizes and rendered pages of one PDF at one zoom, read from the cache when possible."""
+
+    def __init__(self, pdf_path, zoom=1.0):
+        """Find the cache entry of the PDF, the PDF itself is opened on the first page not cached.
+
+        Parameters
+        ----------
+        pdf_path : string
+            Path to the PDF file.
+        zoom : float, optional
+            Pixels per PDF point, 1.0 renders at 72 dpi. The default is 1.0.
+
+        Returns -> None.
+        """
+        self.pdf_path = pdf_path
+        self.zoom = float(zoom)
+        self.document = None  # fitz document, opened on first use
+        self.entry = None  # cache folder of the PDF at this zoom, None when the cache is off
+        if cache.enabled:
+            prefix, version, name = entry_names(pdf_path, self.zoom)
+            try:
+                if os.path.isdir(cache.path(name)):
+                    cache.touch(name)
+                else:
+                    # a new entry, the PDF changed or was never shown at this zoom, remove entries of older versions
+                    cache.remove_stale(prefix, version + '-')
+                    cache.create(name, lambda folder: None)
+                self.entry = cache.path(name)
+            except OSError as e:
+                print('Could not cache the pages of ' + pdf_path + ': ' + str(e))
+
+    def open(self):
+        """Return the fitz document, opening it on first use."""
+        if self.document is None:
+            self.document = fitz.open(self.pdf_path)
+        return self.document
+
+    @instrument.timed('pdf.sizes')
+    def page_sizes(self):
+        """Return the (width, height) in pixels of every page, as rendered by render_page."""
+        sizes_path = None if self.entry is None else os.path.join(self.entry, 'sizes.json')
+        if sizes_path is not None and os.path.exists(sizes_path):
+            with open(sizes_path) as f:
+                return [tuple(size) for size in json.load(f)]
+        matrix = fitz.Matrix(self.zoom, self.zoom)
+        sizes = []
+        for page in self.open():
+            rect = (page.rect * matrix).irect
+            sizes.append((rect.width, rect.height))
+        if sizes_path is not None:
+            def write(tmp):
+                with open(tmp, 'w') as f:
+                    json.dump(sizes, f)
+            cache.store_file(sizes_path, write)
+        return sizes
+
+    @instrument.timed('pdf.page')
+    def render_page(self, number):
+        """Return one page as an RGB PIL image, rendered or read back from the cache.
+
+        Parameters
+        ----------
+        number : int
+            Page number, starting at 0.
+
+        Returns
+        -------
+        PIL image
+            The page at the zoom of this PdfPages.
+        """
+        page_path = None if self.entry is None else os.path.join(self.entry, f'page_{number:04d}.png')
+        if page_path is not None and os.path.exists(page_path):
+            with Image.open(page_path) as image:
+                image.load()
+                instrument.count('pdf.cache_hits')
+                return image
+        pix = self.open()[number].get_pixmap(matrix=fitz.Matrix(self.zoom, self.zoom), alpha=False)
+        image = Image.frombytes('RGB', (pix.width, pix.height), pix.samples)
+        if page_path is not None:
+            cache.store_file(page_path, lambda tmp: image.save(tmp, format='PNG', compress_level=1))
+        return image
+
+    def close(self):
+        """Close the PDF, if it was opened, and keep the cache within its size with the pages rendered."""
+        if self.document is not None:
+            self.document.close()
+            self.document = None
+        if self.entry is not None:
+            cache.trim(keep=os.path.basename(self.entry))
+
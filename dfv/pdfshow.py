@@ -1,25 +1,42 @@
 # Show Pdf imports
-from threading import Thread
-import fitz
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+import bisect
 import tkinter as tk
-from tkinter import ttk
-from PIL import Image, ImageTk
-import math
+from PIL import ImageTk
+
+# custom modules
+from dfv import instrument
+from dfv import pdfpages
+
+PAGE_GAP = 10  # pixels between pages
+PRELOAD_PAGES = 1  # pages rendered beyond either end of the view
+KEEP_PAGES = 2  # photo images kept beyond either end of the view, farther ones are dropped
+POLL_MS = 30  # time between checks on the page worker
 
 class ShowPdf():
-    """ Imports PDF as scrollable image into tkinter  
-    
-    Summary of changes made by jacobchristensen346 to tkPDFViewer (https://github.com/Roshanpaswan/tkPDFViewer.git) 
+    """ Imports PDF as scrollable image into tkinter
+
+    Summary of changes made by jacobchristensen346 to tkPDFViewer (https://github.com/Roshanpaswan/tkPDFViewer.git)
 
     - Added __init__ function to ShowPdf class, moved img_object_li instance variable into __init__ function. This aids in garbage-collection avoidance upon reruns of code.
     - Added explicit anchor argument to self.display_msg = Label(master, textvariable=percentage_load)
     - Added new variable returned upon exit of pdf_view() function (self.img_object_li). This allows capture of image array which aids in garbage collection avoidance.
+    - Pages are laid out from their sizes and only those near the view are rendered, on a worker thread,
+      and turned into photo images on the tk thread. Rendered pages are cached on disk, see dfv.pdfpages.
 
     """
     def __init__(self):
-        self.img_object_li = []
-
-    def pdf_view(self, master, width=1200, height=600, pdf_location="", bar=True, load="after"):
+        self.img_object_li = {}  # page number -> photo image of the pages shown, near the view
+        self.items = {}  # page number -> canvas image item of the pages shown
+        self.pending = {}  # page number -> Future of a page rendering on the worker
+        self.worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix='dfv-pdf')  # renders pages, owns the PDF
+        self.pages = None  # pdfpages.PdfPages, made on the worker
+        self.offsets = []  # canvas y of the top of every page
+        self.update_after_id = None  # pending update of the pages shown after a scroll
+        self.poll_after_id = None  # pending check on the worker
+
+    def pdf_view(self, master, width=1200, height=600, pdf_location="", bar=True, load="after", zoom=1.0):
+        """ Creates the viewer, the pages fill in as they are rendered, returns (frame, photo images) """
 
         self.frame = tk.Frame(master, width=width, height=height, bg="white")
 
@@ -29,54 +46,139 @@ class ShowPdf():
         scroll_x.pack(fill="x", side="bottom")
         scroll_y.pack(fill="y", side="right")
 
-        percentage_view = 0
-        percentage_load = tk.StringVar()
-
-        if bar == True and load == "after":
-            self.display_msg = tk.Label(master, textvariable=percentage_load)
+        self.display_msg = None
+        if bar == True:
+            self.display_msg = tk.Label(master, text="Please wait, the instruction manual is loading...", anchor='w')
             self.display_msg.pack(pady=10)
 
-            loading = ttk.Progressbar(self.frame, orient=tk.HORIZONTAL, length=100, mode='determinate')
-            loading.pack(side=tk.TOP, fill=tk.X)
-
-        self.text = tk.Text(self.frame, yscrollcommand=scroll_y.set, xscrollcommand=scroll_x.set, width=width, height=height)
-        self.text.pack(side="left")
-
-        scroll_x.config(command=self.text.xview)
-        scroll_y.config(command=self.text.yview)
-
-        def add_img():
-            precentage_dicide = 0
-            open_pdf = fitz.open(pdf_location)
-
-            for page in open_pdf:
-                pix = page.get_pixmap()
-                pix1 = fitz.Pixmap(pix, 0) if pix.alpha else pix
-                img = pix1.tobytes("ppm")
-                timg = ImageTk.PhotoImage(data=img)
-                self.img_object_li.append(timg)
-                if bar == True and load == "after":
-                    precentage_dicide = precentage_dicide + 1
-                    percentage_view = (float(precentage_dicide) / float(len(open_pdf)) * float(100))
-                    loading['value'] = percentage_view
-                    percentage_load.set(f"Please wait, the instruction manual is loading... {int(math.floor(percentage_view))}%")
-            if bar == True and load == "after":
-                loading.pack_forget()
-                self.display_msg.pack_forget()
-
-            for i in self.img_object_li:
-                self.text.image_create(tk.END, image=i)
-                self.text.insert(tk.END, "\n\n")
-            self.text.configure(state="disabled")
+        self.canvas = tk.Canvas(self.frame, width=width, height=height, bg="white", yscrollincrement=20,
+                                yscrollcommand=lambda lo, hi: self.scrolled(scroll_y, lo, hi),
+                                xscrollcommand=scroll_x.set)
+        self.canvas.pack(side="left", fill="both", expand=True)
 
+        scroll_x.config(command=self.canvas.xview)
+        scroll_y.config(command=self.canvas.yview)
+        self.canvas.bind('<Configure>', lambda event: self.schedule_update())
+        self.canvas.bind('<MouseWheel>', lambda event: self.canvas.yview_scroll(-3 if event.delta > 0 else 3, 'units'))
+        self.canvas.bind('<Button-4>', lambda event: self.canvas.yview_scroll(-3, 'units'))
+        self.canvas.bind('<Button-5>', lambda event: self.canvas.yview_scroll(3, 'units'))
+        self.frame.bind('<Destroy>', self.destroyed)
 
-        def start_pack():
-            t1 = Thread(target=add_img)
-            t1.start()
+        def start():
+            # the page sizes are read on the worker, from the cache or the PDF, the window shows meanwhile
+            self.pending[None] = self.worker.submit(self.open_pages, pdf_location, zoom)
+            self.start_polling()
 
         if load == "after":
-            master.after(250, start_pack)
+            master.after_idle(start)
         else:
-            start_pack()
-       
-        return self.frame, self.img_object_li
\ No newline at end of file
+            start()
+
+        return self.frame, self.img_object_li
+
+    def open_pages(self, pdf_location, zoom):
+        """ Reads the page sizes, runs on the worker """
+        self.pages = pdfpages.PdfPages(pdf_location, zoom)
+        return self.pages.page_sizes()
+
+    def layout(self, sizes):
+        """ Stacks a placeholder for every page, the scroll region spans the whole document """
+        y = 0
+        for number, (w, h) in enumerate(sizes):
+            self.offsets.append(y)
+            self.canvas.create_rectangle(0, y, w, y + h, outline='gray80', fill='gray95', tags='PAGE_PLACEHOLDER')
+            y += h + PAGE_GAP
+        width = max((w for w, _ in sizes), default=0)
+        self.canvas.configure(scrollregion=(0, 0, width, max(y - PAGE_GAP, 0)))
+        if self.display_msg is not None:
+            self.display_msg.pack_forget()
+        self.update_pages()
+
+    def scrolled(self, scroll_y, lo, hi):
+        """ Moves the scrollbar and updates the pages shown once tk is idle """
+        scroll_y.set(lo, hi)
+        self.schedule_update()
+
+    def schedule_update(self):
+        """ Updates the pages shown once tk is idle, updates asked for in between are merged """
+        if self.update_after_id is None:
+            self.update_after_id = self.canvas.after_idle(self.update_pages)
+
+    def visible_pages(self):
+        """ Returns the first and last page number in view """
+        top = self.canvas.canvasy(0)
+        bottom = self.canvas.canvasy(self.canvas.winfo_height())
+        first = max(bisect.bisect_right(self.offsets, top) - 1, 0)
+        last = max(bisect.bisect_right(self.offsets, bottom) - 1, first)
+        return first, min(last, len(self.offsets) - 1)
+
+    def update_pages(self):
+        """ Renders the pages near the view on the worker and drops the photo images of pages far from it """
+        self.update_after_id = None
+        if not self.offsets:
+            return  # page sizes not read yet
+        first, last = self.visible_pages()
+        keep = range(max(first - KEEP_PAGES, 0), min(last + KEEP_PAGES, len(self.offsets) - 1) + 1)
+        for number in list(self.img_object_li):
+            if number not in keep:
+                self.canvas.delete(self.items.pop(number))
+                del self.img_object_li[number]
+                instrument.count('pdf.pages_dropped')
+        for number in list(self.pending):
+            if number is not None and number not in keep and self.pending[number].cancel():
+                del self.pending[number]
+        # the pages in view first, then those just beyond it
+        wanted = list(range(first, last + 1)) + [n for k in range(1, PRELOAD_PAGES + 1) for n in (last + k, first - k)]
+        for number in wanted:
+            if 0 <= number < len(self.offsets) and number not in self.img_object_li and number not in self.pending:
+                self.pending[number] = self.worker.submit(self.pages.render_page, number)
+        self.start_polling()
+
+    def start_polling(self):
+        """ Starts checking on the worker, unless a check is already scheduled """
+        if self.pending and self.poll_after_id is None:
+            self.poll_after_id = self.canvas.after(POLL_MS, self.poll)
+
+    def poll(self):
+        """ Shows the pages rendered by the worker, runs on the tk event loop """
+        self.poll_after_id = None
+        for number, future in list(self.pending.items()):
+            if not future.done():
+                continue
+            del self.pending[number]
+            try:
+                result = future.result()
+            except (CancelledError, Exception) as e:
+                print('Error showing the instruction manual: ' + str(e))
+                if self.display_msg is not None:
+                    self.display_msg.config(text='The instruction manual could not be opened')
+                continue
+            if number is None:
+                self.layout(result)
+            else:
+                self.show_page(number, result)
+        self.start_polling()
+
+    def show_page(self, number, image):
+        """ Shows a rendered page over its placeholder, unless it was scrolled far out of view meanwhile """
+        first, last = self.visible_pages()
+        if number < first - KEEP_PAGES or number > last + KEEP_PAGES:
+            return
+        self.img_object_li[number] = ImageTk.PhotoImage(image)
+        self.items[number] = self.canvas.create_image(0, self.offsets[number], anchor='nw',
+                                                      image=self.img_object_li[number])
+
+    def destroyed(self, event):
+        """ Drops the work left on the worker and closes the PDF once the viewer is destroyed """
+        if event.widget is not self.frame:
+            return
+        for future in self.pending.values():
+            future.cancel()
+        self.pending.clear()
+        if self.poll_after_id is not None:
+            self.canvas.after_cancel(self.poll_after_id)
+        if self.update_after_id is not None:
+            self.canvas.after_cancel(self.update_after_id)
+        self.worker.submit(lambda: self.pages is not None and self.pages.close())
+        self.worker.shutdown(wait=False)
+        self.img_object_li.clear()
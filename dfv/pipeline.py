@@ -0,0 +1,219 @@
+"""
+dfv.pipeline
+------------
+
+This module loads a mosaic in stages on worker threads, so the tk
+event loop stays free while a mosaic opens:
+
+    - database: the image, defect, scan property and class rows
+    - image: reading, decoding and resizing the mosaic image
+    - placement: mosaic coordinates, bins and colors of every defect
+
+The database and image stages run at the same time, overlapping
+disk and SQLite I/O with the image decode. Defects are streamed from
+the database in chunks, and every chunk is placed as soon as both
+the image table and the mosaic image are ready, so the first defects
+can be drawn while the rest are still being read. At most
+CHUNK_QUEUE chunks wait for placement, while the mosaic image is
+still decoding the database stage waits rather than holding a second
+copy of the defect table, and the marks of every placed chunk are
+written into arrays allocated for the defect count of the analysis,
+see dfv.core.MarkBuilder. Given a
+dfv.scheduler.Scheduler, the stages run on its shared workers,
+connections and image cache, otherwise the loader uses its own.
+Results are posted to a queue as (kind, payload) messages, which
+the GUI drains with after():
+
+    - ('progress', stage name) when a stage finishes
+    - ('image', PIL image) as soon as the resized mosaic is ready
+    - ('marks', defect marks) for every placed chunk of defects
+    - ('done', defect marks or None) when everything is loaded, holding the marks of all defects
+    - ('error', message) or ('cancelled', None) otherwise
+
+Nothing in here imports tkinter.
+"""
+
+# pipeline.py imports
+import queue
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+
+# custom modules
+from dfv import core
+from dfv import instrument
+
+STAGES = ('database', 'image', 'placement')
+CHUNK_QUEUE = 4  # streamed defect chunks waiting for placement at most
+WAIT_S = 0.05  # time between checks on cancellation while waiting on another stage
+
+
+class Cancelled(Exception):
+    """Raised inside the loader when the load was cancelled."""
+
+
+class MosaicLoader:
+    """Loads a MosaicModel and its mosaic image on worker threads."""
+
+    def __init__(self, model, place_defects=True, scheduler=None):
+        """Prepare the loader, start() runs it.
+
+        Parameters
+        ----------
+        model : dfv.core.MosaicModel
+            Model to load, must not be used by other threads until 'done'.
+        place_defects : bool, optional
+            Run the placement stage. The default is True.
+        scheduler : dfv.scheduler.Scheduler, optional
+            Shared resources to load with. The default is None, loading alone.
+
+        Returns -> None.
+        """
+        self.model = model  # model filled in by the workers
+        self.place_defects = place_defects  # compute the defect marks after loading
+        self.scheduler = scheduler  # shared workers, connections and image cache, if any
+        self.messages = queue.Queue()  # (kind, payload) messages for the GUI
+        self.chunks = queue.Queue(maxsize=CHUNK_QUEUE)  # streamed defect chunks waiting for placement, None once all arrived
+        self.scan_tables_ready = threading.Event()  # set once the image table is loaded
+        self.cancelled = threading.Event()  # set by cancel()
+        self.conn = None  # open database connection, interrupted on cancel
+        self.defect_count = 0  # defects the analysis lists, set before the first chunk is queued
+        self.thread = threading.Thread(target=self.run, name='dfv-mosaic-loader', daemon=True)
+
+    def start(self):
+        """Start loading in the background."""
+        self.thread.start()
+
+    def cancel(self):
+        """Stop loading as soon as possible, a running query is interrupted."""
+        self.cancelled.set()
+        conn = self.conn
+        if conn is not None:
+            conn.interrupt()
+
+    def check(self):
+        """Raise Cancelled when the load was cancelled."""
+        if self.cancelled.is_set():
+            raise Cancelled()
+
+    def put_chunk(self, chunk):
+        """Hand a chunk of defects to placement, waiting while the queue is full, returns False once cancelled."""
+        while not self.cancelled.is_set():
+            try:
+                self.chunks.put(chunk, timeout=WAIT_S)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def queue_chunk(self, chunk):
+        """Chunk callback of the database stage, raises Cancelled when the load was cancelled while waiting."""
+        if not self.put_chunk(chunk):
+            raise Cancelled()
+
+    def load_database(self):
+        """Database stage, runs on a worker thread."""
+        try:
+            self.check()
+            if self.scheduler is None:
+                connection = closing(sqlite3.connect(self.model.db_file))
+            else:
+                connection = self.scheduler.connection(self.model.db_file)
+            with connection as conn:
+                self.conn = conn
+                try:
+                    cur = conn.cursor()
+                    self.model.load_scan_tables(cur)
+                    self.scan_tables_ready.set()
+                    if self.place_defects:
+                        self.defect_count = core.analysis_defect_count(cur, self.model.analysis_id)
+                    self.model.load_analysis_tables(cur, self.queue_chunk if self.place_defects else None)
+                except sqlite3.OperationalError:
+                    if self.cancelled.is_set():
+                        raise Cancelled()
+                    raise
+                finally:
+                    self.conn = None
+        finally:
+            self.put_chunk(None)  # placement stops waiting, also on errors
+        self.messages.put(('progress', 'database'))
+
+    def load_image(self):
+        """Image stage, runs on a worker thread."""
+        self.check()
+        if self.scheduler is None:
+            image, source_size = core.load_mosaic_image(self.model.img_loc, self.model.image_scale)
+        else:
+            image, source_size = self.scheduler.mosaic_image(self.model.img_loc, self.model.image_scale, self.check)
+        self.check()
+        self.messages.put(('image', image))
+        self.messages.put(('progress', 'image'))
+        return image, source_size
+
+    @instrument.timed('pipeline.load')
+    def run(self):
+        """Run all stages and post the outcome, runs on the loader thread."""
+        try:
+            if self.scheduler is None:
+                with ThreadPoolExecutor(max_workers=2, thread_name_prefix='dfv-stage') as pool:
+                    marks = self.run_stages(pool, pool)
+            else:
+                marks = self.run_stages(self.scheduler.db_pool, self.scheduler.decode_pool)
+            self.check()
+            self.messages.put(('done', marks))
+        except Cancelled:
+            self.messages.put(('cancelled', None))
+        except Exception as e:
+            self.cancel()  # the database stage stops instead of waiting on placement
+            self.messages.put(('error', f"{type(e).__name__}: {e}"))
+
+    def run_stages(self, db_pool, decode_pool):
+        """Run the database and image stages concurrently, placing defect chunks as they stream in.
+
+        Returns the defect marks of the whole analysis, None without placement.
+        """
+        database = db_pool.submit(self.load_database)
+        image = decode_pool.submit(self.load_image)
+        # the mosaic geometry needs both the image table and the resized image
+        while not self.scan_tables_ready.wait(WAIT_S):
+            if database.done():
+                database.result()  # raises the error of the database stage
+        self.model.set_mosaic_image(*image.result())
+        if not self.place_defects:
+            database.result()
+            return None
+
+        builder = None  # marks of all defects, allocated once the first chunk arrives and the row count is known
+        while True:
+            try:
+                chunk = self.chunks.get(timeout=WAIT_S)
+            except queue.Empty:
+                self.check()
+                continue
+            if chunk is None:
+                break
+            self.check()
+            marks = decode_pool.submit(self.place, chunk).result()
+            if builder is None:
+                builder = core.MarkBuilder(self.defect_count)
+            builder.append(marks)
+            # the GUI draws the marks a chunk at a time, split tables that arrived whole from the cache
+            for start in range(0, len(marks['x']), core.STREAM_CHUNK):
+                self.messages.put(('marks', {key: value[start:start + core.STREAM_CHUNK]
+                                             for key, value in marks.items() if not key.endswith('_counts')}))
+        database.result()
+        self.messages.put(('progress', 'placement'))
+        return self.model.defect_marks() if builder is None else builder.marks()
+
+    @instrument.timed('pipeline.placement')
+    def place(self, chunk):
+        """Placement of one chunk of defects, runs on a worker thread."""
+        return self.model.chunk_marks(chunk)
+
+    def next_message(self):
+        """Return the next message, or None when there is none yet, never blocks."""
+        try:
+            return self.messages.get_nowait()
+        except queue.Empty:
+            return None
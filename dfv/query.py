@@ -0,0 +1,147 @@
+"""
+dfv.query
+---------
+
+This module filters the defects of an analysis with predicates over
+their typed columns: value ranges of Area, Intensity, Eccentricity
+and Score, a set of ClassIDs and a region of tiles of the mosaic,
+combined with AND or OR.
+
+Every predicate becomes a boolean mask over the defect table. Range
+predicates go through a sorted index of their column, built once on
+first use: the defects within a range are a slice of the sorted
+order found with two binary searches. A narrow range marks only the
+defects of its slice, a wide one compares the column directly, so
+a query over 1M defects takes a few milliseconds either way.
+
+Nothing in here imports tkinter.
+"""
+
+# query.py imports
+import numpy as np
+
+# custom modules
+from dfv import instrument
+
+RANGE_COLUMNS = ('Area', 'Intensity', 'Eccentricity', 'Score')  # columns with range predicates
+SLICE_FRACTION = 0.125  # ranges holding fewer defects than this fraction are marked from the sorted index
+
+
+class DefectQuery:
+    """Predicates of a defect filter, a query without predicates keeps every defect."""
+
+    def __init__(self, ranges=None, class_ids=None, region=None, combine='AND'):
+        self.ranges = dict(ranges or {})  # column name -> (low, high), None for an open end
+        self.class_ids = class_ids  # ClassIDs kept, NaN keeps unclassified defects, every class when None
+        self.region = region  # (first row, last row, first column, last column) of the tiles kept, None for an open end
+        self.combine = combine  # 'AND' or 'OR' of the predicates
+
+    def is_empty(self):
+        """Whether the query has no predicates."""
+        return not self.ranges and self.class_ids is None and self.region is None
+
+    def describe(self):
+        """Return the predicates as text, e.g. for a window title."""
+        parts = []
+        for name, (low, high) in self.ranges.items():
+            parts.append(('' if low is None else f'{low:g} <= ') + name + ('' if high is None else f' <= {high:g}'))
+        if self.class_ids is not None:
+            parts.append('ClassID in (' + ', '.join('none' if np.isnan(i) else f'{i:g}' for i in self.class_ids) + ')')
+        if self.region is not None:
+            first_row, last_row, first_col, last_col = ('*' if v is None else str(v) for v in self.region)
+            parts.append(f'Rows {first_row}-{last_row}, Columns {first_col}-{last_col}')
+        return (' ' + self.combine + ' ').join(parts) if parts else 'All defects'
+
+
+class DefectIndex:
+    """Sorted column indexes of a defect table, evaluating DefectQuery predicates on it."""
+
+    def __init__(self, defects, tile_rows, tile_cols):
+        self.defects = defects  # ColumnTable of the defects
+        self.tile_rows = tile_rows  # mosaic row of the tile of every defect
+        self.tile_cols = tile_cols  # mosaic column of the tile of every defect
+        self._sorted = {}  # column name -> (order, sorted values, number of values that are not NaN)
+
+    def __len__(self):
+        return len(self.defects)
+
+    @property
+    def nbytes(self):
+        """Memory held by the sorted column indexes in bytes, the defect table is not counted."""
+        return sum(order.nbytes + ordered.nbytes for order, ordered, _ in list(self._sorted.values()))
+
+    @instrument.timed('query.index')
+    def sorted_column(self, name):
+        """Return the defect order sorting a column, its sorted values and the number of values that are not NaN."""
+        if name not in self._sorted:
+            values = self.defects[name]
+            order = np.argsort(values)  # NaN sorts last
+            ordered = values[order]
+            self._sorted[name] = (order, ordered, len(values) - int(np.isnan(values).sum()))
+        return self._sorted[name]
+
+    def quantile(self, name, fraction):
+        """Return the column value at a fraction of its sorted values, NaN ignored, None when all are NaN."""
+        _, ordered, valid = self.sorted_column(name)
+        if valid == 0:
+            return None
+        return float(ordered[min(valid - 1, max(0, int(round(fraction * (valid - 1)))))])
+
+    def range_slice(self, name, low, high):
+        """Return the start and stop within the sorted order of a column of the values in [low, high]."""
+        _, ordered, valid = self.sorted_column(name)
+        start = 0 if low is None else int(np.searchsorted(ordered[:valid], low, side='left'))
+        stop = valid if high is None else int(np.searchsorted(ordered[:valid], high, side='right'))
+        return start, max(start, stop)
+
+    def range_mask(self, name, low, high):
+        """Return a mask of the defects with a column value in [low, high], either end may be None."""
+        start, stop = self.range_slice(name, low, high)
+        if stop - start < SLICE_FRACTION * len(self):
+            mask = np.zeros(len(self), dtype=bool)
+            mask[self._sorted[name][0][start:stop]] = True
+            return mask
+        values = self.defects[name]
+        mask = ~np.isnan(values)
+        if low is not None:
+            mask &= values >= low
+        if high is not None:
+            mask &= values <= high
+        return mask
+
+    def class_mask(self, class_ids):
+        """Return a mask of the defects of the given ClassIDs, NaN standing for unclassified defects."""
+        class_ids = np.asarray(class_ids, dtype=float)
+        values = self.defects['ClassID']
+        mask = np.isin(values, class_ids[~np.isnan(class_ids)])
+        if np.isnan(class_ids).any():
+            mask |= np.isnan(values)
+        return mask
+
+    def region_mask(self, region):
+        """Return a mask of the defects on the tiles of a (first row, last row, first column, last column) region."""
+        mask = np.ones(len(self), dtype=bool)
+        for values, low, high in ((self.tile_rows, region[0], region[1]), (self.tile_cols, region[2], region[3])):
+            if low is not None:
+                mask &= values >= low
+            if high is not None:
+                mask &= values <= high
+        return mask
+
+    @instrument.timed('query')
+    def evaluate(self, defect_query):
+        """Return the mask of the defects a query keeps, None when it has no predicates."""
+        masks = [self.range_mask(name, low, high) for name, (low, high) in defect_query.ranges.items()]
+        if defect_query.class_ids is not None:
+            masks.append(self.class_mask(defect_query.class_ids))
+        if defect_query.region is not None:
+            masks.append(self.region_mask(defect_query.region))
+        if not masks:
+            return None
+        mask = masks[0]
+        for other in masks[1:]:
+            if defect_query.combine == 'OR':
+                mask |= other
+            else:
+                mask &= other
+        return mask
@@ -0,0 +1,320 @@
+"""
+dfv.render
+----------
+
+This module provides headless rendering of annotated mosaics.
+Defects are stamped onto the resized mosaic image with numpy,
+so no display or tk installation is needed.
+
+Rendering is driven from the command line:
+
+    $ python -m dfv render --db X.db --scans DIR --scan 3 --analysis 7 --scale 4 --out mosaic.png
+
+Several scan/analysis pairs are rendered in parallel across
+processes, one process per pair.
+"""
+
+# render.py imports
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from PIL import Image, ImageColor
+
+# custom modules
+from dfv import core
+
+# tk understands the numbered X11 color variants (e.g. 'royalblue3') but PIL does not
+# the variants are the base color scaled by these factors, see the X11 rgb.txt
+X11_VARIANT_SCALE = {'1': 1.0, '2': 0.932, '3': 0.804, '4': 0.545}
+# numbered variants whose first shade is not the base color itself
+X11_VARIANTS = {
+    'chartreuse3': '#66cd00', 'royalblue1': '#4876ff', 'royalblue3': '#3a5fcd',
+    'goldenrod1': '#ffc125', 'goldenrod3': '#cd9b1d', 'magenta3': '#cd00cd',
+    'aquamarine3': '#66cdaa', 'dodgerblue3': '#1874cd', 'orange3': '#cd8500',
+    'springgreen3': '#00cd66', 'deepskyblue3': '#009acd', 'darkorange3': '#cd6600',
+}
+
+
+def resolve_color(color):
+    """Convert a tk color name into an (r, g, b) tuple.
+
+    Parameters
+    ----------
+    color : string
+        Any color accepted by tk, such as 'red', '#ff0000' or 'royalblue3'.
+
+    Returns
+    -------
+    tuple of int
+        The (r, g, b) value of the color.
+    """
+    color = str(color).strip().lower().replace(' ', '')
+    if color in X11_VARIANTS:
+        return ImageColor.getrgb(X11_VARIANTS[color])
+    try:
+        return ImageColor.getrgb(color)
+    except ValueError:
+        # tk grays from gray0 to gray100, the number is the percentage of white
+        for prefix in ('gray', 'grey'):
+            if color.startswith(prefix) and color[len(prefix):].isdigit():
+                level = int(round(int(color[len(prefix):]) * 2.55))
+                return (level, level, level)
+        # fall back on scaling the base color for the numbered X11 variants
+        if color[-1:] in X11_VARIANT_SCALE:
+            base = ImageColor.getrgb(color[:-1])
+            return tuple(int(round(c * X11_VARIANT_SCALE[color[-1]])) for c in base)
+        raise
+
+
+def disk_offsets(radius):
+    """Return the pixel offsets covered by a filled circle of the given radius."""
+    r = int(np.ceil(radius))
+    dy, dx = np.mgrid[-r:r + 1, -r:r + 1]
+    inside = dx**2 + dy**2 <= radius**2
+    return dx[inside], dy[inside]
+
+
+def stamp_marks(pixels, x, y, colors, radius, chunk=65536):
+    """Draw filled circular defect marks onto an image array.
+
+    Later defects are drawn over earlier ones, matching the
+    stacking order of the ovals on the mosaic canvas.
+
+    Parameters
+    ----------
+    pixels : numpy array
+        (height, width, 3) uint8 image array, modified in place,
+        or (height, width, 4) for an RGBA image.
+    x, y : numpy arrays of float
+        Defect mark centers in pixels.
+    colors : numpy array
+        (n, 3) uint8 array with the color of every mark, (n, 4) for an RGBA image.
+    radius : float
+        Radius of the defect marks in pixels.
+    chunk : int, optional
+        Number of marks stamped per step, bounds memory. The default is 65536.
+
+    Returns -> None
+    """
+    height, width = pixels.shape[:2]
+    dx, dy = disk_offsets(radius)
+    for start in range(0, len(x), chunk):
+        cx = np.rint(x[start:start + chunk]).astype(np.int64)
+        cy = np.rint(y[start:start + chunk]).astype(np.int64)
+        px = (cx[:, None] + dx[None, :]).ravel()
+        py = (cy[:, None] + dy[None, :]).ravel()
+        col = np.repeat(colors[start:start + chunk], len(dx), axis=0)
+        keep = (px >= 0) & (px < width) & (py >= 0) & (py < height)
+        pixels[py[keep], px[keep]] = col[keep]
+
+
+def render_mosaic(model, image):
+    """Draw the defects of a mosaic onto its resized mosaic image.
+
+    Parameters
+    ----------
+    model : dfv.core.MosaicModel
+        Loaded mosaic, its binning settings, which_binning_show and
+        defect_mark_size choose the colors and radius of the marks.
+    image : PIL image
+        Mosaic image, already resized by the image scale.
+
+    Returns
+    -------
+    PIL image
+        RGB mosaic image with defect marks.
+    """
+    pixels = np.array(image.convert('RGB'))
+    if len(model.defects) == 0:
+        return Image.fromarray(pixels)
+
+    model.set_mosaic_size(*image.size)
+    x, y = model.defect_mosaic_coords()
+    stamp_marks(pixels, x, y, mark_colors(model), float(model.defect_mark_size))
+    return Image.fromarray(pixels)
+
+
+def overlay_image(x, y, colors, size, radius):
+    """Draw marks onto a transparent image, one image item instead of a canvas oval per mark.
+
+    Parameters
+    ----------
+    x, y : numpy arrays of float
+        Mark centers in mosaic pixels.
+    colors : numpy array
+        tk color name of every mark.
+    size : tuple of int
+        (width, height) of the resized mosaic.
+    radius : float
+        Radius of the marks in pixels.
+
+    Returns
+    -------
+    PIL image
+        RGBA image of the mosaic size, transparent between the marks.
+    """
+    pixels = np.zeros((size[1], size[0], 4), dtype=np.uint8)
+    names, index = np.unique(np.asarray(colors, dtype=str), return_inverse=True)
+    palette = np.array([resolve_color(name)[:3] + (255,) for name in names], dtype=np.uint8).reshape(-1, 4)
+    stamp_marks(pixels, np.asarray(x), np.asarray(y), palette[index.ravel()], radius)
+    return Image.fromarray(pixels, 'RGBA')
+
+
+def mark_colors(model):
+    """Return the (n, 3) uint8 mark color of every defect, in the class binning
+    when the model shows it and in the size binning otherwise."""
+    if model.which_binning_show == 'CLASS':
+        colors = model.binning_type_colors
+        bins = model.class_bins()
+    else:
+        colors = model.binning_colors
+        bins = model.size_bins()
+    # palette of bin colors with the infinity bin last
+    palette = np.array([resolve_color(c) for c in list(colors) + [model.inf_bin_color]], dtype=np.uint8)
+    return palette[np.minimum(bins, len(palette) - 1)]
+
+
+class RenderJob:
+    """Settings needed to render one scan/analysis pair to a file."""
+
+    def __init__(self, db_file, scan_dir, scan_id, analysis_id, image_scale, out_path,
+                 binning='SIZE', mark_size=3, image_view_only=False,
+                 binning_ranges=core.DEFAULT_BINNING_RANGES,
+                 binning_colors=core.DEFAULT_BINNING_COLORS,
+                 binning_type_colors=np.array([]),
+                 inf_bin_color=core.DEFAULT_INF_BIN_COLOR):
+        self.db_file = db_file
+        self.scan_dir = scan_dir
+        self.scan_id = str(scan_id)
+        self.analysis_id = None if analysis_id is None else str(analysis_id)  # None renders the mosaic image only
+        self.image_scale = int(image_scale)
+        self.out_path = out_path
+        self.binning = binning
+        self.mark_size = mark_size
+        self.image_view_only = image_view_only
+        self.binning_ranges = binning_ranges
+        self.binning_colors = binning_colors
+        self.binning_type_colors = binning_type_colors
+        self.inf_bin_color = inf_bin_color
+
+
+def render_job(job):
+    """Render a single RenderJob and save the image, returns the output path."""
+    img_loc = core.scan_folder(job.scan_dir, job.scan_id)
+    if job.image_view_only or job.analysis_id is None:
+        image, _ = core.load_mosaic_image(img_loc, job.image_scale)
+    else:
+        model = core.MosaicModel(job.db_file, img_loc, job.scan_id, job.analysis_id, job.image_scale,
+                                 binning_ranges=job.binning_ranges, binning_colors=job.binning_colors,
+                                 inf_bin_color=job.inf_bin_color)
+        model.binning_type_colors = job.binning_type_colors
+        model.which_binning_show = job.binning
+        model.defect_mark_size = job.mark_size
+        model.load()
+        image = render_mosaic(model, model.load_mosaic_image())
+    out_dir = os.path.dirname(job.out_path)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    image.save(job.out_path)
+    return job.out_path
+
+
+def render_many(jobs, workers=None):
+    """Render many jobs, in parallel across processes when workers > 1.
+
+    Parameters
+    ----------
+    jobs : list of RenderJob
+        The scan/analysis pairs to render.
+    workers : int, optional
+        Number of worker processes. The default is the number of cores.
+
+    Yields
+    ------
+    string
+        Output path of every finished job, in job order.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(jobs) == 1:
+        for job in jobs:
+            yield render_job(job)
+        return
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+        yield from pool.map(render_job, jobs)
+
+
+def build_jobs(args):
+    """Expand the command line arguments into a list of RenderJob.
+
+    With --image-only every scan gives one job without analysis, also
+    a scan that has none, and {analysis} in --out becomes 'image'.
+    """
+    if args.image_only:
+        if args.analysis:
+            raise SystemExit('--analysis cannot be combined with --image-only, which renders one mosaic image per scan')
+        pairs = [(str(scan_id), None) for scan_id in args.scan]
+    else:
+        conn = sqlite3.connect(args.db)
+        cur = conn.cursor()
+        pairs = []
+        for scan_id in args.scan:
+            choices = core.analysis_ids(cur, scan_id)
+            if args.analysis:
+                choices = choices[np.isin(choices, np.array(args.analysis, dtype=str))]
+            pairs.extend((str(scan_id), analysis_id) for analysis_id in choices)
+        conn.close()
+
+    sample = os.path.splitext(os.path.basename(args.db))[0]
+    jobs = [RenderJob(args.db, args.scans, scan_id, analysis_id, args.scale,
+                      args.out.format(sample=sample, scan=scan_id, analysis='image' if analysis_id is None else analysis_id),
+                      binning=args.binning.upper(), mark_size=args.mark_size,
+                      image_view_only=args.image_only,
+                      binning_ranges=np.array(args.bins, dtype=float),
+                      binning_colors=np.array(args.colors),
+                      binning_type_colors=np.array(args.class_colors),
+                      inf_bin_color=args.inf_color)
+            for scan_id, analysis_id in pairs]
+    if len({job.out_path for job in jobs}) != len(jobs):
+        if args.image_only:
+            raise SystemExit('--out must contain {scan} when rendering several scans')
+        raise SystemExit('--out must contain {scan} and {analysis} when rendering several pairs')
+    return jobs
+
+
+def run(args):
+    """Entry point of the render subcommand."""
+    if len(args.bins) != len(args.colors):
+        raise SystemExit('--bins and --colors must have the same number of values')
+    jobs = build_jobs(args)
+    if not jobs:
+        print('No matching scan/analysis pairs found in ' + args.db)
+        return
+    for out_path in render_many(jobs, args.workers):
+        print(out_path)
+
+
+def add_parser(subparsers):
+    """Register the render subcommand on the dfv argument parser."""
+    parser = subparsers.add_parser('render', help='render annotated mosaics without the GUI')
+    parser.add_argument('--db', required=True, help='nSpec database file')
+    parser.add_argument('--scans', required=True, help="directory containing the 'Scan_XXX' folders")
+    parser.add_argument('--scan', required=True, nargs='+', help='scan ID(s) to render')
+    parser.add_argument('--analysis', nargs='+', default=[],
+                        help='analysis ID(s) to render, default is every analysis of the scans')
+    parser.add_argument('--scale', type=int, default=1, help='image is scaled by dividing by this integer')
+    parser.add_argument('--out', default='mosaic_{scan}_{analysis}.png',
+                        help="output file, may use {sample}, {scan} and {analysis}, which is 'image' with --image-only")
+    parser.add_argument('--binning', choices=['size', 'class'], default='size', help='defect mark coloring')
+    parser.add_argument('--mark-size', type=float, default=3, help='defect mark radius in pixels')
+    parser.add_argument('--bins', nargs='*', type=float, default=list(core.DEFAULT_BINNING_RANGES),
+                        help='size bin ceilings in square microns')
+    parser.add_argument('--colors', nargs='*', default=list(core.DEFAULT_BINNING_COLORS),
+                        help='size bin colors, one per bin ceiling')
+    parser.add_argument('--class-colors', nargs='*', default=[],
+                        help='class bin colors, in DetectionClasses order')
+    parser.add_argument('--inf-color', default=core.DEFAULT_INF_BIN_COLOR, help='infinity bin color')
+    parser.add_argument('--image-only', action='store_true', help='render the mosaic without defects')
+    parser.add_argument('--workers', type=int, default=None, help='number of worker processes')
+    parser.set_defaults(func=run)
+    return parser
@@ -0,0 +1,385 @@
+"""
+dfv.repeaters
+-------------
+
+This module compares the defects of many analyses of a lot, which
+may be spread over several databases, on the shared device grid:
+
+    - repeaters: device positions (XinDevice, YinDevice) holding a
+      defect on several dies, of one wafer or across wafers, in the
+      same or a neighbouring cell
+    - adders: defects of a later scan without a defect on the same
+      die at the same device position in an earlier scan
+
+Device positions are hashed into a grid of cells, the side of a
+cell being the position tolerance in microns. Defects are streamed
+from the database a chunk at a time and reduced at once to the set
+of (die, cell) keys they occupy, so memory follows the number of
+occupied cells rather than the number of defects, and lots of tens
+of millions of defects can be processed. Defects without a DeviceID
+are skipped.
+
+Results are dicts of columns, shown as a mosaic overlay by the GUI
+or written as CSV tables from the command line:
+
+    $ python -m dfv repeaters --db A.db B.db --cell 10 --min-dies 3 --out repeaters.csv
+    $ python -m dfv adders --db A.db --earlier 7 --later 9 --cell 10 --out adders.csv
+
+Nothing in here imports tkinter.
+"""
+
+# repeaters.py imports
+import csv
+import sqlite3
+from contextlib import closing
+import numpy as np
+
+# custom modules
+from dfv import core
+from dfv import instrument
+
+SQL_DEVICE_DEFECTS = "SELECT DefectID, DeviceID, XinDevice, YinDevice FROM vwDefectsLegacy WHERE AnalysisID = ?;"
+DEVICE_COLUMNS = ('DefectID', 'DeviceID', 'XinDevice', 'YinDevice')  # columns of the rows streamed by device_rows
+
+DEFAULT_CELL = 10.0  # side of a grid cell in um, the position tolerance
+DEFAULT_MIN_DIES = 3  # dies a device position must hold a defect on to be a repeater
+LOT_CHUNK = 100000  # defect rows streamed at a time
+COMPACT_CHUNKS = 32  # chunks of keys gathered before they are reduced to unique keys again
+
+# a key packs the die (DeviceID) above the cell row above the cell column
+CELL_BITS = 21  # bits per cell coordinate
+CELL_OFFSET = 1 << (CELL_BITS - 1)  # keeps negative cell coordinates positive
+CELL_MASK = (1 << CELL_BITS) - 1
+POSITION_MASK = (1 << (2 * CELL_BITS)) - 1  # the cell row and column of a key, without the die
+
+
+class LotAnalysis:
+    """One analysis of the lot and the database holding it."""
+
+    def __init__(self, db_file, analysis_id, scan_id=None):
+        self.db_file = db_file  # database containing the analysis
+        self.analysis_id = str(analysis_id)
+        self.scan_id = None if scan_id is None else str(scan_id)
+
+
+def named_analyses(db_files, analysis_ids):
+    """Return the analyses of the given IDs in the databases, and the IDs found in none of them.
+
+    An ID found in several databases gives an analysis for each of them.
+    """
+    analyses = []
+    found = set()
+    for db_file in db_files:
+        with closing(sqlite3.connect(db_file)) as conn:
+            cur = conn.cursor()
+            for analysis_id in analysis_ids:
+                try:
+                    scan_id = core.analysis_scan_id(cur, analysis_id)
+                except ValueError:
+                    continue
+                analyses.append(LotAnalysis(db_file, analysis_id, scan_id))
+                found.add(analysis_id)
+    return analyses, [analysis_id for analysis_id in analysis_ids if analysis_id not in found]
+
+
+def lot_analyses(db_files):
+    """Return the last analysis of every scan of the databases, in database and then scan order."""
+    analyses = []
+    for db_file in db_files:
+        with closing(sqlite3.connect(db_file)) as conn:
+            cur = conn.cursor()
+            for scan_id in sorted(core.scan_ids(cur), key=int):
+                ids = core.analysis_ids(cur, scan_id)
+                if len(ids):
+                    analyses.append(LotAnalysis(db_file, ids[-1], scan_id))
+    return analyses
+
+
+def cell_keys(device, x, y, cell):
+    """Hash device positions into int64 keys of (die, cell row, cell column).
+
+    Parameters
+    ----------
+    device : numpy array
+        DeviceID of every defect.
+    x, y : numpy arrays of float
+        XinDevice and YinDevice of every defect, in um.
+    cell : float
+        Side of a grid cell in um.
+
+    Returns
+    -------
+    numpy array of int64
+        Key of every defect.
+    """
+    cx = np.floor(np.asarray(x) / cell).astype(np.int64) + CELL_OFFSET
+    cy = np.floor(np.asarray(y) / cell).astype(np.int64) + CELL_OFFSET
+    return (np.asarray(device).astype(np.int64) << (2 * CELL_BITS)) | (cy << CELL_BITS) | cx
+
+
+def cell_centers(keys, cell):
+    """Return the device position (x, y) in um of the center of the cells of keys."""
+    cx = (keys & CELL_MASK) - CELL_OFFSET
+    cy = ((keys >> CELL_BITS) & CELL_MASK) - CELL_OFFSET
+    return (cx + 0.5) * cell, (cy + 0.5) * cell
+
+
+def contains(sorted_keys, keys):
+    """Return a mask of the keys found in the sorted array sorted_keys."""
+    if len(sorted_keys) == 0:
+        return np.zeros(len(keys), dtype=bool)
+    pos = np.minimum(np.searchsorted(sorted_keys, keys), len(sorted_keys) - 1)
+    return sorted_keys[pos] == keys
+
+
+def near(sorted_keys, keys):
+    """Return a mask of the keys with the same die in their own or a neighbouring cell of sorted_keys."""
+    found = np.zeros(len(keys), dtype=bool)
+    for dy in (-1, 0, 1):
+        for dx in (-1, 0, 1):
+            found |= contains(sorted_keys, keys + (dy << CELL_BITS) + dx)
+    return found
+
+
+def neighbourhood(keys):
+    """Return the sorted unique keys of the own and the eight neighbouring cells of keys, same die."""
+    return sorted_unique(np.concatenate([keys + (dy << CELL_BITS) + dx for dy in (-1, 0, 1) for dx in (-1, 0, 1)]))
+
+
+def sorted_unique(keys):
+    """Return the sorted unique keys, a plain sort is quicker than np.unique on large int64 arrays."""
+    keys = np.sort(keys)
+    return keys[np.concatenate([[True], keys[1:] != keys[:-1]])] if len(keys) else keys
+
+
+def device_rows(analysis, chunk=LOT_CHUNK):
+    """Yield the DEVICE_COLUMNS of the defects of an analysis as float arrays, a chunk at a time.
+
+    Rows without a DeviceID or device position are dropped.
+    """
+    with closing(sqlite3.connect(analysis.db_file)) as conn:
+        for rows in core.stream_rows(conn.cursor(), 'device_defects', SQL_DEVICE_DEFECTS,
+                                     (analysis.analysis_id,), chunk):
+            rows = np.array(rows, dtype=float)  # NULL becomes nan
+            yield rows[~np.isnan(rows).any(axis=1)]
+
+
+def occupied_keys(analysis, cell=DEFAULT_CELL):
+    """Return the sorted unique (die, cell) keys holding a defect of an analysis."""
+    parts = []
+    for rows in device_rows(analysis):
+        parts.append(sorted_unique(cell_keys(rows[:, 1], rows[:, 2], rows[:, 3], cell)))
+        if len(parts) >= COMPACT_CHUNKS:
+            parts = [sorted_unique(np.concatenate(parts))]
+    return sorted_unique(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int64)
+
+
+@instrument.timed('repeaters')
+def find_repeaters(analyses, cell=DEFAULT_CELL, min_dies=DEFAULT_MIN_DIES, on_progress=None):
+    """Find the device positions holding a defect on several dies across the lot.
+
+    A die counts for a position when it has a defect in the cell of
+    the position or a neighbouring one, the tolerance of adder_rows.
+    Every cell holding a defect is a position, so a repeater straddling
+    a cell boundary is listed for the cells on either side.
+
+    Parameters
+    ----------
+    analyses : list of LotAnalysis
+        Analyses to compare, any number of databases.
+    cell : float, optional
+        Side of a grid cell in um, the position tolerance. The default is 10.
+    min_dies : int, optional
+        Dies over all analyses a position must be hit on. The default is 3.
+    on_progress : callable, optional
+        Called with (analyses done, number of analyses) after every analysis.
+
+    Returns
+    -------
+    dict
+        'key' position key (die bits zero), 'XinDevice' and 'YinDevice' cell center in um,
+        'dies' dies hit over all analyses, 'wafers' analyses with a hit and 'max_dies'
+        most dies hit in one analysis, for every repeater, most dies first.
+    """
+    positions = np.empty(0, dtype=np.int64)
+    dies = wafers = max_dies = np.empty(0, dtype=np.int64)
+    occupied = np.empty(0, dtype=bool)  # whether a defect lies in the cell of a position
+    for done, analysis in enumerate(analyses, start=1):
+        # dies near every device position of this analysis, merged into the lot totals
+        keys = occupied_keys(analysis, cell)
+        new_positions, new_dies = np.unique(neighbourhood(keys) & POSITION_MASK, return_counts=True)
+        new_occupied = contains(sorted_unique(keys & POSITION_MASK), new_positions)
+        merged, inverse = np.unique(np.concatenate([positions, new_positions]), return_inverse=True)
+        inverse = inverse.reshape(-1)
+        old, new = inverse[:len(positions)], inverse[len(positions):]
+        total = np.zeros(len(merged), dtype=np.int64)
+        total[old] += dies
+        total[new] += new_dies
+        hits = np.zeros(len(merged), dtype=np.int64)
+        hits[old] += wafers
+        hits[new] += 1
+        most = np.zeros(len(merged), dtype=np.int64)
+        most[old] = max_dies
+        most[new] = np.maximum(most[new], new_dies)
+        filled = np.zeros(len(merged), dtype=bool)
+        filled[old] = occupied
+        filled[new] |= new_occupied
+        positions, dies, wafers, max_dies, occupied = merged, total, hits, most, filled
+        if on_progress is not None:
+            on_progress(done, len(analyses))
+
+    keep = np.flatnonzero(occupied & (dies >= int(min_dies)))
+    keep = keep[np.argsort(-dies[keep], kind='stable')]
+    x, y = cell_centers(positions[keep], cell)
+    return {'key': positions[keep], 'XinDevice': x, 'YinDevice': y,
+            'dies': dies[keep], 'wafers': wafers[keep], 'max_dies': max_dies[keep]}
+
+
+def adder_rows(earlier, later, cell=DEFAULT_CELL):
+    """Yield the DEVICE_COLUMNS rows of the adders of a later analysis, a chunk at a time.
+
+    A defect of later is an adder when earlier has no defect on the
+    same die in its own or a neighbouring cell.
+    """
+    before = occupied_keys(earlier, cell)
+    for rows in device_rows(later):
+        keys = cell_keys(rows[:, 1], rows[:, 2], rows[:, 3], cell)
+        yield rows[~near(before, keys)]
+
+
+@instrument.timed('adders')
+def find_adders(earlier, later, cell=DEFAULT_CELL):
+    """Find the defects of a later analysis absent from an earlier one, see adder_rows.
+
+    Returns
+    -------
+    dict
+        Column of every name of DEVICE_COLUMNS, one entry per adder.
+    """
+    rows = np.concatenate(list(adder_rows(earlier, later, cell)) or [np.empty((0, len(DEVICE_COLUMNS)))])
+    columns = {name: rows[:, i] for i, name in enumerate(DEVICE_COLUMNS)}
+    columns['DefectID'] = columns['DefectID'].astype(np.int64)
+    columns['DeviceID'] = columns['DeviceID'].astype(np.int64)
+    return columns
+
+
+def defect_flags(defects, repeaters, before, cell=DEFAULT_CELL):
+    """Flag the defects of a ColumnTable that are repeaters or adders.
+
+    Parameters
+    ----------
+    defects : ColumnTable
+        Defect table of one analysis.
+    repeaters : dict
+        Result of find_repeaters.
+    before : numpy array of int64
+        occupied_keys of the earlier analysis, None when there is none.
+    cell : float, optional
+        Side of a grid cell in um, as used for repeaters and before.
+
+    Returns
+    -------
+    is_repeater, is_adder : numpy arrays of bool
+        Flag of every defect, defects without a DeviceID are neither.
+    """
+    device = defects['DeviceID']
+    valid = ~(np.isnan(device) | np.isnan(defects['XinDevice']) | np.isnan(defects['YinDevice']))
+    keys = cell_keys(np.where(valid, device, 0), np.where(valid, defects['XinDevice'], 0),
+                     np.where(valid, defects['YinDevice'], 0), cell)
+    is_repeater = valid & contains(np.sort(repeaters['key']), keys & POSITION_MASK)
+    is_adder = np.zeros(len(defects), dtype=bool) if before is None else valid & ~near(before, keys)
+    return is_repeater, is_adder
+
+
+@instrument.timed('lot_marks')
+def lot_marks(model, cell=DEFAULT_CELL, min_dies=DEFAULT_MIN_DIES):
+    """Compute the lot overlay of a loaded MosaicModel, the defects that are repeaters or adders.
+
+    Repeaters are found across the last analysis of every scan of
+    the database of the model, its own analysis standing in for its
+    scan. Adders are relative to the last analysis of the previous scan.
+    Only the defects kept by the defect filter of the model are shown
+    and counted, repeaters are still found from all defects of the lot.
+
+    Returns
+    -------
+    dict
+        'x' and 'y' mosaic coordinates and 'colors' of the repeaters and adders,
+        'counts' number of repeaters and adders, 'earlier' the analysis ID the
+        adders are relative to, None without a previous scan.
+    """
+    this = LotAnalysis(model.db_file, model.analysis_id, model.scan_id)
+    lot = [a for a in lot_analyses([model.db_file]) if a.scan_id != model.scan_id]
+    earlier = [a for a in lot if int(a.scan_id) < int(model.scan_id)]
+    found = find_repeaters(lot + [this], cell, min_dies)
+    before = occupied_keys(earlier[-1], cell) if earlier else None
+    is_repeater, is_adder = defect_flags(model.defects, found, before, cell)
+    is_adder &= ~is_repeater  # a defect on a repeater position is shown as a repeater
+    x, y = model.defect_mosaic_coords()
+    visible = model.visible_index()
+    if visible is not None:
+        x, y, is_repeater, is_adder = x[visible], y[visible], is_repeater[visible], is_adder[visible]
+    show = is_repeater | is_adder
+    colors = np.where(is_repeater, model.lot_colors[0], model.lot_colors[1]).astype(object)
+    return {'x': x[show], 'y': y[show], 'colors': colors[show],
+            'counts': [int(is_repeater.sum()), int(is_adder.sum())],
+            'earlier': earlier[-1].analysis_id if earlier else None}
+
+
+def write_csv(path, header, chunks):
+    """Write a CSV table from chunks of rows, returns the number of rows written."""
+    count = 0
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        for rows in chunks:
+            writer.writerows(rows)
+            count += len(rows)
+    return count
+
+
+def run_repeaters(args):
+    """Entry point of the repeaters subcommand."""
+    if args.analysis:
+        analyses, missing = named_analyses(args.db, args.analysis)
+        if missing:
+            print('Analysis IDs ' + ', '.join(missing) + ' not found in ' + ', '.join(args.db))
+            return
+    else:
+        analyses = lot_analyses(args.db)
+    found = find_repeaters(analyses, args.cell, args.min_dies,
+                           on_progress=lambda done, total: print(f"Analysis {done} of {total} done"))
+    del found['key']
+    count = write_csv(args.out, list(found), [list(zip(*(column.tolist() for column in found.values())))])
+    print(f"{count} repeaters in {len(analyses)} analyses written to {args.out}")
+
+
+def run_adders(args):
+    """Entry point of the adders subcommand, rows are written as they are found."""
+    earlier = LotAnalysis(args.db, args.earlier)
+    later = LotAnalysis(args.later_db or args.db, args.later)
+    chunks = ([(int(row[0]), int(row[1]), row[2], row[3]) for row in rows.tolist()]
+              for rows in adder_rows(earlier, later, args.cell))
+    count = write_csv(args.out, DEVICE_COLUMNS, chunks)
+    print(f"{count} adders of analysis {args.later} written to {args.out}")
+
+
+def add_parser(subparsers):
+    """Register the repeaters and adders subcommands on the dfv argument parser."""
+    parser = subparsers.add_parser('repeaters', help='find defects repeating at the same device position across a lot')
+    parser.add_argument('--db', required=True, nargs='+', help='nSpec database files of the lot')
+    parser.add_argument('--analysis', nargs='+', help='analysis IDs to compare, default is the last of every scan')
+    parser.add_argument('--out', required=True, help='output CSV file')
+    parser.add_argument('--cell', type=float, default=DEFAULT_CELL, help='position tolerance in um')
+    parser.add_argument('--min-dies', type=int, default=DEFAULT_MIN_DIES, help='dies a repeater is found on')
+    parser.set_defaults(func=run_repeaters)
+
+    parser = subparsers.add_parser('adders', help='find defects of a later scan absent from an earlier scan')
+    parser.add_argument('--db', required=True, help='nSpec database file of the earlier analysis')
+    parser.add_argument('--earlier', required=True, help='analysis ID of the earlier scan')
+    parser.add_argument('--later', required=True, help='analysis ID of the later scan')
+    parser.add_argument('--later-db', help='database file of the later analysis, default is --db')
+    parser.add_argument('--out', required=True, help='output CSV file')
+    parser.add_argument('--cell', type=float, default=DEFAULT_CELL, help='position tolerance in um')
+    parser.set_defaults(func=run_adders)
+    return parser
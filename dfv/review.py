@@ -0,0 +1,99 @@
+"""
+dfv.review
+----------
+
+This module orders the defects kept by the filter for a review,
+visiting them one after another by size, class or score, and tells
+which tiles come next so they can be decoded ahead of time.
+
+An ordering is the sorted index of its column from the defect
+filter, see dfv.query, with the defects the filter drops taken out,
+so changing the ordering of a 1M defect review costs one pass over
+the defects. Defects without a value come last in either direction.
+
+Nothing in here imports tkinter.
+"""
+
+# review.py imports
+import numpy as np
+
+# custom modules
+from dfv import instrument
+
+REVIEW_ORDERS = {'Size': 'Area', 'Class': 'ClassID', 'Score': 'Score'}  # ordering name -> defect column
+PRELOAD_TILES = 4  # tiles decoded ahead of the current defect
+PRELOAD_LEVELS = 1  # of these, tiles whose pyramid levels are built too, the costly part on a busy CPU
+
+
+class DefectSequence:
+    """Defects kept by the filter of a model in a review ordering, with a current position."""
+
+    def __init__(self, model, order='Size', descending=False):
+        self.model = model  # model holding the defects, its filter and sorted column indexes
+        self.order = order  # ordering name, a key of REVIEW_ORDERS
+        self.descending = descending  # largest value first
+        self.defects = np.empty(0, dtype=np.int64)  # defect table index of the defects in review order
+        self.position = 0  # position of the current defect in the review order
+        self.direction = 1  # direction of the last step, the tiles ahead are preloaded
+        self.set_order(order, descending)
+
+    def __len__(self):
+        return len(self.defects)
+
+    @instrument.timed('review.order')
+    def set_order(self, order, descending=False):
+        """Order the defects kept by the filter, the current defect stays current."""
+        current = self.current()
+        index, _, valid = self.model.defect_index().sorted_column(REVIEW_ORDERS[order])
+        if descending:
+            index = np.concatenate([index[:valid][::-1], index[valid:]])
+        mask = self.model.visible_mask()
+        self.defects = index if mask is None else index[mask[index]]
+        self.order = order
+        self.descending = descending
+        found = np.flatnonzero(self.defects == current) if current is not None else []
+        self.position = int(found[0]) if len(found) else 0
+
+    def current(self):
+        """Return the defect table index of the current defect, None when there are no defects."""
+        return int(self.defects[self.position]) if len(self.defects) else None
+
+    def step(self, count=1):
+        """Move by count defects, negative back, stopping at either end, and return the new current defect."""
+        if count:
+            self.direction = 1 if count > 0 else -1
+        self.position = min(max(self.position + count, 0), max(len(self.defects) - 1, 0))
+        return self.current()
+
+    def move_to(self, position):
+        """Make the defect at a position of the review order current and return it."""
+        return self.step(position - self.position)
+
+    def upcoming_tiles(self, count=PRELOAD_TILES):
+        """Return the image table index of the next count tiles in the direction of the last step.
+
+        Tiles are listed in the order they are reached, the tile of the current defect is left out.
+        """
+        tile_index = self.model.tile_index()
+        current = self.current()
+        if current is None:
+            return []
+        tiles = []
+        seen = {int(tile_index[current])}
+        position = self.position
+        # look ahead in blocks, consecutive defects often share a tile
+        block = max(4 * count, 16)
+        while len(tiles) < count and 0 <= position < len(self.defects):
+            if self.direction > 0:
+                ahead = self.defects[position + 1:position + 1 + block]
+                position += block
+            else:
+                ahead = self.defects[max(position - block, 0):position][::-1]
+                position -= block
+            for tile in tile_index[ahead]:
+                if int(tile) not in seen:
+                    seen.add(int(tile))
+                    tiles.append(int(tile))
+                    if len(tiles) == count:
+                        break
+        return tiles
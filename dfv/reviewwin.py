@@ -0,0 +1,116 @@
+"""
+dfv.reviewwin
+-------------
+
+This module provides defect review in one tile window: the defects
+kept by the filter are visited one after another in a chosen order,
+by size, class or score, each shown centred and zoomed in the same
+window. The tiles of the next defects are decoded and their pyramids
+built on the decode workers meanwhile, so a step mostly draws the
+defects of a tile already in memory. See dfv.review.
+
+Page Down or n steps to the next defect, Page Up or p to the previous.
+"""
+
+# reviewwin.py imports
+import tkinter as tk
+from tkinter import ttk
+
+# custom modules
+from dfv import review
+from dfv import tileclick
+
+
+class DefectReview:
+    """ Steps through the defects of one mosaic in a reused tile window """
+    def __init__(self, mosaic_creator):
+
+        self.mosaic_creator = mosaic_creator  # DefectReview instance holds instance of MosaicCreator
+        self.model = mosaic_creator.model  # model of the mosaic, holds the defects and the applied filter
+        self.scheduler = mosaic_creator.root.scheduler  # shared workers and tile cache, preloads the next tiles
+        self.sequence = review.DefectSequence(self.model)  # defects kept by the filter in review order
+        self.pending = 0  # steps asked for since the last shown defect, merged while tk is busy
+        self.step_after_id = None  # pending show of the defect reached by those steps
+        self.tile_window = None  # tile window reused for every defect
+
+        if len(self.sequence) == 0:
+            print('No defects to review, the filter keeps none')
+            return
+        self.show_current()
+        # the review keeps its window, mosaic clicks use the other windows of the pool
+        mosaic_creator.root.tile_windows.detach(self.tile_window)
+        review_window = self.tile_window.master
+        review_window.protocol('WM_DELETE_WINDOW', self.close)
+
+        # ordering and stepping controls below the tile
+        controls = tk.Frame(review_window)
+        controls.grid(row=1, column=0, sticky='ew')
+        tk.Label(controls, text='Order').grid(row=0, column=0)
+        self.order = tk.StringVar(controls, value=self.sequence.order)
+        order_box = ttk.Combobox(controls, textvariable=self.order, values=list(review.REVIEW_ORDERS),
+                                 state='readonly', width=8)
+        order_box.bind('<<ComboboxSelected>>', lambda event: self.reorder())
+        order_box.grid(row=0, column=1)
+        self.descending = tk.IntVar(controls, value=0)
+        tk.Checkbutton(controls, text='Descending', variable=self.descending, command=self.reorder
+                       ).grid(row=0, column=2)
+        button_previous = tk.Button(controls, text='Previous', width=10, command=lambda: self.step(-1))
+        button_next = tk.Button(controls, text='Next', width=10, command=lambda: self.step(1))
+        button_previous.grid(row=0, column=3)
+        button_next.grid(row=0, column=4)
+        self.position_label = tk.Label(controls, anchor='w')
+        self.position_label.grid(row=0, column=5, sticky='w')
+        self.update_position()
+
+        for key, count in (('<Next>', 1), ('n', 1), ('<Prior>', -1), ('p', -1)):
+            review_window.bind(key, lambda event, count=count: self.step(count))
+
+    def step(self, count):
+        """ Steps by count defects once tk is idle, steps asked for in between are merged """
+        self.pending += count
+        if self.step_after_id is None:
+            self.step_after_id = self.tile_window.after_idle(self.show_pending)
+
+    def show_pending(self):
+        """ Shows the defect reached by the pending steps """
+        self.step_after_id = None
+        count, self.pending = self.pending, 0
+        before = self.sequence.position
+        self.sequence.step(count)
+        if self.sequence.position != before:
+            self.show_current()
+        self.update_position()
+
+    def reorder(self):
+        """ Applies the chosen ordering, the current defect stays in view """
+        self.sequence.set_order(self.order.get(), bool(self.descending.get()))
+        self.preload()
+        self.update_position()
+
+    def show_current(self):
+        """ Shows the current defect in the tile window and preloads the tiles ahead of it """
+        defect = self.sequence.current()
+        clicked = tileclick.Clicked(self.mosaic_creator, None, image_index=int(self.model.tile_index()[defect]),
+                                    focus_defect=defect, tile_window=self.tile_window)
+        self.tile_window = clicked.tile_window
+        self.preload()
+
+    def preload(self):
+        """ Decodes the tiles of the next defects on the decode workers, with the pyramid levels of the nearest """
+        for i, image_index in enumerate(self.sequence.upcoming_tiles()):
+            self.scheduler.preload_tile(self.model.tile_path(image_index), levels=i < review.PRELOAD_LEVELS)
+
+    def update_position(self):
+        """ Shows the position in the review and the ordering value of the current defect """
+        defect = self.sequence.current()
+        column = review.REVIEW_ORDERS[self.sequence.order]
+        self.position_label.config(text=f'Defect {self.sequence.position + 1} of {len(self.sequence)}, '
+                                        f'{column} = {self.model.defects.text(defect, column)}')
+        self.tile_window.master.title(self.model.images['FileName'][self.model.tile_index()[defect]]
+                                      + ' || Review by ' + self.sequence.order)
+
+    def close(self):
+        """ Closes the review window """
+        if self.step_after_id is not None:
+            self.tile_window.after_cancel(self.step_after_id)
+        self.tile_window.close()
@@ -2,14 +2,22 @@
 import tkinter as tk
 from tkinter import ttk
 from tkinter import filedialog
-import os
-import sqlite3
-import numpy as np
 
 # custom modules
+from dfv import core
+from dfv import instrument
 from dfv import pdfshow
 from dfv import createmos
+from dfv import gallery
+from dfv import memory
+from dfv import memwin
+from dfv import scheduler
 from dfv import setroot
+from dfv import statswin
+from dfv import tileclick
+from dfv import watchdog
+
+MEMORY_CHECK_MS = 2000  # time between checks of the memory budget
 
 class Root:
     """ Class to create initial Root gui window """
@@ -19,14 +27,24 @@ class Root:
         self.root_wnd = tk.Tk()
         self.root_wnd.title('Defect Viewer v2.0')
         
+        # Root wraps a Session, which holds the actual choices independent of tk
+        self.session = core.Session()
+        # all mosaic windows load through one scheduler, sharing workers, connections and cached images
+        self.scheduler = scheduler.Scheduler()
+        # tile windows of all mosaics, a bounded number reused click after click
+        self.tile_windows = tileclick.TileWindowPool()
+        # large buffers of all windows are accounted here, cold ones are evicted over the memory budget
+        self.memory = memory.MemoryManager()
+        self.memory.register(self.memory.new_owner('Shared caches'), 'mosaic images',
+                             lambda: self.scheduler.cache_bytes, self.scheduler.drop_cache)
+        self.memory.register('Shared caches', 'preloaded tiles', self.scheduler.idle_tile_bytes,
+                             self.scheduler.drop_idle_tiles)
+
         # instance variable initialization
-        self.scan_options = np.array(['Select Choice'])  # list of scan IDs to choose from
-        self.analysis_options = np.array(['Select Choice'])  # list of analysis IDs to choose from
-        self.img_loc = None  # path to folder containing images for specific scan
         self.scan_dir = tk.StringVar()  # path to folder containing all scan folders
         self.db_file = tk.StringVar()  # path to database file
-        self.scan_id = tk.StringVar(self.root_wnd, value = self.scan_options[0])  # specific scan ID to plot
-        self.ana_id = tk.StringVar(self.root_wnd, value = self.analysis_options[0])  # specific analysis ID to draw defects from
+        self.scan_id = tk.StringVar(self.root_wnd, value='Select Choice')  # specific scan ID to plot
+        self.ana_id = tk.StringVar(self.root_wnd, value='Select Choice')  # specific analysis ID to draw defects from
         self.image_scale = tk.StringVar()  # image is scaled by dividing by this variable (integer)
         self.scan_dir_entry = None  # will be defined as text entry field for scan directory
         self.db_file_entry = None  # will be defined as text entry field for database file location
@@ -34,16 +52,22 @@ class Root:
         self.ana_id_select = None  # will be defined as the options menu to select analysis ID choice
         self.image_view_only = None  # variable to hold checkbox choice whether to plot defects or images alone
         self.save_pdf_imgs = None  # variable to capture image output from ShowPdf (instructions manual)
-        self.binning_ranges = np.array([16000, 32000, 64000, 112000, 160000]) # set bin size ranges to arbitrary values
-        self.binning_colors = np.array(['aqua', 'chartreuse3', 'royalblue3', 'goldenrod1', 'magenta3']) # set bin colors to arbitrary values
-        self.inf_bin_color = 'red'  # set infinity bin color to arbitrary value
+        self.watchdog = None  # GUI latency monitor, only when enabled
+        self.memory_after_id = None  # pending memory budget check
         
         self.main_root_window()  # call function to modify root window
+
+        # monitor the responsiveness of the GUI if requested
+        if watchdog.ENABLED:
+            self.watchdog = watchdog.Watchdog(self.root_wnd)
+            self.watchdog.start()
+        self.check_memory()
         
     def main_root_window(self):
         """ Modify the main root window """
 
         self.scan_id.trace('w', self.scan_select)  # cause scan selection to update analysis option menu
+        self.ana_id.trace('w', self.analysis_select)  # keep the session analysis ID in sync with the menu
 
         # button to open embedded pdf of software manual
         button_open_instruct = tk.Button(self.root_wnd, text='?', width=3, command=self.open_instructions)
@@ -61,12 +85,12 @@ class Root:
         
         # dropdown menu to select scan ID
         tk.Label(self.root_wnd, text='Scan ID').grid(row=3, column=0, columnspan=1)
-        self.scan_id_select = ttk.OptionMenu(self.root_wnd, self.scan_id, *self.scan_options)
+        self.scan_id_select = ttk.OptionMenu(self.root_wnd, self.scan_id, 'Select Choice')
         self.scan_id_select.grid(row=3, column=2, columnspan=1, sticky='w')
         
         # dropdown menu to select analysis ID
         tk.Label(self.root_wnd, text='Analysis ID').grid(row=4, column=0, columnspan=1)
-        self.ana_id_select = ttk.OptionMenu(self.root_wnd, self.ana_id, *self.analysis_options)
+        self.ana_id_select = ttk.OptionMenu(self.root_wnd, self.ana_id, 'Select Choice')
         self.ana_id_select.grid(row=4, column=2, columnspan=1, sticky='w')
         
         # text field to enter image scale reduction factor
@@ -101,9 +125,29 @@ class Root:
         
         # these two buttons either plot using the input info, or close out of the software
         button_plot = tk.Button(self.root_wnd, text='Plot', width=10, command=self.call_mosaic_creator)
-        button_close = tk.Button(self.root_wnd, text='Close', width=10, command=self.root_wnd.destroy)
+        button_close = tk.Button(self.root_wnd, text='Close', width=10, command=self.close)
         button_plot.grid(row=6, column=4, columnspan=1)
         button_close.grid(row=7, column=4, columnspan=1)
+        self.root_wnd.protocol('WM_DELETE_WINDOW', self.close)
+
+        # this button opens the mosaic of every scan in the database at once, for lot review
+        button_open_lot = tk.Button(self.root_wnd, text='Open Lot', width=10, command=self.call_lot_mosaics)
+        button_open_lot.grid(row=5, column=4, columnspan=1)
+
+        # this button opens thumbnails of every scan in the database, for quick lot triage
+        button_gallery = tk.Button(self.root_wnd, text='Lot Gallery', width=10, command=self.open_gallery)
+        button_gallery.grid(row=7, column=3, columnspan=1)
+
+        # this button opens a live report of the memory held by every window
+        button_memory = tk.Button(self.root_wnd, text='Memory', width=10,
+                                  command=lambda: memwin.MemoryWindow(self.memory))
+        button_memory.grid(row=8, column=3, columnspan=1)
+
+        # when profiling, show the live timings window and a button to reopen it
+        if instrument.ENABLED:
+            button_timings = tk.Button(self.root_wnd, text='Timings', width=10, command=statswin.StatsWindow)
+            button_timings.grid(row=8, column=4, columnspan=1)
+            statswin.StatsWindow()
         
     def open_instructions(self):
         """ Displays an embedded pdf of the instruction manual """
@@ -120,46 +164,59 @@ class Root:
     
     def call_mosaic_creator(self):
         """ Creates instance of MosaicCreator which initiates mosaic plotting """
+        self.session.image_scale = self.image_scale.get()
+        self.session.image_view_only = bool(self.image_view_only.get())
         # check that all required fields are filled
-        if self.ana_id.get() == 'Select Choice' or self.scan_id.get() == 'Select Choice' or not self.image_scale.get().isdigit():
+        if not self.session.ready_to_plot():
             print('Please select a Scan ID, Analysis ID, and enter an integer for Image Scale before plotting')
         else:
             createmos.MosaicCreator(self)  # pass instance of Root to MosaicCreator
 
+    def call_lot_mosaics(self):
+        """ Opens a MosaicCreator for every scan, all loading in parallel """
+        self.session.image_scale = self.image_scale.get()
+        self.session.image_view_only = bool(self.image_view_only.get())
+        # check that all required fields are filled
+        if not self.session.ready_to_plot_lot():
+            print('Please set the image and DB paths, and enter an integer for Image Scale before opening a lot')
+        else:
+            # each scan shows its last analysis, the scheduler limits how many load at the same time
+            for model in self.session.lot_models():
+                createmos.MosaicCreator(self, model)
+
+    def open_gallery(self):
+        """ Opens a gallery of wafer map thumbnails of every scan """
+        if len(self.session.scan_options) == 0:
+            print('Please set the image and DB paths before opening the lot gallery')
+        else:
+            gallery.Gallery(self)  # pass instance of Root to Gallery
+
+    def check_memory(self):
+        """ Evicts cold buffers while the windows hold more than the memory budget, checked periodically """
+        self.memory.enforce()
+        self.memory_after_id = self.root_wnd.after(MEMORY_CHECK_MS, self.check_memory)
+
+    def close(self):
+        """ Closes the software, dropping any mosaic loading still queued """
+        self.root_wnd.after_cancel(self.memory_after_id)
+        self.scheduler.shutdown()
+        self.root_wnd.destroy()
+
     def analysis_props(self):
         """ Displays analysis properties from currently selected analysis ID """
         if self.ana_id.get() == 'Select Choice':
             print('Please select an analysis ID first')
-        else:    
-            # connect to the database file
-            conn = sqlite3.connect(self.db_file_entry.get())
-            cur = conn.cursor()
-
-            # sql query used to retrieve scan info
-            sql_cmd_ana_prop = "SELECT * FROM AnalysisProperties WHERE AnalysisID = ?;"
-            sql_cmd_analysis = "SELECT * FROM Analysis WHERE AnalysisID = ?;"
-            sql_cmd_analyzer = "SELECT * FROM Analyzers;"
-
-            ana_prop_info = np.array(cur.execute(sql_cmd_ana_prop, (str(self.ana_id.get()),)).fetchall())  # fetch all data from Analysis Properties table
-            analysis_info = np.array(cur.execute(sql_cmd_analysis, (str(self.ana_id.get()),)).fetchall())  # fetch all data from Analysis table
-            analyzer_info = np.array(cur.execute(sql_cmd_analyzer).fetchall())  # fetch all data from Analyzers table
+        else:
+            prop_list = self.session.analysis_properties()  # (label, value) pairs of the properties of interest
 
             # create the properties window
             ana_prop_window = tk.Toplevel()
             ana_prop_window.title('Analysis Properties')
 
-            # retrieve properties of interest
-            analyzer_type = analyzer_info[np.where(analyzer_info[:, 0] == analysis_info[0][3])[0][0], 3]
-            num_defects = analysis_info[0][10]
-
-            prop_list = [analyzer_type, num_defects]  # place property variables into list
-
-            output_labels = np.array(['Analyzer Type', 'Number of Defects'])  # property labels of interest in user-friendly form
-
             # create all labels and corresponding values
-            for idx, label in enumerate(output_labels):
+            for idx, (label, value) in enumerate(prop_list):
                 tk.Label(ana_prop_window, text=f"{label:<30}").grid(row=2 * idx, column=0, columnspan=1, sticky='w')
-                tk.Label(ana_prop_window, text=prop_list[idx]).grid(row=2 * idx, column=1, columnspan=1, sticky='w')
+                tk.Label(ana_prop_window, text=value).grid(row=2 * idx, column=1, columnspan=1, sticky='w')
                 ttk.Separator(ana_prop_window, orient='horizontal').grid(row=2 * idx + 1, column=0, columnspan=2, sticky='ew')
 
             # button to close window
@@ -170,49 +227,22 @@ class Root:
         """ Displays scan properties from currently selected scan ID """
         if self.scan_id.get() == 'Select Choice':
             print('Please select a scan ID first')
-        else:    
-            # connect to the database file
-            conn = sqlite3.connect(self.db_file_entry.get())
-            cur = conn.cursor()
-
-            sql_cmd_scn_prop = "SELECT * FROM ScanProperties WHERE ScanID = ?;"  # sql query used to retrieve scan info
-    
-            scan_prop_info = np.array(cur.execute(sql_cmd_scn_prop, (str(self.scan_id.get()),)).fetchall())  # fetch all data from Scan Properties table
+        else:
+            prop_list = self.session.scan_properties()  # (label, value) pairs of the properties of interest
 
             # create the properties window
             scan_prop_window = tk.Toplevel()
             scan_prop_window.title('Scan Properties')
-            
-            # retrieve the properties of interest
-            sample_id = scan_prop_info[np.where(scan_prop_info == "SampleID")[0][0], np.where(scan_prop_info == "SampleID")[1][0] + 1]
-            lot_id = scan_prop_info[np.where(scan_prop_info == "LotID")[0][0], np.where(scan_prop_info == "LotID")[1][0] + 1]
-            job_name = scan_prop_info[np.where(scan_prop_info == "JobName")[0][0], np.where(scan_prop_info == "JobName")[1][0] + 1]
-            auto_focus_set = scan_prop_info[np.where(scan_prop_info == "Autofocus Set")[0][0], np.where(scan_prop_info == "Autofocus Set")[1][0] + 1]
-            num_tiles = scan_prop_info[np.where(scan_prop_info == "Golden Tile Tiles per Device")[0][0], np.where(scan_prop_info == "Golden Tile Tiles per Device")[1][0] + 1]
-            num_devices = scan_prop_info[np.where(scan_prop_info == "Golden Tile Number of Devices")[0][0], np.where(scan_prop_info == "Golden Tile Number of Devices")[1][0] + 1]
-            scan_width_mic = scan_prop_info[np.where(scan_prop_info == "Scan Width Microns")[0][0], np.where(scan_prop_info == "Scan Width Microns")[1][0] + 1]
-            scan_height_mic = scan_prop_info[np.where(scan_prop_info == "Scan Height Microns")[0][0], np.where(scan_prop_info == "Scan Height Microns")[1][0] + 1]
-            die_width_mic = scan_prop_info[np.where(scan_prop_info == "DieWidth")[0][0], np.where(scan_prop_info == "DieWidth")[1][0] + 1]
-            die_height_mic = scan_prop_info[np.where(scan_prop_info == "DieHeight")[0][0], np.where(scan_prop_info == "DieHeight")[1][0] + 1]
 
-            # place property variables into list
-            prop_list = [sample_id, lot_id, job_name, auto_focus_set, num_tiles, num_devices, scan_width_mic,
-                        scan_height_mic, die_width_mic, die_height_mic]
-            
-            # property labels of interest in user-friendly form
-            output_labels = np.array(['Sample ID', 'Lot ID', 'Job Name', 'Autofocus Set', 'Tiles per Device',
-                                   'Number of Devices', 'Scan Width (Microns)', 'Scan Height (Microns)',
-                                   'Die Width (Microns)', 'Die Height (Microns)'])
-            
             # create all labels and corresponding values
-            for idx, label in enumerate(output_labels):
+            for idx, (label, value) in enumerate(prop_list):
                 tk.Label(scan_prop_window, text=f"{label:<30}").grid(row=2 * idx, column=0, columnspan=1, sticky='w')
-                tk.Label(scan_prop_window, text=prop_list[idx]).grid(row=2 * idx, column=1, columnspan=1, sticky='w')
+                tk.Label(scan_prop_window, text=value).grid(row=2 * idx, column=1, columnspan=1, sticky='w')
                 ttk.Separator(scan_prop_window, orient='horizontal').grid(row=2 * idx + 1, column=0, columnspan=2, sticky='ew')
 
             # button to close window
             button_close = tk.Button(scan_prop_window, text='Close', width=10, command=scan_prop_window.destroy)
-            button_close.grid(row=2 * len(output_labels) + 1, column=1, columnspan=1)
+            button_close.grid(row=2 * len(prop_list) + 1, column=1, columnspan=1)
     
     def set_paths(self):
         """ Sets the currently input database and image directory paths
@@ -227,33 +257,18 @@ class Root:
         scan_menu = self.scan_id_select["menu"]
         scan_menu.delete(0, "end")
         
-        # check validity of inputs
-        if self.scan_dir_entry.get() == '' or self.db_file_entry.get() == '':
-            print('Please fill out filepath fields first')
-            return
-        if not any(x.startswith('Scan_') for x in os.listdir(self.scan_dir_entry.get() + '/')):
-            print('Scans Directory must contain image folders with naming convention \'Scan_XXX\'')
+        # check validity of inputs and load the scan IDs from the database file
+        try:
+            self.session.set_paths(self.scan_dir_entry.get(), self.db_file_entry.get())
+        except ValueError as e:
+            print(e)
             return
-        if self.db_file_entry.get().split('.db')[0].split('/')[-1] != self.scan_dir_entry.get().split('/')[-1]:
+        if not self.session.names_match():
             print('WARNING: Scans Directory and Database File names do not match one another')
             print('Consider reviewing selections before proceeding, or error may occur')
         
-        # connect to the currently selected database file
-        conn = sqlite3.connect(self.db_file_entry.get())
-        cur = conn.cursor()
-
-        # sql queries used to retrieve scan info
-        sql_cmd_scn = "SELECT * FROM Scans;"
-        sql_cmd_scn_prop = "SELECT * FROM ScanProperties"
-
-        scans_info = np.array(cur.execute(sql_cmd_scn).fetchall())  # fetch all data from Scans table
-        scan_prop_info = np.array(cur.execute(sql_cmd_scn_prop).fetchall())  # fetch all data from Scan Properties table
-        
-        # get all of the scan IDs
-        self.scan_options = scans_info[:,0]
-        
         # update the scan ID option menu with choices
-        for string in self.scan_options:
+        for string in self.session.scan_options:
             scan_menu.add_command(label=string, command=lambda value=string: self.scan_id.set(value))
         
     def scan_select(self, *args):
@@ -261,26 +276,22 @@ class Root:
         self.ana_id.set('Select Choice')  # update analysis input variable to default
         # disable running any functionality when Scan ID has not been selected yet 
         if self.scan_id.get() != 'Select Choice':
-            # set the location of the folder containing the scanned images for the chosen Scan ID
-            scans_directory = self.scan_dir_entry.get() + '/'
-            self.img_loc = scans_directory + 'Scan_' + f"{int(self.scan_id.get()):03d}"
-            
-            # connect to the currently selected database file
-            conn = sqlite3.connect(self.db_file_entry.get())
-            cur = conn.cursor()
-
-            sql_cmd_anly = "SELECT * FROM Analysis"  # sql queries used to retrieve analysis info
-
-            analysis_info = np.array(cur.execute(sql_cmd_anly).fetchall())  # fetch all data from Analysis table
-
-            self.analysis_options = (analysis_info[analysis_info[:, 4] == self.scan_id.get()])[:, 0]  # filter list for Analysis IDs corresponding to the chosen Scan ID
+            # sets the folder containing the scanned images and finds the Analysis IDs of the chosen Scan ID
+            self.session.select_scan(self.scan_id.get())
 
             # update the analysis ID option menu with choices
             menu = self.ana_id_select["menu"]
             menu.delete(0, "end")
-            for string in self.analysis_options:
+            for string in self.session.analysis_options:
                 menu.add_command(label=string, command=lambda value=string: self.ana_id.set(value))
         
+    def analysis_select(self, *args):
+        """ Passes the analysis chosen from its dropdown on to the session """
+        if self.ana_id.get() == 'Select Choice':
+            self.session.select_analysis(None)
+        else:
+            self.session.select_analysis(self.ana_id.get())
+
     def browse_file(self):
         """ Opens file explorer for file selection """       
         filename = filedialog.askopenfilename(filetypes=(("db files", "*.db"),))
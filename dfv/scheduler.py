@@ -0,0 +1,330 @@
+"""
+dfv.scheduler
+-------------
+
+This module shares loading resources between all mosaic windows of
+a session, so opening many wafers at once (e.g. a whole lot) runs in
+parallel without multiplying peak memory:
+
+    - a fixed number of decode workers, for mosaic decodes and defect placement
+    - a fixed number of database workers, reusing one pool of connections per database
+    - a memory budget, decodes wait while their full resolution image
+      would not fit next to the decodes already running
+    - a cache of resized mosaic images, shared by every window showing
+      the same scan at the same image scale and kept within the budget
+    - a cache of the last tile image pyramids opened or preloaded, so
+      stepping through defects finds the next tiles already decoded,
+      their reduced levels are built afterwards by one more worker so
+      that decodes never wait behind them
+
+Memory held by the caches is reported to dfv.memory through
+cache_bytes and idle_tile_bytes, and released with drop_cache and
+drop_idle_tiles when the session goes over its memory budget.
+
+MosaicLoader uses a Scheduler when given one. Nothing in here
+imports tkinter.
+"""
+
+# scheduler.py imports
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from PIL import Image
+
+# custom modules
+from dfv import core
+from dfv import imaging
+from dfv import instrument
+
+DEFAULT_DECODE_WORKERS = 2  # mosaics decoded at the same time
+DEFAULT_DB_WORKERS = 4  # database stages run at the same time
+DEFAULT_MEMORY_BUDGET = 2 * 1024**3  # bytes for decodes in progress and cached mosaic images
+DEFAULT_TILE_CACHE = 8  # tile pyramids kept, the open tile and the ones preloaded ahead of it
+
+
+def image_bytes(size, mode):
+    """Bytes taken by a decoded image of the given size and mode."""
+    return size[0] * size[1] * Image.getmodebands(mode)
+
+
+def open_tile(path):
+    """Decode a tile image into a pyramid, its reduced levels are built on first use."""
+    with instrument.timer('scheduler.tile_open'):
+        return imaging.LazyPyramid(Image.open(path))
+
+
+def decode_bytes(img_loc, image_scale):
+    """Estimate the peak memory of decoding and resizing the mosaic of a scan, reading only its header."""
+    with Image.open(core.find_mosaic_image(img_loc)) as image:
+        scale = int(image_scale)
+        resized = (round(image.width / scale), round(image.height / scale))
+        return image_bytes(image.size, image.mode) + image_bytes(resized, image.mode)
+
+
+class Scheduler:
+    """Worker pools, database connections and mosaic image cache shared by all mosaic loads."""
+
+    def __init__(self, decode_workers=DEFAULT_DECODE_WORKERS, db_workers=DEFAULT_DB_WORKERS,
+                 memory_budget=DEFAULT_MEMORY_BUDGET, tile_cache=DEFAULT_TILE_CACHE):
+        """Create the shared pools, worker threads start on first use.
+
+        Parameters
+        ----------
+        decode_workers : int, optional
+            Mosaic decodes and defect placements run at the same time. The default is 2.
+        db_workers : int, optional
+            Database stages run at the same time. The default is 4.
+        memory_budget : int, optional
+            Bytes for decodes in progress plus cached mosaic images. The default is 2 GB.
+        tile_cache : int, optional
+            Tile image pyramids kept. The default is 8.
+
+        Returns -> None.
+        """
+        self.decode_pool = ThreadPoolExecutor(max_workers=decode_workers, thread_name_prefix='dfv-decode')
+        self.db_pool = ThreadPoolExecutor(max_workers=db_workers, thread_name_prefix='dfv-db')
+        self.level_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='dfv-levels')  # tile pyramid levels
+        self.memory_budget = memory_budget  # limit of reserved plus cached bytes
+        self.reserved = 0  # bytes reserved by decodes in progress
+        self.cache = OrderedDict()  # (img_loc, image_scale) -> (image, source_size, bytes), least recently used first
+        self.cache_bytes = 0  # bytes held by the cache
+        self.pending = {}  # (img_loc, image_scale) -> Future of a decode in progress, shared by all waiting on it
+        self.tile_cache = tile_cache  # limit of the tile pyramids kept
+        self.tiles = OrderedDict()  # tile path -> Future of its imaging.LazyPyramid, least recently used first
+        self.tile_users = {}  # tile path -> tile windows showing its pyramid, their memory is theirs
+        self.connections = {}  # db file -> idle connections
+        self.lock = threading.Condition()  # guards all of the above
+
+    @contextmanager
+    def connection(self, db_file):
+        """Borrow a connection to db_file, it is returned to the pool afterwards."""
+        with self.lock:
+            idle = self.connections.setdefault(db_file, [])
+            conn = idle.pop() if idle else None
+        if conn is None:
+            conn = sqlite3.connect(db_file, check_same_thread=False)
+            instrument.count('scheduler.connections')
+        try:
+            yield conn
+        finally:
+            with self.lock:
+                self.connections.setdefault(db_file, []).append(conn)
+
+    def mosaic_image(self, img_loc, image_scale, check=None):
+        """Return the resized mosaic image of a scan and its native size, decoding it at most once.
+
+        Parameters
+        ----------
+        img_loc : string
+            Folder containing the scanned images for one scan.
+        image_scale : int
+            The image is scaled by dividing its size by this value.
+        check : callable, optional
+            Called while waiting for memory, raises to abandon the decode.
+
+        Returns
+        -------
+        image : PIL image
+            Resized mosaic image, shared, must not be modified.
+        source_size : tuple of int
+            Native (width, height) of the mosaic image.
+        """
+        key = (img_loc, int(image_scale))
+        with self.lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                instrument.count('scheduler.cache_hits')
+                image, source_size, _ = self.cache[key]
+                return image, source_size
+            future = self.pending.get(key)
+            owner = future is None
+            if owner:
+                future = self.pending[key] = Future()
+        if not owner:
+            return future.result()  # another window is decoding the same mosaic
+
+        try:
+            nbytes = decode_bytes(img_loc, image_scale)
+            self.reserve(nbytes, check)
+            try:
+                image, source_size = core.load_mosaic_image(img_loc, image_scale)
+            finally:
+                self.release(nbytes)
+            self.add_to_cache(key, image, source_size)
+        except BaseException as e:
+            with self.lock:
+                del self.pending[key]
+            future.set_exception(e)
+            raise
+        with self.lock:
+            del self.pending[key]
+        future.set_result((image, source_size))
+        return image, source_size
+
+    def reserve(self, nbytes, check=None):
+        """Wait until nbytes fit in the memory budget and reserve them, evicting cached images as needed.
+
+        A decode larger than the whole budget still runs, alone.
+        """
+        with self.lock:
+            while True:
+                self.evict(self.memory_budget - self.reserved - nbytes)
+                if self.reserved == 0 or self.reserved + self.cache_bytes + nbytes <= self.memory_budget:
+                    break
+                instrument.count('scheduler.memory_waits')
+                self.lock.wait(0.1)
+                if check is not None:
+                    check()
+            self.reserved += nbytes
+
+    def release(self, nbytes):
+        """Give back memory reserved by reserve()."""
+        with self.lock:
+            self.reserved -= nbytes
+            self.lock.notify_all()
+
+    def add_to_cache(self, key, image, source_size):
+        """Cache a resized mosaic image, evicting older ones to stay within the budget."""
+        nbytes = image_bytes(image.size, image.mode)
+        with self.lock:
+            self.evict(self.memory_budget - self.reserved - nbytes)
+            if self.reserved + self.cache_bytes + nbytes <= self.memory_budget:
+                self.cache[key] = (image, source_size, nbytes)
+                self.cache_bytes += nbytes
+
+    def evict(self, limit):
+        """Drop least recently used images until the cache holds at most limit bytes, lock must be held."""
+        while self.cache and self.cache_bytes > limit:
+            _, (_, _, nbytes) = self.cache.popitem(last=False)
+            self.cache_bytes -= nbytes
+            instrument.count('scheduler.evictions')
+
+    def drop_cache(self):
+        """Drop every cached mosaic image, e.g. over the memory budget of the session."""
+        with self.lock:
+            self.evict(0)
+
+    def tile_pyramid(self, path):
+        """Return the image pyramid of a tile, waiting for its preload or opening it now.
+
+        The tile counts as shown until release_tile(path).
+
+        Returns
+        -------
+        imaging.LazyPyramid
+            Pyramid of the tile, shared, its native image is decoded.
+        """
+        with self.lock:
+            future = self.tiles.get(path)
+            if future is not None:
+                self.tiles.move_to_end(path)
+        if future is not None:
+            try:
+                pyramid = future.result()
+                instrument.count('scheduler.tile_hits')
+                with self.lock:
+                    self.tile_users[path] = self.tile_users.get(path, 0) + 1
+                return pyramid
+            except (CancelledError, Exception):
+                pass  # the preload failed, open the tile here to report why
+        pyramid = open_tile(path)
+        future = Future()
+        future.set_result(pyramid)
+        with self.lock:
+            self.tiles[path] = future
+            self.tiles.move_to_end(path)
+            self.tile_users[path] = self.tile_users.get(path, 0) + 1
+            self.evict_tiles()
+        return pyramid
+
+    def release_tile(self, path):
+        """Tell that a tile window no longer shows the pyramid of a tile taken with tile_pyramid."""
+        with self.lock:
+            users = self.tile_users.get(path, 0) - 1
+            if users > 0:
+                self.tile_users[path] = users
+            else:
+                self.tile_users.pop(path, None)
+
+    def idle_tiles(self):
+        """Return {path: pyramid} of the decoded tile pyramids cached but not shown, lock must be held."""
+        return {path: future.result() for path, future in self.tiles.items()
+                if path not in self.tile_users and future.done() and not future.cancelled()
+                and future.exception() is None}
+
+    def idle_tile_bytes(self):
+        """Return the bytes held by the tile pyramids cached but not shown, e.g. preloaded ones."""
+        with self.lock:
+            pyramids = list(self.idle_tiles().values())
+        return sum(pyramid.nbytes for pyramid in pyramids)
+
+    def drop_idle_tiles(self):
+        """Drop the tile pyramids cached but not shown, they are decoded again when next opened."""
+        with self.lock:
+            for path in self.idle_tiles():
+                del self.tiles[path]
+                instrument.count('scheduler.tile_evictions')
+
+    def preload_tile(self, path, levels=True):
+        """Decode a tile on a decode worker, unless it is cached or on its way.
+
+        Parameters
+        ----------
+        path : string
+            Directory filepath to the tile image.
+        levels : bool, optional
+            Also build its pyramid levels once decoded. The default is True.
+
+        Returns -> None.
+        """
+        with self.lock:
+            if path not in self.tiles:
+                self.tiles[path] = self.decode_pool.submit(open_tile, path)
+                instrument.count('scheduler.tile_preloads')
+                self.evict_tiles()
+        if levels:
+            self.build_levels(path)
+
+    def build_levels(self, path):
+        """Build every pyramid level of a cached tile on the level worker, skipped once the tile is evicted."""
+        def build():
+            with self.lock:
+                future = self.tiles.get(path)
+            if future is None:
+                return
+            try:
+                pyramid = future.result()  # waits for a preload still decoding
+            except (CancelledError, Exception):
+                return
+            pyramid.build_all()
+
+        try:
+            self.level_pool.submit(build)
+        except RuntimeError:
+            pass  # shut down
+
+    def evict_tiles(self):
+        """Drop least recently used tile pyramids beyond the tile cache size, lock must be held.
+
+        A pyramid still shown by a tile window stays alive through it, a preload not started is cancelled.
+        """
+        while len(self.tiles) > self.tile_cache:
+            _, future = self.tiles.popitem(last=False)
+            future.cancel()
+            instrument.count('scheduler.tile_evictions')
+
+    def shutdown(self):
+        """Drop queued work, close idle connections and empty the cache, running stages still finish."""
+        self.decode_pool.shutdown(wait=False, cancel_futures=True)
+        self.db_pool.shutdown(wait=False, cancel_futures=True)
+        self.level_pool.shutdown(wait=False, cancel_futures=True)
+        with self.lock:
+            for idle in self.connections.values():
+                for conn in idle:
+                    conn.close()
+            self.connections.clear()
+            self.evict(0)
+            self.tiles.clear()
+            self.tile_users.clear()
@@ -0,0 +1,97 @@
+"""
+dfv.selwin
+----------
+
+This module provides the window of a defect selection made on the
+mosaic with a rectangle or a lasso: aggregate statistics of the
+selected defects, a table of them sortable by any column, and the
+tiles of the chosen rows opened all at once. The table is the
+virtual defect table of dfv.tablewin, so any selection size works.
+"""
+
+# selwin.py imports
+import tkinter as tk
+from tkinter import ttk
+import numpy as np
+
+# custom modules
+from dfv import query
+from dfv import tablewin
+from dfv import tileclick
+
+MAX_TILES = tileclick.MAX_TILE_WINDOWS  # tiles opened at once, one per tile window
+
+
+class Selection:
+    """ Statistics and table of the defects selected on one mosaic """
+    def __init__(self, mosaic_creator, defect_index):
+
+        self.mosaic_creator = mosaic_creator  # Selection instance holds instance of MosaicCreator
+        self.model = mosaic_creator.model  # model of the mosaic, holds the defect table
+        self.defect_index = defect_index  # defect table index of the selected defects
+
+        # column values of the selection, looked up once
+        tile = self.model.tile_index()[defect_index]
+        self.values = {'Class': self.model.defects['ClassID'][defect_index]}
+        for name in query.RANGE_COLUMNS:
+            self.values[name] = self.model.defects[name][defect_index]
+        self.tiles = tile  # image table index of the tile of every selected defect
+
+        self.selection_window = tk.Toplevel()
+        self.selection_window.title('Defect Selection || Analysis ID = ' + self.model.analysis_id)
+
+        # aggregate statistics of the selection
+        num_tiles = len(np.unique(tile))
+        tk.Label(self.selection_window, text=f'{len(defect_index)} defects selected on {num_tiles} tiles'
+                 ).grid(row=0, column=0, columnspan=2, sticky='w')
+        stats_table = ttk.Treeview(self.selection_window, columns=('min', 'median', 'mean', 'max'),
+                                   height=len(query.RANGE_COLUMNS))
+        stats_table.heading('#0', text='Column')
+        stats_table.column('#0', width=110)
+        for column in ('min', 'median', 'mean', 'max'):
+            stats_table.heading(column, text=column.capitalize())
+            stats_table.column(column, width=90, anchor='e')
+        for name in query.RANGE_COLUMNS:
+            values = self.values[name][~np.isnan(self.values[name])]
+            stats = (values.min(), np.median(values), values.mean(), values.max()) if values.size else ()
+            stats_table.insert('', 'end', text=name, values=tuple(f'{v:.4g}' for v in stats))
+        stats_table.grid(row=1, column=0, sticky='nw')
+
+        # defects per class
+        class_table = ttk.Treeview(self.selection_window, columns=('defects',), height=len(query.RANGE_COLUMNS))
+        class_table.heading('#0', text='Class')
+        class_table.heading('defects', text='Defects')
+        class_table.column('defects', width=80, anchor='e')
+        names = {float(row[0]): str(row[2]) for row in self.model.defect_type_data}
+        for class_id, count in zip(*np.unique(self.values['Class'], return_counts=True)):
+            name = 'Unclassified' if np.isnan(class_id) else names.get(float(class_id), f'{class_id:g}')
+            class_table.insert('', 'end', text=name, values=(int(count),))
+        class_table.grid(row=1, column=1, sticky='nw')
+
+        # table of the selected defects, a click on a heading sorts by it, a double click opens the tile
+        self.view = tablewin.DefectTableView(self.selection_window, self.model, defect_index, on_open=self.open_tile,
+                                             rows=15)
+        self.view.grid(row=2, column=0, columnspan=2, sticky='nsew')
+
+        # open the tiles of the chosen rows, or of the whole selection when no row is chosen
+        button_open = tk.Button(self.selection_window, text='Open Tiles', width=10, command=self.open_tiles)
+        button_close = tk.Button(self.selection_window, text='Close', width=10, command=self.selection_window.destroy)
+        button_open.grid(row=3, column=0, sticky='w')
+        button_close.grid(row=3, column=1, sticky='e')
+        self.selection_window.rowconfigure(2, weight=1)
+        self.selection_window.columnconfigure(0, weight=1)
+
+    def open_tile(self, defect):
+        """ Opens the tile of one defect """
+        tileclick.Clicked(self.mosaic_creator, None, image_index=int(self.model.tile_index()[defect]),
+                          focus_defect=defect)
+
+    def open_tiles(self):
+        """ Opens the tiles of the chosen rows, or of the whole selection, up to MAX_TILES of them """
+        chosen = self.view.chosen_defects()
+        tiles = np.unique(self.model.tile_index()[chosen] if len(chosen) else self.tiles)
+        if len(tiles) > MAX_TILES:
+            print(f'{len(tiles)} tiles hold the defects, opening the first {MAX_TILES}, choose rows to open others')
+            tiles = tiles[:MAX_TILES]
+        for image_index in tiles:
+            tileclick.Clicked(self.mosaic_creator, None, image_index=int(image_index))
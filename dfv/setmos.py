@@ -16,16 +16,26 @@ class MosaicSettings:
         # many of these instance variables are copies of the corresponding passed variables
         # we operate on these variables instead of the MosaicCreator instance
         # ensures MosaicCreator instance is not immediately updated, but only when wanted within the GUI
-        self.binning_ranges = self.mosaic_creator.binning_ranges  # the desired binning ranges given in um^2
-        self.binning_colors = self.mosaic_creator.binning_colors  # the desired binning colors for size binning
-        self.binning_type_colors = self.mosaic_creator.binning_type_colors  # the desired colors for defect type binning
-        self.inf_bin_color = self.mosaic_creator.inf_bin_color  # the desired infinity bin color
-        self.which_binning_show = self.mosaic_creator.which_binning_show  # determines which binning type to display on mosaic
-        self.defect_label_text_choices = np.copy(self.mosaic_creator.defect_label_text_choices)  # create copy to avoid overwritting
+        self.binning_ranges = self.mosaic_creator.model.binning_ranges  # the desired binning ranges given in um^2
+        self.binning_colors = self.mosaic_creator.model.binning_colors  # the desired binning colors for size binning
+        self.binning_type_colors = self.mosaic_creator.model.binning_type_colors  # the desired colors for defect type binning
+        self.inf_bin_color = self.mosaic_creator.model.inf_bin_color  # the desired infinity bin color
+        self.which_binning_show = self.mosaic_creator.model.which_binning_show  # determines which binning type to display on mosaic
+        self.defect_label_text_choices = np.copy(self.mosaic_creator.model.defect_label_text_choices)  # create copy to avoid overwritting
         self.mosaic_settings_window = None  # tk window for mosaic settings
         self.font_size_defect_label = None  # will hold desired font size for defect labels on magnified tile
         self.defect_mark_size = None  # will hold desired defect marker size on canvas
-        self.analysis_id = self.mosaic_creator.analysis_id  # allows for reselection of analysis ID in settings
+        self.analysis_id = self.mosaic_creator.model.analysis_id  # allows for reselection of analysis ID in settings
+        self.density_weight = None  # will hold what each defect adds to the density map
+        self.density_class = None  # will hold the class name the density map is limited to
+        self.density_cell = None  # will hold the density cell size in mosaic pixels
+        self.compare_analysis_id = None  # will hold the analysis ID compared against in diff mode
+        self.match_tolerance = None  # will hold the distance in um within which defects of both analyses match
+        self.lot_cell = None  # will hold the repeater position tolerance in um
+        self.lot_min_dies = None  # will hold the number of dies a repeater is found on
+        self.cluster_link_distance = None  # will hold the cluster grid cell size in um
+        self.cluster_min_cell_defects = None  # will hold the defects a cell needs to seed a cluster
+        self.cluster_min_defects = None  # will hold the defects a cluster needs to be shown
 
         # call function to create initial settings panel
         self.main_mosaic_settings()
@@ -37,19 +47,21 @@ class MosaicSettings:
         self.mosaic_settings_window.title('Mosaic Advanced Settings')
 
         # font size of defect label text
-        self.font_size_defect_label = tk.StringVar(self.mosaic_settings_window, value=self.mosaic_creator.font_size_defect_label)
+        self.font_size_defect_label = tk.StringVar(self.mosaic_settings_window, value=self.mosaic_creator.model.font_size_defect_label)
         tk.Label(self.mosaic_settings_window, text='Defect Label Font Size').grid(row=1, column=0, columnspan=1)
         entry_font_size_defect_label = tk.Entry(self.mosaic_settings_window, textvariable=self.font_size_defect_label, width=5)
         entry_font_size_defect_label.grid(row=1, column=1, columnspan=1)
 
         # change the size of the defect markers on the mosaic canvas
-        self.defect_mark_size = tk.StringVar(self.mosaic_settings_window, value=self.mosaic_creator.defect_mark_size)
+        self.defect_mark_size = tk.StringVar(self.mosaic_settings_window, value=self.mosaic_creator.model.defect_mark_size)
         tk.Label(self.mosaic_settings_window, text='Defect Mark Size').grid(row=2, column=0, columnspan=1)
         entry_mark_resize = tk.Entry(self.mosaic_settings_window, textvariable=self.defect_mark_size, width=5)
         entry_mark_resize.grid(row=2, column=1, columnspan=1)
 
-        # change the analysis ID and replot defects
-        analysis_options = np.insert(self.mosaic_creator.root.analysis_options, 0, 'Select Choice')
+        # change the analysis ID and replot defects, only analyses of the scan of this mosaic apply
+        model = self.mosaic_creator.model
+        scan_analysis_ids = [str(a) for a in model.scan_analysis_ids()]
+        analysis_options = ['Select Choice'] + scan_analysis_ids
         self.analysis_id_change = tk.StringVar(self.mosaic_settings_window, value=analysis_options[0])
         tk.Label(self.mosaic_settings_window, text='Analysis ID').grid(row=3, column=0, columnspan=1)
         entry_analysis_id_change = ttk.OptionMenu(self.mosaic_settings_window, self.analysis_id_change, *analysis_options)
@@ -71,6 +83,66 @@ class MosaicSettings:
         button_defect_label_text = tk.Button(self.mosaic_settings_window, text='Defect Text Options', width=16, command=self.defect_text_options)
         button_defect_label_text.grid(row=6, column=0)
 
+        # density map settings, what each defect adds, which class to count and the cell size
+        self.density_weight = tk.StringVar(self.mosaic_settings_window, value=model.density_weight.title())
+        tk.Label(self.mosaic_settings_window, text='Density Weight').grid(row=7, column=0, columnspan=1)
+        entry_density_weight = ttk.OptionMenu(self.mosaic_settings_window, self.density_weight, self.density_weight.get(), 'Count', 'Area')
+        entry_density_weight.grid(row=7, column=1, columnspan=3, sticky='w')
+
+        class_names = ['All Classes'] + [str(name) for name in model.defect_type_data[:, 2]] if model.defect_type_data.size else ['All Classes']
+        class_choice = 'All Classes'
+        if model.density_class is not None and model.defect_type_data.size:
+            class_choice = str(model.defect_type_data[model.defect_type_data[:, 0].astype(float) == float(model.density_class)][0, 2])
+        self.density_class = tk.StringVar(self.mosaic_settings_window, value=class_choice)
+        tk.Label(self.mosaic_settings_window, text='Density Class').grid(row=8, column=0, columnspan=1)
+        entry_density_class = ttk.OptionMenu(self.mosaic_settings_window, self.density_class, class_choice, *class_names)
+        entry_density_class.grid(row=8, column=1, columnspan=3, sticky='w')
+
+        self.density_cell = tk.StringVar(self.mosaic_settings_window, value=model.density_cell)
+        tk.Label(self.mosaic_settings_window, text='Density Cell Size').grid(row=9, column=0, columnspan=1)
+        entry_density_cell = tk.Entry(self.mosaic_settings_window, textvariable=self.density_cell, width=5)
+        entry_density_cell.grid(row=9, column=1, columnspan=1)
+
+        # analysis diff settings, another analysis of the scan of this mosaic and the match tolerance
+        compare_options = ['Select Choice'] + [a for a in scan_analysis_ids if a != str(model.analysis_id)]
+        compare_choice = model.compare_analysis_id if model.compare_analysis_id in compare_options else compare_options[0]
+        self.compare_analysis_id = tk.StringVar(self.mosaic_settings_window, value=compare_choice)
+        tk.Label(self.mosaic_settings_window, text='Compare Analysis ID').grid(row=10, column=0, columnspan=1)
+        entry_compare_analysis_id = ttk.OptionMenu(self.mosaic_settings_window, self.compare_analysis_id, compare_choice, *compare_options)
+        entry_compare_analysis_id.grid(row=10, column=1, columnspan=3, sticky='w')
+
+        self.match_tolerance = tk.StringVar(self.mosaic_settings_window, value=model.match_tolerance)
+        tk.Label(self.mosaic_settings_window, text='Match Tolerance (um)').grid(row=11, column=0, columnspan=1)
+        entry_match_tolerance = tk.Entry(self.mosaic_settings_window, textvariable=self.match_tolerance, width=5)
+        entry_match_tolerance.grid(row=11, column=1, columnspan=1)
+
+        # lot overlay settings, the repeater position tolerance and how many dies a repeater is found on
+        self.lot_cell = tk.StringVar(self.mosaic_settings_window, value=model.lot_cell)
+        tk.Label(self.mosaic_settings_window, text='Repeater Cell (um)').grid(row=12, column=0, columnspan=1)
+        entry_lot_cell = tk.Entry(self.mosaic_settings_window, textvariable=self.lot_cell, width=5)
+        entry_lot_cell.grid(row=12, column=1, columnspan=1)
+
+        self.lot_min_dies = tk.StringVar(self.mosaic_settings_window, value=model.lot_min_dies)
+        tk.Label(self.mosaic_settings_window, text='Repeater Min Dies').grid(row=13, column=0, columnspan=1)
+        entry_lot_min_dies = tk.Entry(self.mosaic_settings_window, textvariable=self.lot_min_dies, width=5)
+        entry_lot_min_dies.grid(row=13, column=1, columnspan=1)
+
+        # cluster settings, link distance and how many defects a cell and a cluster need
+        self.cluster_link_distance = tk.StringVar(self.mosaic_settings_window, value=model.cluster_link_distance)
+        tk.Label(self.mosaic_settings_window, text='Cluster Link Distance (um)').grid(row=14, column=0, columnspan=1)
+        entry_cluster_link_distance = tk.Entry(self.mosaic_settings_window, textvariable=self.cluster_link_distance, width=5)
+        entry_cluster_link_distance.grid(row=14, column=1, columnspan=1)
+
+        self.cluster_min_cell_defects = tk.StringVar(self.mosaic_settings_window, value=model.cluster_min_cell_defects)
+        tk.Label(self.mosaic_settings_window, text='Cluster Min Cell Defects').grid(row=15, column=0, columnspan=1)
+        entry_cluster_min_cell_defects = tk.Entry(self.mosaic_settings_window, textvariable=self.cluster_min_cell_defects, width=5)
+        entry_cluster_min_cell_defects.grid(row=15, column=1, columnspan=1)
+
+        self.cluster_min_defects = tk.StringVar(self.mosaic_settings_window, value=model.cluster_min_defects)
+        tk.Label(self.mosaic_settings_window, text='Cluster Min Defects').grid(row=16, column=0, columnspan=1)
+        entry_cluster_min_defects = tk.Entry(self.mosaic_settings_window, textvariable=self.cluster_min_defects, width=5)
+        entry_cluster_min_defects.grid(row=16, column=1, columnspan=1)
+
         # button to apply settings
         button_accept = tk.Button(self.mosaic_settings_window, text='Accept', width=10, command=self.return_choices_mosaic)
         button_accept.grid(row=5, column=3)
@@ -114,34 +186,46 @@ class MosaicSettings:
 
     def return_choices_mosaic(self):
         """ Sends input settings back to MosaicCreator """  
-        self.mosaic_creator.font_size_defect_label = self.font_size_defect_label.get()
-        self.mosaic_creator.binning_ranges = self.binning_ranges
-        self.mosaic_creator.binning_colors = self.binning_colors
-        self.mosaic_creator.binning_type_colors = self.binning_type_colors
-        self.mosaic_creator.which_binning_show = self.which_binning_show
-        self.mosaic_creator.inf_bin_color = self.inf_bin_color
-        self.mosaic_creator.defect_mark_size = self.defect_mark_size.get()
-        self.mosaic_creator.defect_label_text_choices = np.copy(self.defect_label_text_choices)
+        self.mosaic_creator.model.font_size_defect_label = self.font_size_defect_label.get()
+        self.mosaic_creator.model.binning_ranges = self.binning_ranges
+        self.mosaic_creator.model.binning_colors = self.binning_colors
+        self.mosaic_creator.model.binning_type_colors = self.binning_type_colors
+        self.mosaic_creator.model.which_binning_show = self.which_binning_show
+        self.mosaic_creator.model.inf_bin_color = self.inf_bin_color
+        self.mosaic_creator.model.defect_mark_size = self.defect_mark_size.get()
+        self.mosaic_creator.model.defect_label_text_choices = np.copy(self.defect_label_text_choices)
+        self.mosaic_creator.model.density_weight = self.density_weight.get().upper()
+        self.mosaic_creator.model.density_cell = self.density_cell.get()
+        # find the ClassID of the chosen class name, if any
+        self.mosaic_creator.model.density_class = None
+        type_data = self.mosaic_creator.model.defect_type_data
+        if self.density_class.get() != 'All Classes' and type_data.size:
+            self.mosaic_creator.model.density_class = type_data[type_data[:, 2].astype(str) == self.density_class.get()][0, 0]
         # update defect data if needed
-        if self.mosaic_creator.analysis_id != self.analysis_id_change.get() and self.analysis_id_change.get() != 'Select Choice':
-            self.mosaic_creator.analysis_id = self.analysis_id_change.get()
-            self.mosaic_creator.defect_data = np.array(self.mosaic_creator.cur.execute(self.mosaic_creator.sql_cmd_def, 
-                                                                                       (str(self.mosaic_creator.analysis_id),)).fetchall())  # fetch all data from defect table
-            self.mosaic_creator.defect_type_data = np.array(self.mosaic_creator.cur.execute(self.mosaic_creator.sql_cmd_typ, 
-                                                                                            (str(self.mosaic_creator.analysis_id),)).fetchall())  # fetch all data from detection class table
-
-            # we must reset defect classification binning in both MosaicCreator and MosaicSettings
+        if self.mosaic_creator.model.analysis_id != self.analysis_id_change.get() and self.analysis_id_change.get() != 'Select Choice':
+            try:
+                self.mosaic_creator.model.set_analysis(self.analysis_id_change.get())  # fetch the defect and detection class data of the new analysis
+            except ValueError as e:
+                print(e)
+                return
+            # the model resets its defect classification binning, we must also reset it in MosaicSettings
             # otherwise, if the MosaicSettings window is not closed between analysis ID changes the previous binning is remembered and applied to wrong analysis
             # we can leave area binning alone since it can apply in any analysis
-            self.mosaic_creator.binning_type_colors = np.array([])
             self.binning_type_colors = np.array([])
 
             # now update the name of the window
-            self.mosaic_creator.mosaic_window.title(self.mosaic_creator.sample_name + " || " + "Scan ID = " + 
-                                                    str(self.mosaic_creator.root.scan_id.get()) + " || " + "Analysis ID = " + 
-                                                    str(self.mosaic_creator.analysis_id))
+            self.mosaic_creator.set_title()
+        # load the defects of the compare analysis if a new one was chosen
+        self.mosaic_creator.model.match_tolerance = self.match_tolerance.get()
+        self.mosaic_creator.model.lot_cell = self.lot_cell.get()
+        self.mosaic_creator.model.lot_min_dies = self.lot_min_dies.get()
+        self.mosaic_creator.model.cluster_link_distance = self.cluster_link_distance.get()
+        self.mosaic_creator.model.cluster_min_cell_defects = self.cluster_min_cell_defects.get()
+        self.mosaic_creator.model.cluster_min_defects = self.cluster_min_defects.get()
+        if self.compare_analysis_id.get() not in ('Select Choice', self.mosaic_creator.model.compare_analysis_id):
+            self.mosaic_creator.model.set_compare_analysis(self.compare_analysis_id.get())
 
         # re-plot the mosaic with the new settings
         # check if user has selected image view only
-        if self.mosaic_creator.root.image_view_only.get() == 0:
+        if not self.mosaic_creator.model.image_view_only:
             self.mosaic_creator.plot_defects()
\ No newline at end of file
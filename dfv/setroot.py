@@ -12,9 +12,9 @@ class RootSettings:
         
         # instance variable initialization
         self.adv_window = None  # used for root settings tk window
-        self.binning_colors = self.root.binning_colors  # set colors to the root values initially
-        self.binning_ranges = self.root.binning_ranges  # set ranges to the root values initially
-        self.inf_bin_color = self.root.inf_bin_color  # set infinity bin color to the root value initially
+        self.binning_colors = self.root.session.binning_colors  # set colors to the root values initially
+        self.binning_ranges = self.root.session.binning_ranges  # set ranges to the root values initially
+        self.inf_bin_color = self.root.session.inf_bin_color  # set infinity bin color to the root value initially
         
         self.initial_panel_root()  # call initial panel function
 
@@ -38,6 +38,6 @@ class RootSettings:
             
     def return_choices_root(self):
         """ Sends input settings back to Root """
-        self.root.binning_ranges = self.binning_ranges
-        self.root.binning_colors = self.binning_colors
-        self.root.inf_bin_color = self.inf_bin_color
\ No newline at end of file
+        self.root.session.binning_ranges = self.binning_ranges
+        self.root.session.binning_colors = self.binning_colors
+        self.root.session.inf_bin_color = self.inf_bin_color
\ No newline at end of file
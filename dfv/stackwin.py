@@ -0,0 +1,72 @@
+"""
+dfv.stackwin
+------------
+
+This module provides the die stack window of a mosaic: every defect
+drawn into one die-sized frame as a scatter in the size or class
+binning of the mosaic, or as a density image, next to a map of the
+defect count of every device. See dfv.diestack.
+"""
+
+# stackwin.py imports
+import tkinter as tk
+from PIL import ImageTk
+
+# custom modules
+from dfv import diestack
+
+MAX_COUNT_PIXELS = 400  # longest side of the device count map
+MAX_COUNT_LABELS = 24  # devices per side up to which every count is written on the map
+
+
+class DieStack:
+    """ Die stack view and device count map of one mosaic """
+    def __init__(self, mosaic_creator):
+
+        self.mosaic_creator = mosaic_creator  # DieStack instance holds instance of MosaicCreator
+        self.model = mosaic_creator.model  # model of the mosaic, its binning colors the marks
+        self.mode = 'SCATTER'  # 'SCATTER' or 'DENSITY'
+        self.stack_photo = None  # tk photo images, kept to avoid garbage collection
+        self.count_photo = None
+
+        self.stack_window = tk.Toplevel()
+        self.stack_window.title('Die Stack || Scan ID = ' + self.model.scan_id + ' || Analysis ID = ' + self.model.analysis_id)
+
+        width, height = diestack.stack_size(self.model)
+        self.stack_canvas = tk.Canvas(self.stack_window, width=width, height=height, bd=0)
+        self.stack_canvas.grid(row=0, column=0, columnspan=4)
+
+        # map of the defect count of every device, one cell per device
+        counts = diestack.device_counts(self.model)
+        rows, cols = counts['grid'].shape
+        cell = max(1, MAX_COUNT_PIXELS // max(rows, cols))
+        self.count_photo = ImageTk.PhotoImage(diestack.count_image(counts['grid'], cell))
+        self.count_canvas = tk.Canvas(self.stack_window, width=cols * cell, height=rows * cell, bd=0)
+        self.count_canvas.create_image(0, 0, anchor=tk.NW, image=self.count_photo)
+        if max(rows, cols) <= MAX_COUNT_LABELS:
+            for (row, col), count in zip(((r, c) for r in range(rows) for c in range(cols)), counts['grid'].ravel()):
+                self.count_canvas.create_text((col + 0.5) * cell, (row + 0.5) * cell, text=str(count), fill='white')
+        self.count_canvas.grid(row=0, column=4, sticky='n')
+        mean = len(self.model.defects) / counts['num_devices'] if counts['num_devices'] else 0
+        tk.Label(self.stack_window, text=f"{counts['placed']} defects stacked, {counts['with_defects']} of "
+                                         f"{counts['num_devices']} devices with defects, {mean:.1f} per device"
+                 ).grid(row=1, column=0, columnspan=5, sticky='w')
+
+        # buttons choosing how the stack is drawn, the binning follows the mosaic
+        button_scatter = tk.Button(self.stack_window, text='Scatter', width=10, command=lambda: self.show('SCATTER'))
+        button_density = tk.Button(self.stack_window, text='Density', width=10, command=lambda: self.show('DENSITY'))
+        button_refresh = tk.Button(self.stack_window, text='Refresh', width=10, command=lambda: self.show(self.mode))
+        button_close = tk.Button(self.stack_window, text='Close', width=10, command=self.stack_window.destroy)
+        button_scatter.grid(row=2, column=0)
+        button_density.grid(row=2, column=1)
+        button_refresh.grid(row=2, column=2)
+        button_close.grid(row=2, column=4)
+
+        self.show(self.mode)
+
+    def show(self, mode):
+        """ Draws the stack as a scatter or density image, with the current binning of the mosaic """
+        self.mode = mode
+        self.stack_photo = ImageTk.PhotoImage(diestack.stack_image(self.model, mode))
+        self.stack_canvas.delete('all')
+        self.stack_canvas.create_image(0, 0, anchor=tk.NW, image=self.stack_photo)
@@ -0,0 +1,94 @@
+"""
+dfv.statswin
+------------
+
+This module provides a live window of the timers and counters
+collected by dfv.instrument. It refreshes itself on the tk event
+loop and can reset the measurements or write the trace on demand.
+"""
+
+# statswin.py imports
+import tkinter as tk
+from tkinter import ttk
+
+# custom modules
+from dfv import instrument
+
+TIMER_COLUMNS = ('calls', 'total', 'mean', 'max', 'last')  # timer columns, times shown in ms
+
+
+class StatsWindow:
+    """Live table of instrumentation timers and counters."""
+
+    def __init__(self, refresh_ms=500):
+        """Create the window and start refreshing it.
+
+        Parameters
+        ----------
+        refresh_ms : int, optional
+            Milliseconds between refreshes. The default is 500.
+
+        Returns -> None.
+        """
+        self.refresh_ms = refresh_ms  # time between table refreshes
+        self.after_id = None  # pending refresh callback, cancelled on close
+
+        self.stats_window = tk.Toplevel()
+        self.stats_window.title('Timings')
+        self.stats_window.protocol('WM_DELETE_WINDOW', self.close)
+
+        # table of timers, one row per instrumented name
+        self.timer_table = ttk.Treeview(self.stats_window, columns=TIMER_COLUMNS, height=12)
+        self.timer_table.heading('#0', text='Timer')
+        self.timer_table.column('#0', width=200)
+        for column in TIMER_COLUMNS:
+            self.timer_table.heading(column, text=column if column == 'calls' else column + ' (ms)')
+            self.timer_table.column(column, width=80, anchor='e')
+        self.timer_table.grid(row=0, column=0, columnspan=3, sticky='nsew')
+
+        # table of counters
+        self.counter_table = ttk.Treeview(self.stats_window, columns=('value',), height=6)
+        self.counter_table.heading('#0', text='Counter')
+        self.counter_table.column('#0', width=200)
+        self.counter_table.heading('value', text='value')
+        self.counter_table.column('value', width=120, anchor='e')
+        self.counter_table.grid(row=1, column=0, columnspan=3, sticky='nsew')
+
+        # buttons to clear the measurements, write the trace now, or close the window
+        button_reset = tk.Button(self.stats_window, text='Reset', width=10, command=instrument.reset)
+        button_reset.grid(row=2, column=0)
+        button_dump = tk.Button(self.stats_window, text='Write Trace', width=10, command=instrument.dump)
+        button_dump.grid(row=2, column=1)
+        button_close = tk.Button(self.stats_window, text='Close', width=10, command=self.close)
+        button_close.grid(row=2, column=2)
+
+        self.stats_window.rowconfigure(0, weight=1)
+        self.stats_window.columnconfigure(0, weight=1)
+        self.refresh()
+
+    def refresh(self):
+        """Update both tables from the current measurements and schedule the next refresh."""
+        stats, counters = instrument.snapshot()
+        self.fill(self.timer_table, {name: (s['count'],) + tuple(f"{s[k] * 1000:.2f}" for k in TIMER_COLUMNS[1:])
+                                     for name, s in stats.items()})
+        self.fill(self.counter_table, {name: (value,) for name, value in counters.items()})
+        self.after_id = self.stats_window.after(self.refresh_ms, self.refresh)
+
+    @staticmethod
+    def fill(table, rows):
+        """Update the rows of a table in place, keyed by name, in sorted order."""
+        existing = set(table.get_children())
+        for index, name in enumerate(sorted(rows)):
+            if name in existing:
+                table.item(name, values=rows[name])
+                table.move(name, '', index)
+            else:
+                table.insert('', index, iid=name, text=name, values=rows[name])
+        for name in existing - set(rows):
+            table.delete(name)  # measurements were reset
+
+    def close(self):
+        """Stop refreshing and destroy the window."""
+        if self.after_id is not None:
+            self.stats_window.after_cancel(self.after_id)
+        self.stats_window.destroy()
@@ -0,0 +1,212 @@
+"""
+dfv.tablewin
+------------
+
+This module provides a table of defects with all of their fields,
+sortable by any field, which stays responsive with millions of rows.
+
+The table is virtual: the Treeview only ever holds the rows that fit
+in its window. Scrolling moves a window over the sort order of the
+defects and writes the values of the rows now in view into the same
+items, so the cost of a scroll step does not depend on the number of
+defects. The sort order of a field is one argsort of its column,
+kept once computed, so sorting by the same field again is immediate.
+A table of every defect reuses the sorted indexes of the defect
+filter, see dfv.query, where they exist.
+"""
+
+# tablewin.py imports
+import tkinter as tk
+from tkinter import ttk
+import numpy as np
+
+# custom modules
+from dfv import core
+from dfv import instrument
+from dfv import tileclick
+
+VISIBLE_ROWS = 25  # rows in view, the only Treeview items of a table
+WHEEL_ROWS = 3  # rows scrolled per mouse wheel step
+FIELD_WIDTHS = {'Contour': 160}  # column width of the wider fields, all others are 80 pixels
+
+
+class DefectTableView:
+    """ Virtual, sortable table of defects, placed in any window with grid """
+    def __init__(self, master, model, defect_index=None, on_open=None, rows=VISIBLE_ROWS):
+
+        self.model = model  # model holding the defect table
+        # defect table index of the rows, every defect when None
+        self.all_defects = defect_index is None  # rows are the whole defect table, in table order
+        self.defect_index = np.arange(len(model.defects)) if defect_index is None else np.asarray(defect_index)
+        self.on_open = on_open  # called with the defect table index of a double-clicked row
+        self.order = np.arange(len(self.defect_index))  # row positions in the current sort order
+        self.first = 0  # sort order position of the first row in view
+        self.sort_column = None  # field the rows are sorted by, None for table order
+        self.sort_descending = False  # sort direction
+        self.orders = {}  # (field, descending) -> sort order, kept once computed
+        self.chosen = set()  # defect table index of the chosen rows, kept while they scroll out of view
+        self.kinds = {name: kind for name, _, kind in model.defects.schema}
+
+        self.frame = tk.Frame(master)
+        self.table = ttk.Treeview(self.frame, columns=core.DEFECT_FIELDS, show='headings',
+                                  height=rows, selectmode='extended')
+        for name in core.DEFECT_FIELDS:
+            self.table.heading(name, text=name, command=lambda name=name: self.sort(name))
+            self.table.column(name, width=FIELD_WIDTHS.get(name, 80), anchor='e', stretch=False)
+        # the items are made once and reused for whichever rows are in view
+        self.items = [self.table.insert('', 'end', iid=str(i)) for i in range(min(rows, len(self.defect_index)))]
+        self.scrollbar = ttk.Scrollbar(self.frame, orient='vertical', command=self.yview)
+        scrollbar_x = ttk.Scrollbar(self.frame, orient='horizontal', command=self.table.xview)
+        self.table.configure(xscrollcommand=scrollbar_x.set)
+        self.table.grid(row=0, column=0, sticky='nsew')
+        self.scrollbar.grid(row=0, column=1, sticky='ns')
+        scrollbar_x.grid(row=1, column=0, sticky='ew')
+        self.frame.rowconfigure(0, weight=1)
+        self.frame.columnconfigure(0, weight=1)
+
+        self.table.bind('<<TreeviewSelect>>', self.selection_changed)
+        self.table.bind('<Double-1>', self.double_click)
+        self.table.bind('<MouseWheel>', lambda event: self.scroll(-WHEEL_ROWS if event.delta > 0 else WHEEL_ROWS))
+        self.table.bind('<Button-4>', lambda event: self.scroll(-WHEEL_ROWS))
+        self.table.bind('<Button-5>', lambda event: self.scroll(WHEEL_ROWS))
+        for key in ('Up', 'Down', 'Prior', 'Next', 'Home', 'End'):
+            self.table.bind('<' + key + '>', self.key_scroll)
+
+        self.refresh()
+
+    def grid(self, **kw):
+        """ Places the table in its window """
+        self.frame.grid(**kw)
+
+    def __len__(self):
+        return len(self.defect_index)
+
+    @instrument.timed('table.sort')
+    def sort_order(self, name, descending):
+        """ Returns the row positions sorted by a field, missing values last (cached)
+
+        The ascending order of a whole defect table is shared with the defect filter of the model.
+        """
+        key = (name, descending)
+        if key not in self.orders and self.all_defects and not descending and self.kinds[name] != 'str':
+            self.orders[key] = self.model.defect_index().sorted_column(name)[0]
+        if key not in self.orders:
+            values = self.model.defects[name][self.defect_index]
+            if self.kinds[name] == 'str':
+                ascending = self.sort_order(name, False) if descending else np.argsort(values, kind='stable')
+                self.orders[key] = ascending[::-1].copy() if descending else ascending
+            else:
+                values = values.astype(float)
+                self.orders[key] = np.argsort(-values if descending else values, kind='stable')  # NaN sorts last
+        return self.orders[key]
+
+    def sort(self, name):
+        """ Sorts by a field, a second click on the same field reverses the order """
+        self.sort_descending = not self.sort_descending if name == self.sort_column else False
+        self.sort_column = name
+        self.order = self.sort_order(name, self.sort_descending)
+        for field in core.DEFECT_FIELDS:
+            arrow = (' v' if self.sort_descending else ' ^') if field == name else ''
+            self.table.heading(field, text=field + arrow)
+        self.first = 0
+        self.refresh()
+
+    def row_defect(self, item):
+        """ Returns the defect table index of the row shown by an item """
+        return int(self.defect_index[self.order[self.first + self.items.index(item)]])
+
+    @instrument.timed('table.refresh')
+    def refresh(self):
+        """ Writes the rows in view into the items and updates the scrollbar """
+        total = len(self.defect_index)
+        self.first = max(0, min(self.first, total - len(self.items)))
+        defects = self.model.defects
+        in_view = []
+        for row, item in enumerate(self.items):
+            defect = int(self.defect_index[self.order[self.first + row]])
+            in_view.append(defect)
+            self.table.item(item, values=[defects.text(defect, name) for name in core.DEFECT_FIELDS])
+        # the chosen rows stay chosen wherever they scroll to
+        self.table.selection_set([item for item, defect in zip(self.items, in_view) if defect in self.chosen])
+        if total:
+            self.scrollbar.set(self.first / total, (self.first + len(self.items)) / total)
+
+    def selection_changed(self, event):
+        """ Keeps the chosen rows in view in sync with the Treeview selection """
+        selected = set(self.table.selection())
+        for item in self.items:
+            defect = self.row_defect(item)
+            if item in selected:
+                self.chosen.add(defect)
+            else:
+                self.chosen.discard(defect)
+
+    def chosen_defects(self):
+        """ Returns the defect table index of the chosen rows """
+        return np.array(sorted(self.chosen), dtype=np.int64)
+
+    def scroll(self, rows):
+        """ Moves the view by a number of rows """
+        self.first += rows
+        self.refresh()
+        return 'break'
+
+    def yview(self, *args):
+        """ Scrollbar command, 'moveto' a fraction or 'scroll' by units or pages """
+        if args[0] == 'moveto':
+            self.first = int(round(float(args[1]) * len(self.defect_index)))
+            self.refresh()
+        elif args[0] == 'scroll':
+            self.scroll(int(args[1]) * (len(self.items) if args[2] == 'pages' else 1))
+
+    def key_scroll(self, event):
+        """ Scrolls with the keys once the focus reaches the top or bottom row in view """
+        if not self.items:
+            return None
+        focus = self.table.focus()
+        row = self.items.index(focus) if focus in self.items else 0
+        last = len(self.items) - 1
+        if event.keysym == 'Up' and row == 0:
+            return self.scroll(-1)
+        if event.keysym == 'Down' and row == last:
+            return self.scroll(1)
+        if event.keysym in ('Prior', 'Next'):
+            return self.scroll(-len(self.items) if event.keysym == 'Prior' else len(self.items))
+        if event.keysym in ('Home', 'End'):
+            self.first = 0 if event.keysym == 'Home' else len(self.defect_index)
+            self.refresh()
+            self.table.focus(self.items[0 if event.keysym == 'Home' else last])
+            return 'break'
+        return None
+
+    def double_click(self, event):
+        """ Opens the defect of the double-clicked row """
+        item = self.table.identify_row(event.y)
+        if item and self.on_open is not None:
+            self.on_open(self.row_defect(item))
+
+
+class DefectTable:
+    """ Window listing the defects of a mosaic kept by the filter, a double click opens the tile of a defect """
+    def __init__(self, mosaic_creator):
+
+        self.mosaic_creator = mosaic_creator  # DefectTable instance holds instance of MosaicCreator
+        self.model = mosaic_creator.model  # model holding the defect table
+
+        self.table_window = tk.Toplevel()
+        self.table_window.title('Defect Table || Analysis ID = ' + self.model.analysis_id)
+        self.table_window.geometry('900x640')
+
+        self.view = DefectTableView(self.table_window, self.model, self.model.visible_index(), on_open=self.open_tile)
+        self.view.grid(row=0, column=0, columnspan=2, sticky='nsew')
+        tk.Label(self.table_window, text=f'{len(self.view)} defects, double click a row to open its tile'
+                 ).grid(row=1, column=0, sticky='w')
+        button_close = tk.Button(self.table_window, text='Close', width=10, command=self.table_window.destroy)
+        button_close.grid(row=1, column=1, sticky='e')
+        self.table_window.rowconfigure(0, weight=1)
+        self.table_window.columnconfigure(0, weight=1)
+
+    def open_tile(self, defect):
+        """ Opens the tile of a defect """
+        tileclick.Clicked(self.mosaic_creator, None, image_index=int(self.model.tile_index()[defect]),
+                          focus_defect=defect)
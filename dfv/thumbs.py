@@ -0,0 +1,223 @@
+"""
+dfv.thumbs
+----------
+
+This module makes small wafer map thumbnails for a whole lot: the
+downsampled mosaic of every scan with the defect density of its
+last analysis blended over it.
+
+Thumbnails are made on a process pool and stored in a persistent
+cache. A cache entry is keyed by the paths and modification times
+of the mosaic image and the database, so it is reused until either
+file changes. Cached thumbnails are returned at once, only missing
+ones are made.
+
+The lot gallery of the GUI uses this module, the cache can also be
+filled ahead of time from the command line:
+
+    $ python -m dfv thumbs --db X.db --scans DIR
+"""
+
+# thumbs.py imports
+import hashlib
+import os
+import sqlite3
+from contextlib import closing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from PIL import Image, PngImagePlugin
+
+# custom modules
+from dfv import core
+from dfv import density
+
+THUMB_SIZE = 256  # longest side of a thumbnail in pixels
+DENSITY_CELL = 4  # side of a density cell in thumbnail pixels
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'dfv', 'thumbnails')
+CACHE_VERSION = '1'  # bump when the look of the thumbnails changes
+
+
+class ThumbJob:
+    """Settings needed to make the thumbnail of one scan."""
+
+    def __init__(self, db_file, scan_dir, scan_id, analysis_id, size=THUMB_SIZE, cache_dir=DEFAULT_CACHE_DIR):
+        self.db_file = db_file  # database containing analysis and scan information
+        self.scan_dir = scan_dir  # directory containing the 'Scan_XXX' folders
+        self.scan_id = str(scan_id)
+        self.analysis_id = None if analysis_id is None else str(analysis_id)  # no density overlay when None
+        self.size = int(size)  # longest side of the thumbnail
+        self.cache_dir = cache_dir  # folder holding the cached thumbnails
+
+
+class ThumbResult:
+    """Outcome of one ThumbJob."""
+
+    def __init__(self, job, path=None, num_defects=0, error=None):
+        self.job = job
+        self.path = path  # cached thumbnail, None when the scan has no mosaic image
+        self.num_defects = num_defects  # defects of the analysis shown
+        self.error = error  # message when the thumbnail could not be made
+
+
+def lot_scans(db_file, scan_dir):
+    """Return every scan of a lot with its last analysis.
+
+    Scans are taken from the Scans table and from the 'Scan_XXX'
+    folders, scans only found as a folder have no analysis.
+
+    Returns
+    -------
+    list of tuple
+        (scan ID, analysis ID or None), sorted by scan ID.
+    """
+    with closing(sqlite3.connect(db_file)) as conn:
+        cur = conn.cursor()
+        scans = {int(scan_id): scan_id for scan_id in core.scan_ids(cur)}
+        for name in os.listdir(scan_dir):
+            if name.startswith('Scan_') and name[5:].isdigit() and os.path.isdir(os.path.join(scan_dir, name)):
+                scans.setdefault(int(name[5:]), str(int(name[5:])))
+        lot = []
+        for number in sorted(scans):
+            analyses = core.analysis_ids(cur, scans[number])
+            lot.append((scans[number], analyses[-1] if len(analyses) else None))
+    return lot
+
+
+def lot_jobs(db_file, scan_dir, size=THUMB_SIZE, cache_dir=DEFAULT_CACHE_DIR):
+    """Create a ThumbJob for every scan of a lot."""
+    return [ThumbJob(db_file, scan_dir, scan_id, analysis_id, size, cache_dir)
+            for scan_id, analysis_id in lot_scans(db_file, scan_dir)]
+
+
+def mosaic_path(job):
+    """Path of the mosaic image of a job, None when the scan has no folder or mosaic."""
+    try:
+        return core.find_mosaic_image(core.scan_folder(job.scan_dir, job.scan_id))
+    except (StopIteration, IndexError):
+        return None
+
+
+def cache_path(job, mosaic):
+    """Path of the cached thumbnail of a job, changes whenever the mosaic or database changes."""
+    parts = [CACHE_VERSION, str(job.size), job.scan_id, str(job.analysis_id)]
+    for path in (mosaic, job.db_file):
+        if path is not None:
+            stat = os.stat(path)
+            parts += [os.path.abspath(path), str(stat.st_mtime_ns), str(stat.st_size)]
+    key = hashlib.sha1('|'.join(parts).encode()).hexdigest()
+    return os.path.join(job.cache_dir, key + '.png')
+
+
+def cached(job):
+    """Return the ThumbResult of a job from the cache, or None when it must be made."""
+    mosaic = mosaic_path(job)
+    if mosaic is None:
+        return None
+    path = cache_path(job, mosaic)
+    if not os.path.exists(path):
+        return None
+    with Image.open(path) as image:
+        return ThumbResult(job, path, int(image.text.get('defects', 0)))
+
+
+def make_thumbnail(job):
+    """Make the thumbnail of one scan and store it in the cache, runs in a worker process."""
+    mosaic = mosaic_path(job)
+    num_defects = 0
+    x = y = None
+    if job.analysis_id is not None:
+        model = core.MosaicModel(job.db_file, core.scan_folder(job.scan_dir, job.scan_id), job.scan_id, job.analysis_id, 1)
+        model.load()
+        num_defects = len(model.defects)
+    if mosaic is None:
+        return ThumbResult(job, None, num_defects)
+
+    with Image.open(mosaic) as image:
+        source_size = image.size
+        image.draft('RGB', (job.size, job.size))  # lets JPEG mosaics decode at a reduced size
+        image = image.convert('RGB')
+    image.thumbnail((job.size, job.size), Image.LANCZOS)
+    if num_defects:
+        model.set_mosaic_image(image, source_size)
+        x, y = model.defect_mosaic_coords()
+        counts = density.histogram(x, y, image.width, image.height, cell=DENSITY_CELL)
+        image = density.blend(image, density.heatmap(counts, size=image.size))
+
+    path = cache_path(job, mosaic)
+    os.makedirs(job.cache_dir, exist_ok=True)
+    info = PngImagePlugin.PngInfo()
+    info.add_text('defects', str(num_defects))
+    temp_path = path + '.' + str(os.getpid()) + '.tmp'  # other processes never see a partial file
+    image.save(temp_path, 'PNG', pnginfo=info)
+    os.replace(temp_path, path)
+    return ThumbResult(job, path, num_defects)
+
+
+def safe_make_thumbnail(job):
+    """make_thumbnail, returning errors instead of raising them so one bad scan spares the rest."""
+    try:
+        return make_thumbnail(job)
+    except Exception as e:
+        return ThumbResult(job, error=f"{type(e).__name__}: {e}")
+
+
+def make_thumbnails(jobs, workers=None):
+    """Yield the ThumbResult of every job, cached ones first, the rest as they finish.
+
+    Parameters
+    ----------
+    jobs : list of ThumbJob
+        The scans to make thumbnails of.
+    workers : int, optional
+        Number of worker processes. The default is the number of cores.
+
+    Yields
+    ------
+    ThumbResult
+        One result per job, in no particular order.
+    """
+    missing = []
+    for job in jobs:
+        try:
+            result = cached(job)
+        except OSError:
+            result = None  # unreadable cache entry, make it again
+        if result is None:
+            missing.append(job)
+        else:
+            yield result
+    if not missing:
+        return
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(missing) == 1:
+        for job in missing:
+            yield safe_make_thumbnail(job)
+        return
+    pool = ProcessPoolExecutor(max_workers=min(workers, len(missing)))
+    try:
+        for future in as_completed([pool.submit(safe_make_thumbnail, job) for job in missing]):
+            yield future.result()
+    finally:
+        # when the consumer stops early, e.g. the gallery is closed, drop the queued jobs
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def run(args):
+    """Entry point of the thumbs subcommand."""
+    jobs = lot_jobs(args.db, args.scans, args.size, args.cache)
+    for result in make_thumbnails(jobs, args.workers):
+        if result.error is not None:
+            print(f"Scan {result.job.scan_id}: {result.error}")
+        else:
+            print(f"Scan {result.job.scan_id}: {result.path or 'no mosaic image'} ({result.num_defects} defects)")
+
+
+def add_parser(subparsers):
+    """Register the thumbs subcommand on the dfv argument parser."""
+    parser = subparsers.add_parser('thumbs', help='fill the thumbnail cache of the lot gallery')
+    parser.add_argument('--db', required=True, help='nSpec database file')
+    parser.add_argument('--scans', required=True, help="directory containing the 'Scan_XXX' folders")
+    parser.add_argument('--size', type=int, default=THUMB_SIZE, help='longest side of a thumbnail in pixels')
+    parser.add_argument('--cache', default=DEFAULT_CACHE_DIR, help='thumbnail cache folder')
+    parser.add_argument('--workers', type=int, default=None, help='number of worker processes')
+    parser.set_defaults(func=run)
+    return parser
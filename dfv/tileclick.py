@@ -7,15 +7,26 @@ interactive tile image displaying defects.
 The tile image can be panned, scrolled, and zoomed.
 This module triggers upon click event on the mosaic canvas
 to then display the appropriate tile based on click location.
+The tile opens centred and zoomed on the defect nearest to the
+click, rendering only that region of the native image first.
+At most MAX_TILE_WINDOWS tile windows are open at once, further
+clicks show their tile in the least recently used one.
 """
 
 # tileclick.py imports
 import math
 from tkinter import ttk
 import tkinter as tk
-from PIL import Image, ImageTk
 import numpy as np
 
+# custom modules
+from dfv import core
+from dfv import display
+from dfv import imaging
+from dfv import instrument
+
+MAX_TILE_WINDOWS = 4  # tile windows open at once, shared by all mosaics
+
 
 class Clicked:
     """Initiate individual tile view upon click event.
@@ -24,7 +35,7 @@ class Clicked:
     Check which tile to plot in the tile window.
     """
     
-    def __init__(self, mosobj, event):
+    def __init__(self, mosobj, event, image_index=None, focus_defect=None, tile_window=None):
         """Receive event and instance related to click event
         
         Parameters
@@ -34,50 +45,51 @@ class Clicked:
             to the click event.
         event : tk event object
             Holds information relevant to the click event on the mosaic canvas.
+            May be None when image_index is given.
+        image_index : int, optional
+            Image table index of the tile to open instead of the clicked one,
+            e.g. for tiles opened from a defect selection. The default is None.
+        focus_defect : int, optional
+            Defect table index of the defect to centre the tile view on.
+            The default is None, the defect nearest to the click.
+        tile_window : TileWindow, optional
+            Tile window to show the tile in, e.g. while stepping through
+            defects. The default is None, a window of the shared pool.
 
         Returns -> None.
         """
         self.mos_click_event = event
-        print(event)
-    
+        self.image_index = image_index
+        self.focus_defect = focus_defect  # defect the tile opens centred on, None opens the whole tile
+        self.tile_window = tile_window  # window showing the tile, taken from the pool by tile_check unless given
+        self.tile_windows = mosobj.root.tile_windows  # pool of the tile windows of the session
+        # shared workers, the pyramid of an opened tile is finished on them
+        self.scheduler = mosobj.root.scheduler
+        # memory accounting of the session, a new tile window registers its pyramid and photo image
+        self.memory = mosobj.root.memory
+
+        # the mosaic model holds the image and defect data, the binning
+        # settings and the mosaic geometry of the MosaicCreator instance
+        self.model = mosobj.model
         # variables passed from the instance of MosaicCreator
         # these variables must be adjusted back to initial values as defined 
         # in the MosaicCreator object each time a click event happens
         # we make copies of these variables to ensure we do 
         # not overwrite the MosaicCreator instance from whence they came
-        # binning ranges for defects, based on defect area
-        self.binning_ranges = mosobj.binning_ranges
-        # binning colors for defects based on defect area
-        self.binning_colors = mosobj.binning_colors
-        # binning colors for defects based on defect classification
-        self.binning_type_colors = mosobj.binning_type_colors
-        # color for the defect bin which goes to infinity
-        self.inf_bin_color = mosobj.inf_bin_color
         # font size for defect labels
-        self.label_fsize = int(mosobj.font_size_defect_label)
-        # array containing all relevant defect data
-        self.defect_data = mosobj.defect_data
-        # array containing relevant defect classification information
-        self.defect_type_data = mosobj.defect_type_data
+        self.label_fsize = int(self.model.font_size_defect_label)
         # variable tells which defect binning to show by default
-        self.which_binning_show = mosobj.which_binning_show
-        # width of mosaic canvas tile
-        self.mos_tile_width = mosobj.mos_tile_width
-        # height of mosaic canvas tile
-        self.mos_tile_height = mosobj.mos_tile_height
-        # list of info to include in each defect label
-        self.text_choices = mosobj.defect_label_text_choices
+        # a tile has no density map, analysis diff or lot overlay, it shows the size binning instead
+        self.which_binning_show = "SIZE" if self.model.which_binning_show in ("DENSITY", "DIFF", "LOT") else self.model.which_binning_show
         # variable determining whether to plot defects at all
-        self.image_view_only = mosobj.root.image_view_only.get()
-        # mosaic image directory
-        self.img_loc = mosobj.root.img_loc + '/'
-        # image data from the database file
-        self.image_data = mosobj.image_data
-        # initialize a variable to indicate the selected image row in database
-        self.sel_irow = None
+        self.image_view_only = self.model.image_view_only
+        # initialize variables to indicate the selected image in database
+        self.sel_index = None  # index into the image table
+        self.sel_irow = None  # image table row, as a dict of column values
         
         self.tile_check()
 
+    @instrument.timed('tile_check')
     def tile_check(self):
         """Check which tile was clicked.
 
@@ -86,34 +98,113 @@ class Clicked:
         
         Returns -> None.
         """
-        # iterate through all image data rows, 
         # find selected image according to click event,
         # image coords, and tile size
-        for idx, img_row in enumerate(self.image_data):
-    
-            # find the Row and Column of the tile in the mosaic image
-            tile_row = float(img_row[7])
-            tile_column = float(img_row[8])
-    
-            # find the ranges of values where tile exists inside mosaic canvas
-            x_bottom = tile_column * self.mos_tile_width 
-            x_top = (tile_column * self.mos_tile_width) + self.mos_tile_width
-            y_bottom = tile_row * self.mos_tile_height
-            y_top = (tile_row * self.mos_tile_height) + self.mos_tile_height
-    
-            if ((x_bottom <= (self.mos_click_event.x) <= x_top) 
-                    and (y_bottom <= (self.mos_click_event.y) <= y_top)):
-                self.sel_irow = img_row  # record selected image row
-                # path to the image
-                filename = self.img_loc + img_row[2]
-                # get the name of the currently selected tile 
-                tile_name = img_row[2]
-                print(tile_name)
-                # create an object of the TileWindow class
-                TileWindow(self, tk.Toplevel(), path=filename, 
-                           window_name=tile_name)
-              
-                
+        if self.image_index is not None:
+            idx = self.image_index
+        else:
+            idx = self.model.tile_at(self.mos_click_event.x, self.mos_click_event.y)
+        if idx is not None:
+            if (self.focus_defect is None and self.mos_click_event is not None
+                    and not self.image_view_only):
+                # open on the defect nearest to the click
+                self.focus_defect = self.model.nearest_tile_defect(
+                    idx, self.mos_click_event.x, self.mos_click_event.y)
+            self.sel_index = idx
+            self.sel_irow = self.model.images.row(idx)  # record selected image row
+            # path to the image
+            filename = self.model.tile_path(idx)
+            # get the name of the currently selected tile 
+            tile_name = self.sel_irow['FileName']
+            print(tile_name)
+            if self.tile_window is not None:
+                # show the tile in the window given
+                self.tile_window.show_tile(self, path=filename,
+                                           window_name=tile_name)
+            else:
+                # show the tile in a new or a reused window of the pool
+                self.tile_window = self.tile_windows.show(
+                    self, path=filename, window_name=tile_name)
+
+
+class TileWindowPool:
+    """Bounded set of open tile windows, reused once all are open.
+
+    Retargeting a window keeps its canvas, buttons and photo image,
+    the pyramid of its previous tile stays in the tile cache of the
+    scheduler, so the memory of tile viewing stays flat however many
+    tiles are opened during a session.
+    """
+
+    def __init__(self, max_windows=MAX_TILE_WINDOWS):
+        """Start with no windows open.
+
+        Parameters
+        ----------
+        max_windows : int, optional
+            Tile windows open at once. The default is 4.
+
+        Returns -> None.
+        """
+        self.max_windows = max_windows  # tile windows open at once
+        self.windows = []  # open TileWindow instances, least recently used first
+
+    def show(self, click_obj, path, window_name):
+        """Show a tile in a window of the pool and return the window.
+
+        A window already showing the tile is reused first, then a new
+        window is opened while fewer than max_windows are open, else
+        the least recently used window is retargeted.
+
+        Parameters
+        ----------
+        click_obj : class instance
+            Instance of Clicked class of the tile.
+        path : string
+            Directory filepath to the tile image.
+        window_name : string
+            Name for the tile window, based on image scanning order.
+
+        Returns
+        -------
+        TileWindow
+            The window showing the tile.
+        """
+        same = [w for w in self.windows if w.canvas_widget.path == path]
+        if same or len(self.windows) >= self.max_windows:
+            window = same[0] if same else self.windows[0]
+            self.windows.remove(window)
+            window.show_tile(click_obj, path, window_name)
+            window.master.deiconify()
+            window.master.lift()
+            instrument.count('tile.windows_reused')
+        else:
+            window = TileWindow(click_obj, tk.Toplevel(), path=path,
+                                window_name=window_name)
+            window.master.protocol('WM_DELETE_WINDOW',
+                                   lambda: self.close(window))
+        self.windows.append(window)  # most recently used
+        return window
+
+    def detach(self, window):
+        """Take a window out of the pool, clicks no longer retarget it.
+
+        Its new owner closes it, e.g. the defect review.
+
+        Returns -> None.
+        """
+        if window in self.windows:
+            self.windows.remove(window)
+
+    def close(self, window):
+        """Close a window of the pool.
+
+        Returns -> None.
+        """
+        self.detach(window)
+        window.close()
+
+
 class TileWindow(ttk.Frame):
     """Creates tile window and initiates tile canvas creation."""
     
@@ -140,8 +231,43 @@ class TileWindow(ttk.Frame):
         self.master.rowconfigure(0, weight=1)
         self.master.columnconfigure(0, weight=1)
         # create widget for master window
-        canvas_widget = TileCanvas(click_obj, self.master, path)
-        canvas_widget.grid_(row=0, column=0)  # show widget in window
+        self.canvas_widget = TileCanvas(click_obj, self.master, path)
+        self.canvas_widget.grid_(row=0, column=0)  # show widget in window
+
+        # the reduced pyramid levels are dropped over the memory budget, they are built again on first use
+        self.memory = click_obj.memory  # memory accounting of the session
+        self.memory_owner = self.memory.new_owner('Tile window')  # name of this window in the accounting
+        self.memory.register(self.memory_owner, 'tile pyramid', lambda: self.canvas_widget.pyramid.nbytes,
+                             lambda: self.canvas_widget.pyramid.drop_levels())
+        self.memory.register(self.memory_owner, 'photo image', lambda: self.canvas_widget.view.nbytes)
+        self.master.bind('<FocusIn>', lambda event: self.memory.touch(self.memory_owner), add='+')
+
+    def show_tile(self, click_obj, path, window_name):
+        """Show another tile in this window, reusing its canvas and buttons.
+
+        Parameters
+        ----------
+        click_obj : class instance
+            Instance of Clicked class of the new tile.
+        path : string
+            Directory filepath to the tile image.
+        window_name : string
+            Name for the tile window, based on image scanning order.
+
+        Returns -> None.
+        """
+        self.master.title(window_name)
+        self.canvas_widget.load_tile(click_obj, path)
+        self.memory.touch(self.memory_owner)
+
+    def close(self):
+        """Close the window, dropping its canvas and tile image.
+
+        Returns -> None.
+        """
+        self.memory.unregister(self.memory_owner)
+        self.canvas_widget.destroy()
+        self.master.destroy()
         
             
 class SmartScrollbar(ttk.Scrollbar):
@@ -179,7 +305,7 @@ class TileCanvas:
         """
         # TileCanvas holds instance containing 
         # copies of MosaicCreator variables
-        self.clob = click_obj
+        self.clob = None  # set by load_tile()
         self.hide_defect_labels = None  # tracks choice to show defect labels
         self.hide_defect_marks = None  # tracks choice to show defect marks
         # the which_binning_show variable passed from MosaicCreator 
@@ -198,7 +324,7 @@ class TileCanvas:
         self.imscale = 1.0
         self.delta = 1.3  # factor by which to scale for a single zoom event
         self.previous_state = 0  # previous state of the keyboard
-        self.path = path  # path to the image
+        self.path = None  # path to the image, set by load_tile()
         # create frame in master window to hold tile canvas
         self.imframe = ttk.Frame(placeholder)
         
@@ -217,6 +343,8 @@ class TileCanvas:
                                 yscrollcommand=vbar.set)
         self.canvas.grid(row=0, column=0, sticky='nswe')
         self.canvas.update()  # ensure canvas exists before continuing
+        # one photo image and canvas item, updated in place on every pan and zoom
+        self.view = display.PhotoBuffer(self.canvas)
         
         hbar.configure(command=self.scroll_x)  # bind scrollbars to the canvas
         vbar.configure(command=self.scroll_y)
@@ -243,8 +371,43 @@ class TileCanvas:
         # scrolling with keyboard
         self.canvas.bind('<Key>', lambda event: 
                          self.canvas.after_idle(self.keystroke, event))
-            
-        self.image = Image.open(self.path)  # open the clicked tile image
+
+        self.load_tile(click_obj, path)  # show the clicked tile
+
+    @instrument.timed('tile.load')
+    def load_tile(self, click_obj, path):
+        """Show a tile on the canvas, replacing the tile shown before.
+
+        The canvas, buttons and photo image are kept, so stepping
+        from tile to tile only reads the new image and draws its defects.
+
+        Parameters
+        ----------
+        click_obj : class instance
+            Instance of Clicked class of the tile. Certain attributes will
+            be unloaded and copied here.
+        path : string
+            Directory filepath to the tile image.
+
+        Returns -> None.
+        """
+        if self.path is not None:
+            self.clob.scheduler.release_tile(self.path)  # the previous tile may leave the tile cache now
+        self.clob = click_obj
+        self.path = path
+        # remove the marks, labels and measurements of the previous tile,
+        # the image item is kept and refilled by show_image
+        for item in self.canvas.find_all():
+            if item != self.view.item:
+                self.canvas.delete(item)
+        self.canvas.xview_moveto(0)
+        self.canvas.yview_moveto(0)
+        self.imscale = 1.0
+        self.new_font_size = None
+
+        # the tile image, shared with the tiles preloaded while stepping through defects
+        self.pyramid = self.clob.scheduler.tile_pyramid(self.path)
+        self.image = self.pyramid[0]
         # get native size of clicked tile image
         self.imwidth = self.image.size[0]
         self.imheight = self.image.size[1]
@@ -253,24 +416,10 @@ class TileCanvas:
         # We will build an image pyramid to handle the slowdown
         # caused by attempting to resize and interpolate the 
         # original high-res tile image over and over during zoom
-        self.pyramid = [self.image]  # init pyramid list with native image
+        # its levels are built on first use, a view zoomed on
+        # a defect needs none of them for its first frame
+        self.reduce_factor = imaging.PYRAMID_REDUCE_FACTOR
         self.curr_img = 0  # tracks which pyramid image to use during zoom
-        # the factor by which to shrink image size
-        # if we set this equal to the zoom scale factor
-        # then we have a one-to-one selection of pyramid
-        # image resolution to total scaling from zoom
-        # using the logarithmic function 
-        # log(curr zoom image scale, pyramid scale factor) = pyramid list index
-        self.reduce_factor = 1.3
-        w, h = self.pyramid[0].size  # starting width and height
-        pyr_cutoff = 512  # the pixel size to stop reducing beyond
-        while w > pyr_cutoff and h > pyr_cutoff:
-            w = w / self.reduce_factor
-            h = h / self.reduce_factor
-            reduced_image = self.pyramid[-1].resize((int(w), int(h)), 
-                                                    Image.LANCZOS)
-            # append scaled image to pyramid list
-            self.pyramid.append(reduced_image)
         # self.scale will track the "total" amount of scaling
         # needed when cropping and displaying the pyramid image
         # it will factor in the zoom events (self.imscale)
@@ -287,14 +436,20 @@ class TileCanvas:
         self.container = self.canvas.create_rectangle((0, 0, self.imwidth, 
                                                        self.imheight), width=0)
         
+        # check if user has selected image view only
+        if not self.clob.image_view_only:
+            self.show_defects()  # show defects on the canvas
+            self.show_labels() # show defect labels on the canvas
+            if self.clob.focus_defect is not None:
+                self.focus_on(self.clob.focus_defect)
+            if self.hide_defect_marks.get() or self.hide_defect_labels.get():
+                self.defect_mark_vis()  # keep the choices made on the previous tile
         # call the method used to scale and show image
         # this method will be repeatably called anytime
         # a zoom or scroll event occurs
         self.show_image()
-        # check if user has selected image view only
-        if self.clob.image_view_only == 0:
-            self.show_defects()  # show defects on the canvas
-            self.show_labels() # show defect labels on the canvas
+        # finish the pyramid in the background for zooming out
+        self.clob.scheduler.build_levels(self.path)
         self.canvas.focus_set()  # set focus on the canvas
         
     def grid_(self, **kw):
@@ -380,6 +535,7 @@ class TileCanvas:
 
         return point_list
 
+    @instrument.timed('tile.show_defects')
     def show_defects(self):
         """Plot defects on the selected image.
         
@@ -389,67 +545,58 @@ class TileCanvas:
         # based on our always-present rectangle
         box_image = self.canvas.coords(self.container)
 
-        # now plot the defects on the currently cropped image region
-        for idx, def_row in enumerate(self.clob.defect_data):
-            if float(def_row[1]) == float(self.clob.sel_irow[0]):
-                # coordinates of defect scaled by image size
-                x = (float(def_row[4]) * box_image[2] 
-                     / float(self.clob.sel_irow[9]))
-                # also converted to image pixels from microns
-                y = (float(def_row[5]) * box_image[3] 
-                     / float(self.clob.sel_irow[10]))
-
-                # we will plot multiple copies of each defect overlaid
-                # each copy will have a different defect mark color
-                # tags are used to toggle defect visibility for bin type
-
-                # get index corresponding to binning range of defect area
-                bin_range_index = np.searchsorted(self.clob.binning_ranges, 
-                                                  float(def_row[8]))
-                # set size-based defect mark color based on 
-                # binning color corresponding to index found above
-                if ((bin_range_index > (len(self.clob.binning_ranges) - 1)) 
-                        or (self.clob.binning_ranges.size == 0)):
-                    binc_outline = self.clob.inf_bin_color
-                else:
-                    binc_outline = self.clob.binning_colors[bin_range_index]
+        model = self.clob.model
+        defects = model.tile_defects(self.clob.sel_index)
+        # coordinates of defects scaled by image size
+        # also converted to image pixels from microns
+        xs, ys = model.tile_pixel_coords(defects, self.clob.sel_index,
+                                         box_image[2], box_image[3])
+
+        # we will plot multiple copies of each defect overlaid
+        # each copy will have a different defect mark color
+        # tags are used to toggle defect visibility for bin type
+        # set size-based and class-based defect mark colors
+        # based on binning colors corresponding to the bin of each defect
+        size_colors = core.bin_colors(model.size_bins()[defects],
+                                      model.binning_colors,
+                                      model.inf_bin_color)
+        class_colors = core.bin_colors(model.class_bins()[defects],
+                                       model.binning_type_colors,
+                                       model.inf_bin_color)
 
-                # set class-based defect mark color based on user binning input
-                if (self.clob.binning_type_colors.size == 0 
-                    or self.clob.defect_type_data.size == 0):
-                    mark_type_outline = self.clob.inf_bin_color
-                else:
-                    btc = self.clob.binning_type_colors
-                    dtd = self.clob.defect_type_data[:, 0:1].flatten()
-                    mark_type_outline = btc[np.where(dtd == def_row[15])][0]
-
-                # ovals cannot be rotated in tkinter
-                # convert oval coordinates to polygon and add in 
-                # rotation defined by "Orientation" from database file
-                # the factor of 2 multiplied on here ensures 
-                # the oval encircles the entire defect
-                # width is y-direction length 
-                # height is x-direction length
-                x0 = x - (float(def_row[7]) * 2) / 2
-                y0 = y - (float(def_row[6]) * 2) / 2
-                x1 = x + (float(def_row[7]) * 2) / 2
-                y1 = y + (float(def_row[6]) * 2) / 2
-
-                # plot multiple overlaid copies for each binning type
-                self.canvas.create_polygon(
-                    tuple(self.poly_oval_v2(x0, y0, x1, y1,
-                                            rotation=float(def_row[12]))),
-                    outline=binc_outline, fill="", width=2,
-                    tags="DEFECT_TILE_MARK_SIZE_BINNING")
-                self.canvas.create_polygon(
-                    tuple(self.poly_oval_v2(x0, y0, x1, y1,
-                                            rotation=float(def_row[12]))),
-                    outline=mark_type_outline, fill="", width=2,
-                    tags="DEFECT_TILE_MARK_CLASS_BINNING")
-                self.canvas.itemconfigure("DEFECT_TILE_MARK_SIZE_BINNING",
-                                          state="hidden")
-                self.canvas.itemconfigure("DEFECT_TILE_MARK_CLASS_BINNING",
-                                          state="hidden")
+        # now plot the defects on the currently cropped image region
+        for i, x, y, binc_outline, mark_type_outline in zip(
+                defects, xs, ys, size_colors, class_colors):
+            def_w = model.defects['W'][i]
+            def_h = model.defects['H'][i]
+            rotation = model.defects['Orientation'][i]
+            # ovals cannot be rotated in tkinter
+            # convert oval coordinates to polygon and add in 
+            # rotation defined by "Orientation" from database file
+            # the factor of 2 multiplied on here ensures 
+            # the oval encircles the entire defect
+            # width is y-direction length 
+            # height is x-direction length
+            x0 = x - (def_h * 2) / 2
+            y0 = y - (def_w * 2) / 2
+            x1 = x + (def_h * 2) / 2
+            y1 = y + (def_w * 2) / 2
+
+            # plot multiple overlaid copies for each binning type
+            self.canvas.create_polygon(
+                tuple(self.poly_oval_v2(x0, y0, x1, y1,
+                                        rotation=rotation)),
+                outline=binc_outline, fill="", width=2,
+                tags="DEFECT_TILE_MARK_SIZE_BINNING")
+            self.canvas.create_polygon(
+                tuple(self.poly_oval_v2(x0, y0, x1, y1,
+                                        rotation=rotation)),
+                outline=mark_type_outline, fill="", width=2,
+                tags="DEFECT_TILE_MARK_CLASS_BINNING")
+            self.canvas.itemconfigure("DEFECT_TILE_MARK_SIZE_BINNING",
+                                      state="hidden")
+            self.canvas.itemconfigure("DEFECT_TILE_MARK_CLASS_BINNING",
+                                      state="hidden")
 
         # by default show current defect binning choice from the mosaic
         if self.clob.which_binning_show == "SIZE":
@@ -491,45 +638,56 @@ class TileCanvas:
         # based on our always-present rectangle
         box_image = self.canvas.coords(self.container)
 
+        model = self.clob.model
+        defects = model.tile_defects(self.clob.sel_index)
+        # coordinates of defect labels scaled by image size
+        # also converted to image pixels from microns
+        xs, ys = model.tile_pixel_coords(defects, self.clob.sel_index,
+                                         box_image[2], box_image[3])
+        scale = 60
+
         # now plot the defect labels on the current canvas image tile
-        for idx, def_row in enumerate(self.clob.defect_data):
-            if float(def_row[1]) == float(self.clob.sel_irow[0]):
-                # coordinates of defect label scaled by image size
-                x = (float(def_row[4]) * box_image[2] 
-                     / float(self.clob.sel_irow[9]))
-                # also converted to image pixels from microns
-                y = (float(def_row[5]) * box_image[3] 
-                     / float(self.clob.sel_irow[10]))
-                scale = 60
-                # this array contains all defect info that can be displayed
-                defect_all_info = np.array(
-                    ["DefectID = " + def_row[0],
-                     "ImageID = " + def_row[1],
-                     "AnalysisID = " + def_row[2],
-                     "DeviceID = " + def_row[3],
-                     "X = " + def_row[4],
-                     "Y = " + def_row[5],
-                     "W = " + def_row[6],
-                     "H = " + def_row[7],
-                     "Area = " + def_row[8], 
-                     "Intensity = " + def_row[9],
-                     "IntensityDeviation = " + def_row[10],
-                     "Eccentricity = " + def_row[11],
-                     "Orientation = " + def_row[12],
-                     "XinDevice = " + def_row[13],
-                     "YinDevice = " + def_row[14],
-                     "ClassID = " + def_row[15],
-                     "Score = " + def_row[16],
-                     "Contour = " + def_row[17]]
-                )
-                # filter info array to user selections
-                defect_select_info = defect_all_info[self.clob.text_choices]
-                # combine all elements into one string
-                label_text = ", ".join(defect_select_info)
-                self.canvas.create_text(
-                    x - box_image[2] / scale, y - box_image[3] / scale, 
-                    text=label_text, font=("Arial", -self.clob.label_fsize), 
-                    tags=("text", "DEFECT_TILE_LABEL"))
+        for i, x, y in zip(defects, xs, ys):
+            # defect info filtered to user selections, in one string
+            label_text = model.label_text(i)
+            self.canvas.create_text(
+                x - box_image[2] / scale, y - box_image[3] / scale, 
+                text=label_text, font=("Arial", -self.clob.label_fsize), 
+                tags=("text", "DEFECT_TILE_LABEL"))
+
+    def focus_on(self, defect):
+        """Zoom in on a defect and centre it in the view.
+
+        Parameters
+        ----------
+        defect : int
+            Defect table index of a defect on this tile.
+
+        Returns -> None
+        """
+        model = self.clob.model
+        x, y = model.tile_pixel_coords(defect, self.clob.sel_index,
+                                       self.imwidth, self.imheight)
+        size = np.nan_to_num(max(model.defects['W'][defect], model.defects['H'][defect]))
+        # ring around the defect, scaled along with the marks
+        ring = max(size, 8)
+        self.canvas.create_oval(x - ring, y - ring, x + ring, y + ring,
+                                outline='white', dash=(4, 4), width=2,
+                                tags="DEFECT_TILE_FOCUS")
+        # zoom in by a power of the wheel step, as far as the wheel may go
+        view_w = max(self.canvas.winfo_width(), 2)
+        view_h = max(self.canvas.winfo_height(), 2)
+        scale_inst = imaging.focus_scale(size, min(view_w, view_h), self.delta,
+                                         max_scale=min(view_w, view_h) // 2)
+        self.imscale = self.imscale * scale_inst
+        self.curr_img, self.scale = imaging.pyramid_level(
+            self.imscale, len(self.pyramid), self.reduce_factor)
+        self.canvas.scale('all', 0, 0, scale_inst, scale_inst)
+        self.scale_labels(scale_inst)
+        # move the defect to the centre of the visible canvas region
+        self.canvas.move('all',
+                         self.canvas.canvasx(view_w / 2) - x * scale_inst,
+                         self.canvas.canvasy(view_h / 2) - y * scale_inst)
 
     def defect_mark_vis(self):
         """Hide or reveal defect labels and/or marks when toggled.
@@ -554,6 +712,7 @@ class TileCanvas:
         else:
             self.canvas.itemconfig("DEFECT_TILE_LABEL", state="normal")
 
+    @instrument.timed('show_image')
     def show_image(self):
         """Show image on the canvas.
         
@@ -617,25 +776,14 @@ class TileCanvas:
             # that would be visible based on the scroll/zoom of the canvas
             # we must scale the dimensions to crop based on the
             # reduction factor of the currently selected image
-            image = self.pyramid[max(0, self.curr_img)].crop(
-                    (int(x1 / self.scale), int(y1 / self.scale),
-                     int(x2 / self.scale), int(y2 / self.scale)))
-            
-            # we have the correct region of the pyramid image cropped
-            # but the image is reduced compared to the original image
-            # now resize the reduced pyramid image to fit the size
+            # then resize the reduced pyramid image to fit the size
             # of the currently scrolled/zoomed canvas region
-            imagetk = ImageTk.PhotoImage(
-                image.resize((int(x2 - x1), int(y2 - y1)), Image.LANCZOS))
-            # and place the image on the canvas
-            imageid = self.canvas.create_image(
-                max(box_canvas[0], box_img_int[0]), 
-                max(box_canvas[1], box_img_int[1]), 
-                anchor='nw', image=imagetk)
-
-            self.canvas.lower(imageid)  # set image into background
-            # make a copy to prevent garbage collection
-            self.canvas.imagetk = imagetk
+            # and place the image on the canvas, reusing the photo image of the previous frame
+            self.view.show(imaging.render_view(self.pyramid, self.curr_img, self.scale, x1, y1, x2, y2),
+                           max(box_canvas[0], box_img_int[0]),
+                           max(box_canvas[1], box_img_int[1]))
+        else:
+            self.view.hide()  # image scrolled out of view
 
     def create_option_buttons(self):
         """Create option buttons off to the side of the canvas.
@@ -768,12 +916,10 @@ class TileCanvas:
 
                 # calculate the area to display next to circle marker on canvas
                 # convert x, y to microns using image size in pixels vs microns
-                micx = ((evx - self.start_x)
-                        * (float(self.clob.sel_irow[9])
-                           / float(self.clob.sel_irow[11])))
-                micy = ((evy - self.start_y)
-                        * (float(self.clob.sel_irow[10])
-                           / float(self.clob.sel_irow[12])))
+                mic_per_px_x, mic_per_px_y = self.clob.model.microns_per_pixel(
+                    self.clob.sel_index)
+                micx = (evx - self.start_x) * mic_per_px_x
+                micy = (evy - self.start_y) * mic_per_px_y
                 micron_radius = (micx**2 + micy**2)**0.5
                 # also, scale according to the current image magnification
                 scaled_radius = (micron_radius / self.imscale)
@@ -801,12 +947,10 @@ class TileCanvas:
 
                 # line length in microns using image size in pixels vs microns
                 # we also scale according to current image magnification
-                micx = ((evx - self.start_x)
-                        * (float(self.clob.sel_irow[9])
-                           / float(self.clob.sel_irow[11])))
-                micy = ((evy - self.start_y)
-                        * (float(self.clob.sel_irow[10])
-                           / float(self.clob.sel_irow[12])))
+                mic_per_px_x, mic_per_px_y = self.clob.model.microns_per_pixel(
+                    self.clob.sel_index)
+                micx = (evx - self.start_x) * mic_per_px_x
+                micy = (evy - self.start_y) * mic_per_px_y
                 micron_len = (micx**2 + micy**2)**0.5
                 scaled_len = (micron_len / self.imscale)
 
@@ -927,18 +1071,28 @@ class TileCanvas:
             self.imscale = self.imscale * self.delta
             scale_inst = scale_inst * self.delta
         # take appropriate image from the pyramid
-        log_chooser = int(math.log(self.imscale, self.reduce_factor))
-        self.curr_img = min((-1) * log_chooser, len(self.pyramid) - 1)
         # self.imscale alone determines the scale from
         # only the zoom events that have occured
-        # below we factor in the total reduction scale
-        # of the selected pyramid image by multiplying the total 
-        # zoom scale by the reduction factor a number of times equal to
-        # the index of the pyramid image in the pyramid list
-        self.scale = self.imscale * self.reduce_factor**(max(0, self.curr_img))
+        # self.scale also factors in the total reduction scale
+        # of the selected pyramid image
+        self.curr_img, self.scale = imaging.pyramid_level(
+            self.imscale, len(self.pyramid), self.reduce_factor)
         # rescale all objects in canvas using scale_inst
         self.canvas.scale('all', x, y, scale_inst, scale_inst)
-        
+        self.scale_labels(scale_inst)
+        # Redraw some figures before showing image on the screen
+        self.show_image()
+
+    def scale_labels(self, scale_inst):
+        """Scale the font of the defect labels along with a zoom.
+
+        Parameters
+        ----------
+        scale_inst : float
+            Scale of this zoom event.
+
+        Returns -> None
+        """
         # below we scale the text
         rounding_indicator = self.clob.label_fsize * scale_inst
         # we will increase or decrease font size based on rounding indicator
@@ -961,8 +1115,6 @@ class TileCanvas:
         for child_widget in self.canvas.find_withtag("text"):
             self.canvas.itemconfigure(child_widget, 
                                       font=("Arial", -self.new_font_size))
-        # Redraw some figures before showing image on the screen
-        self.show_image()
 
     def keystroke(self, event):
         """Scrolling with the keyboard.
@@ -996,13 +1148,14 @@ class TileCanvas:
 
     def destroy(self):
         """Destroy image list, frame, and canvas.
-        Currently not in use.
+        Called when the tile window closes.
 
         Returns -> None
         """
-        self.image.close()
-        map(lambda i: i.close, self.pyramid)  # close all pyramid images
-        del self.pyramid[:]  # delete pyramid list
+        # the pyramid is shared through the tile cache of the scheduler, which drops it
+        self.clob.scheduler.release_tile(self.path)
         del self.pyramid  # delete pyramid variable
+        del self.image
+        self.view = None  # photo image of the canvas
         self.canvas.destroy()
         self.imframe.destroy()
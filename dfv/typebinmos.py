@@ -23,7 +23,7 @@ class DefectTypeBinning:
         self.defect_binning_window = tk.Toplevel()
         self.defect_binning_window.title('Defect Class Binning')
 
-        self.row_num = len(self.mosaic_settings.mosaic_creator.defect_type_data)  # dummy variable records number of defect classification bins
+        self.row_num = len(self.mosaic_settings.mosaic_creator.model.defect_type_data)  # dummy variable records number of defect classification bins
         self.list_of_entry_fields = np.empty((0, 2))  # list to hold all entry variables for referencing
 
         # button to accept binning and send to main mosaic settings window
@@ -41,10 +41,10 @@ class DefectTypeBinning:
         # populate with previously saved choices...
         # the number of entries is automatically set by the number of defect class names in the chosen analysis
         # also check first if defect classes exist for chosen analysis ID
-        if self.mosaic_settings.mosaic_creator.defect_type_data.size == 0:
+        if self.mosaic_settings.mosaic_creator.model.defect_type_data.size == 0:
             tk.Label(self.defect_binning_window, text='---NO CLASSES IN CHOSEN ANALYSIS---').grid(row=2, column=0, columnspan=2)
         else:
-            for i, type_entry in enumerate(self.mosaic_settings.mosaic_creator.defect_type_data[:, [0, 2]]):
+            for i, type_entry in enumerate(self.mosaic_settings.mosaic_creator.model.defect_type_data[:, [0, 2]]):
                 if self.mosaic_settings.binning_type_colors.size == 0:
                     self.list_of_entry_fields = np.append(self.list_of_entry_fields,
                                                 [[tk.Label(self.defect_binning_window, text=type_entry[1]),
@@ -59,7 +59,7 @@ class DefectTypeBinning:
     def set_binning_options(self):
         """ Send current binning options back to MosaicSettings """
         # check first if defect classes exist for chosen analysis ID
-        if self.mosaic_settings.mosaic_creator.defect_type_data.size == 0:
+        if self.mosaic_settings.mosaic_creator.model.defect_type_data.size == 0:
             return
         else:
             def get_var_value(x):
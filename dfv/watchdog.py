@@ -0,0 +1,226 @@
+"""
+dfv.watchdog
+------------
+
+This module measures how responsive the tk event loop is and finds
+the callbacks that freeze the GUI.
+
+A heartbeat is scheduled with after() every few milliseconds. The
+delay between when a heartbeat was due and when it ran is the UI
+latency, collected into a histogram. A background thread watches
+the heartbeats, and while one is overdue by more than the threshold
+it samples the stack of the tk thread. Each stall is attributed to
+the innermost dfv function seen in its stack samples.
+
+The watchdog is off by default and switched on with the
+DFV_WATCHDOG environment variable or the --watchdog flag:
+
+    $ DFV_WATCHDOG=1 python -m dfv
+    $ python -m dfv --watchdog latency.json
+
+Stalls are printed as they end. The histogram and every stall with
+its stack are written as JSON when the session ends. When dfv.instrument
+is on, stalls also appear in its trace as 'ui.stall'.
+"""
+
+# watchdog.py imports
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+
+# custom modules
+from dfv import instrument
+
+# upper edges of the latency histogram buckets in ms, the last bucket is open ended
+LATENCY_BUCKETS_MS = (5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+STACK_DEPTH = 25  # innermost frames kept per stack sample
+THIS_FILE = os.path.abspath(__file__)
+PACKAGE_DIR = os.path.dirname(THIS_FILE)
+
+ENABLED = False  # whether Root starts a watchdog
+log_path = None  # file the latency report is written to
+
+
+def enable(path=None):
+    """Make Root start a watchdog, writing its report to path at exit."""
+    global ENABLED, log_path
+    ENABLED = True
+    log_path = path or os.path.abspath(time.strftime('dfv_latency_%Y%m%d_%H%M%S') + '_' + str(os.getpid()) + '.json')
+
+
+def enable_from_env():
+    """Enable the watchdog when DFV_WATCHDOG is set, a value ending in '.json' names the report file."""
+    value = os.environ.get('DFV_WATCHDOG', '')
+    if value and value != '0':
+        enable(value if value.endswith('.json') else None)
+
+
+def bucket_labels():
+    """Readable labels of the latency histogram buckets."""
+    edges = (0,) + LATENCY_BUCKETS_MS
+    return [f"{lo}-{hi} ms" for lo, hi in zip(edges[:-1], edges[1:])] + [f">{edges[-1]} ms"]
+
+
+def culprit(stack):
+    """Return the innermost frame of a stack sample that belongs to dfv, outside this module."""
+    for filename, lineno, name in reversed(stack):
+        path = os.path.abspath(filename)
+        if path.startswith(PACKAGE_DIR) and path != THIS_FILE:
+            return f"{os.path.basename(filename)}:{name}"
+    filename, lineno, name = stack[-1]
+    return f"{os.path.basename(filename)}:{name}"
+
+
+class Watchdog:
+    """Heartbeat based latency monitor of the tk event loop."""
+
+    def __init__(self, widget, interval_ms=50, threshold_ms=250, path=None):
+        """Prepare the monitor, call start() from the tk thread to run it.
+
+        Parameters
+        ----------
+        widget : tk widget
+            Any widget of the application, used to schedule heartbeats.
+        interval_ms : int, optional
+            Time between heartbeats. The default is 50.
+        threshold_ms : int, optional
+            Heartbeats overdue by more than this are stalls. The default is 250.
+        path : string, optional
+            Report file written by dump(). The default is the enabled log path.
+
+        Returns -> None.
+        """
+        self.widget = widget  # schedules the heartbeats
+        self.interval = interval_ms / 1000  # heartbeat interval in seconds
+        self.threshold = threshold_ms / 1000  # stall threshold in seconds
+        self.path = path or log_path  # file the report is written to
+        self.tk_thread = None  # ident of the thread running the tk event loop
+        self.started = None  # perf_counter time the watchdog started
+        self.after_id = None  # pending heartbeat
+        self.due = None  # perf_counter time the next heartbeat is due
+        self.histogram = [0] * (len(LATENCY_BUCKETS_MS) + 1)  # heartbeat count per latency bucket
+        self.beats = 0  # heartbeats seen
+        self.total_latency = 0.0  # sum of all latencies in seconds
+        self.max_latency = 0.0  # worst latency in seconds
+        self.stalls = []  # finished stalls, see end_stall()
+        self.stall = None  # stall in progress: start time and Counter of stack samples
+        self.lock = threading.Lock()  # guards due and stall, shared with the sampler thread
+        self.stopped = threading.Event()
+        self.sampler = threading.Thread(target=self.sample_loop, name='dfv-watchdog', daemon=True)
+
+    def start(self):
+        """Start the heartbeats and the stack sampler, must be called from the tk thread."""
+        self.tk_thread = threading.get_ident()
+        self.started = time.perf_counter()
+        with self.lock:
+            self.due = time.perf_counter() + self.interval
+        self.after_id = self.widget.after(int(self.interval * 1000), self.heartbeat)
+        self.sampler.start()
+        atexit.register(self.dump)
+
+    def stop(self):
+        """Stop the heartbeats and the sampler."""
+        self.stopped.set()
+        if self.after_id is not None:
+            try:
+                self.widget.after_cancel(self.after_id)
+            except Exception:
+                pass  # the widget is already destroyed
+            self.after_id = None
+
+    def heartbeat(self):
+        """Record the latency of this heartbeat and schedule the next one."""
+        now = time.perf_counter()
+        with self.lock:
+            latency = max(0.0, now - self.due)
+            if self.stall is not None:
+                self.end_stall(now)
+            self.due = now + self.interval
+        self.beats += 1
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+        bucket = sum(latency * 1000 > edge for edge in LATENCY_BUCKETS_MS)
+        self.histogram[bucket] += 1
+        if not self.stopped.is_set():
+            self.after_id = self.widget.after(int(self.interval * 1000), self.heartbeat)
+
+    def sample_loop(self):
+        """Sampler thread, takes a stack sample of the tk thread while a heartbeat is overdue.
+
+        Only the frame is taken under the lock, the stack is formatted
+        after releasing it so the heartbeat never waits on the sampler.
+        """
+        period = min(self.threshold / 2, 0.05)
+        while not self.stopped.wait(period):
+            now = time.perf_counter()
+            with self.lock:
+                due = self.due
+                if due is None or now - due < self.threshold:
+                    continue
+                frame = sys._current_frames().get(self.tk_thread)
+            if frame is None:
+                continue
+            summary = traceback.StackSummary.extract(traceback.walk_stack(frame), limit=STACK_DEPTH, lookup_lines=False)
+            stack = tuple((f.filename, f.lineno, f.name) for f in reversed(summary))
+            del frame
+            with self.lock:
+                if self.due != due:
+                    continue  # the heartbeat came meanwhile, the sample is stale
+                if self.stall is None:
+                    self.stall = {'start': due, 'samples': Counter()}
+                self.stall['samples'][stack] += 1
+
+    def end_stall(self, now):
+        """Attribute a finished stall to its most sampled callback and report it."""
+        start = self.stall['start']
+        samples = self.stall['samples']
+        self.stall = None
+        stack, _ = samples.most_common(1)[0]
+        callbacks = Counter()
+        for sample, n in samples.items():
+            callbacks[culprit(sample)] += n
+        callback = callbacks.most_common(1)[0][0]
+        duration = now - start
+        self.stalls.append({'start': start - self.started, 'duration': duration, 'callback': callback,
+                            'samples': sum(samples.values()),
+                            'stack': [f"{os.path.basename(f)}:{line} {name}" for f, line, name in stack]})
+        if instrument.ENABLED:
+            instrument.record('ui.stall', start, duration)
+        print(f"GUI was unresponsive for {duration * 1000:.0f} ms in {callback}")
+
+    def report(self):
+        """Return the latency histogram and the stalls as a JSON-serializable dict."""
+        by_callback = {}
+        for stall in self.stalls:
+            entry = by_callback.setdefault(stall['callback'], {'count': 0, 'total': 0.0, 'max': 0.0})
+            entry['count'] += 1
+            entry['total'] += stall['duration']
+            entry['max'] = max(entry['max'], stall['duration'])
+        return {
+            'interval_ms': self.interval * 1000,
+            'threshold_ms': self.threshold * 1000,
+            'heartbeats': self.beats,
+            'mean_latency_ms': self.total_latency / self.beats * 1000 if self.beats else 0.0,
+            'max_latency_ms': self.max_latency * 1000,
+            'histogram': dict(zip(bucket_labels(), self.histogram)),
+            'stalls_by_callback': dict(sorted(by_callback.items(), key=lambda item: -item[1]['total'])),
+            'stalls': self.stalls,
+        }
+
+    def dump(self, path=None):
+        """Write the report to path, or to the report file of the watchdog."""
+        path = path or self.path
+        if path is None:
+            return None
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=1)
+        print('Wrote GUI latency report to ' + path)
+        return path
+
+
+enable_from_env()